@@ -0,0 +1,76 @@
+"""
+Measure one `alert.process_alerts` cycle of a source that returns many alerts (i.e. quota or snapshot count alerts),
+matching every alert with the existing ones by scanning the alert list (as before) and with `AlertStore`.
+
+    python -m benchmarks.alert_store [--alerts 5000] [--other 1000] [--repeat 3]
+"""
+import argparse
+from datetime import datetime
+import statistics
+import time
+
+from middlewared.alert.base import Alert
+from middlewared.plugins.alert import AlertStore, TestAlertClass
+
+
+def make_alerts(source, count):
+    return [Alert(TestAlertClass, {"n": i}, node="A", _source=source) for i in range(count)]
+
+
+def handle(alert, existing_alert):
+    alert.uuid = existing_alert.uuid if existing_alert else str(id(alert))
+    alert.datetime = existing_alert.datetime if existing_alert else datetime.utcnow()
+    alert.last_occurrence = datetime.utcnow()
+
+
+def list_cycle(alerts, new_alerts):
+    for alert in new_alerts:
+        try:
+            existing_alert = [
+                a for a in alerts
+                if (a.node, a.source, a.klass, a.key) == (alert.node, alert.source, alert.klass, alert.key)
+            ][0]
+        except IndexError:
+            existing_alert = None
+        handle(alert, existing_alert)
+
+    return [a for a in alerts if a.source != "Quota"] + new_alerts
+
+
+def store_cycle(store, new_alerts):
+    for alert in new_alerts:
+        handle(alert, store.get(alert))
+
+    store.replace_source("Quota", new_alerts)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=5000, help="alerts of the source that is ran")
+    parser.add_argument("--other", type=int, default=1000, help="alerts of other sources")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.alerts} alerts of the source that is ran, {args.other} other alerts")
+    results = []
+    for title, cycle, empty in [("alert list", list_cycle, list), ("AlertStore", store_cycle, AlertStore)]:
+        timings = []
+        for i in range(args.repeat):
+            alerts = empty()
+            for alert_list in (make_alerts("Other", args.other), make_alerts("Quota", args.alerts)):
+                for alert in alert_list:
+                    handle(alert, None)
+                alerts = cycle(alerts, alert_list)
+
+            new_alerts = make_alerts("Quota", args.alerts)
+            start = time.perf_counter()
+            cycle(alerts, new_alerts)
+            timings.append(time.perf_counter() - start)
+
+        results.append(statistics.median(timings))
+        print(f"    {title:<16} {results[-1] * 1000:>10.2f} ms {results[0] / results[-1]:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure `pool.dataset.details` for `--datasets` datasets and `--shares` NFS and SMB shares each, matching every dataset
+against every share and mount (as before) and looking them up in the `DatasetConsumers` indexes.
+
+Other consumers (iSCSI, tasks, VMs and apps) are left empty, so are the dataset and consumer queries.
+
+    python -m benchmarks.dataset_details [--datasets 4000] [--shares 600] [--repeat 5]
+"""
+import argparse
+from unittest.mock import patch
+
+from middlewared.plugins.pool_.dataset_details import PoolDatasetService
+from middlewared.pytest.unit.middleware import Middleware
+
+from .utils import report, timeit
+
+
+def scan_details(datasets, shares, mntinfo):
+    for ds in datasets:
+        for info in filter(lambda x: x['mountpoint'] == ds['mountpoint'], mntinfo.values()):
+            ds['readonly'] = 'RO' in info['mount_opts']
+
+        for key in ('nfs', 'smb'):
+            ds[f'{key}_shares'] = [
+                {'enabled': share['enabled'], 'path': share['path']} for share in shares[key]
+                if share['path'] == ds['mountpoint'] or share['mount_info'].get('mount_source') == ds['id']
+            ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets', type=int, default=4000)
+    parser.add_argument('--shares', type=int, default=600)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    names = [f'tank/ds{i:05d}' for i in range(args.datasets)]
+    mntinfo = {
+        i: {'mountpoint': f'/mnt/{name}', 'mount_source': name, 'mount_opts': ['RW'], 'super_opts': []}
+        for i, name in enumerate(names)
+    }
+    shares = {
+        'nfs': [{'path': f'/mnt/{names[i * 7 % len(names)]}', 'enabled': True} for i in range(args.shares)],
+        'smb': [{'path': f'/mnt/{names[i * 3 % len(names)]}/dir', 'enabled': True, 'name': f'share{i}'}
+                for i in range(args.shares)],
+    }
+
+    def datasets():
+        return [{
+            'id': name, 'name': name, 'type': 'FILESYSTEM', 'mountpoint': f'/mnt/{name}', 'locked': False,
+            'reservation': {'value': None}, 'refreservation': {'value': None}, 'children': [],
+        } for name in names]
+
+    m = Middleware()
+    m['pool.dataset.query'] = lambda *args: datasets()
+    for method in ('iscsi.targetextent.query', 'iscsi.target.query', 'iscsi.extent.query', 'rsynctask.query',
+                   'datastore.query'):
+        m[method] = lambda *args: []
+    m['chart.release.get_consumed_host_paths'] = lambda: {}
+    m['sharing.nfs.query'] = lambda: shares['nfs']
+    m['sharing.smb.query'] = lambda: shares['smb']
+    service = PoolDatasetService(m)
+    by_path = {info['mountpoint']: info for info in mntinfo.values()}
+    service.get_mount_info = lambda path, mntinfo: by_path.get(path.removesuffix('/dir'), {})
+
+    scanned_shares = {
+        key: [{**share, 'mount_info': service.get_mount_info(share['path'], mntinfo)} for share in shares[key]]
+        for key in ('nfs', 'smb')
+    }
+    with patch('middlewared.plugins.pool_.dataset_details.getmntinfo', lambda: mntinfo):
+        report(f'{args.datasets} datasets, {args.shares} NFS and {args.shares} SMB shares', [
+            ('scan shares and mounts', timeit(lambda: scan_details(datasets(), scanned_shares, mntinfo), args.repeat)),
+            ('DatasetConsumers', timeit(service.details, args.repeat)),
+        ])
+
+
+if __name__ == '__main__':
+    main()
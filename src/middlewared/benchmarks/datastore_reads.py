@@ -0,0 +1,155 @@
+"""
+Measure `datastore.query` latency and throughput while a burst of writes is running, with all reads going through
+the single datastore write thread (as before) and with reads served by the read-only connection pool.
+
+Writes are slowed down by `--replication-latency` milliseconds spent in the `datastore.post_execute_write` hook, which
+is what HA replication does on enterprise systems.
+
+    python -m benchmarks.datastore_reads [--readers 8] [--writers 2] [--duration 5] [--replication-latency 5]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+from unittest.mock import patch
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+import middlewared.plugins.datastore  # noqa
+import middlewared.plugins.datastore.connection  # noqa
+import middlewared.plugins.datastore.schema  # noqa
+import middlewared.plugins.datastore.util  # noqa
+from middlewared.plugins.datastore.connection import READ_CONNECTIONS, thread_pool
+from middlewared.pytest.unit.helpers import load_compound_service
+from middlewared.pytest.unit.middleware import Middleware
+
+DatastoreService = load_compound_service('datastore')
+
+Model = declarative_base()
+
+
+class ConfigModel(Model):
+    __tablename__ = 'bench_config'
+
+    id = sa.Column(sa.Integer(), primary_key=True)
+    bench_hostname = sa.Column(sa.String(120))
+    bench_domain = sa.Column(sa.String(120))
+
+
+class ItemModel(Model):
+    __tablename__ = 'bench_item'
+
+    id = sa.Column(sa.Integer(), primary_key=True)
+    bench_value = sa.Column(sa.Integer())
+
+
+class BenchmarkMiddleware(Middleware):
+    """
+    Runs synchronous datastore methods in the executors the real middleware would use.
+    """
+
+    def __init__(self, serialize_reads, replication_latency):
+        super().__init__()
+        self.serialize_reads = serialize_reads
+        self.call_hook_inline = lambda *args: time.sleep(replication_latency)
+
+    async def call(self, name, *args):
+        method = self[name]
+        if asyncio.iscoroutinefunction(method):
+            return await method(*args)
+
+        executor = getattr(method, '_thread_pool', thread_pool)
+        if self.serialize_reads:
+            executor = thread_pool
+
+        return await asyncio.get_running_loop().run_in_executor(executor, method, *args)
+
+
+@contextlib.contextmanager
+def datastore(serialize_reads, replication_latency):
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'freenas-v1.db')
+        with patch('middlewared.plugins.datastore.connection.FREENAS_DATABASE', database):
+            with patch('middlewared.plugins.datastore.schema.Model', Model):
+                with patch('middlewared.plugins.datastore.util.Model', Model):
+                    m = BenchmarkMiddleware(serialize_reads, replication_latency)
+                    ds = DatastoreService(m)
+                    # The write connection can only be used from the datastore thread
+                    thread_pool.submit(ds.setup).result()
+                    connection = [part.connection for part in ds.parts if getattr(part, 'connection', None)][0]
+                    thread_pool.submit(Model.metadata.create_all, bind=connection).result()
+
+                    for name in [
+                        'execute_write', 'fetchall', 'query', 'config', 'insert', 'update', 'send_insert_events',
+                        'send_update_events',
+                    ]:
+                        m[f'datastore.{name}'] = getattr(ds, name)
+
+                    try:
+                        yield ds
+                    finally:
+                        thread_pool.submit(connection.close).result()
+
+
+async def run(ds, readers, writers, duration, items):
+    await ds.insert('bench.config', {'hostname': 'truenas', 'domain': 'local'}, {'prefix': 'bench_'})
+    for i in range(items):
+        await ds.insert('bench.item', {'value': i}, {'prefix': 'bench_'})
+
+    latencies = []
+    writes = 0
+    deadline = time.monotonic() + duration
+
+    async def reader():
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            await ds.middleware.call('datastore.config', 'bench.config', {'prefix': 'bench_'})
+            latencies.append(time.perf_counter() - start)
+
+    async def writer(n):
+        nonlocal writes
+        i = n
+        while time.monotonic() < deadline:
+            await ds.middleware.call(
+                'datastore.update', 'bench.item', i % items + 1, {'value': i}, {'prefix': 'bench_'},
+            )
+            writes += 1
+            i += writers
+
+    await asyncio.gather(*[reader() for i in range(readers)], *[writer(i) for i in range(writers)])
+
+    latencies.sort()
+    return {
+        'reads/s': len(latencies) / duration,
+        'p50 ms': statistics.median(latencies) * 1000,
+        'p99 ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'writes/s': writes / duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--replication-latency', type=float, default=5, help='milliseconds')
+    args = parser.parse_args()
+
+    print(
+        f'{args.readers} readers, {args.writers} writers, {args.duration}s, '
+        f'{args.replication_latency}ms replication latency, {READ_CONNECTIONS} read connections'
+    )
+    for title, serialize_reads in [('reads in the write thread', True), ('read-only connection pool', False)]:
+        with datastore(serialize_reads, args.replication_latency / 1000) as ds:
+            result = asyncio.run(run(ds, args.readers, args.writers, args.duration, args.items))
+
+        print(f'    {title:<30}' + ''.join(f' {k} {v:>10.2f}' for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
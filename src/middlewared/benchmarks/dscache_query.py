@@ -0,0 +1,80 @@
+"""
+Measure `dscache.query` for typical UI requests against a directory services cache of `--users` users, reading,
+sorting and filtering every cached user (as before) and streaming through the `DSCacheIndex` candidates.
+
+The TDB file is emulated with a dictionary of JSON strings (which is what `tdb.entries` and `tdb.batch_ops` decode).
+
+    python -m benchmarks.dscache_query [--users 150000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+
+from middlewared.plugins.cache import DSCache
+from middlewared.pytest.unit.helpers import create_service
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.utils import filter_list
+
+from .utils import report, timeit
+
+QUERIES = [
+    ('typeahead', [['username', '^', 'user0123']], {'limit': 50}),
+    ('first page', [], {'limit': 50, 'offset': 0}),
+    ('uid range', [['uid', '>=', 150000], ['uid', '<', 150100]], {}),
+    ('count', [], {'count': True}),
+]
+
+
+class TDB:
+    def __init__(self, entries):
+        self.values = {f'ID_{entry["uid"]}': json.dumps(entry) for entry in entries}
+
+    def entries(self, data):
+        return [{'key': k, 'val': json.loads(v)} for k, v in self.values.items()]
+
+    def batch_ops(self, data):
+        return [json.loads(self.values[op['key']]) for op in data['ops']]
+
+
+def scan_query(middleware, filters, options):
+    entries = [x['val'] for x in middleware['tdb.entries']({'name': 'activedirectory_user'})]
+    for entry in entries:
+        entry['sid'] = None
+        entry['nt_name'] = None
+
+    return filter_list(sorted(entries, key=lambda i: i['id']), filters, options)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=150000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tdb = TDB([
+        {'id': 100000 + i, 'uid': 100000 + i, 'username': f'user{i:07d}', 'sid': f'S-1-5-21-1-2-3-{i}',
+         'nt_name': f'user{i:07d}', 'full_name': f'User {i}', 'groups': [], 'local': False}
+        for i in range(args.users)
+    ])
+    m = Middleware()
+    m['tdb.entries'] = tdb.entries
+    m['tdb.batch_ops'] = tdb.batch_ops
+    m['directoryservices.get_state'] = lambda: {'activedirectory': 'HEALTHY', 'ldap': 'DISABLED'}
+    m['user.query'] = lambda filters, options: []
+    service = create_service(m, DSCache)
+
+    loop = asyncio.new_event_loop()
+    # The index is built once per middleware process
+    loop.run_until_complete(service.get_index('ACTIVEDIRECTORY', 'USER'))
+
+    for name, filters, options in QUERIES:
+        assert scan_query(m, filters, options) == loop.run_until_complete(service.query('USERS', filters, options))
+        report(f'{args.users} cached users, {name}: {filters} {options}', [
+            ('read every entry', timeit(lambda: scan_query(m, filters, options), args.repeat)),
+            ('DSCacheIndex', timeit(lambda: loop.run_until_complete(service.query('USERS', filters, options)),
+                                    args.repeat)),
+        ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Compare compiled `filter_list` plans against the per-row filter interpreter.
+
+    python -m benchmarks.filter_list [--rows 100000] [--repeat 5]
+"""
+import argparse
+
+from middlewared.utils import filters
+
+from .utils import report, snapshots, timeit
+
+
+QUERIES = [
+    ('equal', [['dataset', '=', 'tank/share/ds7']], {}),
+    ('casefold startswith', [['snapshot_name', 'C^', 'AUTO-0000']], {}),
+    ('regex', [['name', '~', r'tank/share/ds1\d@']], {}),
+    ('in', [['dataset', 'in', [f'tank/share/ds{i}' for i in range(0, 100, 3)]]], {}),
+    ('nested property', [['properties.used.parsed', '>', 512 * 1024]], {}),
+    ('OR + select', [['OR', [['dataset', '$', 'ds1'], ['properties.userrefs.parsed', '!=', 0]]]],
+     {'select': ['id', 'createtxg']}),
+    ('filter + order_by', [['pool', '=', 'tank']], {'order_by': ['-properties.creation.parsed']}),
+    ('get', [['snapshot_name', '=', 'auto-99999999']], {}),
+    ('page of 50', [['pool', '=', 'tank']], {'offset': 100, 'limit': 50}),
+    ('ordered page of 50', [], {'order_by': ['-properties.creation.parsed'], 'offset': 100, 'limit': 50}),
+    ('multi-key ordered page of 50', [], {'order_by': ['-properties.used.parsed', 'dataset'], 'limit': 50}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data = snapshots(args.rows)
+    f = filters()
+    for title, query_filters, options in QUERIES:
+        expected = f.interpret_list(data, query_filters, options)
+        assert f.filter_list(data, query_filters, options) == expected, title
+
+        report(f'{title} ({args.rows} rows)', [
+            ('interpreted', timeit(lambda: f.interpret_list(data, query_filters, options), args.repeat)),
+            ('compiled (cached plan)', timeit(lambda: f.filter_list(data, query_filters, options), args.repeat)),
+        ])
+
+
+if __name__ == '__main__':
+    main()
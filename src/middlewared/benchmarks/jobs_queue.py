@@ -0,0 +1,139 @@
+"""
+Enqueue a burst of jobs spread over a number of locks and dispatch all of them, comparing the scheduler that scans the
+whole waiting list for every dispatched job against the per-lock wait queues.
+
+Jobs run for a varying number of event loop iterations before releasing their lock, so the oldest waiting jobs are
+often blocked by a running job with the same lock while newer ones can be started.
+
+    python -m benchmarks.jobs_queue [--jobs 50000] [--locks 500] [--lock-queue-size N]
+"""
+import argparse
+import asyncio
+import time
+
+from middlewared.job import Job, JobsQueue
+
+
+class ScanningJobsQueue(JobsQueue):
+    """
+    The previous scheduler: a single list of waiting jobs that is scanned for the first job that can run.
+    """
+
+    def __init__(self, middleware):
+        super().__init__(middleware)
+        self.queue = []
+
+    def add(self, job):
+        self.handle_lock(job)
+        if job.options['lock_queue_size'] is not None:
+            queued_jobs = [another_job for another_job in self.queue if another_job.lock is job.lock]
+            if len(queued_jobs) >= job.options['lock_queue_size']:
+                return queued_jobs[-1]
+
+        self.deque.add(job)
+        self.queue.append(job)
+        job.send_event('ADDED', job.__encode__())
+        self.queue_event.set()
+        return job
+
+    def release_lock(self, job):
+        lock = job.lock
+        lock.remove_job(job)
+        lock.release()
+        if len(lock.get_jobs()) == 0:
+            self.job_locks.pop(lock.name)
+        self.queue_event.set()
+
+    async def next(self):
+        while True:
+            await self.queue_event.wait()
+            found = None
+            for job in self.queue:
+                if job.lock is None or not job.lock.locked():
+                    found = job
+                    if job.lock:
+                        await job.lock.acquire()
+                    break
+            if found:
+                self.queue.remove(found)
+                if len(self.queue) == 0:
+                    self.queue_event.clear()
+                return found
+            else:
+                self.queue_event.clear()
+
+
+class BenchmarkMiddleware:
+    loop = None
+
+    def dump_args(self, args, method=None):
+        return args
+
+    def event_register(self, *args):
+        pass
+
+    def send_event(self, *args, **kwargs):
+        pass
+
+
+def make_job(middleware, lock, lock_queue_size):
+    return Job(middleware, 'bench.job', None, None, [], {
+        'lock': lock,
+        'lock_queue_size': lock_queue_size,
+        'logs': False,
+        'process': False,
+        'pipes': [],
+        'check_pipes': False,
+        'description': None,
+        'transient': True,
+        'abortable': False,
+    }, None, None)
+
+
+async def run(queue_class, jobs, locks, lock_queue_size):
+    middleware = BenchmarkMiddleware()
+    queue = queue_class(middleware)
+    queue.deque.maxlen = jobs * 2
+
+    new_jobs = [make_job(middleware, f'lock{i % locks}', lock_queue_size) for i in range(jobs)]
+
+    start = time.perf_counter()
+    queued = len({id(queue.add(job)) for job in new_jobs})
+    enqueue = time.perf_counter() - start
+
+    async def finish(job):
+        for i in range(job.id % 7):
+            await asyncio.sleep(0)
+        queue.release_lock(job)
+
+    start = time.perf_counter()
+    tasks = []
+    for i in range(queued):
+        job = await queue.next()
+        tasks.append(asyncio.create_task(finish(job)))
+    await asyncio.gather(*tasks)
+    dispatch = time.perf_counter() - start
+
+    return queued, enqueue, dispatch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=50000)
+    parser.add_argument('--locks', type=int, default=500)
+    parser.add_argument('--lock-queue-size', type=int, default=None)
+    args = parser.parse_args()
+
+    print(f'{args.jobs} jobs, {args.locks} locks, lock_queue_size={args.lock_queue_size}')
+    results = []
+    for title, queue_class in [('scan waiting list', ScanningJobsQueue), ('per-lock wait queues', JobsQueue)]:
+        queued, enqueue, dispatch = asyncio.run(run(queue_class, args.jobs, args.locks, args.lock_queue_size))
+        results.append(dispatch)
+        print(
+            f'    {title:<30} {queued:>8} queued  enqueue {enqueue * 1000:>10.2f} ms  '
+            f'dispatch {dispatch * 1000:>10.2f} ms {results[0] / dispatch:>8.2f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
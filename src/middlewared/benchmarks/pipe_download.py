@@ -0,0 +1,114 @@
+"""
+Measure `/_download` throughput for a buffered job pipe, copying it in a thread with one event loop round trip per
+megabyte (as before) and sending it with `stream_pipe_response`.
+
+The client runs in a separate process and discards the data.
+
+    python -m benchmarks.pipe_download [--size 4096] [--repeat 3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from aiohttp import web
+
+from middlewared.pipe import Pipe
+from middlewared.restful import stream_pipe_response
+
+CLIENT = '''
+import sys, urllib.request
+with urllib.request.urlopen(sys.argv[1]) as r:
+    total = 0
+    while chunk := r.read(1048576):
+        total += len(chunk)
+print(total)
+'''
+
+
+class BenchmarkMiddleware:
+    async def run_in_thread(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+
+async def thread_copy(request, pipe):
+    resp = web.StreamResponse(status=200, reason='OK', headers={
+        'Content-Type': 'application/octet-stream',
+        'Transfer-Encoding': 'chunked',
+    })
+    await resp.prepare(request)
+
+    loop = asyncio.get_running_loop()
+
+    def do_copy():
+        while True:
+            read = pipe.r.read(1048576)
+            if read == b'':
+                break
+            asyncio.run_coroutine_threadsafe(resp.write(read), loop=loop).result()
+
+    await pipe.middleware.run_in_thread(do_copy)
+    return resp
+
+
+async def download(handler, pipe, repeat):
+    async def handle(request):
+        pipe.r.seek(0)
+        return await handler(request, pipe)
+
+    app = web.Application()
+    app.router.add_get('/', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    timings = []
+    try:
+        for i in range(repeat):
+            start = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, '-c', CLIENT, f'http://127.0.0.1:{port}/', stdout=subprocess.PIPE,
+            )
+            stdout, stderr = await process.communicate()
+            timings.append(time.perf_counter() - start)
+            assert int(stdout) == os.fstat(pipe.r.fileno()).st_size
+    finally:
+        await runner.cleanup()
+
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=4096, help='MiB')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pipe = Pipe(BenchmarkMiddleware(), buffered=True)
+    block = os.urandom(1048576)
+    for i in range(args.size):
+        pipe.w.write(block)
+
+    print(f'{args.size} MiB buffered pipe')
+    results = []
+    for title, handler in [
+        ('thread + run_coroutine_threadsafe', thread_copy),
+        ('stream_pipe_response (sendfile)', lambda request, pipe: stream_pipe_response(request, pipe, {})),
+    ]:
+        seconds = asyncio.run(download(handler, pipe, args.repeat))
+        results.append(seconds)
+        print(
+            f'    {title:<40} {seconds:>8.2f} s {args.size / seconds:>10.2f} MiB/s {results[0] / seconds:>8.2f}x'
+        )
+
+    pipe.w.close()
+    pipe.r.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Measure the `/proc` parsing cost of `reporting.realtime` per sampling tick for a number of subscribers with distinct
+intervals, comparing one polling loop per interval (as before) against the shared `RealtimeSampler` parsers.
+
+A `/proc/stat` and `/proc/diskstats` of a large system are generated in a temporary directory; `/proc/meminfo` is the
+real one.
+
+    python -m benchmarks.realtime_sampler [--cpus 128] [--disks 60] [--subscribers 4] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import humanfriendly
+
+from middlewared.plugins.reporting.iostat import DiskStats
+from middlewared.plugins.reporting.procfs import ProcFile
+from middlewared.plugins.reporting.sampler import parse_cpu, parse_meminfo
+
+
+def legacy_parse(stat_path, diskstats_path):
+    with open('/proc/meminfo') as f:
+        meminfo = {s[0]: humanfriendly.parse_size(s[1], binary=True) for s in [line.split(':', 1) for line in f]}
+
+    with open(stat_path) as f:
+        stat = f.read()
+    cp_times = []
+    cp_time = []
+    for line in stat.split('\n'):
+        bits = line.split()
+        if bits[0].startswith('cpu'):
+            line_ints = [int(i) for i in bits[1:]]
+            if bits[0] == 'cpu':
+                cp_time = line_ints
+            else:
+                cp_times += line_ints
+        else:
+            break
+
+    disks = DiskStats()
+    rv = {}
+    with open(diskstats_path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) != 20:
+                continue
+            rds, _, rbytes, rtime, wrs, _, wbytes, wtime, _, btime, _ = map(int, fields[3:14])
+            if disks.get_disk(fields[2]) is not None:
+                rv[fields[2]] = (rds, wrs, rbytes * 512, wbytes * 512, btime)
+
+    return meminfo, cp_time, cp_times, rv
+
+
+def generate(directory, cpus, disks):
+    stat_path = os.path.join(directory, 'stat')
+    with open(stat_path, 'w') as f:
+        for name in ['cpu'] + [f'cpu{i}' for i in range(cpus)]:
+            f.write(f'{name} ' + ' '.join(str(random.randint(0, 10 ** 9)) for i in range(10)) + '\n')
+        f.write('intr ' + ' '.join('0' for i in range(1000)) + '\nctxt 1\nbtime 1\n')
+
+    diskstats_path = os.path.join(directory, 'diskstats')
+    with open(diskstats_path, 'w') as f:
+        for i in range(disks):
+            for j, name in enumerate([f'sd{chr(97 + i % 26)}{i // 26 or ""}', f'sd{chr(97 + i % 26)}{i // 26 or ""}1']):
+                f.write(f'   8 {i * 16 + j:>7} {name} ' + ' '.join(
+                    str(random.randint(0, 10 ** 9)) for k in range(17)
+                ) + '\n')
+
+    return stat_path, diskstats_path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cpus', type=int, default=128)
+    parser.add_argument('--disks', type=int, default=60)
+    parser.add_argument('--subscribers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        stat_path, diskstats_path = generate(directory, args.cpus, args.disks)
+
+        start = time.perf_counter()
+        for i in range(args.repeat):
+            for j in range(args.subscribers):
+                legacy_parse(stat_path, diskstats_path)
+        legacy = (time.perf_counter() - start) / args.repeat
+
+        stat = ProcFile(stat_path)
+        meminfo = ProcFile('/proc/meminfo')
+        diskstats = DiskStats()
+        diskstats.diskstats = ProcFile(diskstats_path)
+        start = time.perf_counter()
+        for i in range(args.repeat):
+            parse_meminfo(meminfo)
+            parse_cpu(stat)
+            diskstats.read()
+        shared = (time.perf_counter() - start) / args.repeat
+
+    print(f'{args.cpus} cpus, {args.disks} disks, {args.subscribers} subscribers with distinct intervals')
+    for title, seconds in [('one loop per interval', legacy), ('shared sampler', shared)]:
+        print(f'    {title:<30} {seconds * 1000:>8.3f} ms per tick {legacy / seconds:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Measure how long it takes to turn an `rrdtool xport --json` payload into a `reporting.get_data` result with
+aggregations, comparing the nested lists path (as before) against the NumPy series path.
+
+    python -m benchmarks.reporting_export [--rows 52560] [--columns 8] [--graphs 20] [--points 1200]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from middlewared.plugins.reporting.series import aggregate, downsample, encode, load_json_series
+
+AGG_MAP = {'min': min, 'mean': statistics.mean, 'max': max}
+
+
+def lists_export(payload):
+    data = json.loads(payload)
+    data = dict(data=data['data'], **data['meta'], aggregations=dict())
+    transposed = [list(filter(None.__ne__, i)) for i in zip(*data['data'])]
+    for agg, function in AGG_MAP.items():
+        data['aggregations'][agg] = [(function(i) if i else None) for i in transposed]
+    return data
+
+
+def series_export(payload, points):
+    meta, values = load_json_series(payload, 'meta.legend')
+    data = dict(**meta['meta'], aggregations=aggregate(values, tuple(AGG_MAP)))
+    if points:
+        values = downsample(values, points, 'MAX')
+    data['data'] = encode(values, 'ROWS')
+    return data
+
+
+def make_payload(rows, columns):
+    return json.dumps({
+        'about': 'RRDtool graph JSON output',
+        'meta': {'start': 0, 'end': rows * 600, 'step': 600, 'legend': [f'c{i}' for i in range(columns)]},
+        'data': [
+            [random.random() * 1e6 if random.random() > 0.02 else None for j in range(columns)] for i in range(rows)
+        ],
+    }, indent=1).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=52560, help='a year of 10 minute points')
+    parser.add_argument('--columns', type=int, default=8)
+    parser.add_argument('--graphs', type=int, default=20)
+    parser.add_argument('--points', type=int, default=1200)
+    args = parser.parse_args()
+
+    payload = make_payload(args.rows, args.columns)
+    print(f'{args.graphs} graphs of {args.rows} rows x {args.columns} columns ({len(payload) // 1024} KiB each)')
+    results = []
+    for title, export in [
+        ('nested lists', lists_export),
+        ('numpy series', lambda payload: series_export(payload, None)),
+        (f'numpy series, {args.points} points', lambda payload: series_export(payload, args.points)),
+    ]:
+        start = time.perf_counter()
+        for i in range(args.graphs):
+            export(payload)
+        seconds = time.perf_counter() - start
+        results.append(seconds)
+        print(f'    {title:<30} {seconds:>8.2f} s {results[0] / seconds:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
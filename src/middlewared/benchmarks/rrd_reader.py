@@ -0,0 +1,102 @@
+"""
+Measure how long it takes to export graphs from RRD files with collectd's archive layout, spawning `rrdtool xport`
+for every graph (as before) against the in-process `RRDReader`.
+
+`rrdtool` is only spawned if it is installed, otherwise the cost of spawning a no-op process is shown as the lower
+bound of the previous path.
+
+    python -m benchmarks.rrd_reader [--graphs 40] [--start end-1d] [--repeat 5]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from middlewared.plugins.reporting.rrd_reader import (
+    CDP_PREP_SIZE, DS_DEF, LIVE_HEAD, PDP_PREP_SIZE, RRA_DEF, RRA_PTR, RRD_FLOAT_COOKIE, STAT_HEAD, RRDReader,
+)
+
+# collectd archives for `RRARows 1200`: an hour, a day, a week, a month and a year
+RRAS = [(cf, pdp_cnt) for pdp_cnt in (1, 8, 51, 224, 2636) for cf in ('AVERAGE', 'MIN', 'MAX')]
+ROWS = 1200
+
+
+def write_rrd(path, ds, last_up):
+    rng = np.random.default_rng()
+    with open(path, 'wb') as f:
+        f.write(STAT_HEAD.pack(b'RRD\0', b'0003\0', RRD_FLOAT_COOKIE, len(ds), len(RRAS), 10))
+        for name in ds:
+            f.write(DS_DEF.pack(name.encode(), b'GAUGE'))
+        for cf, pdp_cnt in RRAS:
+            f.write(RRA_DEF.pack(cf.encode(), ROWS, pdp_cnt))
+        f.write(LIVE_HEAD.pack(last_up, 0))
+        f.write(b'\0' * (PDP_PREP_SIZE * len(ds) + CDP_PREP_SIZE * len(ds) * len(RRAS)))
+        for i in range(len(RRAS)):
+            f.write(RRA_PTR.pack(int(rng.integers(ROWS))))
+        for i in range(len(RRAS)):
+            f.write((rng.random((ROWS, len(ds))) * 1e6).astype('<f8').tobytes())
+
+
+def graph_args(path):
+    return [
+        f'DEF:rx={path}:rx:AVERAGE', f'DEF:tx={path}:tx:AVERAGE',
+        'CDEF:crx=rx,8,*', 'CDEF:ctx=tx,8,*', 'XPORT:crx:rx', 'XPORT:ctx:tx',
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--graphs', type=int, default=40)
+    parser.add_argument('--start', default='end-1d')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rrdtool = shutil.which('rrdtool')
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(args.graphs):
+            paths.append(os.path.join(directory, f'if_octets-{i}.rrd'))
+            write_rrd(paths[-1], ['rx', 'tx'], int(time.time()))
+
+        def spawn():
+            for path in paths:
+                if rrdtool:
+                    cp = subprocess.run(
+                        [rrdtool, 'xport', '--json', '--start', args.start, '--end', 'now', *graph_args(path)],
+                        capture_output=True,
+                    )
+                    assert cp.returncode == 0, cp.stderr
+                else:
+                    subprocess.run(['true'], capture_output=True)
+
+        reader = RRDReader()
+
+        def native():
+            for path in paths:
+                reader.xport(graph_args(path), args.start, 'now', flush=False)
+
+        print(f'{args.graphs} graphs, --start {args.start}')
+        results = []
+        for title, export in [
+            ('rrdtool xport' if rrdtool else 'spawn a no-op process', spawn),
+            ('RRDReader', native),
+        ]:
+            timings = []
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                export()
+                timings.append(time.perf_counter() - start)
+            results.append(statistics.median(timings))
+            print(
+                f'    {title:<24} {results[-1] * 1000:>10.2f} ms {results[-1] / args.graphs * 1000:>8.3f} ms/graph '
+                f'{results[0] / results[-1]:>8.2f}x'
+            )
+
+
+if __name__ == '__main__':
+    main()
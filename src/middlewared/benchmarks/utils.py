@@ -0,0 +1,53 @@
+import statistics
+import time
+
+
+def timeit(fn, repeat=5):
+    """
+    Run `fn` `repeat` times and return the median wall clock time in seconds.
+    """
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def report(title, results):
+    """
+    Print a table of `(name, seconds)` pairs together with the speedup relative to the first entry.
+    """
+    print(title)
+    baseline = results[0][1]
+    for name, seconds in results:
+        print(f'    {name:<40} {seconds * 1000:>10.2f} ms {baseline / seconds:>8.2f}x')
+
+
+def snapshots(count, datasets=100):
+    """
+    Generate `zfs.snapshot.query`-like entries spread over `datasets` datasets.
+    """
+    rv = []
+    for i in range(count):
+        dataset = f'tank/share/ds{i % datasets}'
+        name = f'auto-{i:08d}'
+        rv.append({
+            'id': f'{dataset}@{name}',
+            'name': f'{dataset}@{name}',
+            'pool': 'tank',
+            'type': 'SNAPSHOT',
+            'snapshot_name': name,
+            'dataset': dataset,
+            'createtxg': str(1000 + i),
+            'holds': {},
+            'properties': {
+                'used': {'value': f'{i % 1024}K', 'rawvalue': str((i % 1024) * 1024), 'parsed': (i % 1024) * 1024},
+                'creation': {'value': str(1600000000 + i), 'rawvalue': str(1600000000 + i),
+                             'parsed': 1600000000 + i},
+                'userrefs': {'value': '0', 'rawvalue': '0', 'parsed': 0},
+            },
+        })
+
+    return rv
@@ -0,0 +1,62 @@
+"""
+Measure process pool worker start cost and memory usage with spawned workers (every worker loads all plugins) and
+with workers forked from a forkserver that preloaded them.
+
+Needs the full middleware runtime dependencies (plugins are imported) but not a running middleware.
+
+    python -m benchmarks.worker_spawn [--workers 5] [--tasks 50]
+"""
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import resource
+import time
+
+import psutil
+
+from middlewared.worker import load_plugins
+
+from .utils import report
+
+
+def task():
+    process = psutil.Process()
+    return os.getpid(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, process.memory_full_info().uss
+
+
+def run(mp_context, workers, tasks):
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, max_tasks_per_child=5, mp_context=mp_context, initializer=load_plugins,
+    ) as pool:
+        results = [f.result() for f in [pool.submit(task) for i in range(tasks)]]
+    elapsed = time.perf_counter() - start
+
+    pids = {pid for pid, maxrss, uss in results}
+    return elapsed, len(pids), max(maxrss for pid, maxrss, uss in results), max(uss for pid, maxrss, uss in results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--tasks', type=int, default=50)
+    args = parser.parse_args()
+
+    forkserver = multiprocessing.get_context('forkserver')
+    forkserver.set_forkserver_preload(['middlewared.worker_preload'])
+
+    results = []
+    for name, mp_context in (('spawn', multiprocessing.get_context('spawn')), ('preloaded forkserver', forkserver)):
+        elapsed, started, peak_rss, peak_uss = run(mp_context, args.workers, args.tasks)
+        print(
+            f'{name}: {started} workers started, {elapsed / started * 1000:.1f} ms per worker, '
+            f'peak RSS {peak_rss / 1048576:.1f} MiB, peak USS {peak_uss / 1048576:.1f} MiB'
+        )
+        results.append((name, elapsed))
+
+    report(f'{args.tasks} calls with max_tasks_per_child=5', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Measure typical `pool.dataset.query`-like requests against `--datasets` datasets, reading every dataset (as before)
+and serving them from `zfs.inventory` with one dataset invalidated in between.
+
+`zfs.dataset.query` is emulated by building the serialized datasets in Python, so the time libzfs spends reading the
+properties (which is what dominates on real systems) is not included and the speedups are a lower bound.
+
+    python -m benchmarks.zfs_inventory [--datasets 10000] [--properties 60] [--repeat 5]
+"""
+import argparse
+import asyncio
+
+from middlewared.plugins.zfs_.dataset_utils import flatten_datasets
+from middlewared.plugins.zfs_.inventory import ZFSInventoryService
+from middlewared.pytest.unit.helpers import create_service
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.utils import filter_list
+
+from .utils import report, timeit
+
+QUERIES = [
+    ('all datasets, 3 properties', [], {'extra': {'properties': ['used', 'available', 'mountpoint']}}),
+    ('one dataset', [['id', '=', 'tank/share/ds00042']], {'extra': {'retrieve_children': False}}),
+    ('one pool, count', [['pool', '=', 'tank']], {'count': True}),
+]
+
+
+class FakeZFS:
+    def __init__(self, datasets, properties):
+        self.names = ['tank', 'tank/share'] + [f'tank/share/ds{i:05d}' for i in range(datasets)]
+        self.properties = [f'prop{i}' for i in range(properties - 3)] + ['used', 'available', 'mountpoint']
+
+    def entry(self, name, props):
+        return {
+            'id': name,
+            'name': name,
+            'pool': 'tank',
+            'type': 'FILESYSTEM',
+            'properties': {
+                k: {'value': f'{k}-value', 'rawvalue': f'{k}-value', 'parsed': f'{k}-value', 'source': 'DEFAULT'}
+                for k in self.properties if props is None or k in props
+            },
+        }
+
+    def query(self, filters, options):
+        extra = options.get('extra', {})
+        props = extra.get('properties')
+        names = self.names
+        if filters and filters[0][0] == 'id' and filters[0][1] in ('=', 'in'):
+            names = [filters[0][2]] if filters[0][1] == '=' else filters[0][2]
+
+        entries = {name: {**self.entry(name, props), 'children': []} for name in names}
+        datasets = []
+        for name in names:
+            parent = name.rsplit('/', 1)[0] if '/' in name else None
+            if parent in entries and extra.get('retrieve_children', True):
+                entries[parent]['children'].append(entries[name])
+            else:
+                datasets.append(entries[name])
+
+        if extra.get('flat', True):
+            datasets = flatten_datasets(datasets)
+
+        return filter_list(datasets, filters, options)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets', type=int, default=10000)
+    parser.add_argument('--properties', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    zfs = FakeZFS(args.datasets, args.properties)
+    m = Middleware()
+    m['zfs.dataset.query'] = zfs.query
+    service = create_service(m, ZFSInventoryService)
+
+    loop = asyncio.new_event_loop()
+    # The inventory is read once per middleware process
+    loop.run_until_complete(service.refresh({'datasets': True, 'snapshots': False}))
+
+    def inventory_query(filters, options):
+        loop.run_until_complete(service.invalidate('tank/share/ds00007', False))
+        return loop.run_until_complete(service.datasets(filters, options))
+
+    for name, filters, options in QUERIES:
+        assert zfs.query(filters, options) == inventory_query(filters, options)
+        report(f'{len(zfs.names)} datasets, {name}: {filters} {options}', [
+            ('zfs.dataset.query', timeit(lambda: zfs.query(filters, options), args.repeat)),
+            ('zfs.inventory.datasets', timeit(lambda: inventory_query(filters, options), args.repeat)),
+        ])
+
+
+if __name__ == '__main__':
+    main()
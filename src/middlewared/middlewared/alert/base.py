@@ -297,6 +297,11 @@ class AlertSource:
         within a specific time interval after failover to prevent false positives.
 
     :cvar run_on_backup_node: set this to `false` to prevent running this alert on HA `BACKUP` node.
+
+    :cvar run_timeout: time in seconds after which `check` is cancelled and reported as failed (the alerts it has
+        previously reported are kept). Sources are ran concurrently, so a slow one does not delay the others.
+        `ThreadedAlertSource` threads can not be cancelled, such source is not ran again until its previous check
+        finishes.
     """
 
     schedule = IntervalSchedule(timedelta())
@@ -304,6 +309,7 @@ class AlertSource:
     products = ("CORE", "ENTERPRISE", "SCALE", "SCALE_ENTERPRISE")
     failover_related = False
     run_on_backup_node = True
+    run_timeout = 60
 
     def __init__(self, middleware):
         self.middleware = middleware
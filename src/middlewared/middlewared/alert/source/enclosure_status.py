@@ -21,6 +21,7 @@ class EnclosureStatusAlertSource(AlertSource):
     products = ("SCALE_ENTERPRISE",)
     failover_related = True
     run_on_backup_node = False
+    run_timeout = 120
     bad = ('critical', 'noncritical', 'unknown', 'unrecoverable')
     bad_elements = []
 
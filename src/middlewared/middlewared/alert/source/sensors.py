@@ -18,6 +18,7 @@ class PowerSupplyAlertClass(AlertClass):
 
 
 class SensorsAlertSource(AlertSource):
+    run_timeout = 120
 
     async def should_alert(self):
         if (await self.middleware.call('system.dmidecode_info'))['system-product-name'].startswith('TRUENAS-R'):
@@ -300,6 +300,10 @@ class Client:
         if typ is not None:
             raise
 
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
     def _send(self, data):
         try:
             self._ws.send(json.dumps(data))
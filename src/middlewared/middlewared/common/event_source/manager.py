@@ -27,6 +27,9 @@ class AppSubscriber(Subscriber):
     def send_event(self, event_type, **kwargs):
         self.app.send_event(self.collection, event_type, **kwargs)
 
+    def serialize_event(self, event_type, **kwargs):
+        return self.app.serialize_event(self.collection, event_type, **kwargs)
+
     def terminate(self, error):
         error_dict = {}
         if error:
@@ -161,6 +164,7 @@ class EventSourceManager:
         return subscriber.iterator
 
     def _send_event(self, name, arg, event_type, **kwargs):
+        serialized = None
         for ident in list(self.subscriptions[name][arg]):
             try:
                 ident_data = self.idents[ident]
@@ -168,7 +172,14 @@ class EventSourceManager:
                 self.middleware.logger.trace("Ident %r is gone", ident)
                 continue
 
-            ident_data.subscriber.send_event(event_type, **kwargs)
+            if isinstance(ident_data.subscriber, AppSubscriber):
+                # Every application subscribed to this event source instance receives the same message
+                if serialized is None:
+                    serialized = ident_data.subscriber.serialize_event(event_type, **kwargs)
+
+                ident_data.subscriber.app.send_serialized(serialized)
+            else:
+                ident_data.subscriber.send_event(event_type, **kwargs)
 
     async def _unsubscribe_all(self, name, arg, error=None):
         for ident in self.subscriptions[name][arg]:
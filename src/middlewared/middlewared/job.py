@@ -1,9 +1,10 @@
 import asyncio
 import contextlib
-from collections import OrderedDict
+from collections import defaultdict, deque, OrderedDict
 import copy
 from datetime import datetime
 import enum
+import heapq
 import logging
 import os
 import shutil
@@ -40,6 +41,8 @@ class JobSharedLock(object):
         self.queue = queue
         self.name = name
         self.jobs = set()
+        # Jobs that were queued with this lock and were not started yet, in the order they were added
+        self.waiting = deque()
         self.lock = asyncio.Lock()
 
     def add_job(self, job):
@@ -66,7 +69,11 @@ class JobsQueue(object):
     def __init__(self, middleware):
         self.middleware = middleware
         self.deque = JobsDeque()
-        self.queue = []
+
+        # Heap of `(job.id, job)` for jobs that can be started right away: jobs without a lock and the first waiting
+        # job of each lock that is not held. Only the head of a lock's waiting queue can ever be in here, so
+        # dispatching a job does not depend on how many jobs are waiting.
+        self.ready = []
 
         # Event responsible for the job queue schedule loop.
         # This event is set and a new job is potentially ready to run
@@ -75,7 +82,11 @@ class JobsQueue(object):
         # Shared lock (JobSharedLock) dict
         self.job_locks = {}
 
-        self.middleware.event_register('core.get_jobs', 'Updates on job changes.')
+        self.middleware.event_register(
+            'core.get_jobs',
+            'Updates on job changes. Progress and description updates only carry `id`, `method`, `state` and the '
+            'changed field.'
+        )
 
     def __getitem__(self, item):
         return self.deque[item]
@@ -86,20 +97,25 @@ class JobsQueue(object):
     def all(self):
         return self.deque.all()
 
+    def filter(self, filters):
+        return self.deque.filter(filters)
+
     def add(self, job):
         self.handle_lock(job)
-        if job.options["lock_queue_size"] is not None:
-            queued_jobs = [another_job for another_job in self.queue if another_job.lock is job.lock]
-            if len(queued_jobs) >= job.options["lock_queue_size"]:
-                return queued_jobs[-1]
+        if job.lock is not None and job.options["lock_queue_size"] is not None:
+            if len(job.lock.waiting) >= job.options["lock_queue_size"]:
+                return job.lock.waiting[-1]
 
         self.deque.add(job)
-        self.queue.append(job)
 
-        job.send_event('ADDED', job.__encode__())
+        if job.lock is None:
+            self._set_ready(job)
+        else:
+            job.lock.waiting.append(job)
+            if len(job.lock.waiting) == 1 and not job.lock.locked():
+                self._set_ready(job)
 
-        # A job has been added to the queue, let the queue scheduler run
-        self.queue_event.set()
+        job.send_event('ADDED', job.__encode__())
 
         return job
 
@@ -131,35 +147,32 @@ class JobsQueue(object):
         if len(lock.get_jobs()) == 0:
             self.job_locks.pop(lock.name)
 
-        # Once a lock is released there could be another job in the queue
-        # waiting for the same lock
+        # Once a lock is released the next job waiting for the same lock can run
+        if lock.waiting:
+            self._set_ready(lock.waiting[0])
+
+    def _set_ready(self, job):
+        heapq.heappush(self.ready, (job.id, job))
+        # A job is ready to run, let the queue scheduler run
         self.queue_event.set()
 
     async def next(self):
         """
         Returns when there is a new job ready to run.
+
+        Jobs are started in the order they were added, skipping those that wait for a lock held by a running job.
         """
-        while True:
-            # Awaits a new event to look for a job
+        while not self.ready:
+            # No jobs available to run, awaits a new event to look for a job
+            self.queue_event.clear()
             await self.queue_event.wait()
-            found = None
-            for job in self.queue:
-                # Get job in the queue if it has no lock or its not locked
-                if job.lock is None or not job.lock.locked():
-                    found = job
-                    if job.lock:
-                        await job.lock.acquire()
-                    break
-            if found:
-                # Unlocked job found to run
-                self.queue.remove(found)
-                # If there are no more jobs in the queue, clear the event
-                if len(self.queue) == 0:
-                    self.queue_event.clear()
-                return found
-            else:
-                # No jobs available to run, clear the event
-                self.queue_event.clear()
+
+        job = heapq.heappop(self.ready)[1]
+        if job.lock:
+            job.lock.waiting.popleft()
+            await job.lock.acquire()
+
+        return job
 
     async def run(self):
         while True:
@@ -180,6 +193,8 @@ class JobsDeque(object):
         self.maxlen = maxlen
         self.count = 0
         self.__dict = OrderedDict()
+        # method name -> {job id: job}, in the order the jobs were added
+        self.__methods = defaultdict(dict)
         with contextlib.suppress(FileNotFoundError):
             shutil.rmtree(LOGS_DIR)
 
@@ -205,17 +220,70 @@ class JobsDeque(object):
                     break
             else:
                 logger.warning("There are %d jobs waiting or running", len(self.__dict))
-        self.__dict[job.id] = job
+        self.__add(job)
 
     def remove(self, job_id):
         if job_id in self.__dict:
-            self.__dict[job_id].cleanup()
-            del self.__dict[job_id]
+            job = self.__dict.pop(job_id)
+            job.cleanup()
+
+            method_jobs = self.__methods[job.method_name]
+            method_jobs.pop(job_id, None)
+            if not method_jobs:
+                self.__methods.pop(job.method_name)
 
     async def receive(self, middleware, job_dict, logs):
         job_dict['id'] = self._get_next_id()
         job = await Job.receive(middleware, job_dict, logs)
+        self.__add(job)
+
+    def __add(self, job):
         self.__dict[job.id] = job
+        self.__methods[job.method_name][job.id] = job
+
+    def filter(self, filters):
+        """
+        Returns jobs that can match `filters` (in the order they were added) without encoding them. Top-level `id`,
+        `method` and `state` equality and `in` filters are answered from the indexes, the rest of the filters still
+        have to be applied to the encoded jobs.
+        """
+        jobs = None
+        states = None
+        for f in filters:
+            if not isinstance(f, (list, tuple)) or len(f) != 3 or f[1] not in ('=', 'in'):
+                continue
+
+            name, op, value = f
+            if op == '=':
+                value = [value]
+            elif not isinstance(value, (list, tuple, set)):
+                continue
+
+            try:
+                if name == 'id':
+                    found = {id: self.__dict[id] for id in value if id in self.__dict}
+                elif name == 'method':
+                    found = {}
+                    for method in value:
+                        found.update(self.__methods.get(method, {}))
+                elif name == 'state':
+                    states = set(value) if states is None else states & set(value)
+                    continue
+                else:
+                    continue
+            except TypeError:
+                # Unhashable filter value, let `filter_list` handle it
+                continue
+
+            jobs = found if jobs is None else {id: job for id, job in jobs.items() if id in found}
+
+        if jobs is None:
+            # `core.get_jobs` runs in a thread
+            jobs = self.__dict.copy()
+        else:
+            jobs = dict(sorted(jobs.items()))
+
+        return [job for job in jobs.values() if states is None or job.state.name in states]
 
 
 class Job:
@@ -266,6 +334,12 @@ class Job:
         self.logs_fd = None
         self.logs_excerpt = None
 
+        # `__encode__` results by `raw_result`. Replaced with an empty dict every time an encoded field changes (rather
+        # than cleared) so that an encoding that was being built in another thread meanwhile is not cached.
+        self._encoded = {}
+        # Job arguments never change, so they are only dumped once
+        self._dumped_args = None
+
         if self.options["check_pipes"]:
             for pipe in self.options["pipes"]:
                 self.check_pipe(pipe)
@@ -293,14 +367,17 @@ class Job:
 
     def set_id(self, id):
         self.id = id
+        self._encoded = {}
 
     def set_result(self, result):
         self.result = result
+        self._encoded = {}
 
     def set_exception(self, exc_info):
         self.error = str(exc_info[1])
         self.exception = ''.join(traceback.format_exception(*exc_info))
         self.exc_info = exc_info
+        self._encoded = {}
 
     def set_state(self, state):
         if self.state == State.WAITING:
@@ -311,6 +388,7 @@ class Job:
         self.state = State.__members__[state]
         if self.state in (State.SUCCESS, State.FAILED, State.ABORTED):
             self.time_finished = datetime.utcnow()
+        self._encoded = {}
 
     def set_description(self, description):
         """
@@ -321,7 +399,8 @@ class Job:
         """
         if self.description != description:
             self.description = description
-            self.send_event('CHANGED', self.__encode__())
+            self._encoded = {}
+            self.send_event('CHANGED', self.__encode_changed('description'))
 
     def set_progress(self, percent=None, description=None, extra=None):
         """
@@ -351,15 +430,17 @@ class Job:
                 self.progress['extra'] = extra
                 changed = True
 
-        encoded = self.__encode__()
+        if changed:
+            self._encoded = {}
+
         if self.on_progress_cb:
             try:
-                self.on_progress_cb(encoded)
+                self.on_progress_cb(self.__encode__())
             except Exception:
                 logger.warning('Failed to run on progress callback', exc_info=True)
 
         if changed:
-            self.send_event('CHANGED', encoded)
+            self.send_event('CHANGED', self.__encode_changed('progress'))
 
         for wrapped in self.wrapped:
             wrapped.set_progress(**self.progress)
@@ -413,6 +494,7 @@ class Job:
 
         if self.options["logs"]:
             self.logs_path = self._logs_path()
+            self._encoded = {}
             await self.middleware.run_in_thread(self.start_logging)
 
         try:
@@ -463,9 +545,9 @@ class Job:
             else:
                 rv = await self.middleware.run_in_thread(self.method, *([self] + args))
         self.set_result(rv)
-        self.set_state('SUCCESS')
         if self.progress['percent'] != 100:
             self.set_progress(100, '')
+        self.set_state('SUCCESS')
 
     def _logs_path(self):
         return os.path.join(LOGS_DIR, f"{self.id}.log")
@@ -499,6 +581,7 @@ class Job:
                 return excerpt
 
             self.logs_excerpt = await self.middleware.run_in_thread(get_logs_excerpt)
+            self._encoded = {}
 
     async def __close_pipes(self):
         def close_pipes():
@@ -510,6 +593,39 @@ class Job:
         await self.middleware.run_in_thread(close_pipes)
 
     def __encode__(self, raw_result=True):
+        """
+        Returns the job as it is shown in `core.get_jobs`.
+
+        The encoding is cached until the job changes, so the returned dictionary is shared and must not be modified.
+        """
+        cache = self._encoded
+        if (encoded := cache.get(raw_result)) is None:
+            encoded = cache[raw_result] = self.__do_encode(raw_result)
+
+        return encoded
+
+    def __encode_changed(self, *fields):
+        """
+        Returns a `core.get_jobs` CHANGED event payload for a running job that only carries `fields` along with the job
+        identification and state. Subscribers merge it into the job they already have.
+
+        Jobs in any other state are encoded in full so that subscribers which have not seen the job yet (or only act on
+        its final state) always receive its arguments, result and error.
+        """
+        if self.state != State.RUNNING:
+            return self.__encode__()
+
+        return {
+            'id': self.id,
+            'method': self.method_name,
+            'state': self.state.name,
+            **{field: copy.copy(getattr(self, field)) for field in fields},
+        }
+
+    def __do_encode(self, raw_result):
+        if self._dumped_args is None:
+            self._dumped_args = self.middleware.dump_args(self.args, method=self.method)
+
         exc_info = None
         if self.exc_info:
             etype = self.exc_info[0]
@@ -534,7 +650,7 @@ class Job:
         return {
             'id': self.id,
             'method': self.method_name,
-            'arguments': self.middleware.dump_args(self.args, method=self.method),
+            'arguments': self._dumped_args,
             'transient': self.options['transient'],
             'description': self.description,
             'abortable': self.options['abortable'],
@@ -569,6 +685,7 @@ class Job:
         job.state = State.__members__[job_dict['state']]
         job.time_started = job_dict['time_started']
         job.time_finished = job_dict['time_finished']
+        job._encoded = {}
 
         if logs is not None:
             def write_logs():
@@ -5,7 +5,7 @@ from .common.event_source.manager import EventSourceManager
 from .event import Events
 from .job import Job, JobsQueue
 from .pipe import Pipes, Pipe
-from .restful import authenticate, copy_multipart_to_pipe, RESTfulAPI
+from .restful import authenticate, copy_multipart_to_pipe, RESTfulAPI, stream_pipe_response
 from .settings import conf
 from .schema import clean_and_validate_arg, Error as SchemaError
 import middlewared.service
@@ -73,6 +73,8 @@ from systemd.daemon import notify as systemd_notify
 from . import logger
 
 SYSTEMD_EXTEND_USECS = 240000000  # 4mins in microseconds
+# Websocket clients that do not read their messages are disconnected once this many bytes are waiting to be sent
+WS_SEND_QUEUE_MAX_SIZE = 64 * 1024 * 1024
 
 
 @dataclass
@@ -111,6 +113,11 @@ class Application:
         self.__callbacks = defaultdict(list)
         self.__subscribed = {}
 
+        # Serialized messages waiting to be sent by `__send_queued`
+        self.__send_queue = deque()
+        self.__send_queue_size = 0
+        self.__send_task = None
+
     @functools.cached_property
     def origin(self):
         try:
@@ -133,8 +140,22 @@ class Application:
         self.__callbacks[name].append(method)
 
     def _send(self, data):
-        serialized = json.dumps(data)
-        asyncio.run_coroutine_threadsafe(self.response.send_str(serialized), loop=self.loop)
+        self.send_serialized(json.dumps(data))
+
+    def send_serialized(self, serialized):
+        """
+        Send an already serialized message. Can be called from any thread.
+        """
+        try:
+            in_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            in_loop = False
+
+        if in_loop:
+            self.__enqueue(serialized)
+        else:
+            self.loop.call_soon_threadsafe(self.__enqueue, serialized)
+
         _1KB = 1000
         if len(serialized) > _1KB:
             # no reason to store data in the deque that
@@ -156,6 +177,36 @@ class Application:
             'message': message,
         })
 
+    def __enqueue(self, serialized):
+        if self.__send_queue_size > WS_SEND_QUEUE_MAX_SIZE:
+            # Already closing
+            return
+
+        self.__send_queue.append(serialized)
+        self.__send_queue_size += len(serialized)
+        if self.__send_queue_size > WS_SEND_QUEUE_MAX_SIZE:
+            self.logger.warning('Closing websocket connection %r as it is not reading its messages', self.session_id)
+            self.__send_queue.clear()
+            self.middleware.create_task(self.response.close(code=WSCloseCode.TRY_AGAIN_LATER))
+            return
+
+        if self.__send_task is None:
+            self.__send_task = self.middleware.create_task(self.__send_queued())
+
+    async def __send_queued(self):
+        try:
+            while self.__send_queue:
+                serialized = self.__send_queue.popleft()
+                self.__send_queue_size -= len(serialized)
+                # Waits for the client to read the previous messages
+                await self.response.send_str(serialized)
+        except Exception:
+            # Connection is closed
+            self.__send_queue.clear()
+            self.__send_queue_size = 0
+        finally:
+            self.__send_task = None
+
     def _tb_error(self, exc_info):
         klass, exc, trace = exc_info
 
@@ -260,6 +311,7 @@ class Application:
             await self.middleware.event_source_manager.subscribe_app(self, self.__esm_ident(ident), shortname, arg)
         else:
             self.__subscribed[ident] = name
+            self.middleware.register_wsclient_subscription(self, name)
 
         self._send({
             'msg': 'ready',
@@ -268,7 +320,9 @@ class Application:
 
     async def unsubscribe(self, ident):
         if ident in self.__subscribed:
-            self.__subscribed.pop(ident)
+            name = self.__subscribed.pop(ident)
+            if name not in self.__subscribed.values():
+                self.middleware.unregister_wsclient_subscription(self, name)
         elif self.__esm_ident(ident) in self.middleware.event_source_manager.idents:
             await self.middleware.event_source_manager.unsubscribe(self.__esm_ident(ident))
 
@@ -283,11 +337,14 @@ class Application:
             )[0] not in self.middleware.event_source_manager.event_sources
         ):
             return
+        self.send_serialized(self.serialize_event(name, event_type, **kwargs))
+
+    @staticmethod
+    def serialize_event(name, event_type, **kwargs):
         event = {
             'msg': event_type.lower(),
             'collection': name,
         }
-        kwargs = kwargs.copy()
         if 'id' in kwargs:
             event['id'] = kwargs.pop('id')
         if event_type in ('ADDED', 'CHANGED'):
@@ -295,7 +352,7 @@ class Application:
                 event['fields'] = kwargs.pop('fields')
         if kwargs:
             event['extra'] = kwargs
-        self._send(event)
+        return json.dumps(event)
 
     def on_open(self):
         self.middleware.register_wsclient(self)
@@ -310,6 +367,8 @@ class Application:
 
         await self.middleware.event_source_manager.unsubscribe_app(self)
 
+        for name in set(self.__subscribed.values()):
+            self.middleware.unregister_wsclient_subscription(self, name)
         self.middleware.unregister_wsclient(self)
 
     async def on_message(self, message):
@@ -456,29 +515,15 @@ class FileApplication(object):
             resp.set_status(410)
             return resp
 
-        resp = web.StreamResponse(status=200, reason='OK', headers={
-            'Content-Type': 'application/octet-stream',
-            'Content-Disposition': f'attachment; filename="{filename}"',
-            'Transfer-Encoding': 'chunked',
-        })
-        await resp.prepare(request)
-
-        def do_copy():
-            while True:
-                read = job.pipes.output.r.read(1048576)
-                if read == b'':
-                    break
-                asyncio.run_coroutine_threadsafe(resp.write(read), loop=self.loop).result()
-
         try:
             await self._cleanup_cancel(job_id)
-            await self.middleware.run_in_thread(do_copy)
+            return await stream_pipe_response(request, job.pipes.output, {
+                'Content-Type': 'application/octet-stream',
+                'Content-Disposition': f'attachment; filename="{filename}"',
+            })
         finally:
             await job.pipes.close()
 
-        await resp.drain()
-        return resp
-
     async def upload(self, request):
         reader = await request.multipart()
 
@@ -517,7 +562,7 @@ class FileApplication(object):
         try:
             job = await self.middleware.call(data['method'], *(data.get('params') or []),
                                              pipes=Pipes(input=self.middleware.pipe()))
-            await self.middleware.run_in_thread(copy_multipart_to_pipe, self.loop, filepart, job.pipes.input)
+            await copy_multipart_to_pipe(filepart, job.pipes.input)
         except CallError as e:
             if e.errno == CallError.ENOMETHOD:
                 status_code = 422
@@ -873,6 +918,8 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
         multiprocessing.set_start_method('spawn')  # Spawn new processes for ProcessPool instead of forking
         self.__init_procpool()
         self.__wsclients = {}
+        # Event name (or `*`) -> {session id: subscribed websocket client}
+        self.__wsclients_subscriptions = defaultdict(dict)
         self.events = Events()
         self.event_source_manager = EventSourceManager(self)
         self.__event_subs = defaultdict(list)
@@ -1113,6 +1160,15 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
     def unregister_wsclient(self, client):
         self.__wsclients.pop(client.session_id)
 
+    def register_wsclient_subscription(self, client, name):
+        self.__wsclients_subscriptions[name][client.session_id] = client
+
+    def unregister_wsclient_subscription(self, client, name):
+        if (subscriptions := self.__wsclients_subscriptions.get(name)) is not None:
+            subscriptions.pop(client.session_id, None)
+            if not subscriptions:
+                self.__wsclients_subscriptions.pop(name)
+
     def register_hook(self, name, method, *, blockable=False, inline=False, order=0, raise_error=False, sync=True):
         """
         Register a hook under `name`.
@@ -1244,9 +1300,14 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
         return await self.run_in_executor(self.thread_pool_executor, method, *args, **kwargs)
 
     def __init_procpool(self):
+        # Workers are recycled every `max_tasks_per_child` calls. Forking them from a forkserver that has already
+        # loaded all plugins is much cheaper than spawning a new interpreter that has to load them again.
+        mp_context = multiprocessing.get_context('forkserver')
+        mp_context.set_forkserver_preload(['middlewared.worker_preload'])
         self.__procpool = concurrent.futures.ProcessPoolExecutor(
             max_workers=5,
             max_tasks_per_child=5,
+            mp_context=mp_context,
             initializer=functools.partial(worker_init, self.debug_level, self.log_handler)
         )
 
@@ -1495,11 +1556,22 @@ class Middleware(LoadPluginsMixin, ServiceCallMixin):
 
         self.logger.trace(f'Sending event {name!r}:{event_type!r}:{kwargs!r}')
 
-        for session_id, wsclient in list(self.__wsclients.items()):
-            try:
-                wsclient.send_event(name, event_type, **kwargs)
-            except Exception:
-                self.logger.warn('Failed to send event {} to {}'.format(name, session_id), exc_info=True)
+        if self.event_source_manager.short_name_arg(name)[0] in self.event_source_manager.event_sources:
+            wsclients = self.__wsclients
+        else:
+            wsclients = {
+                **self.__wsclients_subscriptions.get(name, {}),
+                **self.__wsclients_subscriptions.get('*', {}),
+            }
+
+        if wsclients:
+            # The message is the same for every client
+            serialized = Application.serialize_event(name, event_type, **kwargs)
+            for session_id, wsclient in list(wsclients.items()):
+                try:
+                    wsclient.send_serialized(serialized)
+                except Exception:
+                    self.logger.warn('Failed to send event {} to {}'.format(name, session_id), exc_info=True)
 
         async def wrap(handler):
             try:
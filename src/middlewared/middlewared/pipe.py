@@ -47,6 +47,7 @@ class Pipe:
     """
     def __init__(self, middleware, buffered=False):
         self.middleware = middleware
+        self.buffered = buffered
 
         if buffered:
             self.w = tempfile.NamedTemporaryFile(buffering=0)
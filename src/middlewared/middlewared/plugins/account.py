@@ -279,15 +279,24 @@ class UserService(CRUDService):
         if dssearch:
             ds_state = await self.middleware.call('directoryservices.get_state')
             if ds_state['activedirectory'] == 'HEALTHY' or ds_state['ldap'] == 'HEALTHY':
-                dssearch_results = await self.middleware.call('dscache.query', 'USERS', filters, options.copy())
+                # `dscache.query` filters, orders and pages the results. The projection (or counting) is applied
+                # after 2FA attribute is normalized.
+                ds_options = {k: v for k, v in options.items() if k not in ('select', 'count', 'get')}
+                if options.get('count'):
+                    ds_options.pop('limit', None)
+                    ds_options.pop('offset', None)
+                elif options.get('get'):
+                    ds_options['limit'] = 1
+
+                dssearch_results = await self.middleware.call('dscache.query', 'USERS', filters, ds_options)
                 # For AD users, we will not have 2FA attribute normalized so let's do that
                 ad_users_2fa_mapping = await self.middleware.call('auth.twofactor.get_ad_users')
-                for index, user in enumerate(filter(
-                    lambda u: not u['local'] and 'twofactor_auth_configured' not in u, dssearch_results)
-                ):
-                    dssearch_results[index]['twofactor_auth_configured'] = bool(ad_users_2fa_mapping.get(user['sid']))
+                for user in filter(lambda u: not u['local'] and 'twofactor_auth_configured' not in u, dssearch_results):
+                    user['twofactor_auth_configured'] = bool(ad_users_2fa_mapping.get(user['sid']))
 
-                return await self.middleware.run_in_thread(filter_list, dssearch_results, filters, options)
+                return await self.middleware.run_in_thread(filter_list, dssearch_results, [], {
+                    k: v for k, v in options.items() if k in ('select', 'count', 'get')
+                })
 
         result = await self.middleware.call(
             'datastore.query', self._config.datastore, [], datastore_options
@@ -1514,8 +1523,7 @@ class GroupService(CRUDService):
         if dssearch:
             ds_state = await self.middleware.call('directoryservices.get_state')
             if ds_state['activedirectory'] == 'HEALTHY' or ds_state['ldap'] == 'HEALTHY':
-                dssearch_results = await self.middleware.call('dscache.query', 'GROUPS', filters, options)
-                return await self.middleware.run_in_thread(filter_list, dssearch_results, filters, options)
+                return await self.middleware.call('dscache.query', 'GROUPS', filters, options)
 
         if 'SMB' in additional_information:
             smb_groupmap = await self.middleware.call("smb.groupmap_list")
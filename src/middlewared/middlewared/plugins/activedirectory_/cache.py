@@ -1,11 +1,15 @@
 import grp
 import pwd
 
+from middlewared.plugins.cache import write_cache_entries
 from middlewared.plugins.idmap_.utils import WBClient
 from middlewared.service import Service, private, job
 from middlewared.service_exception import CallError
 from time import sleep
 
+# Number of unix ids converted to SIDs in a single winbindd request
+SID_BATCH_SIZE = 10000
+
 
 class ActiveDirectoryService(Service):
     class Config:
@@ -13,6 +17,10 @@ class ActiveDirectoryService(Service):
 
     @private
     def get_entries(self, data):
+        """
+        Return the NSS entries of the users or groups of the joined domains together with their SIDs. SIDs are
+        resolved with a single winbindd request per `SID_BATCH_SIZE` entries.
+        """
         ret = []
         entry_type = data.get('entry_type')
 
@@ -27,37 +35,45 @@ class ActiveDirectoryService(Service):
 
         if entry_type == 'USER':
             entries = WBClient().users()
+            wbc_type = 'UID'
         else:
             entries = WBClient().groups()
+            wbc_type = 'GID'
 
+        nss_entries = []
         for i in entries:
-            entry = {"id": -1, "sid": None, "nss": None}
-            if entry_type == 'USER':
-                try:
-                    entry["nss"] = pwd.getpwnam(i)
-                except KeyError:
-                    continue
-                entry["id"] = entry["nss"].pw_uid
+            try:
+                if entry_type == 'USER':
+                    nss = pwd.getpwnam(i)
+                    nss_entries.append((i, nss.pw_uid, nss))
+                else:
+                    nss = grp.getgrnam(i)
+                    nss_entries.append((i, nss.gr_gid, nss))
+            except KeyError:
+                continue
 
-            else:
-                try:
-                    entry["nss"] = grp.getgrnam(i)
-                except KeyError:
-                    continue
-                entry["id"] = entry["nss"].gr_gid
+        for i in range(0, len(nss_entries), SID_BATCH_SIZE):
+            batch = nss_entries[i:i + SID_BATCH_SIZE]
+            sids = self.middleware.call_sync('idmap.convert_unixids', [
+                {'id_type': entry_type, 'id': unixid} for name, unixid, nss in batch
+            ])['mapped']
 
-            entry['sid'] = self.middleware.call_sync('idmap.unixid_to_sid', {
-                'id_type': entry_type,
-                'id': entry['id'],
-            })
+            for name, unixid, nss in batch:
+                if (mapped := sids.get(f'{wbc_type}:{unixid}')) is None:
+                    self.logger.debug('%s [%s] does not have a SID. Omitting from cache', entry_type, name)
+                    continue
 
-            if entry['sid'].startswith('S-1-22'):
-                self.logger.warning('%s [%s] collides with local user or group. '
-                                    'Omitting from cache', entry_type, i)
-                continue
+                if mapped['sid'].startswith('S-1-22'):
+                    self.logger.warning('%s [%s] collides with local user or group. '
+                                        'Omitting from cache', entry_type, name)
+                    continue
 
-            entry['domain_info'] = dom_by_sid[entry['sid'].rsplit('-', 1)[0]]
-            ret.append(entry)
+                ret.append({
+                    'id': unixid,
+                    'sid': mapped['sid'],
+                    'nss': nss,
+                    'domain_info': dom_by_sid[mapped['sid'].rsplit('-', 1)[0]],
+                })
 
         return ret
 
@@ -91,7 +107,9 @@ class ActiveDirectoryService(Service):
         if ad['disable_freenas_cache']:
             return
 
+        job.set_progress(0, 'Retrieving users')
         users = self.get_entries({'entry_type': 'USER', 'cache_enabled': not ad['disable_freenas_cache']})
+        entries = {'USER': [], 'GROUP': []}
         for u in users:
             user_data = u['nss']
             rid = int(u['sid'].rsplit('-', 1)[1])
@@ -120,8 +138,9 @@ class ActiveDirectoryService(Service):
                 'nt_name': user_data.pw_name,
                 'sid': u['sid'],
             }
-            self.middleware.call_sync('dscache.insert', self._config.namespace.upper(), 'USER', entry)
+            entries['USER'].append(entry)
 
+        job.set_progress(30, 'Retrieving groups')
         groups = self.get_entries({'entry_type': 'GROUP', 'cache_enabled': not ad['disable_freenas_cache']})
         for g in groups:
             group_data = g['nss']
@@ -141,7 +160,9 @@ class ActiveDirectoryService(Service):
                 'nt_name': group_data.gr_name,
                 'sid': g['sid'],
             }
-            self.middleware.call_sync('dscache.insert', self._config.namespace.upper(), 'GROUP', entry)
+            entries['GROUP'].append(entry)
+
+        write_cache_entries(self.middleware, job, self._config.namespace.upper(), entries, 60, 100)
 
     @private
     async def get_cache(self):
@@ -1,7 +1,10 @@
+import asyncio
+from bisect import bisect_left
 from collections import defaultdict, namedtuple
 import copy
 from datetime import datetime, timezone
 import errno
+import functools
 import os
 import textwrap
 import time
@@ -45,6 +48,15 @@ ALERT_SERVICES_FACTORIES = {}
 
 AlertSourceLock = namedtuple("AlertSourceLock", ["source_name", "expires_at"])
 
+# How many alert sources are checked at the same time
+ALERT_SOURCES_CONCURRENCY = 8
+# Upper bounds (in seconds) of `alert.sources_stats` run time histogram buckets
+ALERT_SOURCE_RUN_TIME_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60)
+# Time to wait for all the alert sources to be checked on the standby controller, shorter than the
+# `alert.process_alerts` period
+BACKUP_NODE_SOURCES_TIMEOUT = 50
+CONNECTION_ERRORS = [errno.ECONNABORTED, errno.ECONNREFUSED, errno.ECONNRESET, errno.EHOSTDOWN, errno.ETIMEDOUT]
+
 SEND_ALERTS_ON_READY = False
 
 
@@ -133,6 +145,79 @@ class AlertPolicy:
         self.last_key_value_alerts.pop(alert.uuid, None)
 
 
+class AlertStore:
+    """
+    Alerts keyed by `(node, source, klass, key)` (there can only be one alert with the same values of these) in the
+    order they were added, indexed by `source` and `uuid`.
+    """
+
+    def __init__(self):
+        self.alerts = {}
+        self.by_source = defaultdict(dict)
+        self.by_uuid = {}
+
+    @staticmethod
+    def identity(alert):
+        return alert.node, alert.source, alert.klass, alert.key
+
+    def __iter__(self):
+        return iter(list(self.alerts.values()))
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def get(self, alert):
+        """
+        Returns the stored alert with the same identity as `alert`.
+        """
+        return self.alerts.get(self.identity(alert))
+
+    def get_by_uuid(self, uuid):
+        return self.by_uuid.get(uuid)
+
+    def source_alerts(self, source, node):
+        return [alert for alert in self.by_source.get(source, {}).values() if alert.node == node]
+
+    def add(self, alert):
+        """
+        Adds `alert` replacing the stored alert with the same identity (or `uuid`).
+        """
+        for existing_alert in (self.get(alert), self.get_by_uuid(alert.uuid)):
+            if existing_alert is not None:
+                self.discard(existing_alert)
+
+        identity = self.identity(alert)
+        self.alerts[identity] = alert
+        self.by_source[alert.source][identity] = alert
+        self.by_uuid[alert.uuid] = alert
+
+    def discard(self, alert):
+        """
+        Removes `alert` if it is stored. Returns whether it was.
+        """
+        identity = self.identity(alert)
+        if self.alerts.get(identity) is not alert:
+            return False
+
+        del self.alerts[identity]
+        source_alerts = self.by_source[alert.source]
+        del source_alerts[identity]
+        if not source_alerts:
+            del self.by_source[alert.source]
+        self.by_uuid.pop(alert.uuid, None)
+        return True
+
+    def replace_source(self, source, alerts):
+        """
+        Replaces all the alerts of `source` with `alerts`.
+        """
+        for alert in list(self.by_source.get(source, {}).values()):
+            self.discard(alert)
+
+        for alert in alerts:
+            self.add(alert)
+
+
 def get_alert_level(alert, classes):
     return AlertLevel[classes.get(alert.klass.name, {}).get("level", alert.klass.level.name)]
 
@@ -199,11 +284,18 @@ class AlertService(Service):
 
         self.blocked_failover_alerts_until = 0
 
+        self.flush_lock = asyncio.Lock()
+
+        # Checks that are still running (including the ones that have timed out)
+        self.sources_checks = {}
         self.sources_run_times = defaultdict(lambda: {
             "last": [],
             "max": 0,
             "total_count": 0,
             "total_time": 0,
+            "timeouts": 0,
+            # Run count for each of `ALERT_SOURCE_RUN_TIME_BUCKETS` and the one above them
+            "histogram": [0] * (len(ALERT_SOURCE_RUN_TIME_BUCKETS) + 1),
         })
 
     @private
@@ -230,15 +322,20 @@ class AlertService(Service):
             if await self.middleware.call("failover.node") == "B":
                 self.node = "B"
 
-        self.alerts = []
+        self.alerts = AlertStore()
+        # `{uuid: (id, row)}` of alerts stored in the database or `None` if the database contents are unknown
+        self.persisted_alerts = None
+        self.stale_alert_ids = []
         if load:
+            self.persisted_alerts = {}
             for alert in await self.middleware.call("datastore.query", "system.alert"):
-                del alert["id"]
+                id_ = alert.pop("id")
 
                 try:
                     alert["klass"] = AlertClass.class_by_name[alert["klass"]]
                 except KeyError:
                     self.logger.info("Alert class %r is no longer present", alert["klass"])
+                    self.stale_alert_ids.append(id_)
                     continue
 
                 alert["_uuid"] = alert.pop("uuid")
@@ -248,8 +345,12 @@ class AlertService(Service):
 
                 alert = Alert(**alert)
 
-                if not any(a.uuid == alert.uuid for a in self.alerts):
-                    self.alerts.append(alert)
+                if alert.uuid in self.persisted_alerts or self.alerts.get(alert) is not None:
+                    self.stale_alert_ids.append(id_)
+                    continue
+
+                self.alerts.add(alert)
+                self.persisted_alerts[alert.uuid] = (id_, self.__alert_row(alert))
 
         self.alert_source_last_run = defaultdict(lambda: datetime.min)
 
@@ -386,10 +487,7 @@ class AlertService(Service):
         return nodes
 
     def __alert_by_uuid(self, uuid):
-        try:
-            return [a for a in self.alerts if a.uuid == uuid][0]
-        except IndexError:
-            return None
+        return self.alerts.get_by_uuid(uuid)
 
     @accepts(Str("uuid"))
     @returns()
@@ -416,11 +514,7 @@ class AlertService(Service):
             await self._send_alert_changed_event(alert)
 
     def _delete_on_dismiss(self, alert):
-        try:
-            self.alerts.remove(alert)
-            removed = True
-        except ValueError:
-            removed = False
+        removed = self.alerts.discard(alert)
 
         for policy in self.policies.values():
             policy.delete_alert(alert)
@@ -625,10 +719,10 @@ class AlertService(Service):
                     master_node = "B"
                     backup_node = "A"
                 try:
-                    remote_version = await self.middleware.call("failover.call_remote", "system.version")
-                    remote_system_state = await self.middleware.call("failover.call_remote", "system.state")
-                    remote_failover_status = await self.middleware.call("failover.call_remote",
-                                                                        "failover.status")
+                    remote_version, remote_system_state, remote_failover_status = await asyncio.gather(*[
+                        self.middleware.call("failover.call_remote", method)
+                        for method in ["system.version", "system.state", "failover.status"]
+                    ])
                 except Exception:
                     pass
                 else:
@@ -642,6 +736,7 @@ class AlertService(Service):
             if source_lock.expires_at <= time.monotonic():
                 await self.unblock_source(k)
 
+        sources = []
         for alert_source in ALERT_SOURCES.values():
             if product_type not in alert_source.products:
                 continue
@@ -653,80 +748,125 @@ class AlertService(Service):
                 continue
 
             self.alert_source_last_run[alert_source.name] = datetime.utcnow()
+            sources.append(alert_source)
+
+        # All the sources are checked concurrently, the ones that run on the standby controller with a single call
+        semaphore = asyncio.Semaphore(ALERT_SOURCES_CONCURRENCY)
+        sources_alerts_a, sources_alerts_b = await asyncio.gather(
+            asyncio.gather(*[
+                self.__run_master_node_source(alert_source, master_node, semaphore) for alert_source in sources
+            ]),
+            self.__run_backup_node_sources(
+                [alert_source for alert_source in sources if alert_source.run_on_backup_node]
+                if run_on_backup_node else [],
+                backup_node,
+            ),
+        )
 
-            alerts_a = [alert
-                        for alert in self.alerts
-                        if alert.node == master_node and alert.source == alert_source.name]
-            locked = False
-            if self.blocked_sources[alert_source.name]:
-                self.logger.debug("Not running alert source %r because it is blocked", alert_source.name)
-                locked = True
-            else:
-                self.logger.trace("Running alert source: %r", alert_source.name)
-
-                try:
-                    alerts_a = await self.__run_source(alert_source.name)
-                except UnavailableException:
-                    pass
+        for alert_source, alerts_a in zip(sources, sources_alerts_a):
             for alert in alerts_a:
                 alert.node = master_node
 
-            alerts_b = []
-            if run_on_backup_node and alert_source.run_on_backup_node:
-                try:
-                    alerts_b = [alert
-                                for alert in self.alerts
-                                if alert.node == backup_node and alert.source == alert_source.name]
-                    try:
-                        if not locked:
-                            alerts_b = await self.middleware.call("failover.call_remote", "alert.run_source",
-                                                                  [alert_source.name])
-
-                            alerts_b = [Alert(**dict({k: v for k, v in alert.items()
-                                                      if k in ["args", "datetime", "last_occurrence", "dismissed",
-                                                               "mail"]},
-                                                     klass=AlertClass.class_by_name[alert["klass"]],
-                                                     _source=alert["source"],
-                                                     _key=alert["key"]))
-                                        for alert in alerts_b]
-                    except CallError as e:
-                        if e.errno in [errno.ECONNABORTED, errno.ECONNREFUSED, errno.ECONNRESET, errno.EHOSTDOWN,
-                                       errno.ETIMEDOUT, CallError.EALERTCHECKERUNAVAILABLE]:
-                            pass
-                        else:
-                            raise
-                except ReserveFDException:
-                    self.logger.debug('Failed to reserve a privileged port')
-                except Exception:
-                    alerts_b = [
-                        Alert(AlertSourceRunFailedOnBackupNodeAlertClass,
-                              args={
-                                  "source_name": alert_source.name,
-                                  "traceback": traceback.format_exc(),
-                              },
-                              _source=alert_source.name)
-                    ]
-
+            alerts_b = sources_alerts_b.get(alert_source.name, [])
             for alert in alerts_b:
                 alert.node = backup_node
 
             for alert in alerts_a + alerts_b:
                 self.__handle_alert(alert)
 
-            self.alerts = (
-                [a for a in self.alerts if a.source != alert_source.name] +
-                alerts_a +
-                alerts_b
-            )
+            self.alerts.replace_source(alert_source.name, alerts_a + alerts_b)
 
-    def __handle_alert(self, alert):
+    async def __run_master_node_source(self, alert_source, master_node, semaphore):
+        if self.blocked_sources[alert_source.name]:
+            self.logger.debug("Not running alert source %r because it is blocked", alert_source.name)
+        else:
+            async with semaphore:
+                self.logger.trace("Running alert source: %r", alert_source.name)
+
+                try:
+                    return await self.__run_source(alert_source.name, master_node)
+                except UnavailableException:
+                    pass
+
+        return self.alerts.source_alerts(alert_source.name, master_node)
+
+    async def __run_backup_node_sources(self, alert_sources, backup_node):
+        result = {
+            alert_source.name: self.alerts.source_alerts(alert_source.name, backup_node)
+            for alert_source in alert_sources
+        }
+        source_names = [
+            alert_source.name for alert_source in alert_sources if not self.blocked_sources[alert_source.name]
+        ]
+        if not source_names:
+            return result
+
+        try:
+            try:
+                sources_alerts = await self.middleware.call("failover.call_remote", "alert.run_sources",
+                                                            [source_names], {"timeout": BACKUP_NODE_SOURCES_TIMEOUT})
+            except CallError as e:
+                if e.errno in CONNECTION_ERRORS:
+                    return result
+                elif e.errno == CallError.ENOMETHOD:
+                    # Standby controller runs an older version that can only run alert sources one by one
+                    for source_name in source_names:
+                        result[source_name] = await self.__run_backup_node_source(source_name, result[source_name])
+
+                    return result
+                else:
+                    raise
+        except ReserveFDException:
+            self.logger.debug('Failed to reserve a privileged port')
+        except Exception:
+            for source_name in source_names:
+                result[source_name] = self.__backup_node_source_failed(source_name)
+        else:
+            for source_name, alerts in sources_alerts.items():
+                # `None` if the alert checker is unavailable on the standby controller
+                if alerts is not None:
+                    result[source_name] = self.__backup_node_alerts(alerts)
+
+        return result
+
+    async def __run_backup_node_source(self, source_name, alerts):
         try:
-            existing_alert = [
-                a for a in self.alerts
-                if (a.node, a.source, a.klass, a.key) == (alert.node, alert.source, alert.klass, alert.key)
-            ][0]
-        except IndexError:
-            existing_alert = None
+            try:
+                alerts = self.__backup_node_alerts(
+                    await self.middleware.call("failover.call_remote", "alert.run_source", [source_name])
+                )
+            except CallError as e:
+                if e.errno not in CONNECTION_ERRORS + [CallError.EALERTCHECKERUNAVAILABLE]:
+                    raise
+        except ReserveFDException:
+            self.logger.debug('Failed to reserve a privileged port')
+        except Exception:
+            alerts = self.__backup_node_source_failed(source_name)
+
+        return alerts
+
+    def __backup_node_alerts(self, alerts):
+        return [
+            Alert(**dict({k: v for k, v in alert.items()
+                          if k in ["args", "datetime", "last_occurrence", "dismissed", "mail"]},
+                         klass=AlertClass.class_by_name[alert["klass"]],
+                         _source=alert["source"],
+                         _key=alert["key"]))
+            for alert in alerts
+        ]
+
+    def __backup_node_source_failed(self, source_name):
+        return [
+            Alert(AlertSourceRunFailedOnBackupNodeAlertClass,
+                  args={
+                      "source_name": source_name,
+                      "traceback": traceback.format_exc(),
+                  },
+                  _source=source_name)
+        ]
+
+    def __handle_alert(self, alert):
+        existing_alert = self.alerts.get(alert)
 
         if existing_alert is None:
             alert.uuid = self.__uuid()
@@ -745,7 +885,9 @@ class AlertService(Service):
             alert.dismissed = existing_alert.dismissed
 
     def __expire_alerts(self):
-        self.alerts = list(filter(lambda alert: not self.__should_expire_alert(alert), self.alerts))
+        for alert in self.alerts:
+            if self.__should_expire_alert(alert):
+                self.alerts.discard(alert)
 
     def __should_expire_alert(self, alert):
         if issubclass(alert.klass, OneShotAlertClass):
@@ -757,7 +899,15 @@ class AlertService(Service):
     @private
     async def sources_stats(self):
         return {
-            k: {"avg": v["total_time"] / v["total_count"] if v["total_count"] != 0 else 0, **v}
+            k: {
+                "avg": v["total_time"] / v["total_count"] if v["total_count"] != 0 else 0,
+                **v,
+                # Cumulative counts of runs that took at most `le` seconds
+                "histogram": [
+                    {"le": le, "count": sum(v["histogram"][:i + 1])}
+                    for i, le in enumerate(ALERT_SOURCE_RUN_TIME_BUCKETS + (None,))
+                ],
+            }
             for k, v in sorted(self.sources_run_times.items(), key=lambda t: t[0])
         }
 
@@ -769,6 +919,36 @@ class AlertService(Service):
         except UnavailableException:
             raise CallError("This alert checker is unavailable", CallError.EALERTCHECKERUNAVAILABLE)
 
+    @private
+    async def run_sources(self, source_names):
+        """
+        Runs multiple alert sources concurrently. Returns alerts of each of them (or `None` if it is unavailable).
+        """
+        semaphore = asyncio.Semaphore(ALERT_SOURCES_CONCURRENCY)
+
+        async def run(source_name):
+            async with semaphore:
+                try:
+                    return await self.run_source(source_name)
+                except CallError as e:
+                    if e.errno == CallError.EALERTCHECKERUNAVAILABLE:
+                        return None
+
+                    error = str(e)
+                except Exception:
+                    error = traceback.format_exc()
+
+                self.logger.warning("Failed to run alert source %r", source_name, exc_info=True)
+                alert = Alert(AlertSourceRunFailedAlertClass,
+                              args={
+                                  "source_name": source_name,
+                                  "traceback": error,
+                              },
+                              _source=source_name)
+                return [dict(alert.__dict__, klass=alert.klass.name)]
+
+        return dict(zip(source_names, await asyncio.gather(*map(run, source_names))))
+
     @private
     async def block_source(self, source_name, timeout=3600):
         if source_name not in ALERT_SOURCES:
@@ -790,17 +970,40 @@ class AlertService(Service):
         # This values come from observation from support of how long a M-series boot can take.
         self.blocked_failover_alerts_until = time.monotonic() + 900
 
-    async def __run_source(self, source_name):
+    async def __run_source(self, source_name, node=None):
         alert_source = ALERT_SOURCES[source_name]
 
+        if source_name in self.sources_checks:
+            self.logger.debug("Not running alert source %r because its previous check is still running", source_name)
+            raise UnavailableException()
+
         start = time.monotonic()
+        timed_out = False
+        check = self.sources_checks[source_name] = asyncio.ensure_future(alert_source.check())
+        check.add_done_callback(functools.partial(self.__source_check_done, source_name))
         try:
-            alerts = (await alert_source.check()) or []
+            alerts = (await asyncio.wait_for(asyncio.shield(check), alert_source.run_timeout)) or []
         except UnavailableException:
             raise
+        except asyncio.TimeoutError:
+            # Threads can not be interrupted, such source is not ran again until its check finishes
+            if not isinstance(alert_source, ThreadedAlertSource):
+                check.cancel()
+
+            timed_out = True
+            alerts = [
+                Alert(AlertSourceRunFailedAlertClass,
+                      args={
+                          "source_name": alert_source.name,
+                          "traceback": f"Timed out after {alert_source.run_timeout} seconds",
+                      })
+            ]
+            # A slow check does not mean that the conditions it has reported are gone
+            if node is not None:
+                alerts += [alert for alert in self.alerts.source_alerts(source_name, node)
+                           if alert.klass != AlertSourceRunFailedAlertClass]
         except Exception as e:
-            if isinstance(e, CallError) and e.errno in [errno.ECONNABORTED, errno.ECONNREFUSED, errno.ECONNRESET,
-                                                        errno.EHOSTDOWN, errno.ETIMEDOUT]:
+            if isinstance(e, CallError) and e.errno in CONNECTION_ERRORS:
                 alerts = [
                     Alert(AlertSourceRunFailedAlertClass,
                           args={
@@ -826,6 +1029,8 @@ class AlertService(Service):
             source_stat["max"] = max(source_stat["max"], run_time)
             source_stat["total_count"] += 1
             source_stat["total_time"] += run_time
+            source_stat["timeouts"] += timed_out
+            source_stat["histogram"][bisect_left(ALERT_SOURCE_RUN_TIME_BUCKETS, run_time)] += 1
 
         keys = set()
         unique_alerts = []
@@ -842,6 +1047,14 @@ class AlertService(Service):
 
         return alerts
 
+    def __source_check_done(self, source_name, check):
+        if self.sources_checks.get(source_name) is check:
+            del self.sources_checks[source_name]
+
+        # Retrieve the exception of a check that has timed out
+        if not check.cancelled():
+            check.exception()
+
     @periodic(3600, run_on_start=False)
     @private
     async def flush_alerts(self):
@@ -849,13 +1062,51 @@ class AlertService(Service):
             if await self.middleware.call('failover.status') == 'BACKUP':
                 return
 
-        await self.middleware.call("datastore.delete", "system.alert", [])
+        async with self.flush_lock:
+            # Only the alerts that changed since the last flush are written, all in a single transaction
+            rows = {alert.uuid: self.__alert_row(alert) for alert in self.alerts}
+            persisted_before = self.persisted_alerts
+            operations = []
+            if self.persisted_alerts is None:
+                operations.append({"method": "delete", "name": "system.alert", "id_or_filters": []})
+                persisted_alerts = {}
+            else:
+                persisted_alerts = self.persisted_alerts
+                for id_ in self.stale_alert_ids:
+                    operations.append({"method": "delete", "name": "system.alert", "id_or_filters": id_})
+                for uuid_, (id_, row) in persisted_alerts.items():
+                    if uuid_ not in rows:
+                        operations.append({"method": "delete", "name": "system.alert", "id_or_filters": id_})
+
+            inserted = []
+            for uuid_, row in rows.items():
+                if uuid_ in persisted_alerts:
+                    id_, persisted_row = persisted_alerts[uuid_]
+                    if row != persisted_row:
+                        operations.append({"method": "update", "name": "system.alert", "id_or_filters": id_,
+                                           "data": row})
+                else:
+                    inserted.append((uuid_, len(operations)))
+                    operations.append({"method": "insert", "name": "system.alert", "data": row})
+
+            if not operations:
+                return
+
+            results = await self.middleware.call("datastore.bulk", operations)
+            if self.persisted_alerts is not persisted_before:
+                # `alert.initialize` was called in the meantime
+                return
 
-        for alert in self.alerts:
-            d = alert.__dict__.copy()
-            d["klass"] = d["klass"].name
-            del d["mail"]
-            await self.middleware.call("datastore.insert", "system.alert", d)
+            ids = {uuid_: id_ for uuid_, (id_, row) in persisted_alerts.items()}
+            ids.update({uuid_: results[i] for uuid_, i in inserted})
+            self.persisted_alerts = {uuid_: (ids[uuid_], row) for uuid_, row in rows.items()}
+            self.stale_alert_ids = []
+
+    def __alert_row(self, alert):
+        d = copy.deepcopy(alert.__dict__)
+        d["klass"] = d["klass"].name
+        del d["mail"]
+        return d
 
     @private
     @accepts(Str("klass"), Any("args", null=True))
@@ -890,7 +1141,7 @@ class AlertService(Service):
 
         self.__handle_alert(alert)
 
-        self.alerts = [a for a in self.alerts if a.uuid != alert.uuid] + [alert]
+        self.alerts.add(alert)
 
         await self.middleware.call("alert.send_alerts")
 
@@ -921,7 +1172,7 @@ class AlertService(Service):
         deleted = False
         for deleted_alert in related_alerts:
             if deleted_alert not in left_alerts:
-                self.alerts.remove(deleted_alert)
+                self.alerts.discard(deleted_alert)
                 deleted = True
 
         if deleted:
@@ -1,4 +1,4 @@
-from middlewared.schema import Any, Str, Ref, Int, Dict, Bool, accepts
+from middlewared.schema import Any, Str, Ref, Int, Dict, Bool, List, accepts
 from middlewared.service import Service, private, job, filterable
 from middlewared.utils import filter_list
 from middlewared.service_exception import CallError, MatchNotFound
@@ -6,13 +6,46 @@ from middlewared.plugins.pwenc import encrypt, decrypt
 from middlewared.plugins.idmap import SID_LOCAL_USER_PREFIX
 
 from collections import namedtuple
+import asyncio
+import bisect
 import errno
+import itertools
 import os
 import time
 import pwd
 import grp
 import json
 
+# Number of cache entries written in a single `tdb.batch_ops` transaction
+DSCACHE_BATCH_SIZE = 5000
+# Number of cache entries `dscache.query` reads in its first `tdb.batch_ops` call, doubled for every subsequent one
+# (up to `DSCACHE_BATCH_SIZE`) so that small pages only read a few entries
+DSCACHE_QUERY_BATCH_SIZE = 100
+
+
+def write_cache_entries(middleware, job, ds, entries, progress_start=0, progress_end=100):
+    """
+    Write `entries` (a dictionary of `{"USER": [...], "GROUP": [...]}`) to the directory services cache of `ds` in
+    chunks of `DSCACHE_BATCH_SIZE`, reporting progress and throughput of `job` between `progress_start` and
+    `progress_end`.
+    """
+    total = sum(len(v) for v in entries.values())
+    written = 0
+    start = time.monotonic()
+    for idtype, idtype_entries in entries.items():
+        for i in range(0, len(idtype_entries), DSCACHE_BATCH_SIZE):
+            chunk = idtype_entries[i:i + DSCACHE_BATCH_SIZE]
+            middleware.call_sync('dscache.insert_many', ds, idtype, chunk)
+            written += len(chunk)
+
+            elapsed = time.monotonic() - start
+            job.set_progress(
+                progress_start + (progress_end - progress_start) * written / total,
+                f'Cached {written} of {total} entries ({int(written / elapsed) if elapsed else written} entries/s)'
+            )
+
+    return written
+
 
 class ClusterCacheService(Service):
     tdb_options = {
@@ -266,17 +299,166 @@ class CacheService(Service):
             return value
 
 
+class DSCacheIndex:
+    """
+    Secondary indexes of the entries of a single directory services cache TDB file (i.e. `activedirectory_user`).
+
+    Only `id`, the unix id and the name of each entry are kept in memory. Sorted views are rebuilt lazily on the
+    first lookup after a change so that bulk inserts do not pay for keeping them sorted.
+    """
+
+    def __init__(self, idtype):
+        if idtype == 'GROUP':
+            self.id_key = 'gid'
+            self.name_key = 'name'
+        else:
+            self.id_key = 'uid'
+            self.name_key = 'username'
+
+        self.entries = {}
+        self.dirty = False
+        self.by_order = []
+        self.by_unixid = []
+        self.by_name = []
+
+    def add(self, entry):
+        self.entries[entry[self.id_key]] = (entry['id'], entry[self.name_key])
+        self.dirty = True
+
+    def __len__(self):
+        return len(self.entries)
+
+    def sorted_views(self):
+        if self.dirty:
+            self.by_order = sorted((id_, unixid) for unixid, (id_, name) in self.entries.items())
+            self.by_unixid = sorted(self.entries)
+            self.by_name = sorted((name, unixid) for unixid, (id_, name) in self.entries.items())
+            self.dirty = False
+
+        return self.by_order, self.by_unixid, self.by_name
+
+    def candidates(self, filters):
+        """
+        Iterable of the unix ids of the entries that might match `filters`, in `id` order.
+
+        Only top-level (implicitly AND-ed) filters on the name, the unix id and `id` are used to narrow the
+        result down. The returned entries still have to be matched against all `filters`.
+        """
+        by_order, by_unixid, by_name = self.sorted_views()
+
+        matched = None
+        for f in filters or []:
+            if len(f) != 3:
+                continue
+
+            name, op, value = f
+            if name == self.name_key:
+                found = self.lookup_name(by_name, op, value)
+            elif name == self.id_key:
+                found = self.lookup_range(by_unixid, op, value, lambda unixid: unixid)
+            elif name == 'id':
+                found = self.lookup_range(by_order, op, value, lambda i: i[1], lambda i: i[0])
+            else:
+                found = None
+
+            if found is not None:
+                matched = found if matched is None else matched & found
+
+        if matched is None:
+            # Sorted views are replaced rather than modified so this can be consumed lazily
+            return (unixid for id_, unixid in by_order)
+
+        return [unixid for id_, unixid in sorted((self.entries[unixid][0], unixid) for unixid in matched)]
+
+    def lookup_name(self, by_name, op, value):
+        if not isinstance(value, str) or op not in ('=', '^'):
+            return None
+
+        end = value + '\U0010ffff' if op == '^' else value + '\0'
+        start = bisect.bisect_left(by_name, (value,))
+        stop = bisect.bisect_left(by_name, (end,))
+        return {unixid for name, unixid in by_name[start:stop] if op == '^' or name == value}
+
+    def lookup_range(self, view, op, value, unixid, key=None):
+        if op == 'in' and isinstance(value, (list, tuple)):
+            values = value
+        elif op in ('=', '>', '>=', '<', '<='):
+            values = [value]
+        else:
+            return None
+
+        if not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            return None
+
+        if op == 'in' or op == '=':
+            ranges = [(v, v) for v in values]
+        elif op in ('>', '>='):
+            ranges = [(value + (op == '>'), None)]
+        else:
+            ranges = [(None, value - (op == '<'))]
+
+        rv = set()
+        for low, high in ranges:
+            start = 0 if low is None else bisect.bisect_left(view, low, key=key)
+            stop = len(view) if high is None else bisect.bisect_right(view, high, key=key)
+            rv.update(unixid(i) for i in view[start:stop])
+
+        return rv
+
+
 class DSCache(Service):
 
     class Config:
         private = True
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.indexes = {}
+        self.indexes_lock = asyncio.Lock()
+
     @accepts(
         Str('directory_service', required=True, enum=["ACTIVEDIRECTORY", "LDAP"]),
         Str('idtype', enum=['USER', 'GROUP'], required=True),
         Dict('cache_entry', additional_attrs=True),
     )
     async def insert(self, ds, idtype, entry):
+        async with self.indexes_lock:
+            await self.middleware.call('tdb.batch_ops', {
+                "name": f'{ds.lower()}_{idtype.lower()}',
+                "ops": self.entry_ops(idtype, entry)
+            })
+            if (index := self.indexes.get((ds, idtype))) is not None:
+                index.add(entry)
+
+        return True
+
+    @accepts(
+        Str('directory_service', required=True, enum=["ACTIVEDIRECTORY", "LDAP"]),
+        Str('idtype', enum=['USER', 'GROUP'], required=True),
+        List('cache_entries'),
+    )
+    async def insert_many(self, ds, idtype, entries):
+        """
+        Insert `cache_entries` writing up to `DSCACHE_BATCH_SIZE` entries in a single `tdb.batch_ops` transaction.
+        """
+        async with self.indexes_lock:
+            index = self.indexes.get((ds, idtype))
+            for i in range(0, len(entries), DSCACHE_BATCH_SIZE):
+                ops = []
+                for entry in entries[i:i + DSCACHE_BATCH_SIZE]:
+                    ops.extend(self.entry_ops(idtype, entry))
+
+                await self.middleware.call('tdb.batch_ops', {
+                    "name": f'{ds.lower()}_{idtype.lower()}',
+                    "ops": ops
+                })
+                if index is not None:
+                    for entry in entries[i:i + DSCACHE_BATCH_SIZE]:
+                        index.add(entry)
+
+        return len(entries)
+
+    def entry_ops(self, idtype, entry):
         if idtype == "GROUP":
             id_key = "gid"
             name_key = "name"
@@ -284,15 +466,10 @@ class DSCache(Service):
             id_key = "uid"
             name_key = "username"
 
-        ops = [
+        return [
             {"action": "SET", "key": f'ID_{entry[id_key]}', "val": entry},
             {"action": "SET", "key": f'NAME_{entry[name_key]}', "val": entry}
         ]
-        await self.middleware.call('tdb.batch_ops', {
-            "name": f'{ds.lower()}_{idtype.lower()}',
-            "ops": ops
-        })
-        return True
 
     @accepts(
         Str('directory_service', required=True, enum=["ACTIVEDIRECTORY", "LDAP"]),
@@ -370,6 +547,40 @@ class DSCache(Service):
         })
         return [x['val'] for x in entries]
 
+    async def get_index(self, ds, idtype):
+        """
+        Return `DSCacheIndex` of the cache TDB file, reading the file once to build it if necessary.
+        """
+        async with self.indexes_lock:
+            if (index := self.indexes.get((ds, idtype))) is None:
+                index = DSCacheIndex(idtype)
+                for entry in await self.entries(ds, idtype):
+                    index.add(entry)
+
+                self.indexes[(ds, idtype)] = index
+
+            return index
+
+    def iter_entries(self, ds, idtype, unixids, get_smb):
+        """
+        Lazily read the cache entries for `unixids` in batches of growing size.
+        """
+        batch_size = DSCACHE_QUERY_BATCH_SIZE
+        unixids = iter(unixids)
+        while batch := list(itertools.islice(unixids, batch_size)):
+            entries = self.middleware.call_sync('tdb.batch_ops', {
+                'name': f'{ds.lower()}_{idtype.lower()}',
+                'ops': [{'action': 'GET', 'key': f'ID_{unixid}'} for unixid in batch],
+            })
+            for entry in entries:
+                if not get_smb:
+                    entry['sid'] = None
+                    entry['nt_name'] = None
+
+                yield entry
+
+            batch_size = min(batch_size * 2, DSCACHE_BATCH_SIZE)
+
     def parse_domain_info(self, sid):
         if sid.startswith(SID_LOCAL_USER_PREFIX):
             return {'domain': 'LOCAL', 'domain_sid': None, 'online': True, 'activedirectory': False}
@@ -490,18 +701,21 @@ class DSCache(Service):
         Query User / Group cache with `query-filters` and `query-options`.
 
         `objtype`: 'USERS' or 'GROUPS'
+
+        Local entries come first, followed by the cached ones in `id` order. Cached entries are read lazily from
+        the candidates of `DSCacheIndex`, so a page only reads as many entries as it needs unless the results
+        have to be ordered or counted.
         """
-        res = []
         ds_state = await self.middleware.call('directoryservices.get_state')
         enabled_ds = None
         extra = options.get("extra", {})
         get_smb = 'SMB' in extra.get('additional_information', [])
-        options.pop('get', None)  # This needs to happen as otherwise `res` will become a list of keys of user attrs
 
         is_name_check = bool(filters and len(filters) == 1 and filters[0][0] in ['username', 'name'])
         is_id_check = bool(filters and len(filters) == 1 and filters[0][0] in ['uid', 'gid'])
 
-        res.extend((await self.middleware.call(f'{objtype.lower()[:-1]}.query', filters, options)))
+        # Paging, ordering and projection are applied to local and directory services entries together below
+        res = await self.middleware.call(f'{objtype.lower()[:-1]}.query', filters, {'extra': extra})
 
         for dstype, state in ds_state.items():
             if state != 'DISABLED':
@@ -509,12 +723,12 @@ class DSCache(Service):
                 break
 
         if not enabled_ds:
-            return res
+            return filter_list(res, filters, options)
 
         if (is_name_check or is_id_check) and filters[0][1] == '=':
             # exists in local sqlite database, return results
             if res:
-                return res
+                return filter_list(res, filters, options)
 
             key = 'who' if is_name_check else 'id'
             entry = await self.retrieve(enabled_ds.upper(), {
@@ -522,20 +736,11 @@ class DSCache(Service):
                 key: filters[0][2],
             }, {'synthesize': True, 'smb': get_smb})
 
-            return [entry] if entry else []
-
-        entries = await self.entries(enabled_ds.upper(), objtype[:-1])
-        if not get_smb:
-            for entry in entries:
-                entry['sid'] = None
-                entry['nt_name'] = None
-
-        entries_by_id = sorted(entries, key=lambda i: i['id'])
-        res.extend(filter_list(entries_by_id, filters, options))
+            return filter_list([entry] if entry else [], filters, options)
 
-        # FIXME: This is broken and will break with groups/users as well, filters/options should be
-        #  respected here, let's fix this please
-        return res
+        index = await self.get_index(enabled_ds.upper(), objtype[:-1])
+        entries = self.iter_entries(enabled_ds.upper(), objtype[:-1], index.candidates(filters), get_smb)
+        return await self.middleware.run_in_thread(filter_list, itertools.chain(res, entries), filters, options)
 
     @job(lock="dscache_refresh")
     async def refresh(self, job):
@@ -544,8 +749,11 @@ class DSCache(Service):
         UI button to 'rebuild directory service cache'.
         """
         for ds in ['activedirectory', 'ldap']:
-            await self.middleware.call('tdb.wipe', {'name': f'{ds}_user'})
-            await self.middleware.call('tdb.wipe', {'name': f'{ds}_group'})
+            async with self.indexes_lock:
+                await self.middleware.call('tdb.wipe', {'name': f'{ds}_user'})
+                await self.middleware.call('tdb.wipe', {'name': f'{ds}_group'})
+                for idtype in ['USER', 'GROUP']:
+                    self.indexes[(ds.upper(), idtype)] = DSCacheIndex(idtype)
 
             ds_state = await self.middleware.call(f'{ds}.get_state')
 
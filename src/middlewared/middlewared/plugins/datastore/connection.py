@@ -1,15 +1,21 @@
 from concurrent.futures import ThreadPoolExecutor
 import re
 import shutil
+import threading
 import time
 
 from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
 
-from middlewared.service import private, Service
+from middlewared.service import private, Service, threaded
 
 from middlewared.plugins.config import FREENAS_DATABASE
 
+# All writes are serialized in this thread
 thread_pool = ThreadPoolExecutor(1)
+# `datastore.fetchall` is served concurrently by these threads, each of them has its own read-only connection
+READ_CONNECTIONS = 4
+read_thread_pool = ThreadPoolExecutor(READ_CONNECTIONS, thread_name_prefix='datastore_read')
 
 
 def regexp(expr, item):
@@ -20,6 +26,59 @@ def regexp(expr, item):
     return reg.search(item) is not None
 
 
+class WriteTransaction:
+    """
+    Executes writes for `datastore.execute_write_transaction`. Consecutive statements that compile to the same SQL
+    are buffered and executed with a single `executemany` call.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.queries = []
+        self.buffer = None
+        self.buffer_rowcount = None
+
+    def execute(self, stmt, rowcount=None):
+        """
+        Execute `stmt`. If `rowcount` is specified then a `RuntimeError` will be raised unless it updates exactly
+        that many rows.
+        """
+        sql, binds = self.service.compile(stmt)
+        if self.buffer is not None and self.buffer[0] == sql and (self.buffer_rowcount is None) == (rowcount is None):
+            self.buffer[1].append(binds)
+            if rowcount is not None:
+                self.buffer_rowcount += rowcount
+        else:
+            self.flush()
+            self.buffer = [sql, [binds]]
+            self.buffer_rowcount = rowcount
+
+    def insert(self, stmt):
+        """
+        Execute insert `stmt` and return `last_insert_rowid()`.
+        """
+        self.execute(stmt)
+        self.flush()
+        return self.service.connection.exec_driver_sql("SELECT last_insert_rowid()").fetchone()[0]
+
+    def fetchall(self, stmt):
+        self.flush()
+        return self.service.connection.execute(stmt).fetchall()
+
+    def flush(self):
+        if self.buffer is None:
+            return
+
+        sql, params = self.buffer
+        result = self.service.connection.exec_driver_sql(sql, [tuple(p) for p in params])
+        if self.buffer_rowcount is not None and result.rowcount != self.buffer_rowcount:
+            raise RuntimeError('No rows were updated')
+
+        self.queries.append(self.buffer)
+        self.buffer = None
+        self.buffer_rowcount = None
+
+
 class DatastoreService(Service):
 
     class Config:
@@ -28,6 +87,8 @@ class DatastoreService(Service):
 
     engine = None
     connection = None
+    read_engine = None
+    read_local = threading.local()
 
     @private
     def handle_constraint_violation(self, row, journal):
@@ -63,6 +124,10 @@ class DatastoreService(Service):
         if self.connection is not None:
             self.connection.close()
 
+        if self.read_engine is not None:
+            # Read connections will be re-opened by their threads
+            self.read_engine.dispose()
+
         self.engine = create_engine(f'sqlite:///{FREENAS_DATABASE}')
 
         self.connection = self.engine.connect()
@@ -80,16 +145,24 @@ class DatastoreService(Service):
 
         self.connection.connection.execute("VACUUM")
 
+        if FREENAS_DATABASE == ':memory:':
+            # In-memory database can't be shared between connections
+            self.read_engine = None
+        else:
+            # Read-only connections do not block each other and only wait for the writer to commit. Each of them is
+            # only used by the thread that opened it, but it might be garbage collected in any other thread.
+            self.read_engine = create_engine(
+                f'sqlite:///file:{FREENAS_DATABASE}?mode=ro&uri=true',
+                connect_args={'check_same_thread': False},
+                poolclass=NullPool,
+            )
+
     @private
     def execute(self, *args):
         return self.connection.execute(*args)
 
     @private
-    def execute_write(self, stmt, options=None):
-        options = options or {}
-        options.setdefault('ha_sync', True)
-        options.setdefault('return_last_insert_rowid', False)
-
+    def compile(self, stmt):
         compiled = stmt.compile(self.engine, compile_kwargs={"render_postcompile": True})
 
         sql = compiled.string
@@ -103,18 +176,77 @@ class DatastoreService(Service):
             else:
                 binds.append(value)
 
+        return sql, binds
+
+    @private
+    def execute_write(self, stmt, options=None):
+        options = options or {}
+        options.setdefault('ha_sync', True)
+        options.setdefault('return_last_insert_rowid', False)
+
+        sql, binds = self.compile(stmt)
+
         result = self.connection.execute(sql, binds)
 
         self.middleware.call_hook_inline("datastore.post_execute_write", sql, binds, options)
 
         if options['return_last_insert_rowid']:
-            return self.fetchall("SELECT last_insert_rowid()")[0][0]
+            return self._fetchall(self.connection, "SELECT last_insert_rowid()")[0][0]
 
         return result
 
     @private
+    def execute_write_transaction(self, writes, options=None):
+        """
+        Call each of `writes` with a `WriteTransaction` in a single SQLite transaction and return their results.
+
+        All the executed queries are replicated to the remote node at once.
+        """
+        options = options or {}
+        options.setdefault('ha_sync', True)
+
+        transaction = WriteTransaction(self)
+        with self.connection.begin():
+            results = [write(transaction) for write in writes]
+            transaction.flush()
+
+        if transaction.queries:
+            self.middleware.call_hook_inline("datastore.post_execute_write_many", transaction.queries, options)
+
+        return results
+
+    @private
+    def execute_many(self, queries):
+        """
+        Execute `queries` (a list of `[sql, [params, ...]]`) in a single SQLite transaction.
+        """
+        with self.connection.begin():
+            for sql, params in queries:
+                self.connection.exec_driver_sql(sql, [tuple(p) for p in params])
+
+    @private
+    @threaded(read_thread_pool)
     def fetchall(self, query, params=None):
-        cursor = self.connection.execute(query, params or [])
+        return self._fetchall(self._read_connection(), query, params)
+
+    def _read_connection(self):
+        read_engine = self.read_engine
+        if read_engine is None:
+            return self.connection
+
+        local = self.read_local
+        if getattr(local, 'engine', None) is not read_engine:
+            if getattr(local, 'connection', None) is not None:
+                local.connection.close()
+
+            local.connection = read_engine.connect()
+            local.connection.connection.create_function("REGEXP", 2, regexp)
+            local.engine = read_engine
+
+        return local.connection
+
+    def _fetchall(self, connection, query, params=None):
+        cursor = connection.execute(query, params or [])
         try:
             return cursor.fetchall()
         finally:
@@ -1,8 +1,28 @@
+"""
+Events for a datastore are sent right away by a task that re-queries the changed rows with a single `<plugin>.query`
+call. The ids of rows changed while that task is running are collected and sent by the same task once it is done, so
+the events of a datastore are always sent in order and a burst of writes results in only a few queries.
+
+Callers that change many rows can `datastore.hold_events` and pass the returned hold id as the `events_hold` option of
+their writes. Events for these rows are collected until `datastore.release_events` is called and then sent at once.
+Events for rows written by anyone else are not held. Rows are re-queried when the events are sent, so an event carries
+the current state of the row even if another writer changed it since.
+"""
 from collections import defaultdict
+import uuid
 
 from middlewared.schema import accepts, Dict, Str
 from middlewared.service import Service
 
+# (pending event, new event) -> event that is sent. `None` means that no event will be sent at all.
+COALESCED_EVENTS = {
+    ("ADDED", "CHANGED"): "ADDED",
+    ("ADDED", "REMOVED"): None,
+    ("CHANGED", "ADDED"): "CHANGED",
+    ("REMOVED", "ADDED"): "CHANGED",
+    ("REMOVED", "CHANGED"): "CHANGED",
+}
+
 
 class DatastoreService(Service):
 
@@ -10,6 +30,9 @@ class DatastoreService(Service):
         private = True
 
     events = defaultdict(list)
+    pending_events = defaultdict(dict)
+    held_events = {}
+    flushes = {}
 
     @accepts(Dict(
         "options",
@@ -27,44 +50,90 @@ class DatastoreService(Service):
 
         self.middleware.event_register(f"{options['plugin']}.query", options["description"])
 
-    async def send_insert_events(self, datastore, row):
-        for options in self.events[datastore]:
-            await self._send_event(
-                options,
-                "ADDED",
-                id=row[options["prefix"] + options["id"]],
-                fields=await self._fields(options, row),
-            )
-
-    async def send_update_events(self, datastore, id):
+    async def send_insert_events(self, datastore, row, hold=None):
         for options in self.events[datastore]:
-            fields = await self._fields(options, {options["prefix"] + options["id"]: id}, False)
-            if not fields:
-                # It is possible the row in question got deleted with the update
-                # event still pending, in this case we skip sending update event
-                continue
-
-            await self._send_event(
-                options,
-                "CHANGED",
-                id=id,
-                fields=fields[0],
-            )
-
-    async def send_delete_events(self, datastore, id):
+            self._add_pending_event(datastore, row[options["prefix"] + options["id"]], "ADDED", hold)
+
+    async def send_update_events(self, datastore, id, hold=None):
+        if self.events[datastore]:
+            self._add_pending_event(datastore, id, "CHANGED", hold)
+
+    async def send_delete_events(self, datastore, id, hold=None):
+        if self.events[datastore]:
+            self._add_pending_event(datastore, id, "REMOVED", hold)
+
+    async def hold_events(self):
+        """
+        Returns a hold id. Events of the writes that pass it as their `events_hold` option are not sent until
+        `datastore.release_events` is called. Used by bulk writers so that the events for all rows they change are sent
+        at once.
+        """
+        hold = str(uuid.uuid4())
+        self.held_events[hold] = defaultdict(dict)
+        return hold
+
+    async def release_events(self, hold):
+        """
+        Release `datastore.hold_events` and send all events held by it.
+        """
+        for datastore, pending in self.held_events.pop(hold).items():
+            for id, type in pending.items():
+                self._add_pending_event(datastore, id, type)
+
+    async def flush_events(self, datastore):
+        """
+        Send all pending events for `datastore` re-querying the changed rows at once.
+        """
+        pending = self.pending_events.pop(datastore, None)
+        if not pending:
+            return
+
         for options in self.events[datastore]:
-            await self._send_event(options, "REMOVED", id=id)
+            rows = {}
+            if ids := [id for id, type in pending.items() if type != "REMOVED"]:
+                rows = {row[options["id"]]: row for row in await self._query(options, [[options["id"], "in", ids]])}
+
+            for id, type in pending.items():
+                if type == "REMOVED":
+                    await self._send_event(options, type, id=id)
+                elif id in rows:
+                    await self._send_event(options, type, id=id, fields=rows[id])
+                # Otherwise it is possible the row in question got deleted with the event still pending, in this
+                # case we skip sending the event
+
+    def _add_pending_event(self, datastore, id, type, hold=None):
+        if hold is not None:
+            pending = self.held_events[hold][datastore]
+        else:
+            pending = self.pending_events[datastore]
+
+        if id in pending:
+            type = COALESCED_EVENTS.get((pending[id], type), type)
+            if type is None:
+                pending.pop(id)
+                return
+
+        pending[id] = type
 
-    async def _fields(self, options, row, get=True):
-        query_options = {"get": get}
+        if hold is None and datastore not in self.flushes:
+            self.flushes[datastore] = self.middleware.create_task(self._flush_pending_events(datastore))
+
+    async def _flush_pending_events(self, datastore):
+        try:
+            while self.pending_events.get(datastore):
+                try:
+                    await self.flush_events(datastore)
+                except Exception:
+                    self.logger.error("Failed to send %r events", datastore, exc_info=True)
+        finally:
+            self.flushes.pop(datastore, None)
+
+    async def _query(self, options, filters):
+        query_options = {}
         if options.get("extra"):
             query_options["extra"] = options["extra"]
 
-        return await self.middleware.call(
-            f"{options['plugin']}.query",
-            [[options["id"], "=", row[options["prefix"] + options["id"]]]],
-            query_options,
-        )
+        return await self.middleware.call(f"{options['plugin']}.query", filters, query_options)
 
     async def _send_event(self, options, type, **kwargs):
         if options["process_event"]:
@@ -1,28 +1,85 @@
 import operator
 
+from sqlalchemy import bindparam
+
 from .schema import SchemaMixin
 
 
-def in_(col, value):
+def in_(col, value, bind=lambda value, **kwargs: value):
     has_nulls = None in value
     value = [v for v in value if v is not None]
-    expr = col.in_(value)
+    expr = col.in_(bind(value, expanding=True))
     if has_nulls:
         expr = expr | (col == None)  # noqa
     return expr
 
 
-def nin(col, value):
+def nin(col, value, bind=lambda value, **kwargs: value):
     has_nulls = None in value
     value = [v for v in value if v is not None]
-    expr = ~col.in_(value)
+    expr = ~col.in_(bind(value, expanding=True))
     if has_nulls:
         expr = expr & (col != None)  # noqa
     return expr
 
 
+def filters_shape(filters):
+    """
+    Returns a hashable representation of `filters` that does not depend on filter values but only on the SQL that
+    `FilterMixin._filters_to_queryset` generates for them when using bound parameters.
+    """
+    rv = []
+    for f in filters:
+        if len(f) == 3:
+            name, op, value = f
+            if op in ('in', 'nin'):
+                value = None in value
+            elif op in ('=', '!='):
+                value = value is None
+            else:
+                value = None
+            rv.append((name, op, value))
+        elif len(f) == 2 and f[0] == 'OR':
+            rv.append(('OR', filters_shape(f[1])))
+        else:
+            raise ValueError('Invalid filter {0}'.format(f))
+
+    return tuple(rv)
+
+
+def filters_params(filters, params=None):
+    """
+    Returns bound parameters values for `filters` in the same order `FilterMixin._filters_to_queryset` binds them.
+    """
+    if params is None:
+        params = {}
+
+    for f in filters:
+        if len(f) == 3:
+            name, op, value = f
+            if op in ('in', 'nin'):
+                bind_param(params, [v for v in value if v is not None])
+            elif not (op in ('=', '!=') and value is None):
+                bind_param(params, value)
+        else:
+            filters_params(f[1], params)
+
+    return params
+
+
+def bind_param(params, value, expanding=False):
+    key = f'filter_{len(params)}'
+    params[key] = value
+    return bindparam(key, expanding=expanding)
+
+
 class FilterMixin(SchemaMixin):
-    def _filters_to_queryset(self, filters, table, prefix, aliases):
+    def _filters_to_queryset(self, filters, table, prefix, aliases, params=None):
+        """
+        If `params` is a dict, filter values are not embedded into the query. Instead, they are stored to `params`
+        and bound parameters are used, so the resulting query can be reused for any other filters with the same
+        `filters_shape`.
+        """
         opmap = {
             '=': operator.eq,
             '!=': operator.ne,
@@ -53,13 +110,18 @@ class FilterMixin(SchemaMixin):
                 if op not in opmap:
                     raise ValueError('Invalid operation: {0}'.format(op))
 
-                q = opmap[op](col, value)
+                if params is None or (op in ('=', '!=') and value is None):
+                    q = opmap[op](col, value)
+                elif op in ('in', 'nin'):
+                    q = opmap[op](col, value, lambda value, **kwargs: bind_param(params, value, **kwargs))
+                else:
+                    q = opmap[op](col, bind_param(params, value))
                 rv.append(q)
             elif len(f) == 2:
                 op, value = f
                 if op == 'OR':
                     or_value = None
-                    for value in self._filters_to_queryset(value, table, prefix, aliases):
+                    for value in self._filters_to_queryset(value, table, prefix, aliases, params):
                         if or_value is None:
                             or_value = value
                         else:
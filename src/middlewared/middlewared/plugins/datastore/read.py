@@ -1,4 +1,4 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import re
 
 from sqlalchemy import and_, func, select
@@ -12,9 +12,11 @@ from middlewared.service import Service
 from middlewared.service_exception import MatchNotFound
 from middlewared.validators import QueryFilters
 
-from .filter import FilterMixin
+from .filter import FilterMixin, filters_params, filters_shape
 from .schema import SchemaMixin
 
+QUERY_CACHE_SIZE = 512
+
 
 def regexp(expr, item):
     reg = re.compile(expr, re.I)
@@ -26,6 +28,10 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
     class Config:
         private = True
 
+    # (table, filters shape, options shape) -> (SQLAlchemy statement with bound parameters for filter values, aliases)
+    # SQLAlchemy caches compiled form of the statements so reusing them also skips SQL compilation.
+    query_cache = OrderedDict()
+
     @accepts(
         Str('name'),
         List('query-filters', items=[List('query-filter')], validators=[QueryFilters()], register=True),
@@ -33,6 +39,7 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
             'query-options',
             Bool('relationships', default=True),
             Str('extend', default=None, null=True),
+            Str('extend_batch', default=None, null=True),
             Str('extend_context', default=None, null=True),
             Str('prefix', default=None, null=True),
             Dict('extra', additional_attrs=True),
@@ -79,6 +86,65 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         """
         table = self._get_table(name)
 
+        try:
+            key = (
+                table, filters_shape(filters), options['relationships'], options['prefix'], options['count'],
+                tuple(options['order_by']), options['offset'], options['limit'],
+            )
+            hash(key)
+        except (TypeError, ValueError):
+            # Invalid filters, `_get_queryset` will raise a proper error for them
+            key = None
+
+        if key is None:
+            qs, aliases = self._get_queryset(table, filters, options)
+            params = None
+        elif (cached := self.query_cache.get(key)) is not None:
+            self.query_cache.move_to_end(key)
+            qs, aliases = cached
+            params = filters_params(filters)
+        else:
+            params = {}
+            qs, aliases = self._get_queryset(table, filters, options, params)
+            self.query_cache[key] = qs, aliases
+            if len(self.query_cache) > QUERY_CACHE_SIZE:
+                self.query_cache.popitem(last=False)
+
+        if options['count']:
+            return (await self.middleware.call("datastore.fetchall", qs, params))[0][0]
+
+        result = await self.middleware.call("datastore.fetchall", qs, params)
+
+        relationships = [{} for row in result]
+        if options['relationships']:
+            # This will only fetch many-to-many relationships for primary table, not for joins, but that's enough
+            relationships = await self._fetch_many_to_many(table, result)
+
+        result = await self._queryset_serialize(
+            result,
+            table, aliases, relationships, options['extend'], options['extend_batch'], options['extend_context'],
+            options['prefix'], options['select'], options['extra'],
+        )
+
+        if options['get']:
+            try:
+                return result[0]
+            except IndexError:
+                raise MatchNotFound() from None
+
+        return result
+
+    @accepts(Str('name'), Ref('query-options'))
+    async def config(self, name, options):
+        """
+        Get configuration settings object for a given `name`.
+
+        This is a shortcut for `query(name, {"get": true})`.
+        """
+        options['get'] = True
+        return await self.query(name, [], options)
+
+    def _get_queryset(self, table, filters, options, params=None):
         # We do not want to make changes to original options
         # which might happen with "prefix"
         options = options.copy()
@@ -100,10 +166,10 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         prefix = options['prefix']
 
         if filters:
-            qs = qs.where(and_(*self._filters_to_queryset(filters, table, prefix, aliases)))
+            qs = qs.where(and_(*self._filters_to_queryset(filters, table, prefix, aliases, params)))
 
         if options['count']:
-            return (await self.middleware.call("datastore.fetchall", qs))[0][0]
+            return qs, aliases
 
         order_by = options['order_by']
         if order_by:
@@ -155,36 +221,7 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         if options['limit']:
             qs = qs.limit(options['limit'])
 
-        result = await self.middleware.call("datastore.fetchall", qs)
-
-        relationships = [{} for row in result]
-        if options['relationships']:
-            # This will only fetch many-to-many relationships for primary table, not for joins, but that's enough
-            relationships = await self._fetch_many_to_many(table, result)
-
-        result = await self._queryset_serialize(
-            result,
-            table, aliases, relationships, options['extend'], options['extend_context'], options['prefix'],
-            options['select'], options['extra'],
-        )
-
-        if options['get']:
-            try:
-                return result[0]
-            except IndexError:
-                raise MatchNotFound() from None
-
-        return result
-
-    @accepts(Str('name'), Ref('query-options'))
-    async def config(self, name, options):
-        """
-        Get configuration settings object for a given `name`.
-
-        This is a shortcut for `query(name, {"get": true})`.
-        """
-        options['get'] = True
-        return await self.query(name, [], options)
+        return qs, aliases
 
     def _get_queryset_joins(self, table):
         result = {}
@@ -203,7 +240,8 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         return result
 
     async def _queryset_serialize(
-        self, qs, table, aliases, relationships, extend, extend_context, field_prefix, select, extra_options,
+        self, qs, table, aliases, relationships, extend, extend_batch, extend_context, field_prefix, select,
+        extra_options,
     ):
         rows = []
         for i, row in enumerate(qs):
@@ -214,6 +252,15 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         else:
             extend_context_value = None
 
+        if extend_batch:
+            # Extend all rows with a single call instead of calling `extend` for each of them
+            if extend_context:
+                rows = await self.middleware.call(extend_batch, rows, extend_context_value)
+            else:
+                rows = await self.middleware.call(extend_batch, rows)
+
+            return [self._select(data, select) for data in rows]
+
         return [
             await self._extend(data, extend, extend_context, extend_context_value, select)
             for data in rows
@@ -232,6 +279,9 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
             else:
                 data = await self.middleware.call(extend, data)
 
+        return self._select(data, select)
+
+    def _select(self, data, select):
         if not select:
             return data
         else:
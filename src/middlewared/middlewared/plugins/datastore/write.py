@@ -1,7 +1,9 @@
-from sqlalchemy import and_, types
+import functools
+
+from sqlalchemy import and_, select, types
 from sqlalchemy.sql import sqltypes
 
-from middlewared.schema import accepts, Any, Bool, Dict, Str
+from middlewared.schema import accepts, Any, Bool, Dict, List, Str
 from middlewared.service import Service
 
 from .filter import FilterMixin
@@ -21,10 +23,17 @@ db operation, we run the plugins associated "query" method. So if we
 update 1000 table entries, then we run "disk.query" 1000 times. In
 real world testing, this has shown to take roughly 82 seconds to update
 100 entries on the `storage_disk` table when there are 641 entries total.
-The database was on a NVMe disk. The solution to this is adding the
-`send_events` key. If this is set to False, then an event will not be
+The database was on a NVMe disk. To avoid this, events are batched (see
+`plugins/datastore/event.py`) and all changed rows are queried at once.
+Callers that change many rows can pass a `datastore.hold_events` id as the
+`events_hold` key so that the events are sent at once when it is released.
+The `send_events` key can still be set to False so that an event will not be
 sent for the db operation. It is the callers responsibility to emit an event
 after all the db operations are complete.
+
+Callers that write many rows at once should use `datastore.bulk`: it executes
+all the operations in a single transaction (using `executemany` where
+possible) and replicates them to the remote node as a single entry.
 """
 
 
@@ -41,6 +50,7 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
             Bool('ha_sync', default=True),
             Str('prefix', default=''),
             Bool('send_events', default=True),
+            Str('events_hold', null=True, default=None),
         ),
     )
     async def insert(self, name, data, options):
@@ -48,14 +58,7 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         Insert a new entry to `name`.
         """
         table = self._get_table(name)
-        insert, relationships = self._extract_relationships(table, options['prefix'], data)
-
-        for column in table.c:
-            if column.default is not None:
-                insert.setdefault(column.name, column.default.arg)
-            if not column.nullable:
-                if isinstance(column.type, (types.String, types.Text)):
-                    insert.setdefault(column.name, '')
+        insert, relationships = self._prepare_insert(table, data, options['prefix'])
 
         pk_column = self._get_pk(table)
         return_last_insert_rowid = type(pk_column.type) == sqltypes.Integer
@@ -75,7 +78,9 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         await self._handle_relationships(pk, relationships)
 
         if options['send_events']:
-            await self.middleware.call('datastore.send_insert_events', name, insert)
+            await self.middleware.call(
+                'datastore.send_insert_events', name, {**insert, pk_column.name: pk}, options['events_hold'],
+            )
 
         return pk
 
@@ -88,6 +93,7 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
             Bool('ha_sync', default=True),
             Str('prefix', default=''),
             Bool('send_events', default=True),
+            Str('events_hold', null=True, default=None),
         ),
     )
     async def update(self, name, id_or_filters, data, options):
@@ -95,7 +101,6 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         Update an entry `id` in `name`.
         """
         table = self._get_table(name)
-        data = data.copy()
 
         if isinstance(id_or_filters, list):
             rows = await self.middleware.call('datastore.query', name, id_or_filters, {'prefix': options['prefix']})
@@ -106,12 +111,7 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         else:
             id = id_or_filters
 
-        for column in table.c:
-            if column.foreign_keys:
-                if column.name[:-3] in data:
-                    data[column.name] = data.pop(column.name[:-3])
-
-        update, relationships = self._extract_relationships(table, options['prefix'], data)
+        update, relationships = self._prepare_update(table, data, options['prefix'])
 
         if update:
             result = await self.middleware.call(
@@ -125,12 +125,150 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
                 raise RuntimeError('No rows were updated')
 
             if options['send_events']:
-                await self.middleware.call('datastore.send_update_events', name, id)
+                await self.middleware.call('datastore.send_update_events', name, id, options['events_hold'])
 
         await self._handle_relationships(id, relationships)
 
         return id
 
+    @accepts(
+        List('operations', items=[
+            Dict(
+                'operation',
+                Str('method', enum=['insert', 'update', 'delete'], required=True),
+                Str('name', required=True),
+                Any('id_or_filters'),
+                Dict('data', additional_attrs=True),
+                Str('prefix', default=''),
+            ),
+        ]),
+        Dict(
+            'options',
+            Bool('ha_sync', default=True),
+            Bool('send_events', default=True),
+        ),
+    )
+    async def bulk(self, operations, options):
+        """
+        Apply a list of `insert`, `update` and `delete` `operations` in a single transaction. If any of them fails,
+        none of them are applied.
+
+        Consecutive operations that result in the same SQL query (i.e. inserting or updating the same columns) are
+        executed with a single `executemany` call.
+
+        Returns a list of the results the corresponding `datastore.insert`/`update`/`delete` calls would return.
+        """
+        writes = []
+        rows = []
+        for operation in operations:
+            table = self._get_table(operation['name'])
+            if operation['method'] == 'insert':
+                row, relationships = self._prepare_insert(table, operation['data'], operation['prefix'])
+                writes.append(functools.partial(self._bulk_insert, table, row, relationships))
+            elif operation['method'] == 'update':
+                row, relationships = self._prepare_update(table, operation['data'], operation['prefix'])
+                writes.append(functools.partial(
+                    self._bulk_update, table, operation['id_or_filters'], row, relationships, operation['prefix'],
+                ))
+            else:
+                row = None
+                writes.append(functools.partial(
+                    self._bulk_delete, table, operation['id_or_filters'], operation['prefix'],
+                ))
+
+            rows.append(row)
+
+        results = await self.middleware.call(
+            'datastore.execute_write_transaction', writes, {'ha_sync': options['ha_sync']},
+        )
+
+        if options['send_events']:
+            hold = await self.middleware.call('datastore.hold_events')
+            try:
+                for operation, row, result in zip(operations, rows, results):
+                    await self._send_bulk_events(operation, row, result, hold)
+            finally:
+                await self.middleware.call('datastore.release_events', hold)
+
+        return results
+
+    def _bulk_insert(self, table, insert, relationships, transaction):
+        pk_column = self._get_pk(table)
+        stmt = table.insert().values(**insert)
+        # Same as `insert`, but explicitly set integer primary keys do not need `last_insert_rowid` so that such rows
+        # can still be inserted with a single `executemany` call
+        if type(pk_column.type) is sqltypes.Integer and pk_column.name not in insert:
+            pk = transaction.insert(stmt)
+        else:
+            transaction.execute(stmt)
+            pk = insert[pk_column.name]
+
+        for stmt in self._relationships_statements(pk, relationships):
+            transaction.execute(stmt)
+
+        return pk
+
+    def _bulk_update(self, table, id_or_filters, update, relationships, prefix, transaction):
+        pk_column = self._get_pk(table)
+        if isinstance(id_or_filters, list):
+            rows = transaction.fetchall(
+                select([pk_column]).where(self._where_clause(table, id_or_filters, {'prefix': prefix}))
+            )
+            if len(rows) != 1:
+                raise RuntimeError(f'{len(rows)} found, expecting one')
+
+            id = rows[0][0]
+        else:
+            id = id_or_filters
+
+        if update:
+            transaction.execute(
+                table.update().values(**update).where(self._where_clause(table, id, {'prefix': prefix})),
+                rowcount=1,
+            )
+
+        for stmt in self._relationships_statements(id, relationships):
+            transaction.execute(stmt)
+
+        return id
+
+    def _bulk_delete(self, table, id_or_filters, prefix, transaction):
+        transaction.execute(table.delete().where(self._where_clause(table, id_or_filters, {'prefix': prefix})))
+        return True
+
+    async def _send_bulk_events(self, operation, row, result, hold):
+        name = operation['name']
+        if operation['method'] == 'insert':
+            pk_column = self._get_pk(self._get_table(name))
+            await self.middleware.call('datastore.send_insert_events', name, {**row, pk_column.name: result}, hold)
+        elif operation['method'] == 'update':
+            if row:
+                await self.middleware.call('datastore.send_update_events', name, result, hold)
+        elif not isinstance(operation['id_or_filters'], list):
+            await self.middleware.call('datastore.send_delete_events', name, operation['id_or_filters'], hold)
+
+    def _prepare_insert(self, table, data, prefix):
+        insert, relationships = self._extract_relationships(table, prefix, data)
+
+        for column in table.c:
+            if column.default is not None:
+                insert.setdefault(column.name, column.default.arg)
+            if not column.nullable:
+                if isinstance(column.type, (types.String, types.Text)):
+                    insert.setdefault(column.name, '')
+
+        return insert, relationships
+
+    def _prepare_update(self, table, data, prefix):
+        data = data.copy()
+
+        for column in table.c:
+            if column.foreign_keys:
+                if column.name[:-3] in data:
+                    data[column.name] = data.pop(column.name[:-3])
+
+        return self._extract_relationships(table, prefix, data)
+
     def _extract_relationships(self, table, prefix, data):
         relationships = self._get_relationships(table)
 
@@ -146,6 +284,10 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         return insert, insert_relationships
 
     async def _handle_relationships(self, pk, relationships):
+        for stmt in self._relationships_statements(pk, relationships):
+            await self.middleware.call('datastore.execute_write', stmt)
+
+    def _relationships_statements(self, pk, relationships):
         for relationship, values in relationships:
             assert len(relationship.synchronize_pairs) == 1
             assert len(relationship.secondary_synchronize_pairs) == 1
@@ -153,19 +295,13 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
             local_pk, relationship_local_pk = relationship.synchronize_pairs[0]
             remote_pk, relationship_remote_pk = relationship.secondary_synchronize_pairs[0]
 
-            await self.middleware.call(
-                'datastore.execute_write',
-                relationship_local_pk.table.delete().where(relationship_local_pk == pk)
-            )
+            yield relationship_local_pk.table.delete().where(relationship_local_pk == pk)
 
             for value in values:
-                await self.middleware.call(
-                    'datastore.execute_write',
-                    relationship_local_pk.table.insert().values({
-                        relationship_local_pk.name: pk,
-                        relationship_remote_pk.name: value,
-                    })
-                )
+                yield relationship_local_pk.table.insert().values({
+                    relationship_local_pk.name: pk,
+                    relationship_remote_pk.name: value,
+                })
 
     def _where_clause(self, table, id_or_filters, options):
         if isinstance(id_or_filters, list):
@@ -181,6 +317,7 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
             Bool('ha_sync', default=True),
             Str('prefix', default=''),
             Bool('send_events', default=True),
+            Str('events_hold', null=True, default=None),
         ),
     )
     async def delete(self, name, id_or_filters, options):
@@ -198,6 +335,6 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         )
 
         if not isinstance(id_or_filters, list) and options['send_events']:
-            await self.middleware.call('datastore.send_delete_events', name, id_or_filters)
+            await self.middleware.call('datastore.send_delete_events', name, id_or_filters, options['events_hold'])
 
         return True
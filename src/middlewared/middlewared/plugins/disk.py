@@ -50,7 +50,7 @@ class DiskService(CRUDService):
     class Config:
         datastore = 'storage.disk'
         datastore_prefix = 'disk_'
-        datastore_extend = 'disk.disk_extend'
+        datastore_extend_batch = 'disk.disk_extend_batch'
         datastore_extend_context = 'disk.disk_extend_context'
         datastore_primary_key = 'identifier'
         datastore_primary_key_type = 'string'
@@ -119,6 +119,10 @@ class DiskService(CRUDService):
 
         return await super().query(filters, options)
 
+    @private
+    async def disk_extend_batch(self, disks, context):
+        return [await self.disk_extend(disk, context) for disk in disks]
+
     @private
     async def disk_extend(self, disk, context):
         disk.pop('enabled', None)
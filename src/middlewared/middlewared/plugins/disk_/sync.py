@@ -123,6 +123,14 @@ class DiskService(Service, ServiceChangeMixin):
         """
         Synchronize all disks with the cache in database.
         """
+        # `disk.query` events for all changed disks are sent at once when released
+        events_hold = self.middleware.call_sync('datastore.hold_events')
+        try:
+            return self._sync_all(job, opts, events_hold)
+        finally:
+            self.middleware.call_sync('datastore.release_events', events_hold)
+
+    def _sync_all(self, job, opts, events_hold):
         # Skip sync disks on standby node
         licensed = self.middleware.call_sync('failover.licensed')
         if licensed:
@@ -138,7 +146,7 @@ class DiskService(Service, ServiceChangeMixin):
         db_disks = self.middleware.call_sync('datastore.query', 'storage.disk', [], {'order_by': ['disk_expiretime']})
 
         uuids = self.middleware.call_sync('disk.get_valid_zfs_partition_type_uuids')
-        options = {'send_events': False, 'ha_sync': False}
+        options = {'ha_sync': False, 'events_hold': events_hold}
         seen_disks = {}
         changed = set()
         deleted = set()
@@ -249,14 +257,6 @@ class DiskService(Service, ServiceChangeMixin):
             job.set_progress(92, 'Restarting necessary services')
             self.middleware.call_sync('disk.restart_services_after_sync')
 
-            # we query the db again since we've made changes to it
-            job.set_progress(94, 'Emitting disk events')
-            disks = {i['disk_identifier']: i for i in self.middleware.call_sync('datastore.query', 'storage.disk')}
-            for change in changed:
-                self.middleware.send_event('disk.query', 'CHANGED', id=change, fields=disks[change])
-            for delete in deleted:
-                self.middleware.send_event('disk.query', 'REMOVED', id=delete)
-
         if opts['zfs_guid']:
             job.set_progress(95, 'Synchronizing ZFS GUIDs')
             self.middleware.call_sync('disk.sync_all_zfs_guid')
@@ -78,7 +78,7 @@ class DiskService(Service):
                 else:
                     self.logger.debug("Pool %r vdev %r disk is None", pool["name"], vdev["guid"])
 
-        events = set()
+        operations = []
         for disk in await self.middleware.call("disk.query", [], {"extra": {"include_expired": True}}):
             guid = disk_to_guid.get(disk["devname"])
             if guid is not None and guid != disk["zfs_guid"]:
@@ -87,11 +87,10 @@ class DiskService(Service):
                         "Setting disk %r (%r) zfs_guid %r",
                         disk["identifier"], disk["devname"], guid,
                     )
-                    events.add(disk["identifier"])
-                    await self.middleware.call(
-                        "datastore.update", "storage.disk", disk["identifier"],
-                        {"zfs_guid": guid}, {"prefix": "disk_", "send_events": False},
-                    )
+                    operations.append({
+                        "method": "update", "name": "storage.disk", "id_or_filters": disk["identifier"],
+                        "data": {"zfs_guid": guid}, "prefix": "disk_",
+                    })
             elif disk["zfs_guid"]:
                 devname = disk_to_guid.inv.get(disk["zfs_guid"])
                 if devname is not None and devname != disk["devname"]:
@@ -99,17 +98,13 @@ class DiskService(Service):
                         "Removing disk %r (%r) zfs_guid %r as %r has it",
                         disk["identifier"], disk["devname"], disk["zfs_guid"], devname,
                     )
-                    events.add(disk["identifier"])
-                    await self.middleware.call(
-                        "datastore.update", "storage.disk", disk["identifier"],
-                        {"zfs_guid": None}, {"prefix": "disk_", "send_events": False},
-                    )
+                    operations.append({
+                        "method": "update", "name": "storage.disk", "id_or_filters": disk["identifier"],
+                        "data": {"zfs_guid": None}, "prefix": "disk_",
+                    })
 
-        if events:
-            disks = {i["identifier"]: i for i in await self.middleware.call("disk.query", [], {"prefix": "disk_"})}
-            for event in events:
-                if event in disks:
-                    self.middleware.send_event("disk.query", "CHANGED", id=event, fields=disks[event])
+        if operations:
+            await self.middleware.call("datastore.bulk", operations)
 
 
 async def zfs_events_hook(middleware, data):
@@ -22,12 +22,22 @@ class FailoverDatastoreService(Service):
             return
 
         if await self.middleware.call('failover.status') != 'BACKUP':
-            # We can't query failover.status on `MASTER` node (please see `hook_datastore_execute_write` for
+            # We can't query failover.status on `MASTER` node (please see `replicate_datastore_write` for
             # explanations). Non-BACKUP nodes are responsible for checking their failover status.
             return
 
         await self.middleware.call('datastore.execute', sql, params)
 
+    async def sql_many(self, data, queries):
+        if await self.middleware.call('system.version') != data['version']:
+            return
+
+        if await self.middleware.call('failover.status') != 'BACKUP':
+            # See `sql`
+            return
+
+        await self.middleware.call('datastore.execute_many', queries)
+
     failure = False
 
     def is_failure(self):
@@ -88,6 +98,15 @@ class FailoverDatastoreService(Service):
 
 
 def hook_datastore_execute_write(middleware, sql, params, options):
+    replicate_datastore_write(middleware, 'failover.datastore.sql', [sql, params], options)
+
+
+def hook_datastore_execute_write_many(middleware, queries, options):
+    # The whole transaction is replicated at once
+    replicate_datastore_write(middleware, 'failover.datastore.sql_many', [queries], options)
+
+
+def replicate_datastore_write(middleware, method, args, options):
     # This code is executed in SQLite thread and blocks it (in order to avoid replication query race conditions)
     # No switching to the async context that will yield to database queries is allowed here as it will result in
     # a deadlock.
@@ -104,14 +123,12 @@ def hook_datastore_execute_write(middleware, sql, params, options):
     try:
         middleware.call_sync(
             'failover.call_remote',
-            'failover.datastore.sql',
+            method,
             [
                 {
                     'version': middleware.call_sync('system.version'),
                 },
-                sql,
-                params,
-            ],
+            ] + args,
             {
                 'timeout': 10,
             },
@@ -126,3 +143,4 @@ async def setup(middleware):
         return
 
     middleware.register_hook('datastore.post_execute_write', hook_datastore_execute_write, inline=True)
+    middleware.register_hook('datastore.post_execute_write_many', hook_datastore_execute_write_many, inline=True)
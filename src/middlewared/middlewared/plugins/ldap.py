@@ -10,6 +10,7 @@ from middlewared.schema import accepts, returns, Bool, Dict, Int, List, Str, Ref
 from middlewared.service import job, private, TDBWrapConfigService, Service, ValidationErrors
 from middlewared.service_exception import CallError
 import middlewared.sqlalchemy as sa
+from middlewared.plugins.cache import write_cache_entries
 from middlewared.plugins.directoryservices import DSStatus, SSL
 from middlewared.plugins.idmap import DSType
 from middlewared.plugins.ldap_.ldap_client import LdapClient
@@ -1030,9 +1031,11 @@ class LDAPService(TDBWrapConfigService):
             self.logger.debug('LDAP cache is disabled. Bypassing cache fill.')
             return
 
+        job.set_progress(0, 'Retrieving users and groups')
         pwd_list = MidNslcdClient().getpwall()
         grp_list = MidNslcdClient().getgrall()
 
+        entries = {'USER': [], 'GROUP': []}
         for u in pwd_list:
             entry = {
                 'id': user_next_index,
@@ -1058,7 +1061,7 @@ class LDAPService(TDBWrapConfigService):
                 'nt_name': None,
                 'sid': None,
             }
-            self.middleware.call_sync('dscache.insert', self._config.namespace.upper(), 'USER', entry)
+            entries['USER'].append(entry)
             user_next_index += 1
 
         for g in grp_list:
@@ -1076,9 +1079,11 @@ class LDAPService(TDBWrapConfigService):
                 'nt_name': None,
                 'sid': None,
             }
-            self.middleware.call_sync('dscache.insert', self._config.namespace.upper(), 'GROUP', entry)
+            entries['GROUP'].append(entry)
             group_next_index += 1
 
+        write_cache_entries(self.middleware, job, self._config.namespace.upper(), entries, 20, 100)
+
     @private
     async def get_cache(self):
         users = await self.middleware.call('dscache.entries', self._config.namespace.upper(), 'USER')
@@ -271,7 +271,7 @@ class SharingNFSService(SharingService):
         namespace = "sharing.nfs"
         datastore = "sharing.nfs_share"
         datastore_prefix = "nfs_"
-        datastore_extend = "sharing.nfs.extend"
+        datastore_extend_batch = "sharing.nfs.extend_batch"
         cli_namespace = "sharing.nfs"
 
     ENTRY = Patch(
@@ -605,6 +605,10 @@ class SharingNFSService(SharingService):
                     # Found an export of the same path to the same 'hosts'. Report it.
                     break
 
+    @private
+    async def extend_batch(self, shares):
+        return [await self.extend(share) for share in shares]
+
     @private
     async def extend(self, data):
         data["networks"] = data.pop("network").split()
@@ -224,7 +224,7 @@ class PoolDatasetService(CRUDService):
         snapshots_count = extra.get('snapshots_count')
         return filter_list(
             self.__transform(self.middleware.call_sync(
-                'zfs.dataset.query', zfsfilters, {
+                'zfs.inventory.datasets', zfsfilters, {
                     'extra': {
                         'flat': extra.get('flat', True),
                         'retrieve_children': retrieve_children,
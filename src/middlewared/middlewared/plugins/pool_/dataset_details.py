@@ -1,16 +1,70 @@
+from collections import Counter, defaultdict
+import itertools
 import os
+import threading
+import time
 
 from middlewared.plugins.zfs_.utils import zvol_path_to_name
 from middlewared.service import Service, private
 from middlewared.schema import accepts, List, returns
 from middlewared.utils.osc.linux.mount import getmntinfo
 
+# Cached consumers are re-read after this many seconds in case they were changed without sending an event (i.e. by
+# writing to the database directly)
+DETAILS_CONSUMERS_MAX_AGE = 60
+# `query` events of the services whose entries `pool.dataset.details` reports
+DETAILS_CONSUMER_EVENTS = (
+    'sharing.nfs.query', 'sharing.smb.query', 'iscsi.target.query', 'iscsi.extent.query', 'iscsi.targetextent.query',
+    'replication.query', 'pool.snapshottask.query', 'cloudsync.query', 'rsynctask.query', 'vm.query',
+    'vm.device.query', 'chart.release.query',
+)
+
+
+class DatasetConsumers:
+    """
+    Consumers of datasets keyed by their path, the dataset their path is located on (`mount_source`) and the zvol
+    they use.
+    """
+
+    def __init__(self):
+        self.by_path = defaultdict(list)
+        self.by_mount_source = defaultdict(list)
+        self.by_zvol = defaultdict(list)
+        self.count = 0
+
+    def add(self, consumer, path=None, mount_info=None, zvol=None):
+        entry = (self.count, consumer)
+        self.count += 1
+        if path is not None:
+            self.by_path[path].append(entry)
+        if mount_source := (mount_info or {}).get('mount_source'):
+            self.by_mount_source[mount_source].append(entry)
+        if zvol is not None:
+            self.by_zvol[zvol].append(entry)
+
+    def get(self, ds):
+        """
+        Consumers of dataset `ds` in the order they were added.
+        """
+        found = dict(itertools.chain(
+            self.by_path.get(ds['mountpoint'], []),
+            self.by_mount_source.get(ds['id'], []),
+            self.by_zvol.get(ds['id'], []),
+        ))
+        return [found[i] for i in sorted(found)]
+
 
 class PoolDatasetService(Service):
 
     class Config:
         namespace = 'pool.dataset'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.consumers = None
+        self.consumers_generation = 0
+        self.consumers_lock = threading.Lock()
+
     @accepts()
     @returns(List(
         'dataset_details',
@@ -204,14 +258,15 @@ class PoolDatasetService(Service):
         datasets = self.middleware.call_sync('pool.dataset.query', [], options)
         mnt_info = getmntinfo()
         info = self.build_details(mnt_info)
+        mounts = {i['mountpoint']: i for i in mnt_info.values()}
         for dataset in datasets:
-            self.collapse_datasets(dataset, info, mnt_info)
+            self.collapse_datasets(dataset, info, mounts)
 
         return datasets
 
     @private
-    def normalize_dataset(self, dataset, info, mnt_info):
-        atime, case, readonly = self.get_mntinfo(dataset, mnt_info)
+    def normalize_dataset(self, dataset, info, mounts):
+        atime, case, readonly = self.get_mntinfo(dataset, mounts)
         dataset['locked'] = dataset['locked']
         dataset['atime'] = atime
         dataset['casesensitive'] = case
@@ -228,10 +283,10 @@ class PoolDatasetService(Service):
         dataset['rsync_tasks_count'] = self.get_rsync_tasks_count(dataset, info['rsync'])
 
     @private
-    def collapse_datasets(self, dataset, info, mnt_info):
-        self.normalize_dataset(dataset, info, mnt_info)
+    def collapse_datasets(self, dataset, info, mounts):
+        self.normalize_dataset(dataset, info, mounts)
         for child in dataset.get('children', []):
-            self.collapse_datasets(child, info, mnt_info)
+            self.collapse_datasets(child, info, mounts)
 
     @private
     def get_mount_info(self, path, mntinfo):
@@ -248,10 +303,10 @@ class PoolDatasetService(Service):
         return mount_info
 
     @private
-    def get_mntinfo(self, ds, mntinfo):
+    def get_mntinfo(self, ds, mounts):
         atime = case = True
         readonly = False
-        for devid, info in filter(lambda x: x[1]['mountpoint'] == ds['mountpoint'], mntinfo.items()):
+        if info := mounts.get(ds['mountpoint']):
             atime = not ('NOATIME' in info['mount_opts'])
             readonly = 'RO' in info['mount_opts']
             case = any((i for i in ('CASESENSITIVE', 'CASEMIXED') if i in info['super_opts']))
@@ -263,7 +318,27 @@ class PoolDatasetService(Service):
         return atime, case, readonly
 
     @private
-    def build_details(self, mntinfo):
+    def get_consumers(self):
+        """
+        Shares, tasks, VMs and apps that might be consuming datasets. They are cached until any of them changes.
+        """
+        with self.consumers_lock:
+            generation = self.consumers_generation
+            now = time.monotonic()
+            if (
+                self.consumers is None or self.consumers[0] != generation or
+                now - self.consumers[1] > DETAILS_CONSUMERS_MAX_AGE
+            ):
+                self.consumers = (generation, now, self.read_consumers())
+
+            return self.consumers[2]
+
+    @private
+    async def invalidate_consumers(self):
+        self.consumers_generation += 1
+
+    @private
+    def read_consumers(self):
         results = {
             'iscsi': [], 'nfs': [], 'smb': [],
             'repl': [], 'snap': [], 'cloud': [],
@@ -280,49 +355,28 @@ class PoolDatasetService(Service):
             2. make sure the target has `groups` entry since, without it, it's impossible
                 that it's being shared via iscsi
             """
-            results['iscsi'].append({
-                'extent': e[i['extent']],
-                'target': t[i['target']],
-                'mount_info': self.get_mount_info(e[i['extent']]['path'], mntinfo),
-            })
+            results['iscsi'].append({'extent': e[i['extent']], 'target': t[i['target']]})
 
         # nfs and smb
         for key in ('nfs', 'smb'):
-            for share in self.middleware.call_sync(f'sharing.{key}.query'):
-                share['mount_info'] = self.get_mount_info(share['path'], mntinfo)
-                results[key].append(share)
+            results[key] = self.middleware.call_sync(f'sharing.{key}.query')
 
         # replication
-        options = {'prefix': 'repl_'}
-        for task in self.middleware.call_sync('datastore.query', 'storage.replication', [], options):
-            # replication can only be configured on a dataset so getting mount info is unnecessary
-            results['repl'].append(task)
+        results['repl'] = self.middleware.call_sync('datastore.query', 'storage.replication', [], {'prefix': 'repl_'})
 
         # snapshots
-        for task in self.middleware.call_sync('datastore.query', 'storage.task', [], {'prefix': 'task_'}):
-            # snapshots can only be configured on a dataset so getting mount info is unnecessary
-            results['snap'].append(task)
+        results['snap'] = self.middleware.call_sync('datastore.query', 'storage.task', [], {'prefix': 'task_'})
 
         # cloud sync
-        for task in self.middleware.call_sync('datastore.query', 'tasks.cloudsync'):
-            task['mount_info'] = self.get_mount_info(task['path'], mntinfo)
-            results['cloud'].append(task)
+        results['cloud'] = self.middleware.call_sync('datastore.query', 'tasks.cloudsync')
 
         # rsync
-        for task in self.middleware.call_sync('rsynctask.query'):
-            task['mount_info'] = self.get_mount_info(task['path'], mntinfo)
-            results['rsync'].append(task)
+        results['rsync'] = self.middleware.call_sync('rsynctask.query')
 
         # vm
-        for vm in self.middleware.call_sync('datastore.query', 'vm.device', [['dtype', 'in', ['RAW', 'DISK']]]):
-            if vm['dtype'] == 'DISK':
-                # disk type is always a zvol
-                vm['zvol'] = zvol_path_to_name(vm['attributes']['path'])
-            else:
-                # raw type is always a file
-                vm['mount_info'] = self.get_mount_info(vm['attributes']['path'], mntinfo)
-
-            results['vm'].append(vm)
+        results['vm'] = self.middleware.call_sync(
+            'datastore.query', 'vm.device', [['dtype', 'in', ['RAW', 'DISK']]],
+        )
 
         # app
         for app_name, paths in self.middleware.call_sync('chart.release.get_consumed_host_paths').items():
@@ -332,51 +386,84 @@ class PoolDatasetService(Service):
                 lambda x: x.startswith('/mnt/') and 'ix-applications/' not in x,
                 paths
             ):
-                results['app'].append({
-                    'name': app_name,
-                    'path': path,
-                    'mount_info': self.get_mount_info(path, mntinfo),
-                })
+                results['app'].append({'name': app_name, 'path': path})
 
         return results
 
     @private
-    def get_nfs_shares(self, ds, nfsshares):
-        nfs_shares = []
-        for share in nfsshares:
-            if share['path'] == ds['mountpoint'] or share['mount_info'].get('mount_source') == ds['id']:
-                nfs_shares.append({'enabled': share['enabled'], 'path': share['path']})
+    def build_details(self, mntinfo):
+        """
+        Index dataset consumers by their path, the dataset their path is located on and the zvol they use.
+        """
+        consumers = self.get_consumers()
+        results = {key: DatasetConsumers() for key in ('iscsi', 'nfs', 'smb', 'cloud', 'rsync', 'vm', 'app')}
+
+        for share in consumers['iscsi']:
+            if share['extent']['type'] == 'DISK':
+                # we store extent information prefixed with `zvol/` (i.e. zvol/tank/zvol01).
+                results['iscsi'].add(share, zvol=share['extent']['path'].removeprefix('zvol/'))
+            elif share['extent']['type'] == 'FILE':
+                # this isn't common but possible, you can share a "file"
+                # via iscsi which means it's not a dataset but a file inside
+                # a dataset so we need to find the source dataset for the file
+                results['iscsi'].add(share, mount_info=self.get_mount_info(share['extent']['path'], mntinfo))
+
+        for key in ('nfs', 'smb'):
+            for share in consumers[key]:
+                results[key].add(share, path=share['path'], mount_info=self.get_mount_info(share['path'], mntinfo))
+
+        # we only care about replication tasks that are configured to push
+        results['repl'] = Counter(itertools.chain.from_iterable(
+            repl['source_datasets'] for repl in consumers['repl'] if repl['direction'] == 'PUSH'
+        ))
+        # snapshots can only be configured on a dataset so getting mount info is unnecessary
+        results['snap'] = Counter(task['dataset'] for task in consumers['snap'])
+
+        # we only care about cloud sync and rsync tasks that are configured to push
+        for key in ('cloud', 'rsync'):
+            for task in filter(lambda x: x['direction'] == 'PUSH', consumers[key]):
+                results[key].add(task, path=task['path'], mount_info=self.get_mount_info(task['path'], mntinfo))
+
+        for vm in consumers['vm']:
+            if vm['dtype'] == 'DISK':
+                # disk type is always a zvol
+                results['vm'].add(
+                    vm, path=vm['attributes']['path'], zvol=zvol_path_to_name(vm['attributes']['path']),
+                )
+            else:
+                # raw type is always a file
+                results['vm'].add(
+                    vm, path=vm['attributes']['path'],
+                    mount_info=self.get_mount_info(vm['attributes']['path'], mntinfo),
+                )
 
-        return nfs_shares
+        for app in consumers['app']:
+            results['app'].add(app, path=app['path'], mount_info=self.get_mount_info(app['path'], mntinfo))
+
+        return results
 
     @private
-    def get_smb_shares(self, ds, smbshares):
-        smb_shares = []
-        for share in smbshares:
-            if share['path'] == ds['mountpoint'] or share['mount_info'].get('mount_source') == ds['id']:
-                smb_shares.append({
-                    'enabled': share['enabled'],
-                    'path': share['path'],
-                    'share_name': share['name']
-                })
+    def get_nfs_shares(self, ds, nfsshares):
+        return [{'enabled': share['enabled'], 'path': share['path']} for share in nfsshares.get(ds)]
 
-        return smb_shares
+    @private
+    def get_smb_shares(self, ds, smbshares):
+        return [
+            {'enabled': share['enabled'], 'path': share['path'], 'share_name': share['name']}
+            for share in smbshares.get(ds)
+        ]
 
     @private
     def get_iscsi_shares(self, ds, iscsishares):
         iscsi_shares = []
-        for share in iscsishares:
-            if share['extent']['type'] == 'DISK' and share['extent']['path'].removeprefix('zvol/') == ds['id']:
-                # we store extent information prefixed with `zvol/` (i.e. zvol/tank/zvol01).
+        for share in iscsishares.get(ds):
+            if share['extent']['type'] == 'DISK':
                 iscsi_shares.append({
                     'enabled': share['extent']['enabled'],
                     'type': 'DISK',
                     'path': f'/dev/{share["extent"]["path"]}',
                 })
-            elif share['extent']['type'] == 'FILE' and share['mount_info'].get('mount_source') == ds['id']:
-                # this isn't common but possible, you can share a "file"
-                # via iscsi which means it's not a dataset but a file inside
-                # a dataset so we need to find the source dataset for the file
+            else:
                 iscsi_shares.append({
                     'enabled': share['extent']['enabled'],
                     'type': 'FILE',
@@ -387,56 +474,33 @@ class PoolDatasetService(Service):
 
     @private
     def get_repl_tasks_count(self, ds, repltasks):
-        count = 0
-        for repl in filter(lambda x: x['direction'] == 'PUSH', repltasks):
-            # we only care about replication tasks that are configured to push
-            for src_ds in filter(lambda x: x == ds['id'], repl['source_datasets']):
-                count += 1
-
-        return count
+        return repltasks[ds['id']]
 
     @private
     def get_snapshot_tasks_count(self, ds, snaptasks):
-        return len([i for i in snaptasks if i['dataset'] == ds['id']])
+        return snaptasks[ds['id']]
 
     @private
     def get_cloudsync_tasks_count(self, ds, cldtasks):
-        count = 0
-        for i in filter(lambda x: x['direction'] == 'PUSH', cldtasks):
-            # we only care about cloud sync tasks that are configured to push
-            if i['path'] == ds['mountpoint'] or i['mount_info'].get('mount_source') == ds['id']:
-                count += 1
-
-        return count
+        return len(cldtasks.get(ds))
 
     @private
     def get_rsync_tasks_count(self, ds, rsynctasks):
-        count = 0
-        for i in filter(lambda x: x['direction'] == 'PUSH', rsynctasks):
-            # we only care about rsync tasks that are configured to push
-            if i['path'] == ds['mountpoint'] or i['mount_info'].get('mount_source') == ds['id']:
-                count += 1
-
-        return count
+        return len(rsynctasks.get(ds))
 
     @private
     def get_vms(self, ds, _vms):
-        vms = []
-        for i in _vms:
-            if (
-                'zvol' in i and i['zvol'] == ds['id'] or
-                i['attributes']['path'] == ds['mountpoint'] or
-                i.get('mount_info', {}).get('mount_source') == ds['id']
-            ):
-                vms.append({'name': i['vm']['name'], 'path': i['attributes']['path']})
-
-        return vms
+        return [{'name': i['vm']['name'], 'path': i['attributes']['path']} for i in _vms.get(ds)]
 
     @private
     def get_apps(self, ds, _apps):
-        apps = []
-        for app in _apps:
-            if app['path'] == ds['mountpoint'] or app['mount_info'].get('mount_source') == ds['id']:
-                apps.append({'name': app['name'], 'path': app['path']})
+        return [{'name': app['name'], 'path': app['path']} for app in _apps.get(ds)]
+
+
+async def on_consumer_change(middleware, event_type, args):
+    await middleware.call('pool.dataset.invalidate_consumers')
+
 
-        return apps
+async def setup(middleware):
+    for event in DETAILS_CONSUMER_EVENTS:
+        middleware.event_subscribe(event, on_consumer_change)
@@ -1,44 +1,32 @@
+import re
+
+from .procfs import ProcFile
+
+ARCSTATS_RE = re.compile(rb'^(hits|misses|c_max|size) +\d+ +(\d+)$', re.M)
+
+
 class ZfsArcStats(object):
 
     def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
+        self.arcstats = ProcFile('/proc/spl/kstat/zfs/arcstats')
 
     def read(self):
-        hits = misses = total = 0
-        fhits = fmisses = fmax = fsize = False
-        data = {'arc_max_size': 0, 'arc_size': 0, 'cache_hit_ratio': 0.0}
-        with open('/proc/spl/kstat/zfs/arcstats') as f:
-            for lineno, line in enumerate(f):
-                if lineno < 2:
-                    # skip first 2 lines
-                    continue
-
-                try:
-                    name, _, value = line.strip().split()
-                except ValueError:
-                    # maybe file format has changed or is malformed?
-                    continue
-
-                if name == 'hits':
-                    hits = int(value)
-                    fhits = True
-                elif name == 'misses':
-                    misses = int(value)
-                    fmisses = True
-                elif name == 'c_max':
-                    data['arc_max_size'] = int(value)
-                    fmax = True
-                elif name == 'size':
-                    data['arc_size'] = int(value)
-                    fsize = True
-
-                if all((fhits, fmisses, fmax, fsize)):
-                    # no reason to iterate entire contents
-                    # if we've got the information we need
-                    break
+        length = self.arcstats.read()
+        stats = {m.group(1): int(m.group(2)) for m in ARCSTATS_RE.finditer(self.arcstats.buffer, 0, length)}
 
+        hits = stats.get(b'hits', 0)
+        misses = stats.get(b'misses', 0)
+        data = {
+            'arc_max_size': stats.get(b'c_max', 0),
+            'arc_size': stats.get(b'size', 0),
+            'cache_hit_ratio': 0.0,
+        }
         if total := (hits + misses):
             data['cache_hit_ratio'] = hits / total
 
         return data
+
+    def close(self):
+        self.arcstats.close()
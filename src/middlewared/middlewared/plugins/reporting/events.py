@@ -1,14 +1,8 @@
-import humanfriendly
-import psutil
-import time
-
 from middlewared.event import EventSource
 from middlewared.schema import Dict, Float, Int
 from middlewared.validators import Range
 
-from .arcstat import ZfsArcStats
-from .ifstat import IfStats
-from .iostat import DiskStats
+from .sampler import RealtimeSampler
 
 
 class RealtimeEventSource(EventSource):
@@ -16,7 +10,12 @@ class RealtimeEventSource(EventSource):
     """
     Retrieve real time statistics for CPU, network,
     virtual memory and zfs arc.
+
+    All subscribers share a single `RealtimeSampler` and are sent the difference between its samples taken their
+    `interval` apart.
     """
+    sampler = None
+
     ACCEPTS = Dict(
         Int('interval', default=2, validators=[Range(min=2)]),
     )
@@ -81,16 +80,8 @@ class RealtimeEventSource(EventSource):
             data['usage'] = 0
         return data
 
-    def get_memory_info(self, arc_size):
-        with open("/proc/meminfo") as f:
-            meminfo = {
-                s[0]: humanfriendly.parse_size(s[1], binary=True)
-                for s in [
-                    line.split(":", 1)
-                    for line in f.readlines()
-                ]
-            }
-
+    @staticmethod
+    def get_memory_info(meminfo, arc_size):
         classes = {}
         classes["page_tables"] = meminfo["PageTables"]
         classes["swap_cache"] = meminfo["SwapCached"]
@@ -120,90 +111,94 @@ class RealtimeEventSource(EventSource):
             "swap": swap,
         }
 
-    def run_sync(self):
-        interval = self.arg['interval']
-        cp_time_last = None
-        cp_times_last = None
-        last_iface_stats = {}
-        last_disk_stats = {}
-        internal_interfaces = tuple(self.middleware.call_sync('interface.internal_interfaces'))
+    @staticmethod
+    def get_interfaces(prev, sample):
+        elapsed = sample.time - prev.time
+        data = {}
+        for nic, (link_state, speed, rx_bytes, tx_bytes) in sample.interfaces.items():
+            if link_state == 'LINK_STATE_UP':
+                prev_rx_bytes, prev_tx_bytes = prev.interfaces.get(nic, (None, None, 0, 0))[2:]
+                rx_diff = rx_bytes - prev_rx_bytes
+                tx_diff = tx_bytes - prev_tx_bytes
+            else:
+                # nic could have been up and is now down so no reason to do calculation
+                rx_diff = tx_diff = 0
+
+            data[nic] = {
+                'link_state': link_state,
+                'speed': speed,
+                'received_bytes': rx_diff,
+                'sent_bytes': tx_diff,
+                'received_bytes_rate': rx_diff / elapsed,
+                'sent_bytes_rate': tx_diff / elapsed,
+            }
 
-        while not self._cancel_sync.is_set():
-            data = {}
+        return data
 
+    @staticmethod
+    def get_disks(prev, sample):
+        read_ops, read_bytes, write_ops, write_bytes, busy_time, total_disks = sample.disks
+        prev_read_ops, prev_read_bytes, prev_write_ops, prev_write_bytes, prev_busy_time = prev.disks[:5]
+        return {
+            'read_opts': read_ops - prev_read_ops,
+            'read_bytes': read_bytes - prev_read_bytes,
+            'write_ops': write_ops - prev_write_ops,
+            'write_bytes': write_bytes - prev_write_bytes,
+            'busy': (busy_time - prev_busy_time) / (sample.time - prev.time) / total_disks if total_disks else 0,
+        }
+
+    @classmethod
+    def get_data(cls, prev, sample):
+        """
+        Statistics between `prev` and `sample`. They are cached in `sample` for subscribers that were given the same
+        samples.
+        """
+        key = prev.time if prev else None
+        if (data := sample.views.get(key)) is not None:
+            return data
+
+        data = {
             # ZFS ARC Size (raw value is in Bytes)
-            data['zfs'] = ZfsArcStats().read()
-
-            # Virtual memory use
-            data['memory'] = self.get_memory_info(data['zfs']['arc_size'])
-            data['virtual_memory'] = psutil.virtual_memory()._asdict()
-
-            # this gathers the most recent metric recorded via netdata (for all charts)
-            # allmetrics = self.middleware.call_sync('netdata.get_all_metrics')
-
-            # memory info (including zfs arc)
-            # data.update(self.middleware.call_sync('reporting.memory.info', allmetrics))
-
-            # Get CPU usage %
-            data['cpu'] = {}
-            num_times = 10
-            with open('/proc/stat') as f:
-                stat = f.read()
-            cp_times = []
-            cp_time = []
-            for line in stat.split('\n'):
-                bits = line.split()
-                if bits[0].startswith('cpu'):
-                    line_ints = [int(i) for i in bits[1:]]
-                    # cpu has a sum of all cpus
-                    if bits[0] == 'cpu':
-                        cp_time = line_ints
-                    # cpuX is for each core
-                    else:
-                        cp_times += line_ints
-                else:
-                    break
-
-            if cp_time and cp_times and cp_times_last:
-                # Get the difference of times between the last check and the current one
-                # cp_time has a list with user, nice, system, interrupt and idle
-                cp_diff = list(map(lambda x: x[0] - x[1], zip(cp_times, cp_times_last)))
-                cp_nums = int(len(cp_times) / num_times)
-                for i in range(cp_nums):
-                    data['cpu'][i] = self.get_cpu_usages(cp_diff[i * num_times:i * num_times + num_times])
-
-                cp_diff = list(map(lambda x: x[0] - x[1], zip(cp_time, cp_time_last)))
-                data['cpu']['average'] = self.get_cpu_usages(cp_diff)
-
-            cp_time_last = cp_time
-            cp_times_last = cp_times
-
-            # CPU temperature
-            data['cpu']['temperature_celsius'] = self.middleware.call_sync('reporting.cpu_temperatures')
-            data['cpu']['temperature'] = {k: 2732 + int(v * 10) for k, v in data['cpu']['temperature_celsius'].items()}
-
-            # Interface IO Stats
-            with IfStats(interval, last_iface_stats, internal_interfaces) as ifstat:
-                if not last_iface_stats:
-                    # means this is the first time iface stats are being gathered so
-                    # get the results but don't set anything yet since we need to
-                    # calculate the difference between the iterations
-                    last_iface_stats, new = ifstat
-                else:
-                    last_iface_stats, data['interfaces'] = ifstat
-
-            # Disk IO Stats
-            if not last_disk_stats:
-                # means this is the first time disk stats are being gathered so
-                # get the results but don't set anything yet since we need to
-                # calculate the difference between the iterations
-                last_disk_stats, new = DiskStats(interval, last_disk_stats).read()
-            else:
-                last_disk_stats, data['disks'] = DiskStats(interval, last_disk_stats).read()
+            'zfs': sample.zfs,
+            'memory': cls.get_memory_info(sample.meminfo, sample.zfs['arc_size']),
+            'virtual_memory': sample.virtual_memory,
+            'cpu': {},
+        }
+
+        if prev:
+            # Get CPU usage %, counters of the `cpu` line (sum of all cpus) are followed by each core's
+            fields = sample.cpu_fields
+            cp_diff = [v - p for v, p in zip(sample.cpu, prev.cpu)]
+            for i in range(len(cp_diff) // fields - 1):
+                data['cpu'][i] = cls.get_cpu_usages(cp_diff[(i + 1) * fields:(i + 2) * fields])
+            data['cpu']['average'] = cls.get_cpu_usages(cp_diff[:fields])
+
+        data['cpu']['temperature_celsius'] = sample.temperatures
+        data['cpu']['temperature'] = {k: 2732 + int(v * 10) for k, v in sample.temperatures.items()}
+
+        if prev:
+            data['interfaces'] = cls.get_interfaces(prev, sample)
+            data['disks'] = cls.get_disks(prev, sample)
+
+        sample.views[key] = data
+        return data
+
+    def run_sync(self):
+        interval = self.arg['interval']
+        self.sampler.subscribe(interval)
+        try:
+            prev = None
+            while not self._cancel_sync.is_set():
+                # Samples are taken on a whole second grid, allow for the sampling period having changed since
+                if (sample := self.sampler.wait(prev.time + interval - 0.5 if prev else None, 1)) is None:
+                    continue
 
-            self.send_event('ADDED', fields=data)
-            time.sleep(interval)
+                self.send_event('ADDED', fields=self.get_data(prev, sample))
+                prev = sample
+        finally:
+            self.sampler.unsubscribe(interval)
 
 
 def setup(middleware):
+    RealtimeEventSource.sampler = RealtimeSampler(middleware)
     middleware.register_event_source('reporting.realtime', RealtimeEventSource)
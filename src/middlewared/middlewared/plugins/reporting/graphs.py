@@ -1,3 +1,4 @@
+import asyncio
 import errno
 import time
 import typing
@@ -9,6 +10,7 @@ from middlewared.validators import Range
 
 from .netdata import GRAPH_PLUGINS
 from .netdata.graph_base import GraphBase
+from .netdata.utils import NETDATA_MAX_CONCURRENCY
 from .utils import convert_unit
 
 
@@ -27,6 +29,21 @@ class ReportingService(Service):
     async def graph_names(self):
         return list(self.__graphs.keys())
 
+    async def __export(self, graphs, query_params, query):
+        """
+        Exports `(graph_plugin, identifier)` pairs concurrently, returning results in the same order.
+        """
+        semaphore = asyncio.Semaphore(NETDATA_MAX_CONCURRENCY)
+
+        async def export(graph_plugin, identifier):
+            async with semaphore:
+                return await graph_plugin.export(
+                    query_params, identifier, aggregate=query['aggregate'], points=query['points'],
+                    downsample_method=query['downsample'], encoding=query['encoding'],
+                )
+
+        return list(await asyncio.gather(*[export(graph_plugin, identifier) for graph_plugin, identifier in graphs]))
+
     def _set_page_attr(attr):
         attr.validators = [Range(min=1)]
         attr.default = 1
@@ -53,15 +70,12 @@ class ReportingService(Service):
             raise CallError(f'{name!r} is not a valid graph plugin.', errno.ENOENT)
 
         query_params = await self.middleware.call('reporting.translate_query_params', query)
-        results = []
-        # TODO: Optimize this so when retrieving stats for multiple plugins we do not get all charts
-        #  again and again
-        for identifier in (await graph_plugin.get_identifiers() or [None]):
-            # TODO: Handle 404 gracefully which can happen if no metrics have been collected
-            # so far for the identifier/chart in question
-            results.append(await graph_plugin.export(query_params, identifier, aggregate=query['aggregate']))
-
-        return results
+        # TODO: Handle 404 gracefully which can happen if no metrics have been collected
+        # so far for the identifier/chart in question
+        return await self.__export(
+            [(graph_plugin, identifier) for identifier in (await graph_plugin.get_identifiers() or [None])],
+            query_params, query,
+        )
 
     @filterable
     @filterable_returns(Dict(
@@ -75,7 +89,9 @@ class ReportingService(Service):
         """
         Get reporting netdata graphs.
         """
-        return filter_list([await i.as_dict() for i in self.__graphs.values()], filters, options)
+        return filter_list(
+            await asyncio.gather(*[i.as_dict() for i in self.__graphs.values()]), filters, options,
+        )
 
     @accepts(
         List('graphs', items=[
@@ -112,6 +128,8 @@ class ReportingService(Service):
 
         `aggregate` will return aggregate available data for each graph (e.g. min, max, mean).
 
+        `points`, `downsample` and `encoding` work the same way as in `reporting.get_data`.
+
         .. examples(websocket)::
 
           Get graph data of "nfsstat" from the last hour.
@@ -129,28 +147,29 @@ class ReportingService(Service):
 
         """
         query_params = await self.middleware.call('reporting.translate_query_params', query)
-        results = []
+        exports = []
         for i in graphs:
             try:
-                graph_plugin = self.__graphs[i['name']]
+                exports.append((self.__graphs[i['name']], i['identifier']))
             except KeyError:
                 raise CallError(f'Graph {i["name"]!r} not found.', errno.ENOENT)
-            results.append(await graph_plugin.export(query_params, i['identifier'], aggregate=query['aggregate']))
 
-        return results
+        return await self.__export(exports, query_params, query)
 
     @private
     @accepts(Ref('reporting_query'))
     async def netdata_get_all(self, query):
         query_params = await self.middleware.call('reporting.translate_query_params', query)
-        rv = []
-        for graph_plugin in self.__graphs.values():
-            idents = await graph_plugin.get_identifiers()
-            if idents is None:
-                idents = [None]
-            for ident in idents:
-                rv.append(await graph_plugin.export(query_params, ident, aggregate=query['aggregate']))
-        return rv
+        graph_plugins = list(self.__graphs.values())
+        identifiers = await asyncio.gather(*[graph_plugin.get_identifiers() for graph_plugin in graph_plugins])
+        return await self.__export(
+            [
+                (graph_plugin, ident)
+                for graph_plugin, idents in zip(graph_plugins, identifiers)
+                for ident in (idents if idents is not None else [None])
+            ],
+            query_params, query,
+        )
 
     @private
     def translate_query_params(self, query):
@@ -5,16 +5,11 @@ from psutil import net_if_stats, net_io_counters
 
 class IfStats(object):
 
-    def __init__(self, interval, prev_data, ignore_ifaces):
-        self.interval = interval
-        self.prev_data = prev_data
+    def __init__(self, ignore_ifaces):
         self.ignore = ignore_ifaces
         self.eth = Ethtool()
 
-    def __enter__(self):
-        return self.read()
-
-    def __exit__(self, _type, _value, _tb):
+    def close(self):
         self.eth.close()
         self.eth = None
 
@@ -42,48 +37,15 @@ class IfStats(object):
         return speed
 
     def read(self):
+        """
+        Returns `{nic: (link_state, speed, received_bytes, sent_bytes)}` with cumulative byte counters.
+        """
         ifs = net_if_stats()
         ioc = net_io_counters(pernic=True)
-        curr_data = dict()
-        new_data = dict()
+        data = dict()
         for nic, iodata in filter(lambda x: x[0] not in self.ignore and x[0] in ifs, ioc.items()):
-            curr_data[nic] = dict()
-            new_data[nic] = dict()
-
-            link_state = self.get_link_state(ifs[nic].isup)
-            curr_data[nic]['link_state'] = link_state
-            new_data[nic]['link_state'] = link_state
-
-            speed = self.get_link_speed(nic)
-            curr_data[nic]['speed'] = speed
-            new_data[nic]['speed'] = speed
-
-            if link_state == 'LINK_STATE_UP':
-                # diff between curr_data and self.prev_data
-                rx_bytes = iodata.bytes_recv
-                tx_bytes = iodata.bytes_sent
-
-                curr_data[nic]['received_bytes'] = rx_bytes
-                curr_data[nic]['sent_bytes'] = tx_bytes
-                curr_data[nic]['received_bytes_rate'] = rx_bytes / self.interval
-                curr_data[nic]['sent_bytes_rate'] = tx_bytes / self.interval
-
-                rx_diff = rx_bytes - self.prev_data.get(nic, {}).get('received_bytes', 0)
-                tx_diff = tx_bytes - self.prev_data.get(nic, {}).get('sent_bytes', 0)
-                new_data[nic]['received_bytes'] = rx_diff
-                new_data[nic]['sent_bytes'] = tx_diff
-                new_data[nic]['received_bytes_rate'] = rx_diff / self.interval
-                new_data[nic]['sent_bytes_rate'] = tx_diff / self.interval
-            else:
-                # nic could have been up and is now down so no reason to do calculation
-                new_data[nic]['received_bytes'] = 0
-                new_data[nic]['sent_bytes'] = 0
-                new_data[nic]['received_bytes_rate'] = 0.0
-                new_data[nic]['sent_bytes_rate'] = 0.0
-
-                curr_data[nic]['received_bytes'] = 0
-                curr_data[nic]['received_bytes_rate'] = 0.0
-                curr_data[nic]['sent_bytes'] = 0
-                curr_data[nic]['sent_bytes_rate'] = 0.0
+            data[nic] = (
+                self.get_link_state(ifs[nic].isup), self.get_link_speed(nic), iodata.bytes_recv, iodata.bytes_sent,
+            )
 
-        return curr_data, new_data
+        return data
@@ -4,11 +4,44 @@ import asyncio
 import contextlib
 
 from .exceptions import ApiException
-from .utils import NETDATA_URI, NETDATA_REQUEST_TIMEOUT
+from .utils import NETDATA_MAX_CONCURRENCY, NETDATA_URI, NETDATA_REQUEST_TIMEOUT
 
 
 class ClientMixin:
 
+    _loop = None
+    _session = None
+
+    @classmethod
+    def session(cls) -> aiohttp.ClientSession:
+        """
+        Long-lived session so that connections to netdata are kept alive between API calls.
+        """
+        loop = asyncio.get_running_loop()
+        if cls._session is None or cls._session.closed or cls._loop is not loop:
+            if cls._session is not None and not cls._session.closed and not cls._loop.is_closed():
+                # A session can only be closed from the event loop it was created in
+                asyncio.run_coroutine_threadsafe(cls._session.close(), cls._loop)
+
+            ClientMixin._loop = loop
+            ClientMixin._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=NETDATA_MAX_CONCURRENCY, keepalive_timeout=60),
+            )
+            cls.on_new_session()
+        return cls._session
+
+    @classmethod
+    def on_new_session(cls):
+        """
+        Called when a new session is created, i.e. the first time API is used from an event loop.
+        """
+
+    @classmethod
+    async def close_session(cls):
+        if ClientMixin._session is not None:
+            await ClientMixin._session.close()
+            ClientMixin._session = None
+
     @classmethod
     @contextlib.asynccontextmanager
     async def request(
@@ -19,12 +52,11 @@ class ClientMixin:
         resource = resource.removeprefix('/')
         uri = f'{NETDATA_URI}/{version}/{resource}'
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-                async with session.get(uri) as resp:
-                    if resp.status != 200:
-                        raise ApiException(f'Received {resp.status!r} response code from {uri!r}')
+            async with cls.session().get(uri, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                if resp.status != 200:
+                    raise ApiException(f'Received {resp.status!r} response code from {uri!r}')
 
-                    yield resp
+                yield resp
         except (asyncio.TimeoutError, aiohttp.ClientResponseError) as e:
             raise ApiException(f'Failed {resource!r} call: {e!r}')
 
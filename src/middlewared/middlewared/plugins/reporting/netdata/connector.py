@@ -1,12 +1,23 @@
+import asyncio
 import errno
+import time
 
 from .client import ClientMixin
 from .exceptions import ApiException
-from .utils import get_query_parameters
+from .utils import get_query_parameters, NETDATA_CHARTS_CACHE_TTL
 
 
 class Netdata(ClientMixin):
 
+    _charts = None
+    _charts_expire = 0
+    _charts_lock = None
+
+    @classmethod
+    def on_new_session(cls):
+        cls._charts = None
+        cls._charts_lock = asyncio.Lock()
+
     @classmethod
     async def get_info(cls):
         """Get information about the running netdata instance"""
@@ -20,8 +31,16 @@ class Netdata(ClientMixin):
     async def get_charts(cls):
         """
         Get available charts/metrics. Each chart/metric points out information about 1 type of data.
+
+        The result is cached for `NETDATA_CHARTS_CACHE_TTL` seconds and must not be modified.
         """
-        return (await cls.api_call('charts', version='v1'))['charts']
+        cls.session()
+        async with cls._charts_lock:
+            if cls._charts is None or cls._charts_expire <= time.monotonic():
+                cls._charts = (await cls.api_call('charts', version='v1'))['charts']
+                cls._charts_expire = time.monotonic() + NETDATA_CHARTS_CACHE_TTL
+
+            return cls._charts
 
     @classmethod
     async def get_chart_details(cls, metric):
@@ -38,3 +57,9 @@ class Netdata(ClientMixin):
             f'data?chart={chart}{get_query_parameters(query_params)}',
             version='v1',
         )
+
+    @classmethod
+    async def get_chart_metrics_payload(cls, chart, query_params=None):
+        """Get metrics for `chart` as the raw JSON payload"""
+        async with cls.request(f'data?chart={chart}{get_query_parameters(query_params)}', version='v1') as resp:
+            return await resp.read()
@@ -1,7 +1,7 @@
 import re
-import statistics
 import typing
 
+from ..series import aggregate as aggregate_series, downsample, encode, load_json_series
 from .connector import Netdata
 
 
@@ -35,12 +35,6 @@ class GraphBase(metaclass=GraphMeta):
     title = None
     vertical_label = None
 
-    AGG_MAP = {
-        'min': min,
-        'mean': statistics.mean,
-        'max': max,
-    }
-
     def __init__(self, middleware):
         self.middleware = middleware
 
@@ -68,6 +62,9 @@ class GraphBase(metaclass=GraphMeta):
         return None
 
     def normalize_metrics(self, metrics) -> dict:
+        """
+        `metrics['data']` is a 2D float array (with NaN for gaps) whose first column is the timestamp.
+        """
         metrics['legend'] = metrics.pop('labels')
         return metrics
 
@@ -80,15 +77,29 @@ class GraphBase(metaclass=GraphMeta):
             'options': 'flip|nonzero'
         }
 
-    async def export(self, query_params: dict, identifier: typing.Optional[str] = None, aggregate: bool = True):
+    async def export(
+        self, query_params: dict, identifier: typing.Optional[str] = None, aggregate: bool = True,
+        points: typing.Optional[int] = None, downsample_method: str = 'MAX', encoding: str = 'ROWS',
+    ):
+        payload = await Netdata.get_chart_metrics_payload(
+            self.get_chart_name(identifier), self.query_parameters() | query_params,
+        )
+        return await self.middleware.run_in_thread(
+            self.export_payload, payload, query_params, identifier, aggregate, points, downsample_method, encoding,
+        )
+
+    def export_payload(
+        self, payload: bytes, query_params: dict, identifier: typing.Optional[str], aggregate: bool,
+        points: typing.Optional[int], downsample_method: str, encoding: str,
+    ) -> dict:
+        metrics, values = load_json_series(payload, 'labels')
+        metrics = self.normalize_metrics({**metrics, 'data': values})
+        values = metrics.pop('data')
         data = {
             'name': self.name,
             'identifier': identifier or self.name,
-            **(await self.middleware.run_in_thread(
-                self.normalize_metrics, await Netdata.get_chart_metrics(
-                    self.get_chart_name(identifier), self.query_parameters() | query_params,
-                ),
-            )),
+            'data': None,
+            **metrics,
             'start': query_params['after'],
             'end': query_params['before'],
             'aggregations': dict(),
@@ -99,18 +110,14 @@ class GraphBase(metaclass=GraphMeta):
             #  as well i believe for UI team
         }
         if self.aggregations and aggregate:
-            # Transpose the data matrix and remove null values
-            transposed = [list(
-                filter(None.__ne__, i)
-            ) for index, i in enumerate(zip(*data['data'])) if index != 0]
             # First column is always timestamp so we remove that
-            for agg in self.aggregations:
-                if agg in self.AGG_MAP:
-                    data['aggregations'][agg] = {
-                        k: (self.AGG_MAP[agg](i) if i else None)
-                        for k, i in zip(data['legend'][1:], transposed)
-                    }
-                else:
-                    raise RuntimeError(f'Aggregation {agg!r} is invalid.')
+            data['aggregations'] = {
+                agg: dict(zip(data['legend'][1:], result))
+                for agg, result in aggregate_series(values[:, 1:], self.aggregations).items()
+            }
+
+        if points:
+            values = downsample(values, points, downsample_method)
 
+        data['data'] = encode(values, encoding, int_columns=1)
         return data
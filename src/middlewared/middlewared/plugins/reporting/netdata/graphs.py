@@ -1,5 +1,7 @@
 import typing
 
+import numpy as np
+
 from .graph_base import GraphBase
 
 
@@ -41,18 +43,15 @@ class DISKPlugin(GraphBase):
     def normalize_metrics(self, metrics) -> dict:
         metrics = super().normalize_metrics(metrics)
         if len(metrics['legend']) < 3:
-            for to_add in {'time', 'reads', 'writes'} - set(metrics['legend']):
-                metrics['legend'].append(to_add)
+            metrics['legend'].extend(
+                to_add for to_add in ('time', 'reads', 'writes') if to_add not in metrics['legend']
+            )
+
+        if (missing := 3 - metrics['data'].shape[1]) > 0:
+            metrics['data'] = np.hstack((metrics['data'], np.zeros((metrics['data'].shape[0], missing))))
 
         write_column = metrics['legend'].index('writes')
-        for index, data in enumerate(metrics['data']):
-            data_length = len(data)
-            if data_length < 3:
-                for i in range(3 - data_length):
-                    data.append(0)
-
-            if data[write_column] is not None:
-                metrics['data'][index][write_column] = abs(data[write_column])
+        metrics['data'][:, write_column] = np.abs(metrics['data'][:, write_column])
         return metrics
 
 
@@ -71,18 +70,15 @@ class InterfacePlugin(GraphBase):
     def normalize_metrics(self, metrics) -> dict:
         metrics = super().normalize_metrics(metrics)
         if len(metrics['legend']) < 3:
-            for to_add in {'time', 'received', 'sent'} - set(metrics['legend']):
-                metrics['legend'].append(to_add)
+            metrics['legend'].extend(
+                to_add for to_add in ('time', 'received', 'sent') if to_add not in metrics['legend']
+            )
+
+        if (missing := 3 - metrics['data'].shape[1]) > 0:
+            metrics['data'] = np.hstack((metrics['data'], np.zeros((metrics['data'].shape[0], missing))))
 
         sent_column = metrics['legend'].index('sent')
-        for index, data in enumerate(metrics['data']):
-            data_length = len(data)
-            if data_length < 3:
-                for i in range(3 - data_length):
-                    data.append(0)
-
-            if data[sent_column] is not None:
-                metrics['data'][index][sent_column] = abs(data[sent_column])
+        metrics['data'][:, sent_column] = np.abs(metrics['data'][:, sent_column])
         return metrics
 
 
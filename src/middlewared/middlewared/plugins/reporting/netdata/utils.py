@@ -5,6 +5,8 @@ from urllib.parse import urlencode
 
 NETDATA_PORT = 22200  # FIXME: Change this to 6999
 NETDATA_REQUEST_TIMEOUT = 30  # seconds
+NETDATA_CHARTS_CACHE_TTL = 30  # seconds
+NETDATA_MAX_CONCURRENCY = 8
 NETDATA_URI = f'http://127.0.0.1:{NETDATA_PORT}/api'
 
 
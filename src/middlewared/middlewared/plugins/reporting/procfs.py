@@ -0,0 +1,42 @@
+import os
+
+
+class ProcFile:
+    """
+    Keeps a procfs file open and re-reads it into the same buffer.
+
+    procfs regenerates the file contents when it is read again from the start, so sampling it does not have to
+    reopen the file and allocate a new string for every read.
+    """
+
+    def __init__(self, path, size=16384):
+        self.path = path
+        self.fd = None
+        self.buffer = bytearray(size)
+
+    def read(self):
+        """
+        Reads the whole file into `self.buffer` and returns its length. The buffer grows if the file does not fit.
+        """
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+        else:
+            os.lseek(self.fd, 0, os.SEEK_SET)
+
+        length = 0
+        while True:
+            if length == len(self.buffer):
+                self.buffer.extend(bytes(len(self.buffer)))
+
+            with memoryview(self.buffer) as view:
+                read = os.readv(self.fd, [view[length:]])
+
+            if read == 0:
+                return length
+
+            length += read
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -38,6 +38,9 @@ class NetdataService(Service):
     async def get_all_metrics(self):
         return await Netdata.get_all_metrics()
 
+    async def terminate(self):
+        await Netdata.close_session()
+
     def get_disk_space(self):
         # TODO: How should we expose graph_age for netdata right now wrt reporting.updte?
         #  Current discussion with Caleb was to store per second data for 7 days
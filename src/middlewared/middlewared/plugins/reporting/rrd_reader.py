@@ -0,0 +1,528 @@
+import math
+import mmap
+import os
+import re
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+RRDCACHED_SOCKET = '/var/run/rrdcached.sock'
+# Default `--maxrows` of `rrdtool xport`
+XPORT_MAX_ROWS = 400
+# `rrdtool xport` refuses to export data older than that
+XPORT_MIN_START = 3600 * 24 * 365 * 10
+
+# Native layout (x86_64) of the RRD file structures, see `rrd_format.h`
+RRD_COOKIE = b'RRD\0'
+RRD_FLOAT_COOKIE = 8.642135E130
+STAT_HEAD = struct.Struct('=4s5s7xdQQQ80x')
+DS_DEF = struct.Struct('=20s20s80x')
+RRA_DEF = struct.Struct('=20s4xQQ80x')
+LIVE_HEAD = struct.Struct('=qq')
+LIVE_HEAD_V1 = struct.Struct('=q')
+PDP_PREP_SIZE = 112
+CDP_PREP_SIZE = 80
+RRA_PTR = struct.Struct('=Q')
+
+RE_UNESCAPED_COLON = re.compile(r'(?<!\\):')
+RE_TIME = re.compile(r'^(now|start|end|s|e|\d{9,})?((?:[+-]\d+[a-z]+)*)$')
+RE_TIME_OFFSET = re.compile(r'([+-])(\d+)([a-z]+)')
+RE_VNAME = re.compile(r'^[A-Za-z0-9_-]{1,255}$')
+TIME_UNITS = {
+    's': 1, 'sec': 1, 'secs': 1, 'second': 1, 'seconds': 1,
+    'min': 60, 'mins': 60, 'minute': 60, 'minutes': 60,
+    'h': 3600, 'hour': 3600, 'hours': 3600,
+    'd': 86400, 'day': 86400, 'days': 86400,
+    'w': 604800, 'week': 604800, 'weeks': 604800,
+}
+TIME_MONTH_UNITS = {
+    'mon': 1, 'mons': 1, 'month': 1, 'months': 1,
+    'y': 12, 'year': 12, 'years': 12,
+}
+
+
+class RRDUnsupportedError(Exception):
+    """
+    Raised for `rrdtool xport` arguments or RRD files this reader does not handle, `rrdtool` should be used instead.
+    """
+
+
+class RRDFlushError(RuntimeError):
+    """
+    Raised when pending updates could not be flushed through `rrdcached`. The files can still be read, they only lack
+    the most recent updates.
+    """
+
+
+def nan_unless_comparable(a, b, result):
+    return np.where(np.isnan(a) | np.isnan(b), np.nan, result.astype(np.float64))
+
+
+# RPN operators with the `rrdtool` semantics for unknown (NaN) values, see `rrd_rpn.c`
+RPN_OPERATORS = {
+    '+': (2, np.add),
+    '-': (2, np.subtract),
+    '*': (2, np.multiply),
+    '/': (2, np.divide),
+    '%': (2, np.fmod),
+    'LT': (2, lambda a, b: nan_unless_comparable(a, b, a < b)),
+    'LE': (2, lambda a, b: nan_unless_comparable(a, b, a <= b)),
+    'GT': (2, lambda a, b: nan_unless_comparable(a, b, a > b)),
+    'GE': (2, lambda a, b: nan_unless_comparable(a, b, a >= b)),
+    'EQ': (2, lambda a, b: nan_unless_comparable(a, b, a == b)),
+    'NE': (2, lambda a, b: nan_unless_comparable(a, b, a != b)),
+    'MIN': (2, np.minimum),
+    'MAX': (2, np.maximum),
+    'UN': (1, lambda a: np.isnan(a).astype(np.float64)),
+    # Unknown is true
+    'IF': (3, lambda a, b, c: np.where(a != 0, b, c)),
+}
+
+
+class RRDHeader:
+    __slots__ = ('version', 'pdp_step', 'ds', 'rras', 'last_up', 'data_offset')
+
+    def __init__(self, version, pdp_step, ds, rras, last_up, data_offset):
+        self.version = version
+        self.pdp_step = pdp_step
+        # Data source names in file order
+        self.ds = ds
+        # `(cf, row_cnt, pdp_cnt, cur_row, offset)` of every RRA
+        self.rras = rras
+        self.last_up = last_up
+        self.data_offset = data_offset
+
+
+def parse_header(buffer, path):
+    """
+    Parses the header of an RRD file mapped in `buffer`.
+    """
+    try:
+        cookie, version, float_cookie, ds_cnt, rra_cnt, pdp_step = STAT_HEAD.unpack_from(buffer, 0)
+    except struct.error:
+        raise RuntimeError(f'{path!r} is not an RRD file')
+
+    if cookie != RRD_COOKIE:
+        raise RuntimeError(f'{path!r} is not an RRD file')
+
+    version = version.rstrip(b'\0').decode(errors='replace')
+    if version not in ('0001', '0003', '0004') or float_cookie != RRD_FLOAT_COOKIE:
+        raise RRDUnsupportedError(f'{path!r} has unsupported format version {version!r} or byte order')
+
+    offset = STAT_HEAD.size
+    ds = []
+    for i in range(ds_cnt):
+        ds.append(DS_DEF.unpack_from(buffer, offset)[0].rstrip(b'\0').decode())
+        offset += DS_DEF.size
+
+    rra_defs = []
+    for i in range(rra_cnt):
+        cf, row_cnt, pdp_cnt = RRA_DEF.unpack_from(buffer, offset)
+        rra_defs.append((cf.rstrip(b'\0').decode(), row_cnt, pdp_cnt))
+        offset += RRA_DEF.size
+
+    live_head = LIVE_HEAD_V1 if version == '0001' else LIVE_HEAD
+    last_up = live_head.unpack_from(buffer, offset)[0]
+    offset += live_head.size + PDP_PREP_SIZE * ds_cnt + CDP_PREP_SIZE * ds_cnt * rra_cnt
+
+    cur_rows = []
+    for i in range(rra_cnt):
+        cur_rows.append(RRA_PTR.unpack_from(buffer, offset)[0])
+        offset += RRA_PTR.size
+
+    rras = []
+    data_offset = offset
+    for (cf, row_cnt, pdp_cnt), cur_row in zip(rra_defs, cur_rows):
+        rras.append((cf, row_cnt, pdp_cnt, cur_row, offset))
+        offset += row_cnt * ds_cnt * 8
+
+    if offset > len(buffer):
+        raise RuntimeError(f'{path!r} is truncated')
+
+    return RRDHeader(version, pdp_step, ds, rras, last_up, data_offset)
+
+
+def parse_time(spec, now, start=None, end=None):
+    """
+    Parses the subset of `rrdtool` AT-style time specifications used by the reporting plugin: seconds since epoch,
+    `now`, `start` or `end` followed by any number of offsets (e.g. `end-1d`, `now-2w+1h`).
+
+    `start` and `end` are the already parsed references. Units are applied the way `rrdtool` does (`m` is months up
+    to 5 and minutes from 6 on, months and years are calendar arithmetic in local time).
+    """
+    if not (match := RE_TIME.match(spec)):
+        raise RRDUnsupportedError(f'Unsupported time specification {spec!r}')
+
+    base, offsets = match.groups()
+    if base in (None, 'now'):
+        base = now
+    elif base in ('start', 's', 'end', 'e'):
+        base = start if base[0] == 's' else end
+        if base is None:
+            raise RRDUnsupportedError(f'Unsupported time specification {spec!r}')
+    else:
+        base = int(base)
+
+    seconds = 0
+    months = 0
+    for sign, number, unit in RE_TIME_OFFSET.findall(offsets):
+        number = int(number) * (-1 if sign == '-' else 1)
+        if unit == 'm':
+            unit = 'mon' if abs(number) < 6 else 'min'
+
+        if unit in TIME_UNITS:
+            seconds += number * TIME_UNITS[unit]
+        elif unit in TIME_MONTH_UNITS:
+            months += number * TIME_MONTH_UNITS[unit]
+        else:
+            raise RRDUnsupportedError(f'Unsupported time specification {spec!r}')
+
+    if months:
+        tm = time.localtime(base)
+        year, month = divmod(tm.tm_year * 12 + tm.tm_mon - 1 + months, 12)
+        base = int(time.mktime((year, month + 1, tm.tm_mday, tm.tm_hour, tm.tm_min, tm.tm_sec, 0, 0, -1)))
+
+    return base + seconds
+
+
+def parse_start_end(starttime, endtime, now=None):
+    """
+    Parses `--start` and `--end` of `rrdtool xport`, either can be relative to the other.
+    """
+    now = int(time.time()) if now is None else now
+    start_relative = RE_TIME.match(starttime) and starttime.startswith(('end', 'e'))
+    end_relative = RE_TIME.match(endtime) and endtime.startswith(('start', 's'))
+    if start_relative and end_relative:
+        raise RuntimeError('the start and end times cannot be specified relative to each other')
+
+    if start_relative:
+        end = parse_time(endtime, now)
+        start = parse_time(starttime, now, end=end)
+    else:
+        start = parse_time(starttime, now)
+        end = parse_time(endtime, now, start=start)
+
+    if start < XPORT_MIN_START:
+        raise RuntimeError('the first entry to fetch should be after 1980')
+    if end < start:
+        raise RuntimeError(f'start ({start}) should be less than end ({end})')
+
+    return start, end
+
+
+def split_spec(spec):
+    return [i.replace('\\:', ':') for i in RE_UNESCAPED_COLON.split(spec)]
+
+
+def parse_xport_args(args):
+    """
+    Parses `DEF`, `CDEF` and `XPORT` arguments of `rrdtool xport` into a list of `(kind, vname, value)` in the order
+    they are given.
+    """
+    specs = []
+    for arg in args:
+        kind, _, rest = arg.partition(':')
+        if kind == 'DEF':
+            fields = split_spec(rest)
+            if len(fields) != 3 or '=' not in fields[0]:
+                raise RRDUnsupportedError(f'Unsupported definition {arg!r}')
+            vname, path = fields[0].split('=', 1)
+            specs.append(('DEF', vname, (path, fields[1], fields[2])))
+        elif kind == 'CDEF':
+            vname, _, rpn = rest.partition('=')
+            specs.append(('CDEF', vname, rpn.split(',')))
+        elif kind == 'XPORT':
+            fields = split_spec(rest)
+            if len(fields) > 2:
+                raise RRDUnsupportedError(f'Unsupported definition {arg!r}')
+            specs.append(('XPORT', fields[0], fields[1] if len(fields) == 2 else ''))
+        else:
+            raise RRDUnsupportedError(f'Unsupported definition {arg!r}')
+
+        if kind != 'XPORT' and not RE_VNAME.match(specs[-1][1]):
+            raise RuntimeError(f'Invalid variable name {specs[-1][1]!r}')
+
+    return specs
+
+
+def rpn_calc(tokens, variables, rows):
+    """
+    Evaluates the `rrdtool` RPN expression `tokens` over whole columns of `variables`.
+    """
+    stack = []
+    with np.errstate(all='ignore'):
+        for token in tokens:
+            if token in variables:
+                stack.append(variables[token])
+            elif token in RPN_OPERATORS:
+                argc, operator = RPN_OPERATORS[token]
+                if len(stack) < argc:
+                    raise RuntimeError(f'RPN stack underflow at {token!r}')
+                args = stack[-argc:]
+                del stack[-argc:]
+                stack.append(operator(*args))
+            else:
+                try:
+                    stack.append(np.full(rows, float(token)))
+                except ValueError:
+                    raise RRDUnsupportedError(f'Unsupported RPN token {token!r}')
+
+    if len(stack) != 1:
+        raise RuntimeError(f'RPN final stack size != 1: {",".join(tokens)!r}')
+
+    return np.broadcast_to(stack[0], (rows,))
+
+
+def reduce_data(cf, data, start, end, cur_step, step):
+    """
+    Consolidates `data` fetched every `cur_step` seconds in `(start, end]` to `step` (a multiple of it), see
+    `reduce_data` in `rrd_graph.c`. Returns the reduced data with its start and end.
+    """
+    factor = step // cur_step
+    start_offset = start % step
+    end_offset = end % step
+    head = tail = 0
+    if start_offset:
+        start -= start_offset
+        head = factor - start_offset // cur_step
+    if end_offset:
+        end += step - end_offset
+        tail = end_offset // cur_step
+
+    body = data[head:data.shape[0] - tail]
+    body = body.reshape(-1, factor)
+    with np.errstate(all='ignore'):
+        if cf == 'MIN':
+            body = np.fmin.reduce(body, axis=1)
+        elif cf == 'MAX':
+            body = np.fmax.reduce(body, axis=1)
+        elif cf == 'LAST':
+            # Last known value of the group
+            valid = ~np.isnan(body)
+            last = factor - 1 - np.argmax(valid[:, ::-1], axis=1)
+            body = np.where(valid.any(axis=1), body[np.arange(body.shape[0]), last], np.nan)
+        else:
+            valid = (~np.isnan(body)).sum(axis=1)
+            body = np.where(valid, np.nansum(body, axis=1) / valid, np.nan)
+
+    return np.concatenate(([np.nan] if start_offset else [], body, [np.nan] if end_offset else [])), start, end
+
+
+class RRDReader:
+    """
+    Exports data from RRD files the way `rrdtool xport --daemon` does without spawning `rrdtool` for every graph.
+
+    Pending updates are flushed through the `rrdcached` socket, files are memory mapped and parsed headers are
+    cached until the file changes.
+    """
+
+    def __init__(self, daemon=RRDCACHED_SOCKET):
+        self.daemon = daemon
+        self.headers = {}
+        self.lock = threading.Lock()
+
+    def flush(self, paths):
+        """
+        Flushes pending updates of all the RRD files in `paths` with a single `rrdcached` request.
+        """
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return
+
+        commands = ''.join(
+            'FLUSH ' + path.replace('\\', '\\\\').replace(' ', '\\ ') + '\n' for path in paths
+        )
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(self.daemon)
+                # Commands are answered in order, send them all at once
+                sock.sendall(commands.encode())
+                with sock.makefile('r', encoding='utf-8', errors='replace') as f:
+                    for path in paths:
+                        self._read_response(f)
+        except OSError as e:
+            raise RRDFlushError(f'Unable to flush RRD files through {self.daemon!r}: {e}')
+
+    def _read_response(self, f):
+        # Status line followed by as many lines as the status if it is positive. Files that do not exist are not an
+        # error here, they will fail to be read.
+        line = f.readline()
+        if not line:
+            raise RRDFlushError('rrdcached closed the connection')
+
+        status, _, message = line.rstrip('\n').partition(' ')
+        try:
+            status = int(status)
+        except ValueError:
+            raise RRDFlushError(f'Unexpected rrdcached response: {line!r}')
+
+        if status < 0:
+            if not message.startswith('No such file'):
+                raise RRDFlushError(f'rrdcached error: {message}')
+        else:
+            for i in range(status):
+                f.readline()
+
+    def header(self, path):
+        """
+        Returns the parsed header of the RRD file at `path` (reusing the cached one if the file did not change).
+        """
+        with open(path, 'rb') as f:
+            return self._header(f, path)
+
+    def _header(self, f, path, buffer=None):
+        st = os.fstat(f.fileno())
+        key = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            cached = self.headers.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        if buffer is None:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                header = parse_header(buffer, path)
+        else:
+            header = parse_header(buffer, path)
+
+        with self.lock:
+            self.headers[path] = (key, header)
+        return header
+
+    def fetch(self, path, ds, cf, start, end, step):
+        """
+        Fetches the `ds` column of the `cf` archive best matching `step` for `(start, end]`, see `rrd_fetch_fn` in
+        `rrd_fetch.c`. Returns the data with the actual start, end and step.
+        """
+        try:
+            f = open(path, 'rb')
+        except OSError as e:
+            raise RuntimeError(f'opening {path!r}: {e.strerror}')
+
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            header = self._header(f, path, buffer)
+            try:
+                ds_index = header.ds.index(ds)
+            except ValueError:
+                raise RuntimeError(f"No DS called '{ds}' in '{path}'")
+
+            rra = self._choose_rra(header, cf, start, end, step)
+            if rra is None:
+                raise RuntimeError(f"the RRD does not contain an RRA matching the chosen CF ('{cf}')")
+
+            row_cnt, pdp_cnt, cur_row, offset = rra
+            step = header.pdp_step * pdp_cnt
+            start -= start % step
+            if end % step:
+                end += step - end % step
+
+            rra_end = header.last_up - header.last_up % step
+            rra_start = rra_end - step * (row_cnt - 1)
+            # Row `i` of the archive (oldest first) holds the value for `start + (i - start_offset + 1) * step`
+            start_offset = (start + step - rra_start) // step
+            end_offset = (rra_end - end) // step
+            rows = np.arange(start_offset, row_cnt - end_offset)
+            valid = (rows >= 0) & (rows < row_cnt)
+
+            data = np.full(rows.shape[0], np.nan)
+            column = np.ndarray(
+                (row_cnt,), dtype=np.float64, buffer=buffer, offset=offset + ds_index * 8,
+                strides=(len(header.ds) * 8,),
+            )
+            data[valid] = column[(cur_row + 1 + rows[valid]) % row_cnt]
+            del column
+
+        return data, start, end, step
+
+    def _choose_rra(self, header, cf, start, end, step):
+        # The archive with the closest step that covers the whole period or, if there is none, the one covering the
+        # largest part of it
+        full_match = None
+        best_full = None
+        partial_match = None
+        best_partial = None
+        for rra_cf, row_cnt, pdp_cnt, cur_row, offset in header.rras:
+            if rra_cf != cf:
+                continue
+
+            rra_step = header.pdp_step * pdp_cnt
+            cal_end = header.last_up - header.last_up % rra_step
+            cal_start = cal_end - rra_step * row_cnt
+            full = cal_start <= start
+            tmp_step_diff = abs(step - rra_step)
+            if full:
+                if best_full is None or tmp_step_diff < best_full:
+                    best_full = tmp_step_diff
+                    full_match = (row_cnt, pdp_cnt, cur_row, offset)
+            else:
+                tmp_match = end - cal_start
+                if (
+                    best_partial is None or tmp_match > best_partial[0] or
+                    (tmp_match == best_partial[0] and tmp_step_diff < best_partial[1])
+                ):
+                    best_partial = (tmp_match, tmp_step_diff)
+                    partial_match = (row_cnt, pdp_cnt, cur_row, offset)
+
+        return full_match or partial_match
+
+    def xport(self, args, starttime, endtime, flush=True):
+        """
+        Equivalent of `rrdtool xport --daemon <daemon> --start <starttime> --end <endtime> <args>`.
+
+        Returns the `meta` attribute of its JSON output (`start`, `end`, `step` and `legend`) and the exported data as
+        a 2D float array. Raises `RRDUnsupportedError` if `args` use features this reader does not implement.
+        """
+        specs = parse_xport_args(args)
+        start, end = parse_start_end(starttime, endtime)
+        if flush:
+            self.flush([value[0] for kind, vname, value in specs if kind == 'DEF'])
+
+        min_step = max(0, (end - start) // XPORT_MAX_ROWS)
+        variables = {}
+        common = None
+        columns = []
+        legend = []
+        for kind, vname, value in specs:
+            if kind == 'DEF':
+                path, ds, cf = value
+                data, data_start, data_end, data_step = self.fetch(path, ds, cf, start, end, min_step)
+                if data_step < min_step:
+                    data, data_start, data_end = reduce_data(
+                        cf, data, data_start, data_end, data_step, math.ceil(min_step / data_step) * data_step,
+                    )
+                    data_step = math.ceil(min_step / data_step) * data_step
+
+                if common is None:
+                    common = (data_start, data_end, data_step)
+                elif common != (data_start, data_end, data_step):
+                    # `rrdtool` would combine them at their least common step
+                    raise RRDUnsupportedError('Definitions with different steps')
+
+                variables[vname] = data
+            elif kind == 'CDEF':
+                if common is None:
+                    raise RRDUnsupportedError('CDEF without DEF')
+                variables[vname] = rpn_calc(value, variables, variables[next(iter(variables))].shape[0])
+            else:
+                try:
+                    columns.append(variables[vname])
+                except KeyError:
+                    raise RuntimeError(f"Unknown variable '{vname}'")
+                legend.append(value)
+
+        if common is None or not columns:
+            raise RuntimeError("can't make an xport without contents")
+
+        data_start, data_end, step = common
+        xport_start = start - start % step
+        xport_end = end - end % step + step
+        rows = (xport_end - xport_start) // step
+        values = np.full((rows, len(columns)), np.nan)
+        # The last row of the export can be past the fetched data
+        available = min(rows, (data_end - data_start) // step)
+        for i, column in enumerate(columns):
+            values[:available, i] = column[:available]
+
+        return {'start': xport_start + step, 'end': xport_end, 'step': step, 'legend': legend}, values
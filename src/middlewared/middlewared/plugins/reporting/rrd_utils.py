@@ -1,17 +1,19 @@
 from dataclasses import dataclass
 import os
-import json
 import re
-import statistics
 import subprocess
 import textwrap
 import time
 from typing import Optional
 
 import humanfriendly
+import numpy as np
 
 from middlewared.service_exception import CallError, ErrnoMixin
 
+from .rrd_reader import RRDFlushError, RRDUnsupportedError
+from .series import aggregate as aggregate_series, downsample, encode, load_json_series
+
 
 RRD_BASE_DIR_PATH = '/var/db/collectd/rrd'
 RRD_BASE_PATH = os.path.join(RRD_BASE_DIR_PATH, 'localhost')
@@ -63,12 +65,6 @@ class RRDBase(object, metaclass=RRDMeta):
     stacked = False
     stacked_show_total = False
 
-    AGG_MAP = {
-        'min': min,
-        'mean': statistics.mean,
-        'max': max,
-    }
-
     def __init__(self, middleware):
         self.middleware = middleware
 
@@ -203,7 +199,35 @@ class RRDBase(object, metaclass=RRDMeta):
 
         return args
 
-    def export(self, identifier, starttime, endtime, aggregate=True):
+    def check_last_update(self, rrd_file, last_update):
+        now = time.time()
+        if last_update > now + 1800:  # Tolerance for small system time adjustments
+            raise CallError(
+                f"RRD file {os.path.relpath(rrd_file, self._base_path)} has update time in the future. "
+                f"Data collection will be paused for {humanfriendly.format_timespan(last_update - now)}.",
+                ErrnoMixin.EINVALIDRRDTIMESTAMP,
+            )
+
+    def _export_native(self, identifier, starttime, endtime, reader, flush):
+        rrd_files = self.get_rrd_files(identifier)
+        if flush:
+            try:
+                reader.flush(rrd_files)
+            except RRDFlushError as e:
+                # Only the most recent updates are missing from the files
+                self.middleware.logger.warning('Failed to flush %r RRD files: %s', self.name, e)
+
+        for rrd_file in rrd_files:
+            try:
+                header = reader.header(rrd_file)
+            except OSError:
+                continue
+
+            self.check_last_update(rrd_file, header.last_up)
+
+        return reader.xport(self.get_defs(identifier), starttime, endtime, flush=False)
+
+    def _export_rrdtool(self, identifier, starttime, endtime):
         for rrd_file in self.get_rrd_files(identifier):
             cp = subprocess.run([
                 'rrdtool',
@@ -213,14 +237,7 @@ class RRDBase(object, metaclass=RRDMeta):
             ], capture_output=True, encoding='utf-8')
 
             if m := RE_LAST_UPDATE.search(cp.stdout):
-                last_update = int(m.group(1))
-                now = time.time()
-                if last_update > now + 1800:  # Tolerance for small system time adjustments
-                    raise CallError(
-                        f"RRD file {os.path.relpath(rrd_file, self._base_path)} has update time in the future. "
-                        f"Data collection will be paused for {humanfriendly.format_timespan(last_update - now)}.",
-                        ErrnoMixin.EINVALIDRRDTIMESTAMP,
-                    )
+                self.check_last_update(rrd_file, int(m.group(1)))
 
         args = [
             'rrdtool',
@@ -235,25 +252,47 @@ class RRDBase(object, metaclass=RRDMeta):
         if cp.returncode != 0:
             raise RuntimeError(f'Failed to export RRD data: {cp.stderr.decode()}')
 
-        data = json.loads(cp.stdout)
+        meta, values = load_json_series(cp.stdout, 'meta.legend')
+        return meta['meta'], values
+
+    def export(
+        self, identifier, starttime, endtime, aggregate=True, points=None, downsample_method='MAX', encoding='ROWS',
+        reader=None, flush=True,
+    ):
+        """
+        Exports graph data using `reader` (an `RRDReader`) if it is given, falling back to `rrdtool xport` for
+        what it does not support. `flush` can be disabled if the caller already flushed the RRD files.
+        """
+        meta = None
+        if reader is not None:
+            try:
+                meta, values = self._export_native(identifier, starttime, endtime, reader, flush)
+            except RRDUnsupportedError as e:
+                self.middleware.logger.debug('Exporting %r using rrdtool: %s', self.name, e)
+
+        if meta is None:
+            meta, values = self._export_rrdtool(identifier, starttime, endtime)
+
         data = dict(
             name=self.name,
             identifier=identifier,
-            data=data['data'],
-            **data['meta'],
+            data=None,
+            **meta,
             aggregations=dict(),
         )
 
         if self.aggregations and aggregate:
-            # Transpose the data matrix and remove null values
-            transposed = [list(filter(None.__ne__, i)) for i in zip(*data['data'])]
-            for agg in self.aggregations:
-                if agg in self.AGG_MAP:
-                    data['aggregations'][agg] = [
-                        (self.AGG_MAP[agg](i) if i else None)
-                        for i in transposed
-                    ]
-                else:
-                    raise RuntimeError(f'Aggregation {agg!r} is invalid.')
+            data['aggregations'] = aggregate_series(values, self.aggregations)
+
+        if points and values.shape[0] > points:
+            # Rows are `step` seconds apart starting at `start`
+            timestamps = meta['start'] + meta['step'] * np.arange(values.shape[0], dtype=np.float64)
+            values = downsample(np.column_stack((timestamps, values)), points, downsample_method)
+            if downsample_method == 'MAX':
+                data['step'] = int(values[1, 0] - values[0, 0]) if values.shape[0] > 1 else meta['step']
+            else:
+                data['timestamps'] = values[:, 0].astype(np.int64).tolist()
+            values = values[:, 1:]
 
+        data['data'] = encode(values, encoding)
         return data
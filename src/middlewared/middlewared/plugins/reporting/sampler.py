@@ -0,0 +1,171 @@
+import array
+import collections
+import math
+import re
+import threading
+import time
+
+import psutil
+
+from .arcstat import ZfsArcStats
+from .ifstat import IfStats
+from .iostat import DiskStats
+from .procfs import ProcFile
+
+MEMINFO_RE = re.compile(
+    rb'^(MemTotal|MemFree|Buffers|Cached|SwapCached|Active|Inactive|SwapTotal|SwapFree|Mapped|Slab|PageTables|'
+    rb'Committed_AS|VmallocUsed): +(\d+) kB$',
+    re.M,
+)
+NOT_CPU_RE = re.compile(rb'^(?!cpu)', re.M)
+SAMPLES = 64
+
+
+class Sample:
+    __slots__ = ('time', 'cpu', 'cpu_fields', 'meminfo', 'zfs', 'virtual_memory', 'temperatures', 'interfaces',
+                 'disks', 'views')
+
+    def __init__(self, time):
+        self.time = time
+        self.views = {}
+
+
+def parse_cpu(procfile):
+    """
+    Parses the `cpu` and `cpuX` lines of `/proc/stat` into a single array of counters and returns it with the number
+    of counters per line. The first line holds the totals.
+    """
+    length = procfile.read()
+    end = NOT_CPU_RE.search(procfile.buffer, 1, length).start()
+    lines = procfile.buffer.count(b'\n', 0, end)
+    counters = procfile.buffer[:end].split()
+    fields = len(counters) // lines
+    # Drop the `cpu` and `cpuX` names
+    del counters[::fields]
+    return array.array('Q', map(int, counters)), fields - 1
+
+
+def parse_meminfo(procfile):
+    length = procfile.read()
+    return {m.group(1).decode(): int(m.group(2)) * 1024 for m in MEMINFO_RE.finditer(procfile.buffer, 0, length)}
+
+
+class RealtimeSampler:
+    """
+    Samples the system counters shown by `reporting.realtime` for all its subscribers.
+
+    The sampling period is the greatest common divisor of the subscribed intervals, so every subscriber can be given
+    samples exactly its interval apart. The last `SAMPLES` samples are kept in a ring buffer.
+    """
+
+    def __init__(self, middleware):
+        self.middleware = middleware
+        self.intervals = collections.Counter()
+        self.period = None
+        self.samples = collections.deque(maxlen=SAMPLES)
+        self.condition = threading.Condition()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def subscribe(self, interval):
+        with self.condition:
+            self.intervals[interval] += 1
+            self.period = math.gcd(*self.intervals)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='reporting.realtime', daemon=True)
+                self.thread.start()
+            self.wakeup.set()
+
+    def unsubscribe(self, interval):
+        with self.condition:
+            self.intervals[interval] -= 1
+            if self.intervals[interval] == 0:
+                del self.intervals[interval]
+            self.period = math.gcd(*self.intervals) if self.intervals else None
+            self.wakeup.set()
+
+    def wait(self, after, timeout):
+        """
+        Returns the oldest sample taken at or after the monotonic time `after` (or the latest sample if `after` is
+        `None`), waiting up to `timeout` seconds for it to be taken.
+        """
+        def find():
+            if not self.samples:
+                return None
+            if after is None:
+                return self.samples[-1]
+
+            found = None
+            for sample in reversed(self.samples):
+                if sample.time < after:
+                    break
+                found = sample
+            return found
+
+        with self.condition:
+            return self.condition.wait_for(find, timeout)
+
+    def run(self):
+        procfiles = []
+        try:
+            procfiles.append(stat := ProcFile('/proc/stat'))
+            procfiles.append(meminfo := ProcFile('/proc/meminfo'))
+            procfiles.append(arcstats := ZfsArcStats())
+            procfiles.append(diskstats := DiskStats())
+            procfiles.append(ifstats := IfStats(tuple(self.middleware.call_sync('interface.internal_interfaces'))))
+
+            last_time = None
+            while True:
+                with self.condition:
+                    if not self.intervals:
+                        self.thread = None
+                        self.samples.clear()
+                        return
+
+                    period = self.period
+                    self.wakeup.clear()
+
+                now = time.monotonic()
+                if last_time is None:
+                    next_time = now
+                else:
+                    next_time = last_time + period
+                    if now < next_time:
+                        # Also woken up when subscriptions change so that a shorter period is applied right away
+                        self.wakeup.wait(next_time - now)
+                        continue
+
+                    # Skip the samples that were missed if sampling took longer than the period
+                    next_time += (now - next_time) // period * period
+
+                try:
+                    sample = self.sample(stat, meminfo, arcstats, diskstats, ifstats)
+                except Exception:
+                    self.middleware.logger.error('Failed to sample realtime statistics', exc_info=True)
+                else:
+                    with self.condition:
+                        self.samples.append(sample)
+                        self.condition.notify_all()
+
+                last_time = next_time
+        finally:
+            with self.condition:
+                if self.thread is threading.current_thread():
+                    self.thread = None
+                    self.samples.clear()
+
+            for procfile in procfiles:
+                procfile.close()
+
+    def sample(self, stat, meminfo, arcstats, diskstats, ifstats):
+        # Rates are calculated using the time the counters were actually read at rather than the scheduled one, so
+        # the counters are read first and right after it
+        sample = Sample(time.monotonic())
+        sample.cpu, sample.cpu_fields = parse_cpu(stat)
+        sample.interfaces = ifstats.read()
+        sample.disks = diskstats.read()
+        sample.meminfo = parse_meminfo(meminfo)
+        sample.zfs = arcstats.read()
+        sample.virtual_memory = psutil.virtual_memory()._asdict()
+        sample.temperatures = self.middleware.call_sync('reporting.cpu_temperatures')
+        return sample
@@ -0,0 +1,156 @@
+import json
+import warnings
+
+import numpy as np
+
+# Characters of a JSON array of numeric arrays that are replaced with separators so it can be parsed as a flat list
+# of numbers
+JSON_ARRAY_SEPARATORS = bytes.maketrans(b'[],', b'   ')
+
+
+def load_json_series(payload: bytes, columns_key: str, data_key: str = 'data') -> tuple[dict, np.ndarray]:
+    """
+    Parses a JSON `payload` with a `data_key` matrix of numbers (and `null` for gaps) without building nested lists
+    of it.
+
+    Returns the other attributes and the matrix as a 2D float array with NaN for gaps. The number of columns is the
+    length of the `columns_key` attribute (it can be a dotted path, e.g. `meta.legend`).
+    """
+    def get_columns(meta):
+        columns = meta
+        for key in columns_key.split('.'):
+            columns = columns[key]
+        return len(columns)
+
+    try:
+        # The matrix is expected to be the last attribute, everything else is parsed as usual
+        start = payload.index(b'[', payload.index(f'"{data_key}"'.encode()))
+        end = payload.rindex(b']') + 1
+        meta = json.loads(payload[:start] + b'[]' + payload[end:])
+        columns = get_columns(meta)
+        with warnings.catch_warnings():
+            # Raised if not all of the matrix could be parsed as numbers
+            warnings.simplefilter('error', DeprecationWarning)
+            values = np.fromstring(
+                payload[start:end].translate(JSON_ARRAY_SEPARATORS).replace(b'null', b'nan'), sep=' ',
+            )
+        if columns == 0 or values.size % columns:
+            raise ValueError('Unexpected number of values')
+        values = values.reshape(-1, columns)
+    except (KeyError, ValueError, DeprecationWarning):
+        meta = json.loads(payload)
+        values = rows_to_array(meta[data_key], get_columns(meta))
+
+    meta.pop(data_key)
+    return meta, values
+
+
+def rows_to_array(rows: list, columns: int) -> np.ndarray:
+    """
+    Converts a list of rows (with `None` for gaps) to a 2D float array with NaN for gaps.
+    """
+    return np.array(rows, dtype=np.float64).reshape(len(rows), columns)
+
+
+def aggregate(values: np.ndarray, aggregations: tuple) -> dict:
+    """
+    Column-wise `aggregations` (`min`, `mean`, `max`) of `values` ignoring gaps. Columns without any values are
+    aggregated to `None`.
+    """
+    functions = {'min': np.nanmin, 'mean': np.nanmean, 'max': np.nanmax}
+    result = {}
+    for agg in aggregations:
+        try:
+            function = functions[agg]
+        except KeyError:
+            raise RuntimeError(f'Aggregation {agg!r} is invalid.')
+
+        with warnings.catch_warnings():
+            # All-NaN columns
+            warnings.simplefilter('ignore', RuntimeWarning)
+            result[agg] = to_list(function(values, axis=0)) if values.shape[0] else [None] * values.shape[1]
+
+    return result
+
+
+def downsample_max(values: np.ndarray, points: int) -> np.ndarray:
+    """
+    Splits rows of `values` in at most `points` buckets of the same number of consecutive rows and keeps the first
+    column (the timestamp) of the first row and the maximum of the other columns of every bucket.
+    """
+    if values.shape[0] <= points:
+        return values
+
+    edges = np.arange(0, values.shape[0], -(-values.shape[0] // points))
+    result = np.fmax.reduceat(values, edges, axis=0)
+    result[:, 0] = values[edges, 0]
+    return result
+
+
+def downsample_lttb(values: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling of rows of `values` to `points` rows. The first column is the x axis
+    (the timestamp), the other columns are series sharing it; the row that forms the largest triangles summed over
+    all series is kept from every bucket. Gaps do not contribute to the triangle areas: the average of the next
+    bucket skips them, a series with a gap in the previously kept row is measured against the average of the next
+    bucket instead and rows that are gaps in all series are only kept from buckets that have nothing else.
+    """
+    length = values.shape[0]
+    if points < 3 or length <= points:
+        return values
+
+    x = values[:, 0]
+    y = values[:, 1:]
+    gaps = np.isnan(y).all(axis=1)
+    edges = np.linspace(1, length - 1, points - 1).astype(np.intp)
+    selected = np.empty(points, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = length - 1
+    with warnings.catch_warnings():
+        # All-NaN columns of the next bucket
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for i in range(points - 2):
+            start, end = edges[i], edges[i + 1]
+            next_end = edges[i + 2] if i + 2 < points - 1 else length
+            next_x = x[end:next_end].mean()
+            next_y = np.nanmean(y[end:next_end], axis=0)
+            prev = selected[i]
+            prev_y = np.where(np.isnan(y[prev]), next_y, y[prev])
+            areas = np.nansum(np.abs(
+                (x[prev] - next_x) * (y[start:end] - prev_y) - (x[prev] - x[start:end, None]) * (next_y - prev_y)
+            ), axis=1)
+            areas[gaps[start:end]] = -1
+            selected[i + 1] = start + np.argmax(areas)
+
+    return values[selected]
+
+
+def downsample(values: np.ndarray, points: int, method: str) -> np.ndarray:
+    return {'LTTB': downsample_lttb, 'MAX': downsample_max}[method](values, points)
+
+
+def to_list(values: np.ndarray) -> list:
+    """
+    Converts an array of floats to (nested) lists with `None` for NaN.
+    """
+    result = values.astype(object)
+    result[np.isnan(values)] = None
+    return result.tolist()
+
+
+def encode(values: np.ndarray, encoding: str, int_columns: int = 0) -> list:
+    """
+    Encodes `values` as a list of rows (`ROWS`) or a list of columns (`COLUMNS`). The first `int_columns` columns
+    (i.e. timestamps) are encoded as integers.
+    """
+    if encoding == 'COLUMNS':
+        return [
+            values[:, i].astype(np.int64).tolist() if i < int_columns else to_list(values[:, i])
+            for i in range(values.shape[1])
+        ]
+
+    if int_columns:
+        rows = to_list(values[:, int_columns:])
+        return [[*ints, *row] for ints, row in zip(values[:, :int_columns].astype(np.int64).tolist(), rows)]
+
+    return to_list(values)
@@ -8,6 +8,7 @@ from middlewared.service import CallError, ConfigService, filterable, filterable
 from middlewared.utils import filter_list, run
 from middlewared.validators import Range
 
+from .rrd_reader import RRDFlushError, RRDReader
 from .rrd_utils import RRD_PLUGINS
 
 
@@ -39,6 +40,7 @@ class ReportingService(ConfigService):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.__rrds = {}
+        self.__rrd_reader = RRDReader()
         for name, klass in RRD_PLUGINS.items():
             self.__rrds[name] = klass(self.middleware)
 
@@ -162,6 +164,27 @@ class ReportingService(ConfigService):
             i.asdict() for i in self.__rrds.values() if i.has_data()
         ], filters, options)
 
+    def __export_options(self, query):
+        return {
+            'aggregate': query['aggregate'],
+            'points': query['points'],
+            'downsample_method': query['downsample'],
+            'encoding': query['encoding'],
+            'reader': self.__rrd_reader,
+            'flush': False,
+        }
+
+    def __export(self, exports, query):
+        # Pending updates of all the graphs are flushed with a single rrdcached request
+        starttime, endtime = self.__rquery_to_start_end(query)
+        try:
+            self.__rrd_reader.flush([path for rrd, ident in exports for path in rrd.get_rrd_files(ident)])
+        except RRDFlushError as e:
+            # Only the most recent updates are missing from the files
+            self.logger.warning('Failed to flush RRD files: %s', e)
+
+        return [rrd.export(ident, starttime, endtime, **self.__export_options(query)) for rrd, ident in exports]
+
     def __rquery_to_start_end(self, query):
         unit = query.get('unit')
         if unit:
@@ -205,6 +228,9 @@ class ReportingService(ConfigService):
             Str('start', empty=False),
             Str('end', empty=False),
             Bool('aggregate', default=True),
+            Int('points', default=None, null=True, validators=[Range(min=3)]),
+            Str('downsample', enum=['MAX', 'LTTB'], default='MAX'),
+            Str('encoding', enum=['ROWS', 'COLUMNS'], default='ROWS'),
             register=True,
         )
     )
@@ -232,6 +258,14 @@ class ReportingService(ConfigService):
 
         `aggregate` will return aggregate available data for each graph (e.g. min, max, mean).
 
+        `points` limits the number of data points returned for each graph. `downsample` selects how the data is
+        reduced: `MAX` keeps the maximum of each group of consecutive points (and adjusts `step`), `LTTB` keeps the
+        points that best preserve the shape of the graph (Largest-Triangle-Three-Buckets) and returns their
+        `timestamps`. Aggregations are always computed from all the data points.
+
+        `encoding` `COLUMNS` returns `data` as a list of columns (one for each `legend` entry) instead of a list of
+        rows.
+
         .. examples(websocket)::
 
           Get graph data of "nfsstat" from the last hour.
@@ -248,27 +282,23 @@ class ReportingService(ConfigService):
             }
 
         """
-        starttime, endtime = self.__rquery_to_start_end(query)
-        rv = []
+        exports = []
         for i in graphs:
             try:
                 rrd = self.__rrds[i['name']]
             except KeyError:
                 raise CallError(f'Graph {i["name"]!r} not found.', errno.ENOENT)
-            rv.append(
-                rrd.export(i['identifier'], starttime, endtime, aggregate=query['aggregate'])
-            )
-        return rv
+            exports.append((rrd, i['identifier']))
+        return self.__export(exports, query)
 
     @private
     @accepts(Ref('reporting_query'))
     def get_all(self, query):
-        starttime, endtime = self.__rquery_to_start_end(query)
-        rv = []
+        exports = []
         for rrd in self.__rrds.values():
             idents = rrd.get_identifiers()
             if idents is None:
                 idents = [None]
             for ident in idents:
-                rv.append(rrd.export(ident, starttime, endtime, aggregate=query['aggregate']))
-        return rv
+                exports.append((rrd, ident))
+        return self.__export(exports, query)
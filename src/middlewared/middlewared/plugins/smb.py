@@ -931,7 +931,7 @@ class SharingSMBService(SharingService):
         namespace = 'sharing.smb'
         datastore = 'sharing.cifs_share'
         datastore_prefix = 'cifs_'
-        datastore_extend = 'sharing.smb.extend'
+        datastore_extend_batch = 'sharing.smb.extend_batch'
         cli_namespace = 'sharing.smb'
 
     LP_CTX = param.LoadParm(SMBPath.STUBCONF.platform())
@@ -1713,6 +1713,10 @@ class SharingSMBService(SharingService):
 
         return data
 
+    @private
+    async def extend_batch(self, shares):
+        return [await self.extend(share) for share in shares]
+
     @private
     async def extend(self, data):
         data['hostsallow'] = data['hostsallow'].split()
@@ -92,12 +92,10 @@ class ZFSDatasetService(CRUDService):
                 datasets = list(datasets)
 
             if snapshots_count:
-                prefetch = not (len(kwargs.get('datasets', [])) == 1)
                 get_snapshot_count_cached(
                     self.middleware,
                     zfs,
                     datasets,
-                    prefetch,
                     True,
                     pop_snapshots_changed
                 )
@@ -153,6 +151,7 @@ class ZFSDatasetService(CRUDService):
             self.logger.error('Failed to create dataset', exc_info=True)
             raise CallError(f'Failed to create dataset: {e}')
         else:
+            self.middleware.call_sync('zfs.inventory.invalidate', data['name'])
             return data
 
     @accepts(
@@ -183,6 +182,9 @@ class ZFSDatasetService(CRUDService):
             raise CallError(f'Failed to update dataset: {e}')
         else:
             return data
+        finally:
+            # Inherited properties of the descendants change too
+            self.middleware.call_sync('zfs.inventory.invalidate', id, True)
 
     @accepts(
         Str('id'),
@@ -214,12 +216,17 @@ class ZFSDatasetService(CRUDService):
         except subprocess.CalledProcessError as e:
             if recv_run.returncode == 0 and e.stderr.strip().endswith('dataset does not exist'):
                 # This operation might have deleted this dataset if it was created by `zfs recv` operation
+                self.middleware.call_sync('zfs.inventory.discard', id)
+                self.middleware.call_sync('zfs.snapshot_count.forget', id, True)
                 return
             error = e.stderr.strip()
             errno_ = errno.EFAULT
             if 'Device busy' in error or 'dataset is busy' in error:
                 errno_ = errno.EBUSY
             raise CallError(f'Failed to delete dataset: {error}', errno_)
+
+        self.middleware.call_sync('zfs.inventory.discard', id)
+        self.middleware.call_sync('zfs.snapshot_count.forget', id, True)
         return True
 
     def destroy_snapshots(self, name, snapshot_spec):
@@ -229,6 +236,9 @@ class ZFSDatasetService(CRUDService):
                 return dataset.delete_snapshots(snapshot_spec)
         except libzfs.ZFSException as e:
             raise CallError(str(e))
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', name, snapshot_spec.get('recursive', False))
+            self.middleware.call_sync('zfs.snapshot_count.forget', name, snapshot_spec.get('recursive', False))
 
     def update_zfs_object_props(self, properties, zfs_object):
         verrors = ValidationErrors()
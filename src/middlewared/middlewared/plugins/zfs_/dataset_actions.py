@@ -63,6 +63,8 @@ class ZFSDatasetService(Service):
         except libzfs.ZFSException as e:
             self.logger.error('Failed to mount dataset', exc_info=True)
             raise CallError(f'Failed to mount dataset: {e}')
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', name, options['recursive'])
 
     @accepts(Str('name'), Dict('options', Bool('force', default=False)))
     def umount(self, name, options):
@@ -73,6 +75,8 @@ class ZFSDatasetService(Service):
         except libzfs.ZFSException as e:
             self.logger.error('Failed to umount dataset', exc_info=True)
             raise CallError(f'Failed to umount dataset: {e}')
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', name, True)
 
     @accepts(
         Str('dataset'),
@@ -90,6 +94,10 @@ class ZFSDatasetService(Service):
         except libzfs.ZFSException as e:
             self.logger.error('Failed to rename dataset', exc_info=True)
             raise CallError(f'Failed to rename dataset: {e}')
+        else:
+            self.middleware.call_sync('zfs.inventory.discard', name)
+            self.middleware.call_sync('zfs.inventory.invalidate', options['new_name'], True)
+            self.middleware.call_sync('zfs.snapshot_count.forget', name, True)
 
     def promote(self, name):
         try:
@@ -99,6 +107,10 @@ class ZFSDatasetService(Service):
         except libzfs.ZFSException as e:
             self.logger.error('Failed to promote dataset', exc_info=True)
             raise CallError(f'Failed to promote dataset: {e}')
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', name, True)
+            # Snapshots are moved from the origin dataset
+            self.middleware.call_sync('zfs.snapshot_count.forget', name.split('/')[0], True)
 
     def inherit(self, name, prop, recursive=False):
         try:
@@ -121,3 +133,5 @@ class ZFSDatasetService(Service):
             # SHARENFSFAILED. We give special return in this case
             # so that caller can set this property to "off"
             raise CallError(err, errno.EPROTONOSUPPORT)
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', name, True)
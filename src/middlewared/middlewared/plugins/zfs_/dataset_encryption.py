@@ -124,6 +124,8 @@ class ZFSDatasetService(Service):
         else:
             if mount_ds:
                 self.middleware.call_sync('zfs.dataset.mount', id, {'recursive': recursive})
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', id, recursive)
 
     @accepts(
         Str('id'),
@@ -171,6 +173,8 @@ class ZFSDatasetService(Service):
         except libzfs.ZFSException as e:
             self.logger.error(f'Failed to unload key for {id}', exc_info=True)
             raise CallError(f'Failed to unload key for {id}: {e}')
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', id, options['recursive'])
 
     @accepts(
         Str('id'),
@@ -195,6 +199,9 @@ class ZFSDatasetService(Service):
         except libzfs.ZFSException as e:
             self.logger.error(f'Failed to change key for {id}', exc_info=True)
             raise CallError(f'Failed to change key for {id}: {e}')
+        finally:
+            # Encryption root and key status of the child datasets can change too
+            self.middleware.call_sync('zfs.inventory.invalidate', id, True)
 
     @accepts(
         Str('id'),
@@ -210,6 +217,8 @@ class ZFSDatasetService(Service):
                 ds.change_key(load_key=options['load_key'], inherit=True)
         except libzfs.ZFSException as e:
             raise CallError(f'Failed to change encryption root for {id}: {e}')
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', id, True)
 
     @accepts(Str('name'), List('params', private=True))
     @job()
@@ -31,7 +31,7 @@ class ZFSDatasetService(Service):
         }
         return [
             {k: v for k, v in i['properties'].items() if k in options['extra']['properties']}
-            for i in self.middleware.call_sync('zfs.dataset.query', [], options)
+            for i in self.middleware.call_sync('zfs.inventory.datasets', [], options)
         ]
 
     # quota_type in ('USER', 'GROUP', 'DATASET', 'PROJECT')
@@ -0,0 +1,392 @@
+import asyncio
+import copy
+import time
+
+from middlewared.schema import accepts, Bool, Dict, Str
+from middlewared.service import filterable, private, Service
+from middlewared.utils import filter_getattrs, filter_list
+
+# Cached datasets and snapshots are re-read when they are older than this many seconds (unless the caller specifies
+# `query-options.extra.max_age`) as space accounting properties change without any ZFS event being sent
+INVENTORY_MAX_AGE = 30
+# `zfs.dataset.query` extra options that the inventory does not cache the data for
+DATASET_UNCACHED_EXTRA = ('snapshots', 'snapshots_count', 'snapshots_recursive')
+SNAPSHOT_UNCACHED_EXTRA = ('holds', 'min_txg', 'max_txg', 'properties', 'retention')
+
+
+def dataset_sort_key(name):
+    # The order in which ZFS traverses the dataset tree
+    return name.split('/')
+
+
+def is_descendant(name, parent):
+    return name == parent or name.startswith(f'{parent}/')
+
+
+class DatasetInventory:
+    """
+    Datasets (without `children`) keyed by their name together with the tree order and the children of every dataset.
+
+    It is never modified once built so that queries can use it while a newer one is being read.
+    """
+
+    def __init__(self, datasets, refreshed, tree=None):
+        self.datasets = datasets
+        self.refreshed = refreshed
+        if tree is not None:
+            # Same datasets as in the inventory being replaced
+            self.order, self.children = tree
+            return
+
+        self.order = sorted(datasets, key=dataset_sort_key)
+        self.children = {name: [] for name in self.order}
+        for name in self.order:
+            if '/' in name and (parent := name.rsplit('/', 1)[0]) in self.children:
+                self.children[parent].append(name)
+
+    @classmethod
+    def from_tree(cls, tree, refreshed):
+        datasets = {}
+        add_tree(datasets, tree)
+        return cls(datasets, refreshed)
+
+    def replace(self, datasets, subtrees=(), refreshed=None):
+        """
+        Return a new inventory with `datasets` (a dictionary of dataset names and their new entries or `None` for
+        removed ones) and everything below `subtrees` removed before the update.
+        """
+        rv = {
+            name: entry for name, entry in self.datasets.items()
+            if not any(is_descendant(name, subtree) for subtree in subtrees)
+        } if subtrees else dict(self.datasets)
+        for name, entry in datasets.items():
+            if entry is None:
+                rv.pop(name, None)
+            else:
+                rv[name] = entry
+
+        return DatasetInventory(
+            rv, self.refreshed if refreshed is None else refreshed,
+            (self.order, self.children) if rv.keys() == self.datasets.keys() else None,
+        )
+
+    def serialize(self, name, props, user_props, retrieve_children):
+        """
+        Copy of the cached `name` entry with only the requested properties, like `zfs.dataset.query` returns it.
+        """
+        entry = self.datasets[name]
+        rv = {
+            k: v if isinstance(v, (str, int, float, type(None))) else copy.deepcopy(v)
+            for k, v in entry.items() if k != 'properties'
+        }
+        rv['properties'] = {
+            k: dict(v) for k, v in entry['properties'].items()
+            if (user_props if ':' in k else props is None) or (props is not None and k in props)
+        }
+        rv['children'] = [
+            self.serialize(child, props, user_props, True) for child in self.children[name]
+        ] if retrieve_children else []
+        return rv
+
+
+def add_tree(datasets, tree):
+    for entry in tree:
+        entry = dict(entry)
+        add_tree(datasets, entry.pop('children', None) or [])
+        datasets[entry['name']] = entry
+
+
+class ZFSInventoryService(Service):
+    """
+    Process-wide cache of ZFS datasets and snapshot names.
+
+    The cache is invalidated incrementally from ZFS history events and from middleware methods that change datasets
+    or snapshots. Invalidated datasets are re-read on the next query, everything is re-read once it gets older than
+    the `max_age` a query asks for.
+    """
+
+    class Config:
+        namespace = 'zfs.inventory'
+        private = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = asyncio.Lock()
+        self.datasets_inventory = None
+        self.dirty = set()
+        self.dirty_recursive = set()
+        # Datasets destroyed while the inventory is being read
+        self.discarded = set()
+        # Snapshot names of every dataset in ZFS order
+        self.snapshots_inventory = None
+        self.snapshots_refreshed = None
+        self.snapshots_dirty = set()
+
+    @filterable
+    async def datasets(self, filters, options):
+        """
+        Query datasets like `zfs.dataset.query` does.
+
+        `query-options.extra.max_age` is the maximum age (in seconds) of the cached data to use.
+
+        Snapshots (and snapshot counts) are not cached, such queries are forwarded to `zfs.dataset.query`.
+        """
+        extra = options.get('extra') or {}
+        if any(extra.get(k) for k in DATASET_UNCACHED_EXTRA):
+            return await self.middleware.call('zfs.dataset.query', filters, options)
+
+        inventory = await self.get_datasets(extra.get('max_age', INVENTORY_MAX_AGE))
+        return await self.middleware.run_in_thread(self.query_datasets, inventory, filters, options)
+
+    def query_datasets(self, inventory, filters, options):
+        extra = options.get('extra') or {}
+        props = extra.get('properties', None)
+        flat = extra.get('flat', True)
+        user_props = extra.get('user_properties', True)
+        retrieve_children = extra.get('retrieve_children', True)
+        if not extra.get('retrieve_properties', True):
+            user_props = False
+            props = []
+
+        names = None
+        if filters and len(filters[0]) == 3 and filters[0][0] in ('id', 'name'):
+            if filters[0][1] == '=':
+                names = [filters[0][2]]
+            elif filters[0][1] == 'in':
+                names = filters[0][2]
+
+        if names is not None:
+            names = [name for name in names if name in inventory.datasets]
+        elif flat:
+            names = inventory.order
+        else:
+            names = [name for name in inventory.order if '/' not in name]
+
+        attrs = filter_getattrs(filters)
+        if filters and not any(
+            attr.split('.')[0] == 'children' or (
+                attr.split('.')[0] == 'properties' and (props is not None or not user_props)
+            )
+            for attr in attrs
+        ):
+            # Filters do not depend on the requested properties or children so only the matching datasets have to
+            # be copied
+            names = [entry['name'] for entry in filter_list((inventory.datasets[name] for name in names), filters)]
+            filters = []
+            if options.get('count'):
+                return len(names)
+
+        datasets = (inventory.serialize(name, props, user_props, retrieve_children) for name in names)
+        return filter_list(datasets, filters, options)
+
+    @filterable
+    async def snapshots(self, filters, options):
+        """
+        Query snapshot names (`select: ["name"]`) or snapshot count like `zfs.snapshot.query` does.
+
+        Queries for other snapshot attributes and properties are forwarded to `zfs.snapshot.query`.
+        """
+        extra = options.get('extra') or {}
+        if (
+            not (options.get('select') == ['name'] or options.get('count')) or
+            not filter_getattrs(filters).issubset({'id', 'name', 'pool', 'dataset', 'snapshot_name'}) or
+            any(extra.get(k) for k in SNAPSHOT_UNCACHED_EXTRA)
+        ):
+            return await self.middleware.call('zfs.snapshot.query', filters, options)
+
+        snapshots = await self.get_snapshots(extra.get('max_age', INVENTORY_MAX_AGE))
+        return await self.middleware.run_in_thread(self.query_snapshots, snapshots, filters, options)
+
+    def query_snapshots(self, snapshots, filters, options):
+        datasets = None
+        for f in filters:
+            if len(f) == 3 and f[0] in ('pool', 'dataset') and f[1] in ('=', 'in'):
+                values = [f[2]] if f[1] == '=' else f[2]
+                if f[0] == 'pool':
+                    found = {ds for ds in snapshots if ds.split('/')[0] in values}
+                else:
+                    found = set(values) & snapshots.keys()
+
+                datasets = found if datasets is None else datasets & found
+
+        def rows():
+            for dataset in sorted(snapshots if datasets is None else datasets, key=dataset_sort_key):
+                for name in snapshots[dataset]:
+                    yield {
+                        'id': name,
+                        'name': name,
+                        'pool': dataset.split('/')[0],
+                        'dataset': dataset,
+                        'snapshot_name': name.split('@', 1)[1],
+                    }
+
+        return filter_list(rows(), filters, options)
+
+    @accepts(Str('name'), Bool('recursive', default=False))
+    async def invalidate(self, name, recursive):
+        """
+        Re-read dataset (or snapshot) `name` (and all of its descendants if `recursive` is set) on the next query.
+
+        Snapshot names of the dataset are re-read as well.
+        """
+        dataset = name.split('@')[0]
+        if recursive:
+            self.dirty_recursive.add(dataset)
+            # There is no way to list snapshots of the descendants without listing them one by one
+            self.snapshots_refreshed = None
+        else:
+            self.dirty.add(dataset)
+            self.snapshots_dirty.add(dataset)
+
+    @accepts(Str('name'))
+    async def discard(self, name):
+        """
+        Forget dataset `name` and all of its descendants (or snapshot `name`) once it has been destroyed.
+        """
+        dataset = name.split('@')[0]
+        if '@' in name:
+            if self.snapshots_inventory is not None and name in self.snapshots_inventory.get(dataset, []):
+                self.snapshots_inventory[dataset] = [
+                    snapshot for snapshot in self.snapshots_inventory[dataset] if snapshot != name
+                ]
+            # `usedbysnapshots` of the dataset changes
+            self.dirty.add(dataset)
+            return
+
+        self.discarded.add(dataset)
+        if self.datasets_inventory is not None:
+            self.datasets_inventory = self.datasets_inventory.replace({}, [dataset])
+        if self.snapshots_inventory is not None:
+            self.snapshots_inventory = {
+                ds: names for ds, names in self.snapshots_inventory.items() if not is_descendant(ds, dataset)
+            }
+        if '/' in dataset:
+            # Space accounting of the parent changes
+            self.dirty.add(dataset.rsplit('/', 1)[0])
+
+    @accepts(Dict(
+        'options',
+        Bool('datasets', default=True),
+        Bool('snapshots', default=True),
+    ))
+    async def refresh(self, options):
+        """
+        Re-read the whole inventory now.
+        """
+        if options['datasets']:
+            await self.get_datasets(0)
+        if options['snapshots'] and self.snapshots_inventory is not None:
+            await self.get_snapshots(0)
+
+    async def status(self):
+        """
+        Size and age (in seconds) of the inventory and the number of datasets that will be re-read on the next query.
+        """
+        now = time.monotonic()
+        return {
+            'datasets': None if self.datasets_inventory is None else len(self.datasets_inventory.datasets),
+            'datasets_age': None if self.datasets_inventory is None else now - self.datasets_inventory.refreshed,
+            'snapshots': None if self.snapshots_inventory is None else sum(map(len, self.snapshots_inventory.values())),
+            'snapshots_age': None if self.snapshots_refreshed is None else now - self.snapshots_refreshed,
+            'dirty': len(self.dirty | self.dirty_recursive),
+        }
+
+    @private
+    async def get_datasets(self, max_age):
+        async with self.lock:
+            inventory = self.datasets_inventory
+            if inventory is None or time.monotonic() - inventory.refreshed > max_age:
+                await self.read_datasets()
+            elif self.dirty or self.dirty_recursive:
+                await self.read_dirty_datasets()
+
+            return self.datasets_inventory
+
+    @private
+    async def read_datasets(self):
+        # Whatever gets invalidated while the datasets are being read has to be read again
+        self.dirty.clear()
+        self.dirty_recursive.clear()
+        self.discarded.clear()
+        refreshed = time.monotonic()
+        try:
+            tree = await self.middleware.call('zfs.dataset.query', [], {'extra': {'flat': False}})
+        except Exception:
+            # Invalidations are lost so the next query has to read everything again
+            self.datasets_inventory = None
+            raise
+        inventory = await self.middleware.run_in_thread(DatasetInventory.from_tree, tree, refreshed)
+        self.datasets_inventory = inventory.replace({}, self.discarded) if self.discarded else inventory
+
+    @private
+    async def read_dirty_datasets(self):
+        subtrees = set()
+        for name in sorted(self.dirty_recursive, key=len):
+            if not any(is_descendant(name, subtree) for subtree in subtrees):
+                subtrees.add(name)
+        names = {name for name in self.dirty if not any(is_descendant(name, subtree) for subtree in subtrees)}
+        self.dirty.clear()
+        self.dirty_recursive.clear()
+        self.discarded.clear()
+
+        datasets = {name: None for name in names}
+        try:
+            for subtree in subtrees:
+                add_tree(datasets, await self.middleware.call(
+                    'zfs.dataset.query', [['id', '=', subtree]], {'extra': {'flat': False}},
+                ))
+            if names:
+                add_tree(datasets, await self.middleware.call(
+                    'zfs.dataset.query', [['id', 'in', list(names)]], {'extra': {'retrieve_children': False}},
+                ))
+        except Exception:
+            # i.e. some of the datasets do not exist anymore
+            self.logger.debug('Failed to re-read invalidated datasets, reading all of them', exc_info=True)
+            await self.read_datasets()
+        else:
+            self.datasets_inventory = self.datasets_inventory.replace(datasets, subtrees | self.discarded)
+
+    @private
+    async def get_snapshots(self, max_age):
+        async with self.lock:
+            if self.snapshots_refreshed is None or time.monotonic() - self.snapshots_refreshed > max_age:
+                await self.read_snapshots()
+            elif self.snapshots_dirty:
+                await self.read_dirty_snapshots()
+
+            return self.snapshots_inventory
+
+    @private
+    async def read_snapshots(self):
+        self.snapshots_dirty.clear()
+        refreshed = time.monotonic()
+        try:
+            snapshots = await self.middleware.call('zfs.snapshot.query', [], {'select': ['name']})
+        except Exception:
+            self.snapshots_refreshed = None
+            raise
+        self.snapshots_inventory = await self.middleware.run_in_thread(self.group_snapshots, snapshots)
+        self.snapshots_refreshed = refreshed
+
+    @private
+    async def read_dirty_snapshots(self):
+        datasets = list(self.snapshots_dirty)
+        self.snapshots_dirty.clear()
+        try:
+            snapshots = await self.middleware.call(
+                'zfs.snapshot.query', [['dataset', 'in', datasets]], {'select': ['name']},
+            )
+        except Exception:
+            self.logger.debug('Failed to re-read invalidated snapshots, reading all of them', exc_info=True)
+            await self.read_snapshots()
+        else:
+            inventory = {ds: names for ds, names in self.snapshots_inventory.items() if ds not in datasets}
+            inventory.update(self.group_snapshots(snapshots))
+            self.snapshots_inventory = inventory
+
+    def group_snapshots(self, snapshots):
+        rv = {}
+        for snapshot in snapshots:
+            rv.setdefault(snapshot['name'].split('@')[0], []).append(snapshot['name'])
+
+        return rv
@@ -1,9 +1,14 @@
 import copy
 import errno
 import libzfs
+import time
+
+from collections import defaultdict
 
 from middlewared.schema import accepts, Bool, Dict, List, Str
-from middlewared.service import CallError, CRUDService, filterable, private, ValidationErrors
+from middlewared.service import (
+    bulk_implementation, CallError, CRUDService, filterable, private, ValidationErrors
+)
 from middlewared.utils import filter_list, filter_getattrs
 from middlewared.validators import Match, ReplicationSnapshotNamingSchema
 
@@ -23,7 +28,7 @@ class ZFSSnapshot(CRUDService):
     def count(self, dataset_names='*', recursive=False):
         kwargs = {
             'user_props': False,
-            'props': ['snapshots_changed'],
+            'props': ['snapshots_changed', 'mountpoint'],
             'retrieve_children': (dataset_names == '*' or recursive)
         }
         if dataset_names != '*':
@@ -32,14 +37,10 @@ class ZFSSnapshot(CRUDService):
 
             kwargs['datasets'] = dataset_names
 
-        prefetch = True
-        if dataset_names != '*' and len(dataset_names) == 1 and not recursive:
-            prefetch = False
-
         try:
             with libzfs.ZFS() as zfs:
                 datasets = zfs.datasets_serialized(**kwargs)
-                return get_snapshot_count_cached(self.middleware, zfs, datasets, prefetch)
+                return get_snapshot_count_cached(self.middleware, zfs, datasets)
 
         except libzfs.ZFSException as e:
             raise CallError(str(e))
@@ -189,6 +190,7 @@ class ZFSSnapshot(CRUDService):
             if affected_vms := self.middleware.call_sync('vm.query_snapshot_begin', dataset, recursive):
                 self.middleware.call_sync('vm.suspend_vms', list(affected_vms))
 
+        started = int(time.time())
         try:
             if not exclude:
                 with libzfs.ZFS() as zfs:
@@ -208,6 +210,10 @@ class ZFSSnapshot(CRUDService):
             self.logger.error(f'Failed to snapshot {dataset}@{name}: {err}')
             raise CallError(f'Failed to snapshot {dataset}@{name}: {err}', errno_)
         else:
+            self.middleware.call_sync('zfs.inventory.invalidate', f'{dataset}@{name}', recursive)
+            if not recursive:
+                # Snapshots of the descendants are counted from ZFS events
+                self.middleware.call_sync('zfs.snapshot_count.update', f'{dataset}@{name}', True, started)
             return self.middleware.call_sync('zfs.snapshot.get_instance', f'{dataset}@{name}')
         finally:
             if affected_vms:
@@ -271,6 +277,7 @@ class ZFSSnapshot(CRUDService):
             return False
         return True
 
+    @bulk_implementation('zfs.snapshot.bulk_delete')
     @accepts(
         Str('id'),
         Dict(
@@ -285,6 +292,7 @@ class ZFSSnapshot(CRUDService):
 
         `options.defer` will defer the deletion of snapshot.
         """
+        started = int(time.time())
         try:
             with libzfs.ZFS() as zfs:
                 snap = zfs.get_snapshot(id)
@@ -292,4 +300,95 @@ class ZFSSnapshot(CRUDService):
         except libzfs.ZFSException as e:
             raise CallError(str(e))
         else:
+            if options['recursive']:
+                self.middleware.call_sync('zfs.inventory.invalidate', id, True)
+            elif options['defer']:
+                # A held snapshot is only destroyed once it is released
+                self.middleware.call_sync('zfs.inventory.invalidate', id, False)
+                self.middleware.call_sync('zfs.snapshot_count.forget', id.split('@')[0], False)
+            else:
+                self.middleware.call_sync('zfs.inventory.discard', id)
+                self.middleware.call_sync('zfs.snapshot_count.update', id, False, started)
             return True
+
+    @private
+    async def bulk_delete(self, params):
+        """
+        `core.bulk` implementation of `zfs.snapshot.delete`. Existing snapshots that are deleted with default options
+        are destroyed with one `zfs.dataset.destroy_snapshots` call per dataset, the rest are deleted one by one.
+        """
+        statuses = [None] * len(params)
+        datasets = defaultdict(dict)
+        batched = set()
+        single = []
+        for i, p in enumerate(params):
+            options = p[1] if len(p) == 2 else {}
+            if (
+                len(p) in (1, 2) and isinstance(p[0], str) and '@' in p[0] and p[0] not in batched and
+                isinstance(options, dict) and set(options) <= {'defer', 'recursive'} and not any(options.values())
+            ):
+                dataset, name = p[0].split('@', 1)
+                datasets[dataset][i] = name
+                batched.add(p[0])
+            else:
+                # Repeated snapshots are deleted (and fail) after the batch just like they would one by one
+                single.append(i)
+
+        async def existing():
+            return {
+                snapshot['name']
+                for snapshot in await self.middleware.call(
+                    'zfs.inventory.snapshots', [['dataset', 'in', list(datasets)]], {'select': ['name']},
+                )
+            }
+
+        if datasets:
+            # Snapshots that do not exist are deleted one by one to get the proper error
+            snapshots = await existing()
+            for dataset, names in datasets.items():
+                for i, name in list(names.items()):
+                    if f'{dataset}@{name}' not in snapshots:
+                        names.pop(i)
+                        single.append(i)
+
+        failed = False
+        for dataset, names in datasets.items():
+            if not names:
+                continue
+
+            try:
+                await self.middleware.call('zfs.dataset.destroy_snapshots', dataset, {
+                    'all': False,
+                    'recursive': False,
+                    'snapshots': list(names.values()),
+                })
+            except Exception:
+                failed = True
+            else:
+                for i, name in names.items():
+                    statuses[i] = await self._bulk_deleted(f'{dataset}@{name}')
+
+        if failed:
+            # Some snapshots of a failed batch might still have been destroyed
+            snapshots = await existing()
+            for dataset, names in datasets.items():
+                for i, name in names.items():
+                    if statuses[i] is None:
+                        if f'{dataset}@{name}' in snapshots:
+                            single.append(i)
+                        else:
+                            statuses[i] = await self._bulk_deleted(f'{dataset}@{name}')
+
+        for i in sorted(single):
+            try:
+                statuses[i] = {'result': await self.middleware.call('zfs.snapshot.delete', *params[i]), 'error': None}
+            except Exception as e:
+                statuses[i] = {'result': None, 'error': str(e)}
+
+        return statuses
+
+    async def _bulk_deleted(self, id):
+        # What `zfs.snapshot.delete` does after `do_delete` for the snapshots destroyed at once
+        await self.middleware.call_hook('zfs.snapshot.post_delete', True)
+        self.middleware.send_event('zfs.snapshot.query', 'REMOVED', id=id)
+        return {'result': True, 'error': None}
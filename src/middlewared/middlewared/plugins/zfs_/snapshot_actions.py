@@ -44,6 +44,8 @@ class ZFSSnapshot(Service):
         except libzfs.ZFSException as err:
             self.logger.error("{0}".format(err))
             raise CallError(f'Failed to clone snapshot: {err}')
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', dataset_dst)
 
     @accepts(
         Str('id'),
@@ -99,6 +101,9 @@ class ZFSSnapshot(Service):
             )
         except subprocess.CalledProcessError as e:
             raise CallError(f'Failed to rollback snapshot: {e.stderr.strip()}')
+        finally:
+            self.middleware.call_sync('zfs.inventory.invalidate', id.split('@')[0])
+            self.middleware.call_sync('zfs.snapshot_count.forget', id.split('@')[0])
 
     @accepts(
         Str('id'),
@@ -0,0 +1,172 @@
+import asyncio
+from collections import OrderedDict
+
+from middlewared.schema import accepts, Bool, Dict, Int, Str
+from middlewared.service import private, Service
+
+SNAPSHOT_COUNT_TDB = 'snapshot_count'
+SNAPSHOT_COUNT_KEY_PREFIX = 'SNAPCNT%'
+# Counts are written to the TDB file this many seconds after they change
+SNAPSHOT_COUNT_SYNC_DELAY = 30
+# The same snapshot creation/destruction is reported both by the middleware method that did it and by the ZFS event,
+# remember this many of the last applied ones so that they are counted only once
+SNAPSHOT_COUNT_RECENT_OPS = 10000
+
+
+class ZFSSnapshotCountService(Service):
+    """
+    Snapshot count of every dataset maintained incrementally from snapshot creation and destruction.
+
+    Each entry holds the dataset `snapshots_changed` timestamp it was counted (or validated) at. An entry that was
+    changed incrementally since then instead holds the time of the last operation applied to it and takes the
+    `snapshots_changed` value the next time it is used unless snapshots changed after that operation. Datasets whose
+    snapshots might have changed in some other way are forgotten and have to be counted again.
+    """
+
+    class Config:
+        namespace = 'zfs.snapshot_count'
+        private = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.counts = None
+        self.recent = OrderedDict()
+        # Datasets which entries have to be written to (or removed from) the TDB file
+        self.unsynced = set()
+        self.persisted = set()
+        self.sync_scheduled = False
+
+    @accepts(Dict('datasets', additional_attrs=True))
+    async def get(self, datasets):
+        """
+        Snapshot counts of `datasets` (a dictionary of dataset names and their `snapshots_changed` timestamps) that
+        are known. Datasets that are missing from the result have to be counted and `zfs.snapshot_count.set`.
+        """
+        counts = await self.get_counts()
+        rv = {}
+        for name, changed_ts in datasets.items():
+            if (entry := counts.get(name)) is None:
+                continue
+
+            if entry['changed_ts'] is None:
+                # Snapshots changed after the last operation applied (or their creation time is not tracked)
+                if changed_ts is None or changed_ts > entry['updated_ts']:
+                    continue
+
+                counts[name] = entry = {'changed_ts': changed_ts, 'cnt': entry['cnt']}
+                self.changed(name)
+            elif entry['changed_ts'] != changed_ts:
+                continue
+
+            rv[name] = entry['cnt']
+
+        return rv
+
+    @accepts(Dict('counts', additional_attrs=True))
+    async def set(self, counts):
+        """
+        Set snapshot counts of datasets (a dictionary of dataset names and `[snapshots_changed, count]` lists).
+        """
+        entries = await self.get_counts()
+        for name, (changed_ts, cnt) in counts.items():
+            if changed_ts is None:
+                # There are circumstances in which legacy datasets may not have this property populated, such counts
+                # can never be validated and have to be counted every time
+                if entries.pop(name, None) is not None:
+                    self.changed(name)
+                continue
+
+            entries[name] = {'changed_ts': changed_ts, 'cnt': cnt}
+            self.changed(name)
+
+    @accepts(Str('name'), Bool('created'), Int('timestamp', null=True))
+    async def update(self, name, created, timestamp):
+        """
+        Account for snapshot `name` being created (or destroyed) at `timestamp` (a UNIX timestamp that must not be later
+        than the operation itself).
+
+        Counts made at or after `timestamp` might already include the snapshot, such datasets are forgotten instead.
+        """
+        op = 'created' if created else 'destroyed'
+        if self.recent.get(name) == op:
+            return
+
+        self.recent[name] = op
+        self.recent.move_to_end(name)
+        if len(self.recent) > SNAPSHOT_COUNT_RECENT_OPS:
+            self.recent.popitem(last=False)
+
+        dataset = name.split('@')[0]
+        entries = await self.get_counts()
+        if (entry := entries.get(dataset)) is None:
+            return
+
+        if timestamp is None or (entry['changed_ts'] is not None and entry['changed_ts'] >= timestamp):
+            entries.pop(dataset)
+        else:
+            entries[dataset] = {
+                'changed_ts': None,
+                'cnt': max(entry['cnt'] + (1 if created else -1), 0),
+                'updated_ts': max(timestamp, entry.get('updated_ts') or timestamp),
+            }
+
+        self.changed(dataset)
+
+    @accepts(Str('name'), Bool('recursive', default=False))
+    async def forget(self, name, recursive):
+        """
+        Forget snapshot count of dataset `name` (and all of its descendants if `recursive` is set) so that it is
+        counted again the next time it is requested.
+        """
+        entries = await self.get_counts()
+        for dataset in [name] + ([ds for ds in entries if ds.startswith(f'{name}/')] if recursive else []):
+            if entries.pop(dataset, None) is not None:
+                self.changed(dataset)
+
+    @private
+    async def get_counts(self):
+        if self.counts is None:
+            counts = {}
+            for entry in await self.middleware.call('tdb.entries', {'name': SNAPSHOT_COUNT_TDB}):
+                if entry['key'].startswith(SNAPSHOT_COUNT_KEY_PREFIX):
+                    counts[entry['key'][len(SNAPSHOT_COUNT_KEY_PREFIX):]] = entry['val']
+
+            # Something might have been loaded concurrently
+            if self.counts is None:
+                self.counts = counts
+                self.persisted = set(counts)
+
+        return self.counts
+
+    @private
+    def changed(self, name):
+        self.unsynced.add(name)
+        if not self.sync_scheduled:
+            self.sync_scheduled = True
+            asyncio.get_event_loop().call_later(
+                SNAPSHOT_COUNT_SYNC_DELAY, lambda: self.middleware.create_task(self.sync()),
+            )
+
+    @private
+    async def sync(self):
+        """
+        Write changed snapshot counts to the TDB file.
+        """
+        self.sync_scheduled = False
+        ops = []
+        for name in self.unsynced:
+            key = f'{SNAPSHOT_COUNT_KEY_PREFIX}{name}'
+            if (entry := self.counts.get(name)) is not None and entry['changed_ts'] is not None:
+                ops.append({'action': 'SET', 'key': key, 'val': dict(entry)})
+                self.persisted.add(name)
+            elif name in self.persisted:
+                # Incrementally updated counts are not persisted until they are validated
+                ops.append({'action': 'DEL', 'key': key})
+                self.persisted.discard(name)
+
+        self.unsynced.clear()
+        if ops:
+            try:
+                await self.middleware.call('tdb.batch_ops', {'name': SNAPSHOT_COUNT_TDB, 'ops': ops})
+            except Exception:
+                self.logger.warning('Failed to write snapshot counts', exc_info=True)
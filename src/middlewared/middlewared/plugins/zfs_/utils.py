@@ -3,7 +3,6 @@ import enum
 import logging
 import os
 
-from middlewared.service_exception import MatchNotFound
 
 logger = logging.getLogger(__name__)
 
@@ -114,12 +113,11 @@ def unlocked_zvols_fast(options=None, data=None):
     return zvols
 
 
-def get_snapshot_count_cached(middleware, lz, datasets, prefetch=False, update_datasets=False, remove_snapshots_changed=False):
+def get_snapshot_count_cached(middleware, lz, datasets, update_datasets=False, remove_snapshots_changed=False):
     """
-    Try retrieving snapshot count for dataset from cache if the
-    `snapshots_changed` timestamp hasn't changed. If it has,
-    then retrieve new snapshot count in most optimized way possible
-    and cache new value
+    Retrieve snapshot count for datasets from `zfs.snapshot_count` which maintains them incrementally.
+    Datasets it does not know the count for (or which `snapshots_changed` timestamp has changed
+    in some other way) are counted in most optimized way possible and the new value is cached.
 
     Parameters:
     ----------
@@ -127,8 +125,6 @@ def get_snapshot_count_cached(middleware, lz, datasets, prefetch=False, update_d
     lz - libzfs handle, e.g. libzfs.ZFS()
     zhdl - iterable containing dataset information as returned by
         libzfs.datasets_serialized
-    prefetch - bool - optional performance enhancement to grab entire
-        tdb contents prior to iteration. This reduces count of middleware calls.
     update_datasets - bool - optional - insert `snapshot_count` key into datasets passed
         into this method
     remove_snapshots_changed - bool - remove the snapshots_changed key from dataset properties
@@ -162,85 +158,40 @@ def get_snapshot_count_cached(middleware, lz, datasets, prefetch=False, update_d
 
         return len(lz.snapshots_serialized(['name'], datasets=[zhdl['name']], recursive=False))
 
-    def get_entry_prefetch(key, tdb_entries):
-        return tdb_entries.get(key, {'changed_ts': None, 'cnt': -1})
+    def get_changed_ts(zhdl):
+        # Raw value is a UNIX timestamp so that it can be compared with the time of snapshot operations
+        prop = zhdl['properties']['snapshots_changed']
+        if prop['parsed'] is None:
+            return None
 
-    def get_entry_fetch(key, tdb_entries):
         try:
-            entry = middleware.call_sync('tdb.fetch', {
-                'name': 'snapshot_count',
-                'key': key,
-            })
-        except MatchNotFound:
-            entry = {
-                'changed_ts': None,
-                'cnt': -1
-            }
-        return entry
-
-    def process_entry(out, zhdl, tdb_entries, batch_ops, get_entry_fn):
-        """
-        This method processes the dataset entry and
-        sets new value in tdb file if necessary. Since
-        we may be consuming "flattened" datasets here, there
-        is potential for duplicate entries. Hence, check for
-        whether we've already handled the dataset for this run.
-        """
-        existing_entry = out.get(zhdl['name'])
-        if existing_entry:
+            return int(prop['rawvalue']) or None
+        except ValueError:
+            return None
+
+    def iter_datasets(datasets_in):
+        # Since we may be consuming "flattened" datasets here, there is potential for duplicate entries
+        for ds in datasets_in:
+            yield ds
+            yield from iter_datasets(ds.get('children', []))
+
+    datasets = list(datasets)
+    handles = {}
+    for zhdl in iter_datasets(datasets):
+        handles.setdefault(zhdl['name'], zhdl)
+
+    changed = {name: get_changed_ts(zhdl) for name, zhdl in handles.items()}
+    out = middleware.call_sync('zfs.snapshot_count.get', changed)
+    if missing := {name: [changed[name], entry_get_cnt(zhdl)] for name, zhdl in handles.items() if name not in out}:
+        middleware.call_sync('zfs.snapshot_count.set', missing)
+        out.update({name: cnt for name, (changed_ts, cnt) in missing.items()})
+
+    if update_datasets or remove_snapshots_changed:
+        for zhdl in iter_datasets(datasets):
             if update_datasets:
-                zhdl['snapshot_count'] = existing_entry
+                zhdl['snapshot_count'] = out[zhdl['name']]
 
             if remove_snapshots_changed:
                 zhdl['properties'].pop('snapshots_changed', None)
 
-            return
-
-        changed_ts = zhdl['properties']['snapshots_changed']['parsed']
-        cache_key = f'SNAPCNT%{zhdl["name"]}'
-
-        entry = get_entry_fn(cache_key, tdb_entries)
-
-        if entry['changed_ts'] != changed_ts:
-            entry['cnt'] = entry_get_cnt(zhdl)
-            entry['changed_ts'] = changed_ts
-
-            # There are circumstances in which legacy datasets
-            # may not have this property populated. We don't
-            # want cache insertion with NULL key to avoid
-            # collisions
-            if changed_ts:
-                batch_ops.append({
-                    'action': 'SET',
-                    'key': cache_key,
-                    'val': entry
-                })
-
-        out[zhdl['name']] = entry['cnt']
-        if update_datasets:
-            zhdl['snapshot_count'] = entry['cnt']
-
-        if remove_snapshots_changed:
-            zhdl['properties'].pop('snapshots_changed', None)
-
-    def iter_datasets(out, datasets_in, tdb_entries, batch_ops, get_entry_fn):
-        for ds in datasets_in:
-            process_entry(out, ds, tdb_entries, batch_ops, get_entry_fn)
-            iter_datasets(out, ds.get('children', []), tdb_entries, batch_ops, get_entry_fn)
-
-    tdb_entries = {}
-    out = {}
-    batch_ops = []
-    get_entry_fn = get_entry_fetch
-    if prefetch:
-        tdb_entries = {
-            x['key']: x['val']
-            for x in middleware.call_sync('tdb.entries', {'name': 'snapshot_count'})
-        }
-        get_entry_fn = get_entry_prefetch
-
-    iter_datasets(out, datasets, tdb_entries, batch_ops, get_entry_fn)
-    if batch_ops:
-        middleware.call_sync('tdb.batch_ops', {'name': 'snapshot_count', 'ops': batch_ops})
-
     return out
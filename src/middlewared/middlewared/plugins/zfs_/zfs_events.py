@@ -9,6 +9,10 @@ from middlewared.alert.base import (
 from middlewared.utils.threading import start_daemon_thread
 
 CACHE_POOLS_STATUSES = 'system.system_health_pools'
+# History events that (might) change descendants of the dataset too, i.e. inherited properties
+INVENTORY_RECURSIVE_EVENTS = ('set', 'inherit', 'receive', 'promote', 'rollback')
+# History events after which snapshot counts of the dataset and its descendants are not known anymore
+SNAPSHOT_COUNT_RESET_EVENTS = ('destroy', 'rename', 'receive', 'finish receiving', 'clone swap', 'rollback')
 
 SCAN_THREADS = {}
 
@@ -158,6 +162,14 @@ async def zfs_events(middleware, data):
     ):
         pool_name = data.get('pool')
         pool_guid = data.get('guid')
+        if pool_name:
+            if event_id.endswith('pool_destroy'):
+                await middleware.call('zfs.inventory.discard', pool_name)
+                await middleware.call('zfs.snapshot_count.forget', pool_name, True)
+            elif event_id.endswith('pool_import'):
+                await middleware.call('zfs.inventory.invalidate', pool_name, True)
+                await middleware.call('zfs.snapshot_count.forget', pool_name, True)
+
         if await middleware.call('system.ready'):
             # Swap must be configured only on disks being used by some pool,
             # for this reason we must react to certain types of ZFS events to keep
@@ -194,6 +206,28 @@ async def zfs_events(middleware, data):
         # we need to send events for dataset creation/updating/deletion in case it's done via cli
         event_type = data['history_internal_name']
         ds_id = data['history_dsname']
+        if ds_id.split('/')[-1].startswith('%'):
+            # Hidden clones such as `%recv` dataset created by replication are not listed
+            pass
+        elif event_type == 'destroy':
+            await middleware.call('zfs.inventory.discard', ds_id)
+        elif event_type == 'rename':
+            # New name is not part of the event
+            await middleware.call('zfs.inventory.invalidate', ds_id.split('/')[0], True)
+        else:
+            await middleware.call('zfs.inventory.invalidate', ds_id, event_type in INVENTORY_RECURSIVE_EVENTS)
+
+        if '@' in ds_id and event_type in ('snapshot', 'destroy'):
+            await middleware.call(
+                'zfs.snapshot_count.update', ds_id, event_type == 'snapshot', data.get('history_time'),
+            )
+        elif event_type in SNAPSHOT_COUNT_RESET_EVENTS:
+            # `%recv` clone snapshots become snapshots of the dataset being received
+            await middleware.call('zfs.snapshot_count.forget', ds_id.split('@')[0].split('/%')[0], True)
+        elif event_type == 'promote':
+            # Snapshots are moved from the origin dataset that might be anywhere in the pool
+            await middleware.call('zfs.snapshot_count.forget', ds_id.split('/')[0], True)
+
         if await middleware.call('pool.dataset.is_internal_dataset', ds_id):
             # We should not raise any event for system internal datasets
             return
@@ -27,7 +27,12 @@ class Middleware(SchemasMixin, dict):
         super().__init__()
 
         # Resolve core schemas like `query-filters`
-        super()._resolve_methods([DatastoreService(self)], [])
+        datastore = DatastoreService(self)
+        super()._resolve_methods([datastore], [])
+        # Schemas are resolved in place so only the first instance would register them
+        for attr in datastore.query.accepts:
+            if attr.register and attr.name not in self._schemas:
+                self._schemas.add(attr)
 
     def _resolve_methods(self, services, events):
         try:
@@ -0,0 +1,117 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from middlewared.plugins.pool_.dataset_details import PoolDatasetService
+from middlewared.pytest.unit.middleware import Middleware
+
+MNTINFO = {
+    1: {'mountpoint': '/mnt/tank', 'mount_source': 'tank', 'mount_opts': ['RW'], 'super_opts': ['CASESENSITIVE']},
+    2: {'mountpoint': '/mnt/tank/share', 'mount_source': 'tank/share', 'mount_opts': ['RO', 'NOATIME'],
+        'super_opts': ['CASEINSENSITIVE']},
+}
+
+
+def dataset(name, type_='FILESYSTEM', children=()):
+    return {
+        'id': name,
+        'name': name,
+        'type': type_,
+        'mountpoint': f'/mnt/{name}' if type_ == 'FILESYSTEM' else None,
+        'locked': False,
+        'reservation': {'value': None},
+        'refreservation': {'value': '1G' if type_ == 'VOLUME' else None},
+        'children': list(children),
+    }
+
+
+def details_service():
+    m = Middleware()
+    m['pool.dataset.query'] = Mock(side_effect=lambda *args: [
+        dataset('tank', children=[dataset('tank/share'), dataset('tank/vol', 'VOLUME')]),
+    ])
+    m['iscsi.targetextent.query'] = Mock(return_value=[
+        {'target': 1, 'extent': 1}, {'target': 1, 'extent': 2}, {'target': 2, 'extent': 3},
+    ])
+    m['iscsi.target.query'] = Mock(return_value=[{'id': 1, 'groups': [{}]}, {'id': 2, 'groups': []}])
+    m['iscsi.extent.query'] = Mock(return_value=[
+        {'id': 1, 'type': 'DISK', 'path': 'zvol/tank/vol', 'enabled': True},
+        {'id': 2, 'type': 'FILE', 'path': '/mnt/tank/share/file', 'enabled': False},
+        {'id': 3, 'type': 'DISK', 'path': 'zvol/tank/vol', 'enabled': True},
+    ])
+    m['sharing.nfs.query'] = Mock(return_value=[
+        {'path': '/mnt/tank/share', 'enabled': True},
+        {'path': '/mnt/tank/share/dir', 'enabled': False},
+        {'path': '/mnt/tank', 'enabled': True},
+    ])
+    m['sharing.smb.query'] = Mock(return_value=[{'path': '/mnt/tank/share/dir', 'enabled': True, 'name': 'smb'}])
+    m['rsynctask.query'] = Mock(return_value=[
+        {'path': '/mnt/tank/share', 'direction': 'PUSH'}, {'path': '/mnt/tank/share', 'direction': 'PULL'},
+    ])
+    m['chart.release.get_consumed_host_paths'] = Mock(return_value={
+        'app': ['/mnt/tank/share/app', '/mnt/tank/ix-applications/app', '/etc/hosts'],
+    })
+
+    def datastore_query(name, filters=None, options=None):
+        return {
+            'storage.replication': [
+                {'direction': 'PUSH', 'source_datasets': ['tank/share', 'tank']},
+                {'direction': 'PUSH', 'source_datasets': ['tank/share']},
+                {'direction': 'PULL', 'source_datasets': ['tank/share']},
+            ],
+            'storage.task': [{'dataset': 'tank/share'}, {'dataset': 'tank'}, {'dataset': 'tank/share'}],
+            'tasks.cloudsync': [{'path': '/mnt/tank/share/dir', 'direction': 'PUSH'}],
+            'vm.device': [
+                {'dtype': 'DISK', 'attributes': {'path': '/dev/zvol/tank/vol'}, 'vm': {'name': 'disk'}},
+                {'dtype': 'RAW', 'attributes': {'path': '/mnt/tank/share/raw'}, 'vm': {'name': 'raw'}},
+            ],
+        }[name]
+
+    m['datastore.query'] = Mock(side_effect=datastore_query)
+
+    service = PoolDatasetService(m)
+    service.get_mount_info = lambda path, mntinfo: mntinfo[2] if path.startswith('/mnt/tank/share/') else {}
+    return service
+
+
+def test__details():
+    service = details_service()
+    with patch('middlewared.plugins.pool_.dataset_details.getmntinfo', Mock(return_value=MNTINFO)):
+        tank = service.details()[0]
+
+    share, vol = tank['children']
+    assert (tank['atime'], tank['casesensitive'], tank['readonly']) == (True, True, False)
+    assert (share['atime'], share['casesensitive'], share['readonly']) == (False, False, True)
+    assert tank['nfs_shares'] == [{'enabled': True, 'path': '/mnt/tank'}]
+    assert share['nfs_shares'] == [
+        {'enabled': True, 'path': '/mnt/tank/share'}, {'enabled': False, 'path': '/mnt/tank/share/dir'},
+    ]
+    assert share['smb_shares'] == [{'enabled': True, 'path': '/mnt/tank/share/dir', 'share_name': 'smb'}]
+    assert share['iscsi_shares'] == [{'enabled': False, 'type': 'FILE', 'path': '/mnt/tank/share/file'}]
+    assert vol['iscsi_shares'] == [{'enabled': True, 'type': 'DISK', 'path': '/dev/zvol/tank/vol'}]
+    assert vol['vms'] == [{'name': 'disk', 'path': '/dev/zvol/tank/vol'}]
+    assert share['vms'] == [{'name': 'raw', 'path': '/mnt/tank/share/raw'}]
+    assert share['apps'] == [{'name': 'app', 'path': '/mnt/tank/share/app'}]
+    assert [
+        (ds['replication_tasks_count'], ds['snapshot_tasks_count'], ds['cloudsync_tasks_count'],
+         ds['rsync_tasks_count']) for ds in (tank, share, vol)
+    ] == [(1, 1, 0, 0), (2, 2, 1, 1), (0, 0, 0, 0)]
+    assert vol['thick_provisioned'] is True
+    assert tank['thick_provisioned'] is False
+
+
+@pytest.mark.asyncio
+async def test__details_consumers_cache():
+    service = details_service()
+    with patch('middlewared.plugins.pool_.dataset_details.getmntinfo', Mock(return_value=MNTINFO)):
+        service.details()
+        service.details()
+        assert service.middleware['sharing.nfs.query'].call_count == 1
+
+        await service.invalidate_consumers()
+        service.details()
+        assert service.middleware['sharing.nfs.query'].call_count == 2
+
+        with patch('middlewared.plugins.pool_.dataset_details.time.monotonic', Mock(return_value=10 ** 9)):
+            service.details()
+        assert service.middleware['sharing.nfs.query'].call_count == 3
@@ -18,4 +18,4 @@ from middlewared.plugins.reporting.iostat import DiskStats
     ("nvme0n11", "nvme0n11"),
 ])
 def test__get_disk(device, disk):
-    assert DiskStats(None, None).get_disk(device) == disk
+    assert DiskStats().get_disk(device) == disk
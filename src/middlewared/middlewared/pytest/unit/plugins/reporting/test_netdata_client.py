@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import pytest
+
+from middlewared.plugins.reporting.graphs import ReportingService
+from middlewared.plugins.reporting.netdata import Netdata
+from middlewared.pytest.unit.middleware import Middleware
+
+
+async def netdata_server(charts, delay=0):
+    requests = []
+    running = {'now': 0, 'max': 0}
+
+    async def handle_charts(request):
+        requests.append(request.path)
+        return web.json_response({'charts': charts})
+
+    async def handle_data(request):
+        requests.append(request.query['chart'])
+        running['now'] += 1
+        running['max'] = max(running['max'], running['now'])
+        await asyncio.sleep(delay)
+        running['now'] -= 1
+        return web.json_response({'labels': ['time', 'reads', 'writes'], 'data': [[1, 1, -2], [2, 3, -4]]})
+
+    app = web.Application()
+    app.router.add_get('/api/v1/charts', handle_charts)
+    app.router.add_get('/api/v1/data', handle_data)
+    server = TestServer(app)
+    await server.start_server()
+    return server, requests, running
+
+
+@pytest.mark.asyncio
+async def test__charts_are_cached_and_session_reused():
+    server, requests, running = await netdata_server({'disk.sda': {}})
+    try:
+        with patch('middlewared.plugins.reporting.netdata.client.NETDATA_URI', str(server.make_url('/api'))):
+            assert await asyncio.gather(Netdata.get_charts(), Netdata.get_charts()) == [{'disk.sda': {}}] * 2
+            session = Netdata.session()
+            assert await Netdata.get_charts() == {'disk.sda': {}}
+            assert Netdata.session() is session
+
+            with patch('middlewared.plugins.reporting.netdata.connector.NETDATA_CHARTS_CACHE_TTL', 0):
+                Netdata._charts_expire = 0
+                await Netdata.get_charts()
+                await Netdata.get_charts()
+
+        assert requests == ['/api/v1/charts'] * 3
+    finally:
+        await Netdata.close_session()
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test__netdata_get_data_concurrently():
+    server, requests, running = await netdata_server({}, delay=0.01)
+    m = Middleware()
+    m['reporting.translate_query_params'] = AsyncMock(return_value={'after': 0, 'before': 10})
+    try:
+        with patch('middlewared.plugins.reporting.netdata.client.NETDATA_URI', str(server.make_url('/api'))):
+            results = await ReportingService.netdata_get_data.wraps(
+                ReportingService(m), [{'name': 'disk', 'identifier': f'sd{i}'} for i in range(20)],
+                {'aggregate': True, 'points': None, 'downsample': 'MAX', 'encoding': 'ROWS'},
+            )
+
+        assert [r['identifier'] for r in results] == [f'sd{i}' for i in range(20)]
+        assert sorted(requests) == sorted(f'disk.sd{i}' for i in range(20))
+        assert results[0]['aggregations']['max'] == {'reads': 3, 'writes': 4}
+        assert 1 < running['max'] <= 8
+    finally:
+        await Netdata.close_session()
+        await server.close()
+
+
+def test__session_of_previous_loop_is_closed():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        async def session():
+            return Netdata.session()
+
+        previous = asyncio.run_coroutine_threadsafe(session(), loop).result()
+
+        async def replace_session():
+            try:
+                assert Netdata.session() is not previous
+            finally:
+                await Netdata.close_session()
+
+        asyncio.run(replace_session())
+
+        deadline = time.monotonic() + 1
+        while not previous.closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert previous.closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
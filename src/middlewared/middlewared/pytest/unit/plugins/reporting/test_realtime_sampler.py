@@ -0,0 +1,147 @@
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from middlewared.plugins.reporting.events import RealtimeEventSource
+from middlewared.plugins.reporting.iostat import DiskStats
+from middlewared.plugins.reporting.procfs import ProcFile
+from middlewared.plugins.reporting.sampler import parse_cpu, parse_meminfo, RealtimeSampler, Sample
+
+STAT = (
+    'cpu  300 0 30 3000 3 0 0 0 0 0\n'
+    'cpu0 100 0 10 1000 1 0 0 0 0 0\n'
+    'cpu1 200 0 20 2000 2 0 0 0 0 0\n'
+    'intr 1 2 3\n'
+    'ctxt 123\n'
+)
+DISKSTATS = (
+    '   8       0 sda 10 0 100 0 20 0 200 0 0 1000 0 0 0 0 0 0 0\n'
+    '   8       1 sda1 5 0 50 0 10 0 100 0 0 500 0 0 0 0 0 0 0\n'
+    ' 259       0 nvme0n1 1 0 8 0 2 0 16 0 0 10 0 0 0 0 0 0 0\n'
+    '   9       0 md127 7 0 7 0 7 0 7 0 0 7 0 0 0 0 0 0 0\n'
+)
+
+
+def procfile(tmp_path, contents, size=16):
+    path = tmp_path / 'file'
+    path.write_text(contents)
+    return ProcFile(str(path), size)
+
+
+def test__procfile_rereads_into_same_buffer(tmp_path):
+    f = procfile(tmp_path, 'x' * 40)
+    assert f.read() == 40
+    buffer = f.buffer
+
+    (tmp_path / 'file').write_text('y' * 10)
+    assert f.read() == 10
+    assert f.buffer is buffer
+    assert f.buffer[:10] == b'y' * 10
+    f.close()
+
+
+def test__parse_cpu(tmp_path):
+    counters, fields = parse_cpu(procfile(tmp_path, STAT))
+    assert fields == 10
+    assert list(counters[10:20]) == [100, 0, 10, 1000, 1, 0, 0, 0, 0, 0]
+    assert len(counters) == 30
+
+
+def test__parse_meminfo(tmp_path):
+    meminfo = parse_meminfo(procfile(tmp_path, (
+        'MemTotal:        1000 kB\n'
+        'Active:           100 kB\n'
+        'Active(anon):      50 kB\n'
+        'HugePages_Total:    0\n'
+    )))
+    assert meminfo == {'MemTotal': 1024000, 'Active': 102400}
+
+
+def test__disk_stats_read(tmp_path):
+    stats = DiskStats()
+    stats.diskstats = procfile(tmp_path, DISKSTATS)
+    assert stats.read() == (16, 158 * 512, 32, 316 * 512, 1510, 3)
+
+
+def sample(time, cpu, interfaces, disks):
+    s = Sample(time)
+    s.cpu, s.cpu_fields = cpu
+    s.meminfo = {k: 0 for k in (
+        'MemTotal', 'MemFree', 'Buffers', 'Cached', 'SwapCached', 'Active', 'Inactive', 'SwapTotal', 'SwapFree',
+        'Mapped', 'Slab', 'PageTables', 'Committed_AS', 'VmallocUsed',
+    )}
+    s.zfs = {'arc_max_size': 0, 'arc_size': 0, 'cache_hit_ratio': 0.0}
+    s.virtual_memory = {}
+    s.temperatures = {'0': 40.0}
+    s.interfaces = interfaces
+    s.disks = disks
+    return s
+
+
+def test__get_data(tmp_path):
+    prev = sample(
+        10, parse_cpu(procfile(tmp_path, STAT)), {'eth0': ('LINK_STATE_UP', 1000, 100, 200)}, (1, 2, 3, 4, 100, 2),
+    )
+    cur = sample(
+        12, parse_cpu(procfile(tmp_path, STAT.replace('cpu1 200', 'cpu1 210').replace('cpu  300', 'cpu  310'))),
+        {'eth0': ('LINK_STATE_UP', 1000, 300, 600)}, (2, 4, 6, 8, 500, 2),
+    )
+
+    data = RealtimeEventSource.get_data(prev, cur)
+
+    assert list(data['cpu']) == [0, 1, 'average', 'temperature_celsius', 'temperature']
+    assert data['cpu'][0]['usage'] == 0
+    assert data['cpu'][1]['user'] == 100
+    assert data['cpu']['temperature'] == {'0': 3132}
+    assert data['interfaces'] == {'eth0': {
+        'link_state': 'LINK_STATE_UP', 'speed': 1000, 'received_bytes': 200, 'sent_bytes': 400,
+        'received_bytes_rate': 100.0, 'sent_bytes_rate': 200.0,
+    }}
+    assert data['disks'] == {'read_opts': 1, 'read_bytes': 2, 'write_ops': 3, 'write_bytes': 4, 'busy': 100.0}
+    assert RealtimeEventSource.get_data(prev, cur) is data
+    assert 'interfaces' not in RealtimeEventSource.get_data(None, cur)
+
+
+def test__sampler_period():
+    sampler = RealtimeSampler(Mock(call_sync=Mock(return_value=[])))
+
+    with patch.object(sampler, 'sample', side_effect=lambda *args: Sample(time.monotonic())), \
+            patch('middlewared.plugins.reporting.sampler.ProcFile'), \
+            patch('middlewared.plugins.reporting.sampler.ZfsArcStats'), \
+            patch('middlewared.plugins.reporting.sampler.DiskStats'), \
+            patch('middlewared.plugins.reporting.sampler.IfStats'):
+        sampler.subscribe(4)
+        sampler.subscribe(6)
+        assert sampler.period == 2
+        thread = sampler.thread
+
+        assert sampler.wait(None, 5) is not None
+        assert sampler.thread is thread
+
+        sampler.unsubscribe(6)
+        assert sampler.period == 4
+        sampler.unsubscribe(4)
+        thread.join(5)
+        assert sampler.thread is None
+        assert not sampler.samples
+
+
+def test__sample_time_is_read_time(tmp_path):
+    sampler = RealtimeSampler(Mock(call_sync=Mock(return_value={})))
+    ifstats = Mock(read=Mock(return_value={}))
+    (tmp_path / 'meminfo').mkdir()
+    with patch('middlewared.plugins.reporting.sampler.time.monotonic', Mock(return_value=1234.5)):
+        s = sampler.sample(procfile(tmp_path, STAT), procfile(tmp_path / 'meminfo', 'MemTotal: 1 kB\n'), Mock(),
+                           Mock(), ifstats)
+
+    assert s.time == 1234.5
+    assert s.cpu_fields == 10
+
+
+@pytest.mark.parametrize('after,time', [(None, 14), (9, 10), (10.5, 12), (15, None)])
+def test__sampler_wait(after, time):
+    sampler = RealtimeSampler(Mock())
+    sampler.samples.extend(Sample(t) for t in (8, 10, 12, 14))
+    found = sampler.wait(after, 0)
+    assert (found.time if found else None) == time
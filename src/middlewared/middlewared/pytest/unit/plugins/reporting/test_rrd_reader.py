@@ -0,0 +1,303 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+
+from middlewared.plugins.reporting.rrd_reader import (
+    DS_DEF, LIVE_HEAD, PDP_PREP_SIZE, CDP_PREP_SIZE, RRA_DEF, RRA_PTR, RRD_FLOAT_COOKIE, STAT_HEAD,
+    RRDFlushError, RRDReader, RRDUnsupportedError, parse_start_end, parse_time, reduce_data, rpn_calc,
+)
+from middlewared.plugins.reporting.rrd_utils import RRDBase, RRDType
+
+NOW = 1700000000
+
+
+def write_rrd(path, pdp_step, ds, rras, last_up, value):
+    """
+    Writes an RRD file with `ds` data sources and `rras` (`(cf, pdp_cnt, row_cnt, cur_row)`) archives whose rows hold
+    `value(rra, ds, timestamp)`.
+    """
+    data = b''
+    for i, (cf, pdp_cnt, row_cnt, cur_row) in enumerate(rras):
+        step = pdp_step * pdp_cnt
+        rra_end = last_up - last_up % step
+        rows = np.empty((row_cnt, len(ds)))
+        for k in range(row_cnt):
+            # `cur_row` holds the most recent row
+            timestamp = rra_end - ((cur_row - k) % row_cnt) * step
+            rows[k] = [value(i, j, timestamp) for j in range(len(ds))]
+        data += rows.astype('<f8').tobytes()
+
+    with open(path, 'wb') as f:
+        f.write(STAT_HEAD.pack(b'RRD\0', b'0003\0', RRD_FLOAT_COOKIE, len(ds), len(rras), pdp_step))
+        for name in ds:
+            f.write(DS_DEF.pack(name.encode(), b'GAUGE'))
+        for cf, pdp_cnt, row_cnt, cur_row in rras:
+            f.write(RRA_DEF.pack(cf.encode(), row_cnt, pdp_cnt))
+        f.write(LIVE_HEAD.pack(last_up, 0))
+        f.write(b'\0' * (PDP_PREP_SIZE * len(ds) + CDP_PREP_SIZE * len(ds) * len(rras)))
+        for cf, pdp_cnt, row_cnt, cur_row in rras:
+            f.write(RRA_PTR.pack(cur_row))
+        f.write(data)
+
+
+@pytest.fixture()
+def rrd_file(tmp_path):
+    path = str(tmp_path / 'memory.rrd')
+    # 10 second rows for an hour and 80 second rows for a day, unknown before `NOW - 3000`
+    write_rrd(
+        path, 10, ['used', 'free'], [('AVERAGE', 1, 360, 17), ('AVERAGE', 8, 1080, 500), ('MAX', 1, 360, 0)],
+        NOW, lambda rra, ds, t: np.nan if t <= NOW - 3000 else (t - NOW) * (1 if ds == 0 else -1),
+    )
+    return path
+
+
+def test__header(rrd_file):
+    header = RRDReader().header(rrd_file)
+    assert header.ds == ['used', 'free']
+    assert header.pdp_step == 10
+    assert header.last_up == NOW
+    assert [rra[:4] for rra in header.rras] == [('AVERAGE', 360, 1, 17), ('AVERAGE', 1080, 8, 500), ('MAX', 360, 1, 0)]
+
+
+def test__header_cached_until_file_changes(rrd_file):
+    reader = RRDReader()
+    header = reader.header(rrd_file)
+    assert reader.header(rrd_file) is header
+
+    os.utime(rrd_file, ns=(0, 0))
+    assert reader.header(rrd_file) is not header
+
+
+def test__fetch_wraps_archive(rrd_file):
+    data, start, end, step = RRDReader().fetch(rrd_file, 'free', 'AVERAGE', NOW - 600, NOW, 1)
+    assert (start, end, step) == (NOW - 600, NOW, 10)
+    np.testing.assert_array_equal(data, -np.arange(NOW - 590, NOW + 1, 10) + NOW)
+
+
+def test__fetch_unknown_outside_archive(rrd_file):
+    data, start, end, step = RRDReader().fetch(rrd_file, 'used', 'AVERAGE', NOW - 3600 - 100, NOW + 30, 1)
+    # The first hour archive does not cover the start, the day archive is chosen
+    assert step == 80
+    timestamps = np.arange(start + step, end + 1, step)
+    expected = np.where(timestamps <= NOW - 3000, np.nan, timestamps - NOW)
+    expected[timestamps > NOW - NOW % 80] = np.nan
+    np.testing.assert_array_equal(data, expected)
+
+
+def test__fetch_missing_ds(rrd_file):
+    with pytest.raises(RuntimeError, match="No DS called 'cached'"):
+        RRDReader().fetch(rrd_file, 'cached', 'AVERAGE', NOW - 600, NOW, 1)
+
+
+def test__reduce_data():
+    data = np.array([1, 2, np.nan, 4, np.nan, np.nan, 7, 8, 9])
+    # Rows for (100, 190] consolidated to 30 seconds rows for (90, 210], partial rows are unknown
+    result, start, end = reduce_data('AVERAGE', data, 100, 190, 10, 30)
+    assert (start, end) == (90, 210)
+    np.testing.assert_array_equal(result, [np.nan, 4, 7.5, np.nan])
+
+    result, start, end = reduce_data('MAX', data[1:7], 110, 170, 10, 30)
+    np.testing.assert_array_equal(result, [np.nan, 4, np.nan])
+
+
+def test__rpn_calc():
+    variables = {'a': np.array([1., 5., np.nan]), 'b': np.array([2., 2., 2.])}
+    np.testing.assert_array_equal(rpn_calc('a,b,+,2,*'.split(','), variables, 3), [6, 14, np.nan])
+    np.testing.assert_array_equal(rpn_calc('a,b,LT'.split(','), variables, 3), [1, 0, np.nan])
+    np.testing.assert_array_equal(rpn_calc('a,UN,0,a,IF'.split(','), variables, 3), [1, 5, 0])
+    # Unknown is true
+    np.testing.assert_array_equal(rpn_calc('a,b,LT,b,0,IF'.split(','), variables, 3), [2, 0, 2])
+
+    with pytest.raises(RRDUnsupportedError):
+        rpn_calc('a,TREND'.split(','), variables, 3)
+
+
+@pytest.mark.parametrize('spec,expected', [
+    ('now', NOW),
+    ('1600000000', 1600000000),
+    ('now-1h', NOW - 3600),
+    ('now-10m', NOW - 600),
+    ('now-2w+1d', NOW - 13 * 86400),
+])
+def test__parse_time(spec, expected):
+    assert parse_time(spec, NOW) == expected
+
+
+def test__parse_time_months():
+    tm = time.localtime(NOW)
+    expected = time.mktime((tm.tm_year, tm.tm_mon - 1, tm.tm_mday, tm.tm_hour, tm.tm_min, tm.tm_sec, 0, 0, -1))
+    assert parse_time('now-1m', NOW) == expected
+    assert parse_time('now-1mon', NOW) == expected
+
+
+def test__parse_start_end():
+    assert parse_start_end('end-1d', 'now-1d', NOW) == (NOW - 2 * 86400, NOW - 86400)
+    assert parse_start_end('now-1h', 'start+10min', NOW) == (NOW - 3600, NOW - 3000)
+
+    with pytest.raises(RRDUnsupportedError):
+        parse_start_end('yesterday', 'now', NOW)
+    with pytest.raises(RuntimeError):
+        parse_start_end('now', 'now-1h', NOW)
+
+
+def test__xport(rrd_file):
+    path = rrd_file.replace(':', r'\:')
+    with patch('time.time', Mock(return_value=NOW + 5)):
+        meta, values = RRDReader().xport([
+            f'DEF:used={path}:used:AVERAGE',
+            f'DEF:free={path}:free:AVERAGE',
+            'CDEF:total=used,free,-',
+            'XPORT:used:used',
+            'XPORT:total:total',
+        ], 'end-1h', 'now', flush=False)
+
+    # 3600 / 400 requested step, 10 seconds rows are consolidated to 10 * ceil(9 / 10)
+    assert meta == {'start': NOW - 3600 + 10, 'end': NOW + 10, 'step': 10, 'legend': ['used', 'total']}
+    timestamps = np.arange(meta['start'], meta['end'] + 1, meta['step'], dtype=np.float64)
+    used = np.where(timestamps <= NOW - 3000, np.nan, timestamps - NOW)
+    used[timestamps > NOW] = np.nan
+    np.testing.assert_array_equal(values, np.column_stack((used, used * 2)))
+
+
+def test__xport_reduces_to_requested_step(rrd_file):
+    with patch('time.time', Mock(return_value=NOW)):
+        meta, values = RRDReader().xport(
+            [f'DEF:used={rrd_file}:used:MAX', 'XPORT:used:used'], 'end-2h', 'now', flush=False,
+        )
+
+    # Only the MAX hour archive (10 seconds rows) that does not cover the start, 7200 / 400 = 18 seconds requested
+    assert meta['step'] == 20
+    assert values.shape == ((7200 + 20) // 20, 1)
+    # Maximum of each pair of rows, the end is aligned to the step so there is an extra unknown row
+    np.testing.assert_array_equal(values[-4:, 0], [-40, -20, 0, np.nan])
+
+
+def test__xport_unsupported(rrd_file):
+    with pytest.raises(RRDUnsupportedError):
+        RRDReader().xport([f'DEF:used={rrd_file}:used:AVERAGE:step=60', 'XPORT:used'], 'end-1h', 'now')
+
+
+def test__flush(tmp_path):
+    path = str(tmp_path / 'rrdcached.sock')
+    requests = []
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        with conn, conn.makefile('r') as f:
+            for i in range(3):
+                requests.append(line := f.readline())
+                if 'missing' in line:
+                    conn.sendall(b'-1 No such file: /missing.\n')
+                else:
+                    conn.sendall(b'0 Successfully flushed.\n')
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    RRDReader(path).flush(['/a b.rrd', '/missing', '/c.rrd', '/a b.rrd'])
+    thread.join(5)
+    server.close()
+
+    assert requests == ['FLUSH /a\\ b.rrd\n', 'FLUSH /missing\n', 'FLUSH /c.rrd\n']
+
+
+def test__flush_error(tmp_path):
+    with pytest.raises(RRDFlushError, match='Unable to flush'):
+        RRDReader(str(tmp_path / 'missing.sock')).flush(['/a.rrd'])
+
+
+class MemoryPlugin(RRDBase):
+    plugin = 'memory'
+    name = 'test_rrd_reader_memory'
+    rrd_types = (
+        RRDType('memory', 'used'),
+        RRDType('memory', 'free', '%name%,-1,*'),
+    )
+
+
+def test__export_native(tmp_path, rrd_file):
+    reader = RRDReader()
+    plugin = MemoryPlugin(Mock())
+    with patch.object(MemoryPlugin, 'get_rrd_file', Mock(return_value=rrd_file)):
+        with patch('subprocess.run') as run:
+            data = plugin.export(None, str(NOW - 600), str(NOW), reader=reader, flush=False)
+
+    run.assert_not_called()
+    assert data['legend'] == ['memory_used', 'memory_free']
+    assert data['step'] == 10
+    assert data['data'][-2:] == [[0, 0], [None, None]]
+    assert data['data'][0] == [-590, -590]
+    assert data['aggregations']['min'] == [-590, -590]
+
+
+def test__export_native_flush_error(tmp_path, rrd_file):
+    plugin = MemoryPlugin(Mock())
+    with patch.object(MemoryPlugin, 'get_rrd_file', Mock(return_value=rrd_file)):
+        data = plugin.export(None, str(NOW - 600), str(NOW), reader=RRDReader(str(tmp_path / 'missing.sock')))
+
+    assert data['data'][0] == [-590, -590]
+    plugin.middleware.logger.warning.assert_called_once()
+
+
+def test__export_native_future_update(tmp_path, rrd_file):
+    plugin = MemoryPlugin(Mock())
+    with patch.object(MemoryPlugin, 'get_rrd_file', Mock(return_value=rrd_file)):
+        with patch('middlewared.plugins.reporting.rrd_utils.time.time', Mock(return_value=NOW - 3600)):
+            with pytest.raises(Exception, match='has update time in the future'):
+                plugin.export(None, str(NOW - 600), str(NOW), reader=RRDReader(), flush=False)
+
+
+@pytest.mark.skipif(shutil.which('rrdtool') is None, reason='rrdtool is not installed')
+@pytest.mark.parametrize('start,end', [
+    ('end-1h', 'now'), ('end-1d', 'now'), ('end-1w', 'now-1d'), ('end-7000s', 'now-123s'),
+])
+def test__xport_matches_rrdtool(tmp_path, start, end):
+    path = str(tmp_path / 'test.rrd')
+    now = int(time.time())
+    first = now - 8 * 86400
+    subprocess.run([
+        'rrdtool', 'create', path, '--start', str(first - 10), '--step', '10',
+        'DS:a:GAUGE:20:U:U', 'DS:b:GAUGE:20:U:U',
+        'RRA:AVERAGE:0.5:1:1200', 'RRA:AVERAGE:0.5:8:1200', 'RRA:AVERAGE:0.5:51:1200', 'RRA:MAX:0.5:8:1200',
+    ], check=True)
+    rng = np.random.default_rng(0)
+    updates = [
+        f'{t}:{rng.random() * 100:.6f}:{"U" if (t // 3000) % 7 == 0 else f"{rng.random():.6f}"}'
+        for t in range(first, now - 30, 10)
+    ]
+    for i in range(0, len(updates), 1000):
+        subprocess.run(['rrdtool', 'update', path, *updates[i:i + 1000]], check=True)
+
+    args = [
+        f'DEF:a={path}:a:AVERAGE', f'DEF:b={path}:b:AVERAGE', f'DEF:m={path}:a:MAX',
+        'CDEF:c=b,UN,0,b,IF,a,*', 'CDEF:d=a,50,GT,m,a,IF', 'XPORT:a:a', 'XPORT:c:c', 'XPORT:d:d',
+    ]
+    cp = subprocess.run(['rrdtool', 'xport', '--json', '--start', start, '--end', end, *args], capture_output=True)
+    assert cp.returncode == 0, cp.stderr
+    expected = json.loads(cp.stdout)
+
+    meta, values = RRDReader().xport(args, start, end, flush=False)
+    assert {k: expected['meta'][k] for k in meta} == meta
+    np.testing.assert_allclose(values, np.array(expected['data'], dtype=np.float64), rtol=1e-9)
+
+
+def test__export_falls_back_to_rrdtool(rrd_file):
+    plugin = MemoryPlugin(Mock())
+    meta = {'start': NOW - 590, 'end': NOW, 'step': 10, 'legend': ['memory_used']}
+    with patch.object(MemoryPlugin, 'get_rrd_file', Mock(return_value=rrd_file)):
+        with patch.object(MemoryPlugin, 'get_defs', Mock(return_value=[f'DEF:used={rrd_file}:used:AVERAGE:step=60'])):
+            with patch.object(MemoryPlugin, '_export_rrdtool', Mock(return_value=(meta, np.ones((60, 1))))) as export:
+                data = plugin.export(None, str(NOW - 600), str(NOW), reader=RRDReader(), flush=False)
+
+    export.assert_called_once_with(None, str(NOW - 600), str(NOW))
+    assert data['data'] == [[1.0]] * 60
@@ -0,0 +1,127 @@
+import json
+import math
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+
+from middlewared.plugins.reporting.plugins import MemoryPlugin
+from middlewared.plugins.reporting.series import (
+    aggregate, downsample_lttb, downsample_max, encode, load_json_series,
+)
+
+RRD_XPORT = b'''{ "about": "RRDtool graph JSON output",
+  "meta": {
+    "start": 1000,
+    "end": 1060,
+    "step": 10,
+    "legend": [
+      "used",
+      "free"
+    ]
+  },
+  "data": [
+    [ 1.0000000000e+00, null ],
+    [ 3.0000000000e+00, 2.5e+01 ],
+    [ null, null ],
+    [ 2.0000000000e+00, -5.0e-01 ],
+    [ 8.0000000000e+00, 1.0e+00 ],
+    [ 4.0000000000e+00, 2.0e+00 ]
+  ]
+}
+'''
+
+
+def test__load_json_series():
+    meta, values = load_json_series(RRD_XPORT, 'meta.legend')
+    assert meta == {
+        'about': 'RRDtool graph JSON output',
+        'meta': {'start': 1000, 'end': 1060, 'step': 10, 'legend': ['used', 'free']},
+    }
+    assert values.shape == (6, 2)
+    assert np.array_equal(
+        values, np.array(json.loads(RRD_XPORT)['data'], dtype=np.float64), equal_nan=True,
+    )
+
+
+@pytest.mark.parametrize('payload', [
+    b'{"data": [[1, 2], [3, 4]], "labels": ["a", "b"]}',
+    b'{"labels": ["a", "b"], "data": []}',
+])
+def test__load_json_series_fallback(payload):
+    meta, values = load_json_series(payload, 'labels')
+    assert meta == {'labels': ['a', 'b']}
+    assert values.shape[1] == 2
+
+
+def test__aggregate():
+    values = np.array([[1, np.nan], [3, np.nan], [np.nan, np.nan]])
+    assert aggregate(values, ('min', 'mean', 'max')) == {
+        'min': [1, None], 'mean': [2, None], 'max': [3, None],
+    }
+    assert aggregate(np.empty((0, 2)), ('max',)) == {'max': [None, None]}
+    with pytest.raises(RuntimeError):
+        aggregate(values, ('median',))
+
+
+def test__downsample_max():
+    values = np.column_stack((np.arange(10) * 10, [1, 5, 2, np.nan, np.nan, np.nan, 3, 0, 9, 1]))
+    result = downsample_max(values, 4)
+    assert np.array_equal(result, [[0, 5], [30, np.nan], [60, 9], [90, 1]], equal_nan=True)
+
+
+def test__downsample_lttb():
+    x = np.arange(1000)
+    y = np.sin(x / 50)
+    y[437] = 100
+    result = downsample_lttb(np.column_stack((x, y, np.full(1000, np.nan))), 50)
+    assert result.shape == (50, 3)
+    assert result[0, 0] == 0 and result[-1, 0] == 999
+    assert np.all(np.diff(result[:, 0]) > 0)
+    assert 437 in result[:, 0]
+
+
+def test__downsample_lttb_gaps():
+    x = np.arange(100)
+    y = np.full(100, 10.0)
+    # Gaps must not be treated as zeros
+    y[20:30] = np.nan
+    y[70:80] = np.nan
+    y[72] = 50
+    result = downsample_lttb(np.column_stack((x, y, np.where(x < 50, np.nan, 5.0))), 10)
+    assert result.shape == (10, 3)
+    assert not np.isnan(result[:, 1]).any()
+    assert 72 in result[:, 0]
+
+    # Rows that are gaps in all series are kept only from buckets that have nothing else
+    y = np.full(100, np.nan)
+    y[::20] = 1
+    result = downsample_lttb(np.column_stack((x, y)), 10)
+    assert np.count_nonzero(~np.isnan(result[:, 1])) == 5
+
+
+def test__encode():
+    values = np.array([[1000, 1.5, np.nan], [1010, 2, 3]])
+    assert encode(values, 'ROWS', int_columns=1) == [[1000, 1.5, None], [1010, 2.0, 3.0]]
+    assert encode(values, 'COLUMNS', int_columns=1) == [[1000, 1010], [1.5, 2.0], [None, 3.0]]
+    assert encode(values[:, 1:], 'ROWS') == [[1.5, None], [2.0, 3.0]]
+
+
+@pytest.mark.parametrize('kwargs,expected', [
+    ({}, {'step': 10, 'data': [[1, None], [3, 25], [None, None], [2, -0.5], [8, 1], [4, 2]]}),
+    ({'points': 3}, {'step': 20, 'data': [[3, 25], [2, -0.5], [8, 2]]}),
+    ({'points': 3, 'downsample_method': 'LTTB', 'encoding': 'COLUMNS'}, {
+        'step': 10, 'timestamps': [1000, 1010, 1050], 'data': [[1, 3, 4], [None, 25, 2]],
+    }),
+])
+def test__rrd_export(kwargs, expected):
+    def run(args, **kwargs):
+        return Mock(returncode=0, stdout='' if args[1] == 'info' else RRD_XPORT)
+
+    with patch('middlewared.plugins.reporting.rrd_utils.subprocess.run', run):
+        data = MemoryPlugin(None).export(None, 'end-1h', 'now', **kwargs)
+
+    assert data['aggregations'] == {'min': [1, -0.5], 'mean': [3.6, 27.5 / 4], 'max': [8, 25]}
+    assert {k: data.get(k) for k in expected} == expected
+    assert data['legend'] == ['used', 'free']
+    assert not math.isnan(data['start'])
@@ -0,0 +1,251 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+import threading
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from middlewared.alert.base import Alert, AlertSource, ThreadedAlertSource, UnavailableException
+from middlewared.plugins import alert as alert_plugin
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.service_exception import CallError
+
+
+class SleepAlertSource(AlertSource):
+    def __init__(self, middleware, name, seconds, run_timeout=30):
+        super().__init__(middleware)
+        self._name = name
+        self.seconds = seconds
+        self.run_timeout = run_timeout
+
+    @property
+    def name(self):
+        return self._name
+
+    async def check(self):
+        await asyncio.sleep(self.seconds)
+        return Alert(alert_plugin.TestAlertClass, {"source": self._name})
+
+
+def alert_service(sources):
+    m = Middleware()
+    m["alert.product_type"] = AsyncMock(return_value="SCALE_ENTERPRISE")
+    m["failover.licensed"] = AsyncMock(return_value=True)
+    m["failover.node"] = AsyncMock(return_value="A")
+    m["system.version"] = AsyncMock(return_value="1")
+
+    async def call_remote(method, args=None, options=None):
+        if method == "alert.run_sources":
+            return {name: [{"klass": "Test", "args": {"source": name}, "source": name, "key": "remote",
+                            "datetime": datetime.utcnow(), "last_occurrence": datetime.utcnow(), "dismissed": False,
+                            "mail": None}] for name in args[0]}
+        return {"system.version": "1", "system.state": "READY", "failover.status": "BACKUP"}[method]
+
+    m["failover.call_remote"] = AsyncMock(side_effect=call_remote)
+
+    service = alert_plugin.AlertService(m)
+    service.alerts = alert_plugin.AlertStore()
+    service.persisted_alerts = None
+    service.stale_alert_ids = []
+    service.alert_source_last_run = defaultdict(lambda: datetime.min)
+    return service, patch.dict("middlewared.plugins.alert.ALERT_SOURCES", {s.name: s for s in sources}, clear=True)
+
+
+@pytest.mark.asyncio
+async def test__sources_run_concurrently():
+    sources = [SleepAlertSource(None, f"Sleep{i}", 0.2) for i in range(4)]
+    service, alert_sources = alert_service(sources)
+    with alert_sources:
+        start = time.monotonic()
+        await service._AlertService__run_alerts()
+        assert time.monotonic() - start < 0.6
+
+    assert sorted((alert.node, alert.source) for alert in service.alerts) == sorted(
+        [("A", f"Sleep{i}") for i in range(4)] + [("B", f"Sleep{i}") for i in range(4)]
+    )
+
+
+@pytest.mark.asyncio
+async def test__backup_node_sources_are_batched():
+    sources = [SleepAlertSource(None, f"Sleep{i}", 0) for i in range(3)]
+    sources[1].run_on_backup_node = False
+    service, alert_sources = alert_service(sources)
+    with alert_sources:
+        await service._AlertService__run_alerts()
+
+    run_sources_calls = [
+        c for c in service.middleware["failover.call_remote"].call_args_list if c.args[0] == "alert.run_sources"
+    ]
+    assert len(run_sources_calls) == 1
+    assert run_sources_calls[0].args[1] == [["Sleep0", "Sleep2"]]
+    assert sorted(alert.source for alert in service.alerts if alert.node == "B") == ["Sleep0", "Sleep2"]
+
+
+@pytest.mark.asyncio
+async def test__source_timeout():
+    sources = [SleepAlertSource(None, "Slow", 0, run_timeout=0.1), SleepAlertSource(None, "Fast", 0)]
+    service, alert_sources = alert_service(sources)
+    with alert_sources:
+        await service._AlertService__run_alerts()
+
+        sources[0].seconds = 5
+        start = time.monotonic()
+        await service._AlertService__run_alerts()
+        assert time.monotonic() - start < 1
+
+    slow = sorted(
+        [alert for alert in service.alerts if alert.source == "Slow" and alert.node == "A"],
+        key=lambda alert: alert.klass.name,
+    )
+    assert [alert.klass.name for alert in slow] == ["AlertSourceRunFailed", "Test"]
+    assert slow[0].args["traceback"] == "Timed out after 0.1 seconds"
+
+    stats = await service.sources_stats()
+    assert stats["Slow"]["timeouts"] == 1
+    assert stats["Slow"]["histogram"][:2] == [{"le": 0.1, "count": 1}, {"le": 0.5, "count": 2}]
+    assert stats["Fast"]["timeouts"] == 0
+    assert stats["Fast"]["histogram"][0] == {"le": 0.1, "count": 2}
+    assert stats["Fast"]["histogram"][-1] == {"le": None, "count": 2}
+
+
+@pytest.mark.asyncio
+async def test__run_sources_unavailable():
+    class UnavailableAlertSource(SleepAlertSource):
+        async def check(self):
+            raise UnavailableException()
+
+    sources = [SleepAlertSource(None, "Sleep", 0), UnavailableAlertSource(None, "Unavailable", 0)]
+    service, alert_sources = alert_service(sources)
+    with alert_sources:
+        result = await service.run_sources(["Sleep", "Unavailable"])
+
+    assert result["Unavailable"] is None
+    assert [alert["args"] for alert in result["Sleep"]] == [{"source": "Sleep"}]
+
+
+@pytest.mark.asyncio
+async def test__run_sources_failure():
+    class BrokenAlertSource(SleepAlertSource):
+        async def check(self):
+            return ["not an alert"]
+
+    sources = [SleepAlertSource(None, "Sleep", 0), BrokenAlertSource(None, "Broken", 0)]
+    service, alert_sources = alert_service(sources)
+    with alert_sources:
+        result = await service.run_sources(["Broken", "Sleep"])
+
+    assert [(alert["klass"], alert["source"]) for alert in result["Broken"]] == [("AlertSourceRunFailed", "Broken")]
+    assert [alert["args"] for alert in result["Sleep"]] == [{"source": "Sleep"}]
+
+
+@pytest.mark.asyncio
+async def test__backup_node_without_run_sources():
+    sources = [SleepAlertSource(None, f"Sleep{i}", 0) for i in range(2)]
+    service, alert_sources = alert_service(sources)
+    call_remote = service.middleware["failover.call_remote"].side_effect
+
+    async def old_call_remote(method, args=None, options=None):
+        if method == "alert.run_sources":
+            raise CallError("Method not found", CallError.ENOMETHOD)
+        if method == "alert.run_source":
+            return (await call_remote("alert.run_sources", [args]))[args[0]]
+        return await call_remote(method, args, options)
+
+    service.middleware["failover.call_remote"].side_effect = old_call_remote
+    with alert_sources:
+        await service._AlertService__run_alerts()
+
+    assert sorted((alert.klass.name, alert.source) for alert in service.alerts if alert.node == "B") == [
+        ("Test", "Sleep0"), ("Test", "Sleep1"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test__threaded_source_still_running():
+    finish = threading.Event()
+
+    class BlockingAlertSource(ThreadedAlertSource):
+        name = "Blocking"
+        run_timeout = 0.1
+        checks = 0
+
+        def check_sync(self):
+            BlockingAlertSource.checks += 1
+            finish.wait(5)
+            return Alert(alert_plugin.TestAlertClass, {"source": self.name})
+
+    service, alert_sources = alert_service([])
+    source = BlockingAlertSource(service.middleware)
+    service.middleware.run_in_thread = lambda method, *args: asyncio.get_event_loop().run_in_executor(
+        None, method, *args,
+    )
+    with alert_sources:
+        alert_plugin.ALERT_SOURCES["Blocking"] = source
+        assert (await service.run_source("Blocking"))[0]["klass"] == "AlertSourceRunFailed"
+        with pytest.raises(CallError) as ve:
+            await service.run_source("Blocking")
+        assert ve.value.errno == CallError.EALERTCHECKERUNAVAILABLE
+
+        finish.set()
+        while service.sources_checks:
+            await asyncio.sleep(0.01)
+
+        assert (await service.run_source("Blocking"))[0]["klass"] == "Test"
+        assert BlockingAlertSource.checks == 2
+
+
+def test__alert_store():
+    store = alert_plugin.AlertStore()
+    a = Alert(alert_plugin.TestAlertClass, {"n": 1}, node="A", _source="Source", _uuid="1")
+    b = Alert(alert_plugin.TestAlertClass, {"n": 2}, node="B", _source="Source", _uuid="2")
+    c = Alert(alert_plugin.TestAlertClass, {"n": 1}, node="A", _source="Other", _uuid="3")
+    for alert in (a, b, c):
+        store.add(alert)
+
+    assert list(store) == [a, b, c]
+    assert store.get(Alert(alert_plugin.TestAlertClass, {"n": 1}, node="A", _source="Source")) is a
+    assert store.get_by_uuid("2") is b
+    assert store.source_alerts("Source", "B") == [b]
+
+    a2 = Alert(alert_plugin.TestAlertClass, {"n": 1}, node="A", _source="Source", _uuid="1")
+    store.replace_source("Source", [a2])
+    assert list(store) == [c, a2]
+    assert store.get_by_uuid("2") is None
+    assert not store.discard(a)
+    assert store.discard(a2)
+    assert list(store) == [c]
+
+
+@pytest.mark.asyncio
+async def test__flush_alerts_writes_changes():
+    service, alert_sources = alert_service([])
+    service.middleware["failover.status"] = AsyncMock(return_value="MASTER")
+    bulk = service.middleware["datastore.bulk"] = AsyncMock(
+        side_effect=lambda operations: [10 + i for i in range(len(operations))]
+    )
+    a = Alert(alert_plugin.TestAlertClass, {"n": 1}, node="A", _source="Source", _uuid="1")
+    b = Alert(alert_plugin.TestAlertClass, {"n": 2}, node="A", _source="Source", _uuid="2")
+    service.alerts.add(a)
+    service.alerts.add(b)
+
+    # The database contents are unknown at first
+    await service.flush_alerts()
+    assert [(o["method"], o.get("id_or_filters")) for o in bulk.call_args.args[0]] == [
+        ("delete", []), ("insert", None), ("insert", None),
+    ]
+
+    bulk.reset_mock()
+    await service.flush_alerts()
+    bulk.assert_not_called()
+
+    a.dismissed = True
+    service.alerts.discard(b)
+    service.alerts.add(Alert(alert_plugin.TestAlertClass, {"n": 3}, node="A", _source="Source", _uuid="3"))
+    await service.flush_alerts()
+    assert [(o["method"], o.get("id_or_filters")) for o in bulk.call_args.args[0]] == [
+        ("delete", 12), ("update", 11), ("insert", None),
+    ]
+    assert bulk.call_args.args[0][1]["data"]["dismissed"] is True
+    assert {uuid: id_ for uuid, (id_, row) in service.persisted_alerts.items()} == {"1": 11, "3": 12}
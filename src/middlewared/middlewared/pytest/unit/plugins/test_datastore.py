@@ -1,10 +1,13 @@
+import asyncio
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 import datetime
-from unittest.mock import ANY, patch
+from unittest.mock import ANY, call, Mock, patch
 
 import pytest
 import sqlalchemy as sa
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -14,6 +17,8 @@ import middlewared.plugins.datastore  # noqa
 import middlewared.plugins.datastore.connection  # noqa
 import middlewared.plugins.datastore.schema  # noqa
 import middlewared.plugins.datastore.util  # noqa
+from middlewared.plugins.datastore.filter import filters_params
+from middlewared.plugins.datastore.read import DatastoreService as DatastoreReadService
 
 from middlewared.pytest.unit.helpers import load_compound_service
 from middlewared.pytest.unit.middleware import Middleware
@@ -24,9 +29,9 @@ Model = declarative_base()
 
 
 @asynccontextmanager
-async def datastore_test():
+async def datastore_test(database=":memory:"):
     m = Middleware()
-    with patch("middlewared.plugins.datastore.connection.FREENAS_DATABASE", ":memory:"):
+    with patch("middlewared.plugins.datastore.connection.FREENAS_DATABASE", database):
         with patch("middlewared.plugins.datastore.schema.Model", Model):
             with patch("middlewared.plugins.datastore.util.Model", Model):
                 ds = DatastoreService(m)
@@ -41,12 +46,15 @@ async def datastore_test():
 
                 m["datastore.execute"] = ds.execute
                 m["datastore.execute_write"] = ds.execute_write
+                m["datastore.execute_write_transaction"] = ds.execute_write_transaction
                 m["datastore.fetchall"] = ds.fetchall
 
                 m["datastore.query"] = ds.query
                 m["datastore.send_insert_events"] = ds.send_insert_events
                 m["datastore.send_update_events"] = ds.send_update_events
                 m["datastore.send_delete_events"] = ds.send_delete_events
+                m["datastore.hold_events"] = ds.hold_events
+                m["datastore.release_events"] = ds.release_events
 
                 m["datastore.update"] = ds.update
 
@@ -331,6 +339,43 @@ async def test__string_filters(filter, ids):
         assert [row["id"] for row in await ds.query("test.string", filter)] == ids
 
 
+@pytest.mark.asyncio
+async def test__query_cache():
+    with patch.object(DatastoreReadService, "query_cache", OrderedDict()) as query_cache:
+        async with datastore_test() as ds:
+            ds.execute("INSERT INTO test_string VALUES (1, 'Lorem')")
+            ds.execute("INSERT INTO test_string VALUES (2, 'Ipsum')")
+            ds.execute("INSERT INTO test_string VALUES (3, NULL)")
+
+            for filters, ids in [
+                ([("string", "=", "Lorem")], [1]),
+                ([("string", "=", "Ipsum")], [2]),
+                ([("string", "=", None)], [3]),
+                ([("OR", [("string", "in", ["Lorem", None]), ("id", ">", 1)])], [1, 2, 3]),
+                ([("OR", [("string", "in", ["Ipsum"]), ("id", ">", 2)])], [2, 3]),
+                ([("OR", [("string", "in", []), ("id", ">", 2)])], [3]),
+            ]:
+                assert [row["id"] for row in await ds.query("test.string", filters)] == ids
+
+            # `=` with a value and with `None`, `in` with and without `None`
+            assert len(query_cache) == 4
+
+
+@pytest.mark.parametrize("filters", [
+    [("string", "=", "Lorem"), ("id", "!=", None)],
+    [("OR", [("string", "in", ["Lorem", None]), ("string", "nin", [None]), ("string", "^", "L")])],
+    [("string", "~", "L.*m"), ("OR", [("id", "in", {1, 2}), ("id", "=", 3)])],
+])
+@pytest.mark.asyncio
+async def test__filters_params(filters):
+    async with datastore_test() as ds:
+        part = [part for part in ds.parts if isinstance(part, DatastoreReadService)][0]
+        params = {}
+        part._filters_to_queryset(filters, part._get_table("test.string"), "", {}, params)
+
+        assert params == filters_params(filters)
+
+
 @pytest.mark.asyncio
 async def test_delete_not_in():
     async with datastore_test() as ds:
@@ -731,6 +776,19 @@ async def test__insert_integer_pk_record():
         assert len(await ds.query("test.bigintegerprimarykey", [["integer_id", "=", pk]])) == 1
 
 
+@pytest.mark.asyncio
+async def test__bulk_insert_non_integer_pk_records():
+    async with datastore_test() as ds:
+        assert await ds.bulk([
+            {"method": "insert", "name": "test.stringprimarykey", "data": {"string_id": "key", "value": 1}},
+            {"method": "insert", "name": "test.bigintegerprimarykey", "data": {"integer_id": 120093877, "value": 1}},
+            {"method": "insert", "name": "test.bigintegerprimarykey", "data": {"integer_id": 120093878, "value": 2}},
+        ]) == ["key", 120093877, 120093878]
+
+        with pytest.raises(KeyError):
+            await ds.bulk([{"method": "insert", "name": "test.bigintegerprimarykey", "data": {"value": 3}}])
+
+
 class SMBModel(Model):
     __tablename__ = 'test_smb'
 
@@ -790,3 +848,182 @@ async def test__null_order_by(order_by, result):
         await ds.insert("test.null", {"value": 1})
 
         assert [row["id"] for row in await ds.query("test.null", [], {"order_by": order_by})] == result
+
+
+@asynccontextmanager
+async def datastore_events_test(rows):
+    from middlewared.plugins.datastore.event import DatastoreService as DatastoreEventService
+
+    with patch.multiple(DatastoreEventService, events=defaultdict(list), pending_events=defaultdict(dict),
+                        held_events={}, flushes={}):
+        async with datastore_test() as ds:
+            ds.middleware.create_task = lambda coro: asyncio.get_running_loop().create_task(coro)
+            ds.middleware["group.query"] = Mock(side_effect=ds.middleware._query_filter(rows))
+            await ds.register_event({
+                "description": "Groups",
+                "datastore": "account.bsdgroups",
+                "plugin": "group",
+            })
+            yield ds
+
+
+async def sent_events():
+    from middlewared.plugins.datastore.event import DatastoreService as DatastoreEventService
+
+    while DatastoreEventService.flushes:
+        await asyncio.gather(*DatastoreEventService.flushes.values())
+
+
+@pytest.mark.asyncio
+async def test__held_events_are_coalesced_and_queried_at_once():
+    async with datastore_events_test([
+        {"id": 2, "bsdgrp_gid": 2020},
+        {"id": 3, "bsdgrp_gid": 3030},
+        {"id": 4, "bsdgrp_gid": 4040},
+    ]) as ds:
+        hold = await ds.hold_events()
+        await ds.insert("account.bsdgroups", {"bsdgrp_gid": 1010}, {"events_hold": hold})
+        await ds.insert("account.bsdgroups", {"bsdgrp_gid": 2020}, {"events_hold": hold})
+        await ds.insert("account.bsdgroups", {"bsdgrp_gid": 3030}, {"events_hold": hold})
+        await ds.update("account.bsdgroups", 2, {"bsdgrp_gid": 2020}, {"events_hold": hold})
+        await ds.delete("account.bsdgroups", 1, {"events_hold": hold})
+        # Other writers' events are not held
+        await ds.insert("account.bsdgroups", {"bsdgrp_gid": 4040})
+        await sent_events()
+        assert ds.middleware.send_event.call_args_list == [
+            call("group.query", "ADDED", id=4, fields={"id": 4, "bsdgrp_gid": 4040}),
+        ]
+
+        ds.middleware.send_event.reset_mock()
+        await ds.release_events(hold)
+        await sent_events()
+
+        assert ds.middleware["group.query"].call_args_list == [
+            call([["id", "in", [4]]], {}), call([["id", "in", [2, 3]]], {}),
+        ]
+        assert ds.middleware.send_event.call_args_list == [
+            call("group.query", "ADDED", id=2, fields={"id": 2, "bsdgrp_gid": 2020}),
+            call("group.query", "ADDED", id=3, fields={"id": 3, "bsdgrp_gid": 3030}),
+        ]
+
+
+@pytest.mark.asyncio
+async def test__events_are_sent_in_order():
+    rows = [{"id": 1, "bsdgrp_gid": 1010}]
+    async with datastore_events_test(rows) as ds:
+        query = ds.middleware["group.query"].side_effect
+        queried = asyncio.Event()
+        proceed = asyncio.Event()
+
+        async def slow_query(*args):
+            queried.set()
+            await proceed.wait()
+            return query(*args)
+
+        ds.middleware["group.query"].side_effect = slow_query
+
+        # The first event is sent right away
+        await ds.insert("account.bsdgroups", {"bsdgrp_gid": 1010})
+        await queried.wait()
+
+        # Events of the writes made while it is being sent are sent after it
+        await ds.update("account.bsdgroups", 1, {"bsdgrp_gid": 1011})
+        await ds.insert("account.bsdgroups", {"bsdgrp_gid": 2020})
+        rows[:] = [{"id": 1, "bsdgrp_gid": 1011}, {"id": 2, "bsdgrp_gid": 2020}]
+        proceed.set()
+        await sent_events()
+
+        assert ds.middleware["group.query"].call_args_list == [
+            call([["id", "in", [1]]], {}), call([["id", "in", [1, 2]]], {}),
+        ]
+        assert ds.middleware.send_event.call_args_list == [
+            call("group.query", "ADDED", id=1, fields={"id": 1, "bsdgrp_gid": 1011}),
+            call("group.query", "CHANGED", id=1, fields={"id": 1, "bsdgrp_gid": 1011}),
+            call("group.query", "ADDED", id=2, fields={"id": 2, "bsdgrp_gid": 2020}),
+        ]
+
+
+@pytest.mark.asyncio
+async def test__bulk():
+    async with datastore_test() as ds:
+        ds.execute("INSERT INTO `account_bsdgroups` VALUES (10, 1010)")
+        ds.execute("INSERT INTO `account_bsdgroups` VALUES (20, 2020)")
+        ds.execute("INSERT INTO `account_bsdgroups` VALUES (30, 3030)")
+
+        assert await ds.bulk([
+            {"method": "insert", "name": "account.bsdgroups", "data": {"bsdgrp_gid": 4040}},
+            {"method": "update", "name": "account.bsdgroups", "id_or_filters": 10, "data": {"gid": 1011},
+             "prefix": "bsdgrp_"},
+            {"method": "update", "name": "account.bsdgroups", "id_or_filters": 20, "data": {"gid": 2021},
+             "prefix": "bsdgrp_"},
+            {"method": "delete", "name": "account.bsdgroups", "id_or_filters": 30},
+            {"method": "update", "name": "account.bsdgroups", "id_or_filters": [["gid", "=", 4040]],
+             "data": {"gid": 4041}, "prefix": "bsdgrp_"},
+        ]) == [31, 10, 20, True, 31]
+
+        assert [tuple(row) for row in ds.fetchall("SELECT * FROM account_bsdgroups")] == [
+            (10, 1011), (20, 2021), (31, 4041),
+        ]
+        ds.middleware.call_hook_inline.assert_called_once_with(
+            "datastore.post_execute_write_many",
+            [
+                ["INSERT INTO account_bsdgroups (bsdgrp_gid) VALUES (?)", [[4040]]],
+                ["UPDATE account_bsdgroups SET bsdgrp_gid=? WHERE account_bsdgroups.id = ?", [[1011, 10], [2021, 20]]],
+                ["DELETE FROM account_bsdgroups WHERE account_bsdgroups.id = ?", [[30]]],
+                ["UPDATE account_bsdgroups SET bsdgrp_gid=? WHERE account_bsdgroups.id = ?", [[4041, 31]]],
+            ],
+            ANY,
+        )
+
+
+@pytest.mark.asyncio
+async def test__bulk_rollback():
+    async with datastore_test() as ds:
+        ds.execute("INSERT INTO `account_bsdgroups` VALUES (10, 1010)")
+
+        with pytest.raises(RuntimeError):
+            await ds.bulk([
+                {"method": "update", "name": "account.bsdgroups", "id_or_filters": 10, "data": {"bsdgrp_gid": 1011}},
+                {"method": "update", "name": "account.bsdgroups", "id_or_filters": 20, "data": {"bsdgrp_gid": 2021}},
+            ])
+
+        assert [tuple(row) for row in ds.fetchall("SELECT * FROM account_bsdgroups")] == [(10, 1010)]
+        ds.middleware.call_hook_inline.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test__fetchall_uses_read_only_connection(tmp_path):
+    async with datastore_test(str(tmp_path / "freenas-v1.db")) as ds:
+        await ds.insert("account.bsdgroups", {"bsdgrp_gid": 1010})
+
+        with ThreadPoolExecutor(1) as executor:
+            assert executor.submit(ds.fetchall, "SELECT bsdgrp_gid FROM account_bsdgroups").result() == [(1010,)]
+
+            with pytest.raises(OperationalError):
+                executor.submit(ds.fetchall, "DELETE FROM account_bsdgroups").result()
+
+
+@pytest.mark.parametrize("extend_context", [None, "group.extend_context"])
+@pytest.mark.asyncio
+async def test__extend_batch(extend_context):
+    async with datastore_test() as ds:
+        ds.execute("INSERT INTO `account_bsdgroups` VALUES (10, 1010)")
+        ds.execute("INSERT INTO `account_bsdgroups` VALUES (20, 2020)")
+
+        ds.middleware["group.extend_context"] = Mock(return_value={"offset": 1})
+        ds.middleware["group.extend_batch"] = Mock(
+            side_effect=lambda rows, context={"offset": 0}: [
+                dict(row, gid=row["gid"] + context["offset"], name=f"group{row['id']}") for row in rows
+            ]
+        )
+
+        assert await ds.query("account.bsdgroups", [], {
+            "prefix": "bsdgrp_",
+            "extend_batch": "group.extend_batch",
+            "extend_context": extend_context,
+            "select": ["gid", "name"],
+        }) == [
+            {"gid": 1010 + bool(extend_context), "name": "group10"},
+            {"gid": 2020 + bool(extend_context), "name": "group20"},
+        ]
+        ds.middleware["group.extend_batch"].assert_called_once()
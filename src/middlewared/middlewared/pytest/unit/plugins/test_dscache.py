@@ -0,0 +1,151 @@
+from collections import namedtuple
+import json
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from middlewared.plugins import cache as cache_plugin
+from middlewared.plugins.activedirectory_ import cache as ad_cache
+from middlewared.pytest.unit.helpers import create_service
+from middlewared.pytest.unit.middleware import Middleware
+
+PasswdEntry = namedtuple('PasswdEntry', ['pw_name', 'pw_uid', 'pw_gecos'])
+GroupEntry = namedtuple('GroupEntry', ['gr_name', 'gr_gid'])
+DOMAIN_SID = 'S-1-5-21-1-2-3'
+
+
+class FakeTDB:
+    def __init__(self):
+        self.files = {}
+        self.reads = 0
+
+    def batch_ops(self, data):
+        tdb = self.files.setdefault(data['name'], {})
+        output = []
+        for op in data['ops']:
+            if op['action'] == 'SET':
+                tdb[op['key']] = json.dumps(op['val'])
+            elif op['action'] == 'GET':
+                self.reads += 1
+                output.append(json.loads(tdb[op['key']]))
+
+        return output
+
+    def entries(self, data):
+        tdb = self.files.setdefault(data['name'], {})
+        self.reads += len(tdb)
+        return [{'key': k, 'val': json.loads(v)} for k, v in tdb.items() if k.startswith('ID')]
+
+
+def dscache_service(tdb, local_users=()):
+    m = Middleware()
+    m['tdb.batch_ops'] = tdb.batch_ops
+    m['tdb.entries'] = tdb.entries
+    m['directoryservices.get_state'] = AsyncMock(return_value={'activedirectory': 'HEALTHY', 'ldap': 'DISABLED'})
+    m['user.query'] = m._query_filter(list(local_users))
+    return create_service(m, cache_plugin.DSCache)
+
+
+def convert_unixids(id_list):
+    return {
+        'mapped': {
+            f'{"UID" if i["id_type"] == "USER" else "GID"}:{i["id"]}': {'sid': f'{DOMAIN_SID}-{i["id"] - 100000}'}
+            for i in id_list if i['id'] != 100013
+        },
+        'unmapped': {},
+    }
+
+
+@pytest.mark.asyncio
+async def test__insert_many_chunks():
+    m = Middleware()
+    m['tdb.batch_ops'] = AsyncMock()
+    entries = [{'uid': i, 'username': f'user{i}'} for i in range(5)]
+
+    with patch('middlewared.plugins.cache.DSCACHE_BATCH_SIZE', 2):
+        assert await cache_plugin.DSCache(m).insert_many('ACTIVEDIRECTORY', 'USER', entries) == 5
+
+    calls = m['tdb.batch_ops'].call_args_list
+    assert [len(c.args[0]['ops']) for c in calls] == [4, 4, 2]
+    assert {c.args[0]['name'] for c in calls} == {'activedirectory_user'}
+    assert [op['key'] for op in calls[0].args[0]['ops']] == ['ID_0', 'NAME_user0', 'ID_1', 'NAME_user1']
+
+
+def test__ad_fill_cache_bulk():
+    m = Middleware()
+    m['activedirectory.config'] = Mock(return_value={'disable_freenas_cache': False})
+    m['idmap.online_status'] = Mock(return_value=[])
+    m['idmap.query'] = Mock(return_value=[
+        {'domain_info': {'sid': DOMAIN_SID}, 'range_low': 100000, 'idmap_backend': 'RID'},
+        {'domain_info': None},
+    ])
+    m['idmap.convert_unixids'] = Mock(side_effect=convert_unixids)
+    m['dscache.insert_many'] = Mock()
+
+    users = [f'DOM\\user{i}' for i in range(25)]
+    wbclient = Mock(users=Mock(return_value=users), groups=Mock(return_value=['DOM\\group']))
+    job = Mock()
+    with patch.object(ad_cache, 'WBClient', Mock(return_value=wbclient)):
+        with patch.object(ad_cache, 'SID_BATCH_SIZE', 10), patch.object(cache_plugin, 'DSCACHE_BATCH_SIZE', 20):
+            with patch('pwd.getpwnam', lambda name: PasswdEntry(name, 100000 + int(name[8:]), '')):
+                with patch('grp.getgrnam', lambda name: GroupEntry(name, 200000)):
+                    ad_cache.ActiveDirectoryService(m).fill_cache(job)
+
+    # SIDs are resolved in batches rather than per user
+    assert [len(c.args[0]) for c in m['idmap.convert_unixids'].call_args_list] == [10, 10, 5, 1]
+
+    inserts = m['dscache.insert_many'].call_args_list
+    assert [(c.args[1], len(c.args[2])) for c in inserts] == [('USER', 20), ('USER', 4), ('GROUP', 1)]
+    # uid 100013 has no SID
+    assert 100013 not in [u['uid'] for u in inserts[0].args[2] + inserts[1].args[2]]
+    assert inserts[0].args[2][1] == {
+        **inserts[0].args[2][1],
+        'id': 200001, 'uid': 100001, 'username': 'DOM\\user1', 'sid': f'{DOMAIN_SID}-1', 'id_type_both': True,
+    }
+    assert job.set_progress.call_args.args[0] == 100
+    assert job.set_progress.call_args.args[1].startswith('Cached 25 of 25 entries')
+
+
+@pytest.mark.asyncio
+async def test__query_uses_indexes():
+    tdb = FakeTDB()
+    service = dscache_service(tdb, [{'id': 1, 'uid': 1000, 'username': 'local', 'local': True}])
+    await service.insert_many('ACTIVEDIRECTORY', 'USER', [
+        {'id': 300000 - i, 'uid': 100000 + i, 'username': f'user{i:04d}', 'sid': f'{DOMAIN_SID}-{i}', 'local': False}
+        for i in range(1000)
+    ])
+
+    # A new instance has to build its indexes from the TDB file first
+    service = dscache_service(tdb, service.middleware['user.query']())
+    page = await service.query('USERS', [], {'limit': 3, 'offset': 1})
+    assert [u['username'] for u in page] == ['user0999', 'user0998', 'user0997']
+    assert page[0]['sid'] is None
+
+    tdb.reads = 0
+    page = await service.query('USERS', [['username', '^', 'user01']], {'limit': 5, 'extra': {
+        'additional_information': ['SMB'],
+    }})
+    assert [u['username'] for u in page] == ['user0199', 'user0198', 'user0197', 'user0196', 'user0195']
+    assert page[0]['sid'] == f'{DOMAIN_SID}-199'
+    assert tdb.reads == 100
+
+    tdb.reads = 0
+    assert await service.query('USERS', [['uid', '>=', 100990], ['uid', '<', 100995]], {'count': True}) == 5
+    assert await service.query('USERS', [['uid', 'in', [1000, 100005]]], {'select': ['username']}) == [
+        {'username': 'local'}, {'username': 'user0005'},
+    ]
+    assert await service.query('USERS', [['id', '>', 299998]], {'get': True}) == {
+        'id': 299999, 'uid': 100001, 'username': 'user0001', 'sid': None, 'nt_name': None, 'local': False,
+    }
+    assert tdb.reads == 8
+
+    # Filters that can not use indexes are still honoured
+    page = await service.query('USERS', [['username', '$', '99']], {'order_by': ['uid'], 'offset': 2})
+    assert [u['username'] for u in page] == ['user0299', 'user0399', 'user0499', 'user0599', 'user0699',
+                                             'user0799', 'user0899', 'user0999']
+
+    await service.insert('ACTIVEDIRECTORY', 'USER', {
+        'id': 1, 'uid': 100000, 'username': 'renamed', 'sid': f'{DOMAIN_SID}-0', 'local': False,
+    })
+    assert [u['uid'] for u in await service.query('USERS', [['username', '^', 'renamed']], {})] == [100000]
+    assert await service.query('USERS', [['username', '^', 'user0000']], {}) == []
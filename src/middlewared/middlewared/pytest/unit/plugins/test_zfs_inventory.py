@@ -0,0 +1,165 @@
+from unittest.mock import patch
+
+import pytest
+
+from middlewared.plugins.zfs_.inventory import ZFSInventoryService
+from middlewared.pytest.unit.helpers import create_service
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.service_exception import CallError
+
+
+class FakeZFS:
+    def __init__(self, names):
+        self.used = {name: 1 for name in names}
+        self.snapshots = []
+        self.calls = []
+        self.fail = False
+
+    def entry(self, name, children):
+        return {
+            'id': name,
+            'name': name,
+            'pool': name.split('/')[0],
+            'type': 'FILESYSTEM',
+            'properties': {
+                'used': {'value': str(self.used[name]), 'parsed': self.used[name]},
+                'mountpoint': {'value': f'/mnt/{name}', 'parsed': f'/mnt/{name}'},
+                'org.truenas:managedby': {'value': 'test'},
+            },
+            'children': children,
+        }
+
+    def tree(self, name):
+        return self.entry(name, [
+            self.tree(child) for child in sorted(self.used) if child.rsplit('/', 1)[0] == name and '/' in child
+        ])
+
+    def dataset_query(self, filters, options):
+        self.calls.append(filters)
+        if self.fail:
+            raise CallError('Failed')
+
+        if not filters:
+            return [self.tree(name) for name in sorted(self.used) if '/' not in name]
+        elif filters[0][1] == '=':
+            return [self.tree(filters[0][2])] if filters[0][2] in self.used else []
+        else:
+            assert options['extra']['retrieve_children'] is False
+            return [self.entry(name, []) for name in filters[0][2] if name in self.used]
+
+    def snapshot_query(self, filters, options):
+        self.calls.append(filters)
+        assert options == {'select': ['name']}
+        return [
+            {'name': name} for name in self.snapshots if not filters or name.split('@')[0] in filters[0][2]
+        ]
+
+
+def inventory_service(zfs):
+    m = Middleware()
+    m['zfs.dataset.query'] = zfs.dataset_query
+    m['zfs.snapshot.query'] = zfs.snapshot_query
+    return create_service(m, ZFSInventoryService)
+
+
+@pytest.mark.asyncio
+async def test__datasets_query():
+    zfs = FakeZFS(['tank', 'tank/a', 'tank/a/b', 'tank/c', 'boot'])
+    service = inventory_service(zfs)
+
+    assert [ds['id'] for ds in await service.datasets([], {})] == ['boot', 'tank', 'tank/a', 'tank/a/b', 'tank/c']
+    tree = await service.datasets([['id', '=', 'tank']], {'extra': {'flat': False, 'properties': ['used']}})
+    assert tree[0]['properties'] == {'used': {'value': '1', 'parsed': 1}, 'org.truenas:managedby': {'value': 'test'}}
+    assert [child['id'] for child in tree[0]['children']] == ['tank/a', 'tank/c']
+    assert tree[0]['children'][0]['children'][0]['id'] == 'tank/a/b'
+
+    assert [ds['id'] for ds in await service.datasets([['id', 'in', ['tank/c', 'tank/a']]], {})] == ['tank/c', 'tank/a']
+    assert [c['id'] for c in (await service.datasets([['id', '=', 'tank/a']], {'get': True}))['children']] == [
+        'tank/a/b',
+    ]
+    assert await service.datasets([['id', '=', 'tank/a']], {'extra': {
+        'retrieve_children': False, 'retrieve_properties': False,
+    }}) == [{'id': 'tank/a', 'name': 'tank/a', 'pool': 'tank', 'type': 'FILESYSTEM', 'properties': {}, 'children': []}]
+    assert await service.datasets([['pool', '=', 'tank']], {'count': True}) == 4
+
+    # Cached entries are not modified by the callers
+    (await service.datasets([['id', '=', 'tank/c']], {'get': True}))['properties']['used']['parsed'] = 100
+    assert (await service.datasets([['id', '=', 'tank/c']], {'get': True}))['properties']['used']['parsed'] == 1
+    assert len(zfs.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test__datasets_invalidate():
+    zfs = FakeZFS(['tank', 'tank/a', 'tank/a/b', 'tank/c'])
+    service = inventory_service(zfs)
+    await service.datasets([], {})
+
+    zfs.used['tank/c'] = 2
+    zfs.used['tank/a/b'] = 3
+    zfs.used['tank/a/d'] = 4
+    await service.invalidate('tank/c', False)
+    await service.invalidate('tank/a', True)
+    await service.invalidate('tank/a/b', False)
+    assert {ds['id']: ds['properties']['used']['parsed'] for ds in await service.datasets([], {})} == {
+        'tank': 1, 'tank/a': 1, 'tank/a/b': 3, 'tank/a/d': 4, 'tank/c': 2,
+    }
+    assert zfs.calls[1:] == [[['id', '=', 'tank/a']], [['id', 'in', ['tank/c']]]]
+
+    del zfs.used['tank/a/b']
+    del zfs.used['tank/a/d']
+    await service.discard('tank/a/b')
+    await service.discard('tank/a/d')
+    assert [ds['id'] for ds in await service.datasets([], {})] == ['tank', 'tank/a', 'tank/c']
+    # Parent is re-read because of its space accounting
+    assert zfs.calls[3:] == [[['id', 'in', ['tank/a']]]]
+
+    # Whatever can not be re-read on its own is read with everything else
+    zfs.fail = True
+    await service.invalidate('tank/a', True)
+    with pytest.raises(CallError):
+        await service.datasets([], {})
+    zfs.fail = False
+    zfs.used['tank/a'] = 6
+    assert [ds['properties']['used']['parsed'] for ds in await service.datasets([], {})] == [1, 6, 2]
+    assert zfs.calls[-1] == []
+
+
+@pytest.mark.asyncio
+async def test__datasets_max_age():
+    zfs = FakeZFS(['tank'])
+    service = inventory_service(zfs)
+    with patch('middlewared.plugins.zfs_.inventory.time.monotonic', return_value=100):
+        await service.datasets([], {})
+        zfs.used['tank'] = 5
+
+    with patch('middlewared.plugins.zfs_.inventory.time.monotonic', return_value=120):
+        assert (await service.datasets([], {'get': True}))['properties']['used']['parsed'] == 1
+        assert (await service.datasets([], {'get': True, 'extra': {'max_age': 10}}))['properties']['used'][
+            'parsed'] == 5
+
+    assert zfs.calls == [[], []]
+    await service.refresh({'datasets': True, 'snapshots': False})
+    assert await service.datasets([], {'count': True}) == 1
+    assert zfs.calls == [[], [], []]
+
+
+@pytest.mark.asyncio
+async def test__snapshots_query():
+    zfs = FakeZFS(['tank', 'tank/a', 'tank/b'])
+    zfs.snapshots = ['tank@1', 'tank/a@1', 'tank/a@2', 'tank/b@1']
+    service = inventory_service(zfs)
+
+    assert await service.snapshots([['dataset', '=', 'tank/a']], {'select': ['name']}) == [
+        {'name': 'tank/a@1'}, {'name': 'tank/a@2'},
+    ]
+    assert await service.snapshots([['pool', '=', 'tank'], ['snapshot_name', '=', '1']], {'count': True}) == 3
+
+    zfs.snapshots = ['tank@1', 'tank/a@2', 'tank/b@1', 'tank/b@2']
+    await service.discard('tank/a@1')
+    await service.invalidate('tank/b@2', False)
+    assert await service.snapshots([], {'select': ['name']}) == [{'name': name} for name in zfs.snapshots]
+    assert zfs.calls == [[], [['dataset', 'in', ['tank/b']]]]
+
+    # Everything else is not cached
+    service.middleware['zfs.snapshot.query'] = lambda filters, options: [{'name': 'tank@1', 'holds': {}}]
+    assert await service.snapshots([], {'extra': {'holds': True}}) == [{'name': 'tank@1', 'holds': {}}]
@@ -0,0 +1,87 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from middlewared.plugins.zfs_.snapshot import ZFSSnapshot
+from middlewared.pytest.unit.helpers import create_service
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.service_exception import CallError
+
+
+@pytest.mark.parametrize('destroy_fails', [False, True])
+@pytest.mark.asyncio
+async def test__bulk_delete(destroy_fails):
+    existing = {'tank/a@1', 'tank/a@2', 'tank/a@3', 'tank/b@1'}
+
+    async def destroy_snapshots(dataset, spec):
+        if destroy_fails and dataset == 'tank/a':
+            # Partially destroyed batch
+            existing.discard('tank/a@1')
+            raise CallError('Failed')
+
+        existing.difference_update({f'{dataset}@{name}' for name in spec['snapshots']})
+
+    async def delete(id, options=None):
+        if id not in existing:
+            raise CallError(f'{id} does not exist')
+
+        existing.discard(id)
+        return True
+
+    m = Middleware()
+    m['zfs.inventory.snapshots'] = AsyncMock(side_effect=lambda *args: [{'name': name} for name in existing])
+    m['zfs.dataset.destroy_snapshots'] = AsyncMock(side_effect=destroy_snapshots)
+    m['zfs.snapshot.delete'] = AsyncMock(side_effect=delete)
+
+    statuses = await ZFSSnapshot(m).bulk_delete([
+        ['tank/a@1'],
+        ['tank/b@1', {'defer': False}],
+        ['tank/a@2', {}],
+        ['tank/a@missing'],
+        ['tank/a@3', {'defer': True}],
+        ['tank/b@1'],
+    ])
+
+    assert statuses == [
+        {'result': True, 'error': None},
+        {'result': True, 'error': None},
+        {'result': True, 'error': None},
+        {'result': None, 'error': '[EFAULT] tank/a@missing does not exist'},
+        {'result': True, 'error': None},
+        {'result': None, 'error': '[EFAULT] tank/b@1 does not exist'},
+    ]
+    assert existing == set()
+    assert m['zfs.dataset.destroy_snapshots'].call_count == 2
+    assert [call.args for call in m['zfs.snapshot.delete'].call_args_list] == (
+        [('tank/a@2', {}), ('tank/a@missing',), ('tank/a@3', {'defer': True}), ('tank/b@1',)] if destroy_fails else
+        [('tank/a@missing',), ('tank/a@3', {'defer': True}), ('tank/b@1',)]
+    )
+    # `zfs.snapshot.delete` calls send their own events
+    assert sorted(call.kwargs['id'] for call in m.send_event.call_args_list) == (
+        ['tank/a@1', 'tank/b@1'] if destroy_fails else ['tank/a@1', 'tank/a@2', 'tank/b@1']
+    )
+    assert all(call.args == ('zfs.snapshot.query', 'REMOVED') for call in m.send_event.call_args_list)
+    assert m.call_hook.call_count == m.send_event.call_count
+    m.call_hook.assert_called_with('zfs.snapshot.post_delete', True)
+
+
+@pytest.mark.parametrize('defer', [False, True])
+def test__delete__snapshot_count(defer):
+    m = Middleware()
+    m['zfs.inventory.discard'] = Mock()
+    m['zfs.inventory.invalidate'] = Mock()
+    m['zfs.snapshot_count.update'] = Mock()
+    m['zfs.snapshot_count.forget'] = Mock()
+
+    with patch('middlewared.plugins.zfs_.snapshot.libzfs.ZFS'):
+        assert create_service(m, ZFSSnapshot).do_delete('tank/a@1', {'defer': defer})
+
+    if defer:
+        # The snapshot is still there if it is held
+        m['zfs.snapshot_count.update'].assert_not_called()
+        m['zfs.snapshot_count.forget'].assert_called_once_with('tank/a', False)
+        m['zfs.inventory.discard'].assert_not_called()
+    else:
+        m['zfs.snapshot_count.update'].assert_called_once()
+        m['zfs.snapshot_count.forget'].assert_not_called()
+        m['zfs.inventory.discard'].assert_called_once_with('tank/a@1')
@@ -0,0 +1,112 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from middlewared.plugins.zfs_.snapshot_count import ZFSSnapshotCountService
+from middlewared.plugins.zfs_.utils import get_snapshot_count_cached
+from middlewared.pytest.unit.helpers import create_service
+from middlewared.pytest.unit.middleware import Middleware
+
+
+def snapshot_count_service(tdb_entries):
+    m = Middleware()
+    m['tdb.entries'] = AsyncMock(return_value=[{'key': f'SNAPCNT%{k}', 'val': v} for k, v in tdb_entries.items()])
+    m['tdb.batch_ops'] = AsyncMock()
+    return create_service(m, ZFSSnapshotCountService)
+
+
+@pytest.mark.asyncio
+async def test__snapshot_count_incremental():
+    service = snapshot_count_service({'tank': {'changed_ts': 10, 'cnt': 3}, 'tank/a': {'changed_ts': 10, 'cnt': 7}})
+
+    assert await service.get({'tank': 10, 'tank/a': 11, 'tank/b': 10}) == {'tank': 3}
+
+    await service.update('tank@new', True, 11)
+    # The same snapshot creation reported by the ZFS event
+    await service.update('tank@new', True, 12)
+    await service.update('tank@old', False, 12)
+    await service.update('tank/b@new', True, 11)
+    # Incrementally updated count takes `snapshots_changed` of the last operation applied
+    assert await service.get({'tank': 12}) == {'tank': 3}
+    assert await service.get({'tank': 12}) == {'tank': 3}
+    assert await service.get({'tank': 13}) == {}
+
+    await service.set({'tank/a': [11, 8], 'tank/b': [None, 1]})
+    # Legacy datasets without `snapshots_changed` are always counted
+    assert await service.get({'tank': 12, 'tank/a': 11, 'tank/b': None}) == {'tank': 3, 'tank/a': 8}
+
+    # Snapshots changed after the last operation applied in some other way
+    await service.update('tank/a@new', True, 12)
+    assert await service.get({'tank/a': 14}) == {}
+
+    await service.forget('tank', True)
+    assert await service.get({'tank': 12, 'tank/a': 12}) == {}
+    service.middleware['tdb.entries'].assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test__snapshot_count_recounted_before_event():
+    service = snapshot_count_service({'tank': {'changed_ts': 10, 'cnt': 3}})
+
+    # Snapshot created at 11 is counted before its ZFS event is received
+    assert await service.get({'tank': 11}) == {}
+    await service.set({'tank': [11, 4]})
+    await service.update('tank@new', True, 11)
+    assert await service.get({'tank': 11}) == {}
+
+    await service.set({'tank': [11, 4]})
+    await service.update('tank@newer', True, 12)
+    assert await service.get({'tank': 12}) == {'tank': 5}
+
+    # Events without a timestamp can not be ordered with the counts
+    await service.update('tank@newest', True, None)
+    assert await service.get({'tank': 12}) == {}
+
+
+@pytest.mark.asyncio
+async def test__snapshot_count_sync():
+    service = snapshot_count_service({'tank': {'changed_ts': 1, 'cnt': 3}, 'tank/a': {'changed_ts': 1, 'cnt': 7}})
+    await service.update('tank@new', True, 2)
+    await service.update('tank/a@new', True, 2)
+    await service.get({'tank/a': 2})
+    await service.set({'tank/b': [1, 2], 'tank/c': [None, 1]})
+
+    await service.sync()
+    ops = service.middleware['tdb.batch_ops'].call_args.args[0]['ops']
+    assert sorted(ops, key=lambda op: op['key']) == [
+        # Not validated since it was changed
+        {'action': 'DEL', 'key': 'SNAPCNT%tank'},
+        {'action': 'SET', 'key': 'SNAPCNT%tank/a', 'val': {'changed_ts': 2, 'cnt': 8}},
+        {'action': 'SET', 'key': 'SNAPCNT%tank/b', 'val': {'changed_ts': 1, 'cnt': 2}},
+    ]
+
+    service.middleware['tdb.batch_ops'].reset_mock()
+    await service.sync()
+    service.middleware['tdb.batch_ops'].assert_not_called()
+
+
+def test__get_snapshot_count_cached():
+    def dataset(name, changed_ts, children=()):
+        return {
+            'name': name,
+            'properties': {
+                'snapshots_changed': {'parsed': f'ts{changed_ts}', 'rawvalue': str(changed_ts)},
+                'mountpoint': {'parsed': None},
+            },
+            'children': list(children),
+        }
+
+    datasets = [dataset('tank', 1, [dataset('tank/a', 2), dataset('tank/locked', 3)]), dataset('tank/a', 2)]
+    m = Middleware()
+    m['zfs.snapshot_count.get'] = Mock(return_value={'tank': 3, 'tank/a': 4})
+    m['zfs.snapshot_count.set'] = Mock()
+    lz = Mock(snapshots_serialized=Mock(return_value=[{'name': 'tank/locked@1'}, {'name': 'tank/locked@2'}]))
+
+    assert get_snapshot_count_cached(m, lz, datasets, True, True) == {'tank': 3, 'tank/a': 4, 'tank/locked': 2}
+
+    m['zfs.snapshot_count.get'].assert_called_once_with({'tank': 1, 'tank/a': 2, 'tank/locked': 3})
+    m['zfs.snapshot_count.set'].assert_called_once_with({'tank/locked': [3, 2]})
+    lz.snapshots_serialized.assert_called_once_with(['name'], datasets=['tank/locked'], recursive=False)
+    assert [ds['snapshot_count'] for ds in datasets] == [3, 4]
+    assert datasets[0]['children'][1]['snapshot_count'] == 2
+    assert 'snapshots_changed' not in datasets[1]['properties']
@@ -0,0 +1,76 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from middlewared.main import Application
+
+
+def application(send_str):
+    middleware = Mock()
+    middleware.create_task = lambda coro: asyncio.get_running_loop().create_task(coro)
+    middleware.event_source_manager.short_name_arg.side_effect = lambda name: (name, None)
+    middleware.event_source_manager.event_sources = {}
+    response = Mock(send_str=send_str, close=AsyncMock())
+    return Application(middleware, asyncio.get_running_loop(), Mock(), response)
+
+
+@pytest.mark.asyncio
+async def test__send_keeps_order_from_loop_and_threads():
+    sent = []
+
+    async def send_str(data):
+        await asyncio.sleep(0)
+        sent.append(json.loads(data)['n'])
+
+    app = application(send_str)
+    app._send({'n': 0})
+    await asyncio.get_running_loop().run_in_executor(None, lambda: [app._send({'n': i}) for i in range(1, 50)])
+    app._send({'n': 50})
+    for i in range(100):
+        await asyncio.sleep(0)
+
+    assert sent == list(range(51))
+
+
+@pytest.mark.asyncio
+async def test__send_closes_connection_that_does_not_read():
+    blocked = asyncio.Event()
+
+    async def send_str(data):
+        await blocked.wait()
+
+    app = application(send_str)
+    with patch('middlewared.main.WS_SEND_QUEUE_MAX_SIZE', 100):
+        for i in range(10):
+            app._send({'data': 'x' * 20})
+            await asyncio.sleep(0)
+
+    app.response.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test__subscriptions_are_indexed():
+    app = application(AsyncMock())
+    await app.subscribe('1', 'core.get_jobs')
+    await app.subscribe('2', 'core.get_jobs')
+    app.middleware.register_wsclient_subscription.assert_called_with(app, 'core.get_jobs')
+
+    await app.unsubscribe('1')
+    app.middleware.unregister_wsclient_subscription.assert_not_called()
+
+    await app.unsubscribe('2')
+    app.middleware.unregister_wsclient_subscription.assert_called_once_with(app, 'core.get_jobs')
+
+
+def test__serialize_event():
+    kwargs = {'id': 1, 'fields': {'state': 'RUNNING'}, 'extra_key': 1}
+    assert json.loads(Application.serialize_event('core.get_jobs', 'CHANGED', **kwargs)) == {
+        'msg': 'changed',
+        'collection': 'core.get_jobs',
+        'id': 1,
+        'fields': {'state': 'RUNNING'},
+        'extra': {'extra_key': 1},
+    }
+    assert kwargs == {'id': 1, 'fields': {'state': 'RUNNING'}, 'extra_key': 1}
@@ -0,0 +1,82 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.service import bulk_implementation, CoreService, Service
+from middlewared.service_exception import CallError
+
+
+class SleepService(Service):
+    running = 0
+    max_running = 0
+
+    async def sleep(self, delay, fail=False):
+        SleepService.running += 1
+        SleepService.max_running = max(SleepService.max_running, SleepService.running)
+        try:
+            await asyncio.sleep(delay)
+            if fail:
+                raise CallError('Failed')
+            return delay
+        finally:
+            SleepService.running -= 1
+
+    @bulk_implementation('test.bulk_double')
+    async def double(self, value):
+        return value * 2
+
+    async def bulk_double(self, params):
+        return [{'result': p[0] * 2, 'error': None} for p in params]
+
+
+def middleware():
+    m = Middleware()
+    service = SleepService(m)
+    m._method_lookup = Mock(side_effect=lambda name: (service, getattr(service, name.split('.')[1])))
+    for name in ['sleep', 'double', 'bulk_double']:
+        m[f'test.{name}'] = getattr(service, name)
+    return m
+
+
+@pytest.mark.parametrize('concurrency,max_running', [(1, 1), (3, 3), (10, 5)])
+@pytest.mark.asyncio
+async def test__bulk_concurrency(concurrency, max_running):
+    SleepService.max_running = 0
+    job = Mock()
+
+    statuses = await CoreService(middleware()).bulk(
+        job, 'test.sleep', [[0.03], [0.01], [0.02, True], [0], [0.01]], None, {'concurrency': concurrency},
+    )
+
+    assert statuses == [
+        {'result': 0.03, 'error': None},
+        {'result': 0.01, 'error': None},
+        {'result': None, 'error': '[EFAULT] Failed'},
+        {'result': 0, 'error': None},
+        {'result': 0.01, 'error': None},
+    ]
+    assert SleepService.max_running == max_running
+    assert job.set_progress.call_count == 5
+
+
+@pytest.mark.asyncio
+async def test__bulk_implementation():
+    m = middleware()
+    m['test.double'] = Mock(side_effect=AssertionError)
+
+    statuses = await CoreService(m).bulk(Mock(), 'test.double', [[1], [2]], None, {})
+
+    assert statuses == [{'result': 2, 'error': None}, {'result': 4, 'error': None}]
+
+
+@pytest.mark.asyncio
+async def test__bulk_method_not_found():
+    m = middleware()
+    m._method_lookup.side_effect = CallError('Method not found', CallError.ENOMETHOD)
+
+    statuses = await CoreService(m).bulk(Mock(), 'test.missing', [[1], [2]], None, {'concurrency': 1})
+
+    assert [status['result'] for status in statuses] == [None, None]
+    assert all(status['error'] for status in statuses)
@@ -0,0 +1,155 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from middlewared.job import Job, JobsQueue
+
+
+def job(middleware, lock=None, lock_queue_size=None):
+    return Job(middleware, 'test.job', None, Mock(), [], {
+        'lock': lock,
+        'lock_queue_size': lock_queue_size,
+        'logs': False,
+        'process': False,
+        'pipes': [],
+        'check_pipes': False,
+        'description': None,
+        'transient': False,
+        'abortable': False,
+    }, None, None)
+
+
+async def started(queue):
+    rv = []
+    while queue.ready:
+        rv.append((await queue.next()).id)
+    return rv
+
+
+@pytest.mark.asyncio
+async def test__jobs_queue_runs_jobs_in_order_one_per_lock():
+    middleware = Mock()
+    queue = JobsQueue(middleware)
+    jobs = [queue.add(job(middleware, lock)) for lock in ['a', 'b', None, 'a', 'b', 'a', None]]
+
+    assert await started(queue) == [1, 2, 3, 7]
+
+    queue.release_lock(jobs[1])
+    queue.release_lock(jobs[0])
+    assert await started(queue) == [4, 5]
+
+    queue.release_lock(jobs[3])
+    assert await started(queue) == [6]
+
+    for j in [jobs[4], jobs[5]]:
+        queue.release_lock(j)
+    assert await started(queue) == []
+    assert queue.job_locks == {}
+
+
+@pytest.mark.asyncio
+async def test__jobs_queue_waits_for_ready_job():
+    middleware = Mock()
+    queue = JobsQueue(middleware)
+    first = queue.add(job(middleware, 'a'))
+    queue.add(job(middleware, 'a'))
+    assert (await queue.next()) is first
+
+    next_job = asyncio.ensure_future(queue.next())
+    await asyncio.sleep(0)
+    assert not next_job.done()
+
+    queue.release_lock(first)
+    assert (await asyncio.wait_for(next_job, 1)).id == 2
+
+
+@pytest.mark.asyncio
+async def test__jobs_queue_lock_queue_size():
+    middleware = Mock()
+    queue = JobsQueue(middleware)
+    running = queue.add(job(middleware, 'a', 1))
+    assert (await queue.next()) is running
+
+    waiting = queue.add(job(middleware, 'a', 1))
+    assert waiting is not running
+    assert queue.add(job(middleware, 'a', 1)) is waiting
+
+    queue.release_lock(running)
+    assert (await queue.next()) is waiting
+    assert queue.add(job(middleware, 'a', 1)).id == 3
+
+
+def test__job_encoding_is_cached_and_progress_events_are_deltas():
+    middleware = Mock()
+    j = job(middleware)
+    j.set_id(1)
+    j.set_state('RUNNING')
+
+    encoded = j.__encode__()
+    assert j.__encode__() is encoded
+
+    j.set_progress(50, 'Halfway')
+    middleware.send_event.assert_called_once_with('core.get_jobs', 'CHANGED', id=1, fields={
+        'id': 1,
+        'method': 'test.job',
+        'state': 'RUNNING',
+        'progress': {'percent': 50, 'description': 'Halfway', 'extra': None},
+    })
+
+    j.set_progress(50, 'Halfway')
+    assert middleware.send_event.call_count == 1
+
+    assert j.__encode__() is not encoded
+    assert j.__encode__()['progress']['percent'] == 50
+    middleware.dump_args.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test__job_terminal_event_carries_result():
+    middleware = Mock(run_in_thread=AsyncMock(), dump_args=Mock(return_value=[]))
+    events = []
+    middleware.send_event.side_effect = lambda name, event_type, **kwargs: events.append(kwargs['fields'])
+
+    async def method(job, *args):
+        job.set_progress(10, 'Working')
+        return 'done'
+
+    j = job(middleware)
+    j.method = method
+    j.set_id(1)
+    j.set_description('Waiting')
+    await j.run(Mock())
+
+    assert events[0]['arguments'] == []
+    assert events[2] == {'id': 1, 'method': 'test.job', 'state': 'RUNNING',
+                         'progress': {'percent': 10, 'description': 'Working', 'extra': None}}
+    terminal = next(event for event in events if event['state'] in ('SUCCESS', 'FAILED', 'ABORTED'))
+    assert terminal['state'] == 'SUCCESS'
+    assert terminal['result'] == 'done'
+    assert terminal['progress']['percent'] == 100
+
+
+@pytest.mark.parametrize('filters,ids', [
+    ([], [1, 2, 4]),
+    ([['id', '=', 3]], []),
+    ([['id', 'in', [4, 2, 7]]], [2, 4]),
+    ([['method', '=', 'test.other']], [2, 4]),
+    ([['method', 'in', ['test.job', 'test.other']], ['id', '!=', 1]], [1, 2, 4]),
+    ([['method', '=', 'test.other'], ['state', '=', 'RUNNING']], [4]),
+    ([['state', 'in', ['SUCCESS', 'RUNNING']], ['state', '=', 'RUNNING']], [4]),
+    ([['id', '=', 1], ['method', '=', 'test.other']], []),
+    ([['OR', [['id', '=', 1], ['id', '=', 2]]]], [1, 2, 4]),
+])
+def test__jobs_deque_filter(filters, ids):
+    middleware = Mock()
+    queue = JobsQueue(middleware)
+    for i in range(4):
+        j = job(middleware)
+        if i % 2:
+            j.method_name = 'test.other'
+        queue.add(j)
+    queue[4].set_state('RUNNING')
+    queue.remove(3)
+
+    assert [j.id for j in queue.filter(filters)] == ids
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import threading
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+import pytest
+
+from middlewared.pipe import Pipe
+from middlewared.restful import copy_multipart_to_pipe, PIPE_CHUNK_SIZE, stream_pipe_response
+
+DATA = os.urandom(PIPE_CHUNK_SIZE * 3 + 12345)
+
+
+class Middleware:
+    async def run_in_thread(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+
+def write_pipe(pipe):
+    with pipe.w:
+        for i in range(0, len(DATA), 65536):
+            pipe.w.write(DATA[i:i + 65536])
+
+
+@pytest.mark.parametrize('buffered', [True, False])
+@pytest.mark.asyncio
+async def test__stream_pipe_response(buffered):
+    pipe = Pipe(Middleware(), buffered)
+    if buffered:
+        pipe.w.write(DATA)
+    else:
+        threading.Thread(target=write_pipe, args=(pipe,), daemon=True).start()
+
+    async def handler(request):
+        return await stream_pipe_response(request, pipe, {'Content-Type': 'application/octet-stream'})
+
+    app = web.Application()
+    app.router.add_get('/', handler)
+    async with TestClient(TestServer(app)) as client:
+        resp = await client.get('/')
+        assert resp.status == 200
+        assert await resp.read() == DATA
+        if buffered:
+            assert resp.headers['Content-Length'] == str(len(DATA))
+        else:
+            assert resp.headers['Transfer-Encoding'] == 'chunked'
+
+
+@pytest.mark.parametrize('buffered', [True, False])
+@pytest.mark.asyncio
+async def test__copy_multipart_to_pipe(buffered):
+    pipe = Pipe(Middleware(), buffered)
+    received = []
+    reader = None
+    if not buffered:
+        reader = threading.Thread(target=lambda: received.append(pipe.r.read()), daemon=True)
+        reader.start()
+
+    async def handler(request):
+        multipart = await request.multipart()
+        await copy_multipart_to_pipe(await multipart.next(), pipe)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post('/', handler)
+    async with TestClient(TestServer(app)) as client:
+        with aiohttp.MultipartWriter('form-data') as writer:
+            part = writer.append(DATA)
+            part.set_content_disposition('form-data', name='file')
+            resp = await client.post('/', data=writer)
+            assert resp.status == 200
+
+    if buffered:
+        assert pipe.w.closed
+        received.append(pipe.r.read())
+    else:
+        reader.join(5)
+
+    assert received == [DATA]
@@ -0,0 +1,39 @@
+from unittest.mock import Mock, patch
+
+from middlewared.worker import FakeJob, WorkerClient
+
+
+def test__fake_job_coalesces_progress():
+    client = Mock()
+    with patch('middlewared.worker.PROGRESS_UPDATE_INTERVAL', 3600):
+        job = FakeJob(1, client)
+        job.set_progress(10, 'Starting')
+        job.set_progress(20)
+        job.set_progress(30, 'Copying')
+        assert client.call.call_count == 1
+
+        job.flush_progress()
+        assert client.call.call_count == 2
+        client.call.assert_called_with(
+            'core.job_update', 1, {'progress': {'percent': 30, 'description': 'Copying', 'extra': None}},
+        )
+
+        job.flush_progress()
+        assert client.call.call_count == 2
+
+
+def test__worker_client_reuses_connection():
+    with patch('middlewared.worker.Client') as Client:
+        Client.return_value.closed = False
+        on_connect = Mock()
+        client = WorkerClient()
+        client.on_connect(on_connect)
+        client.call('core.ping')
+        client.call('core.ping')
+        assert Client.call_count == 1
+        on_connect.assert_called_once_with(Client.return_value)
+
+        Client.return_value.closed = True
+        client.call('core.ping')
+        assert Client.call_count == 2
+        assert on_connect.call_count == 2
@@ -1,4 +1,7 @@
-from middlewared.utils import filter_list
+import pytest
+
+from middlewared.service_exception import MatchNotFound
+from middlewared.utils import filter_list, filters
 
 
 DATA = [
@@ -282,3 +285,106 @@ def test__filter_list_option_casefold_rnin():
 
 def test__filter_list_option_casefold_complex_data():
     assert len(filter_list(COMPLEX_DATA, [['Authentication.clientAccount', 'C=', 'JOINER']])) == 1
+
+
+SNAPSHOTS = [
+    {
+        'id': f'tank/ds{i % 7}@snap-{i}',
+        'dataset': f'tank/ds{i % 7}',
+        'snapshot_name': f'snap-{i}' if i % 5 else f'SNAP-{i}',
+        'holds': None if i % 3 else f'hold-{i % 4}',
+        'properties': {'used': {'parsed': (i * 37) % 101}},
+        'list': [i % 2, i % 3],
+    }
+    for i in range(200)
+]
+
+
+@pytest.mark.parametrize('filters_', [
+    [],
+    [['dataset', '=', 'tank/ds1']],
+    [['snapshot_name', 'C^', 'snap-1']],
+    [['id', '~', r'tank/ds[12]@']],
+    [['dataset', 'in', ['tank/ds1', 'tank/ds3']]],
+    [['dataset', 'nin', ('tank/ds1', 'tank/ds3')]],
+    [['list', 'in', [[0, 1], [1, 2]]]],
+    [['list', 'rin', 2]],
+    [['list.1', '=', 2]],
+    [['properties.used.parsed', '>=', 50], ['holds', '=', None]],
+    [['OR', [['snapshot_name', '$', '7'], ['properties.used.parsed', '<', 10]]]],
+])
+@pytest.mark.parametrize('options', [
+    None,
+    {'select': ['id', 'holds']},
+    {'count': True},
+    {'get': True},
+    {'get': True, 'order_by': ['-properties.used.parsed']},
+    {'order_by': ['nulls_first:holds', 'dataset']},
+    {'order_by': ['nulls_last:-holds']},
+    {'order_by': ['properties.used.parsed'], 'offset': 3, 'limit': 10},
+])
+def test__filter_list_compiled_matches_interpreted(filters_, options):
+    f = filters()
+    results = []
+    for i in range(2):
+        # Second iteration is served from the plan cache
+        try:
+            results.append(f.filter_list(SNAPSHOTS, filters_, options))
+        except MatchNotFound:
+            results.append(MatchNotFound)
+
+    try:
+        expected = f.interpret_list(SNAPSHOTS, filters_, options)
+    except MatchNotFound:
+        expected = MatchNotFound
+
+    assert results == [expected, expected]
+
+
+def test__filter_list_plan_cache():
+    f = filters(plan_cache_size=2)
+    assert f.get_plan([['a', '=', 1]]) is f.get_plan([['a', '=', 1]])
+    f.get_plan([['a', '=', 2]])
+    f.get_plan([['a', '=', 3]])
+    assert len(f.plan_cache) == 2
+
+
+def test__filter_list_plan_cache_does_not_share_mutable_values():
+    f = filters()
+    value = ['foo1']
+    assert len(f.filter_list(DATA, [['foo', 'in', value]])) == 1
+    value.append('foo2')
+    assert len(f.filter_list(DATA, [['foo', 'in', value]])) == 2
+    assert len(f.filter_list(DATA, [['foo', 'in', ['foo1']]])) == 1
+
+
+def test__filter_list_plan_cache_tuple_values():
+    f = filters()
+    data = [{'list': [1, 2]}]
+    assert len(f.filter_list(data, [['list', '=', [1, 2]]])) == 1
+    assert len(f.filter_list(data, [['list', '=', (1, 2)]])) == 0
+
+
+def test__filter_list_invalid_regex_empty_list():
+    assert filter_list([], [['foo', '~', '(']]) == []
+
+
+@pytest.mark.parametrize('options', [
+    {'order_by': ['-properties.used.parsed', 'dataset'], 'limit': 10},
+    {'order_by': ['nulls_last:holds', '-dataset'], 'offset': 5, 'limit': 20},
+    {'order_by': ['nulls_first:-holds'], 'limit': 1},
+    {'order_by': ['snapshot_name'], 'offset': 195, 'limit': 50},
+])
+def test__filter_list_top_k_matches_full_sort(options):
+    f = filters()
+    assert f.filter_list(SNAPSHOTS, [], options) == f.interpret_list(SNAPSHOTS, [], options)
+
+
+class ExplodingDict(dict):
+    def get(self, *args, **kwargs):
+        raise AssertionError('Entry after the requested page was evaluated')
+
+
+def test__filter_list_pagination_stops_after_page():
+    data = [{'foo': 'foo'} for i in range(10)] + [ExplodingDict(foo='foo')]
+    assert len(filter_list(data, [['foo', '=', 'foo']], {'offset': 5, 'limit': 5})) == 5
@@ -4,6 +4,7 @@ import binascii
 from collections import defaultdict
 import copy
 import errno
+import os
 import traceback
 import types
 import urllib.parse
@@ -19,6 +20,8 @@ from .service_exception import adapt_exception, CallError, MatchNotFound, Valida
 from .utils.nginx import get_remote_addr_port
 from .utils.origin import TCPIPOrigin
 
+PIPE_CHUNK_SIZE = 1048576
+
 
 async def authenticate(middleware, request, method, resource):
     auth = request.headers.get('Authorization')
@@ -763,7 +766,7 @@ class Resource(object):
         try:
             result = await self.middleware.call(methodname, *method_args, **method_kwargs)
             if upload_pipe:
-                await self.middleware.run_in_thread(copy_multipart_to_pipe, self.middleware.loop, filepart, upload_pipe)
+                await copy_multipart_to_pipe(filepart, upload_pipe)
             if method['downloadable'] and download_pipe is None:
                 result = await result.wait()
         except CallError as e:
@@ -805,25 +808,7 @@ class Resource(object):
                     }
 
         if download_pipe is not None:
-            resp = web.StreamResponse(status=200, reason='OK', headers={
-                'Content-Type': 'application/octet-stream',
-                'Transfer-Encoding': 'chunked',
-            })
-            await resp.prepare(req)
-
-            loop = asyncio.get_event_loop()
-
-            def do_copy():
-                while True:
-                    read = download_pipe.r.read(1048576)
-                    if read == b'':
-                        break
-                    asyncio.run_coroutine_threadsafe(resp.write(read), loop=loop).result()
-
-            await self.middleware.run_in_thread(do_copy)
-
-            await resp.drain()
-            return resp
+            return await stream_pipe_response(req, download_pipe, {'Content-Type': 'application/octet-stream'})
 
         if isinstance(result, types.GeneratorType):
             result = list(result)
@@ -836,18 +821,68 @@ class Resource(object):
         return resp
 
 
-def copy_multipart_to_pipe(loop, filepart, pipe):
+async def copy_multipart_to_pipe(filepart, pipe):
+    """
+    Copy uploaded `filepart` to the job input `pipe` and close it.
+
+    Unbuffered pipes are written by the event loop without blocking, buffered pipes (temporary files) are written in a
+    thread.
+    """
+    loop = asyncio.get_running_loop()
     try:
+        if pipe.buffered:
+            try:
+                while read := await filepart.read_chunk(PIPE_CHUNK_SIZE):
+                    await pipe.middleware.run_in_thread(pipe.w.write, read)
+            finally:
+                await pipe.middleware.run_in_thread(pipe.w.close)
+        else:
+            transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, pipe.w)
+            writer = asyncio.StreamWriter(transport, protocol, None, loop)
+            try:
+                while read := await filepart.read_chunk(PIPE_CHUNK_SIZE):
+                    writer.write(read)
+                    await writer.drain()
+            finally:
+                # Closes `pipe.w`
+                writer.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+async def stream_pipe_response(request, pipe, headers):
+    """
+    Send the job output `pipe` as a response to `request`.
+
+    Buffered pipes (temporary files that were completely written by the job) are sent with `sendfile`. Unbuffered
+    pipes are read by the event loop without blocking as the job writes them.
+    """
+    loop = asyncio.get_running_loop()
+    if pipe.buffered:
+        offset = pipe.r.tell()
+        count = os.fstat(pipe.r.fileno()).st_size - offset
+        resp = web.StreamResponse(status=200, reason='OK', headers={**headers, 'Content-Length': str(count)})
+        await resp.prepare(request)
+        if count:
+            try:
+                await loop.sendfile(request.transport, pipe.r, offset, count)
+            except NotImplementedError:
+                # E.g. a TLS transport
+                pipe.r.seek(offset)
+                while read := await pipe.middleware.run_in_thread(pipe.r.read, PIPE_CHUNK_SIZE):
+                    await resp.write(read)
+    else:
+        resp = web.StreamResponse(status=200, reason='OK', headers={**headers, 'Transfer-Encoding': 'chunked'})
+        await resp.prepare(request)
+
+        reader = asyncio.StreamReader(limit=PIPE_CHUNK_SIZE, loop=loop)
+        transport, protocol = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe.r)
         try:
-            while True:
-                read = asyncio.run_coroutine_threadsafe(
-                    filepart.read_chunk(filepart.chunk_size),
-                    loop=loop,
-                ).result()
-                if read == b'':
-                    break
-                pipe.w.write(read)
+            while read := await reader.read(PIPE_CHUNK_SIZE):
+                await resp.write(read)
         finally:
-            pipe.w.close()
-    except BrokenPipeError:
-        pass
+            # Closes `pipe.r`
+            transport.close()
+
+    await resp.write_eof()
+    return resp
@@ -8,6 +8,7 @@ def service_config(klass, config):
         'datastore': None,
         'datastore_prefix': '',
         'datastore_extend': None,
+        'datastore_extend_batch': None,
         'datastore_extend_context': None,
         'datastore_primary_key': 'id',
         'datastore_primary_key_type': 'integer',
@@ -51,6 +52,8 @@ class ServiceBase(type):
     Currently the following options are allowed:
       - datastore: name of the datastore mainly used in the service
       - datastore_extend: datastore `extend` option used in common `query` method
+      - datastore_extend_batch: datastore `extend_batch` option used in common `query` method. Receives the list of
+                                all rows at once and is used instead of `datastore_extend`.
       - datastore_prefix: datastore `prefix` option used in helper methods
       - service: system service `name` option used by `SystemServiceService`
       - service_verb: verb to be used on update (default to `reload`)
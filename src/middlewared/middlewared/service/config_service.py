@@ -75,6 +75,7 @@ class ConfigService(ServiceChangeMixin, Service, metaclass=ConfigServiceMetabase
     async def config(self):
         options = {}
         options['extend'] = self._config.datastore_extend
+        options['extend_batch'] = self._config.datastore_extend_batch
         options['extend_context'] = self._config.datastore_extend_context
         options['prefix'] = self._config.datastore_prefix
         return await self._get_or_insert(self._config.datastore, options)
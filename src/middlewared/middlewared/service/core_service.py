@@ -33,6 +33,7 @@ from .service import Service
 
 
 MIDDLEWARE_STARTED_SENTINEL_PATH = os.path.join(MIDDLEWARE_RUN_DIR, 'middlewared-started')
+BULK_MAX_CONCURRENCY = 32
 
 
 def is_service_class(service, klass):
@@ -170,7 +171,8 @@ class CoreService(Service):
         """Get the long running jobs."""
         raw_result = options['extra'].get('raw_result', True)
         jobs = filter_list([
-            i.__encode__(raw_result) for i in list(self.middleware.jobs.all().values())
+            # Encoded jobs are cached and shared with job events
+            dict(i.__encode__(raw_result)) for i in self.middleware.jobs.filter(filters)
         ], filters, options)
         return jobs
 
@@ -655,9 +657,17 @@ class CoreService(Service):
     def threads_stacks(self):
         return get_threads_stacks()
 
-    @accepts(Str("method"), List("params"), Str("description", null=True, default=None))
+    @accepts(
+        Str("method"),
+        List("params"),
+        Str("description", null=True, default=None),
+        Dict(
+            "options",
+            Int("concurrency", default=1, validators=[Range(min=1, max=BULK_MAX_CONCURRENCY)]),
+        ),
+    )
     @job(lock=lambda args: f"bulk:{args[0]}")
-    async def bulk(self, job, method, params, description):
+    async def bulk(self, job, method, params, description, options):
         """
         Will sequentially call `method` with arguments from the `params` list. For example, running
 
@@ -679,36 +689,75 @@ class CoreService(Service):
         error occurs). Caller must check for individual call results to ensure the absence of any call errors.
 
         `description` contains format string for job progress (e.g. "Deleting snapshot {0[dataset]}@{0[name]}")
+
+        `options.concurrency` allows running up to this many calls at once. Results are still returned in the order
+        of `params`.
+
+        Methods that have a batched implementation (e.g. `zfs.snapshot.delete`) are run with all the `params` at once.
         """
         statuses = []
         if not params:
             return statuses
 
-        for i, p in enumerate(params):
-            progress_description = f"{i} / {len(params)}"
-            if description is not None:
-                progress_description += ": " + description.format(*p)
+        if bulk_method := self._get_bulk_implementation(method):
+            job.set_progress(0, f"0 / {len(params)}")
+            try:
+                statuses = await self.middleware.call(bulk_method, params)
+            except Exception as e:
+                statuses = [{"result": None, "error": str(e)} for p in params]
 
-            job.set_progress(100 * i / len(params), progress_description)
+            job.set_progress(100, f"{len(params)} / {len(params)}")
+            return statuses
 
-            try:
-                msg = await self.middleware.call(method, *p)
-                status = {"result": msg, "error": None}
+        statuses = [None] * len(params)
+        pending = iter(enumerate(params))
+        completed = 0
 
-                if isinstance(msg, Job):
-                    b_job = msg
-                    status["job_id"] = b_job.id
-                    status["result"] = await msg.wait()
+        async def worker():
+            nonlocal completed
+            for i, p in pending:
+                progress_description = f"{completed} / {len(params)}"
+                if description is not None:
+                    progress_description += ": " + description.format(*p)
 
-                    if b_job.error:
-                        status["error"] = b_job.error
+                job.set_progress(100 * completed / len(params), progress_description)
 
-                statuses.append(status)
-            except Exception as e:
-                statuses.append({"result": None, "error": str(e)})
+                statuses[i] = await self._bulk_call(method, p)
+                completed += 1
+
+        await asyncio.gather(*[worker() for i in range(min(options["concurrency"], len(params)))])
 
         return statuses
 
+    def _get_bulk_implementation(self, method):
+        try:
+            serviceobj, methodobj = self.middleware._method_lookup(method)
+        except CallError:
+            # Individual calls will report the error
+            return None
+
+        if isinstance(serviceobj, CRUDService) and methodobj.__name__ in ["create", "update", "delete"]:
+            methodobj = getattr(serviceobj, f"do_{methodobj.__name__}")
+
+        return getattr(methodobj, "_bulk_implementation", None)
+
+    async def _bulk_call(self, method, params):
+        try:
+            msg = await self.middleware.call(method, *params)
+            status = {"result": msg, "error": None}
+
+            if isinstance(msg, Job):
+                b_job = msg
+                status["job_id"] = b_job.id
+                status["result"] = await msg.wait()
+
+                if b_job.error:
+                    status["error"] = b_job.error
+
+            return status
+        except Exception as e:
+            return {"result": None, "error": str(e)}
+
     _environ = {}
 
     @private
@@ -129,6 +129,7 @@ class CRUDService(ServiceChangeMixin, Service, metaclass=CRUDServiceMetabase):
     async def get_options(self, options):
         options = options or {}
         options['extend'] = self._config.datastore_extend
+        options['extend_batch'] = self._config.datastore_extend_batch
         options['extend_context'] = self._config.datastore_extend_context
         options['prefix'] = self._config.datastore_prefix
         return options
@@ -149,7 +150,7 @@ class CRUDService(ServiceChangeMixin, Service, metaclass=CRUDServiceMetabase):
         # In case we are extending which may transform the result in numerous ways
         # we can only filter the final result. Exception is when forced to use sql
         # for filters for performance reasons.
-        if not options['force_sql_filters'] and options['extend']:
+        if not options['force_sql_filters'] and (options['extend'] or options['extend_batch']):
             datastore_options = options.copy()
             datastore_options.pop('count', None)
             datastore_options.pop('get', None)
@@ -12,6 +12,20 @@ PeriodicTaskDescriptor = namedtuple('PeriodicTaskDescriptor', ['interval', 'run_
 THREADING_LOCKS = defaultdict(threading.Lock)
 
 
+def bulk_implementation(method):
+    """
+    Declare `method` as a batched implementation of the decorated method that `core.bulk` will call instead of calling
+    the decorated method once per item.
+
+    `method` accepts the list of `core.bulk` `params` (raw, not validated argument lists) and must return a list of
+    `{"result": ..., "error": ...}` statuses in the same order.
+    """
+    def wrap(fn):
+        fn._bulk_implementation = method
+        return fn
+    return wrap
+
+
 def cli_private(fn):
     """Do not expose method in CLI"""
     fn._cli_private = True
@@ -24,10 +24,7 @@ class SharingTaskService(CRUDService):
 
     @private
     async def sharing_task_extend_context(self, rows, extra):
-        datasets = sum([
-            await self.middleware.call(f'{self._config.namespace}.sharing_task_datasets', row)
-            for row in rows
-        ], [])
+        datasets = sum([await self.sharing_task_datasets(row) for row in rows], [])
 
         return {
             'locked_datasets': await self.middleware.call('zfs.dataset.locked_datasets', datasets) if datasets else [],
@@ -114,23 +111,25 @@ class SharingTaskService(CRUDService):
         )
 
     @private
-    async def sharing_task_extend(self, data, context):
-        args = [data] + ([context['service_extend']] if self._config.datastore_extend_context else [])
+    async def sharing_task_extend_batch(self, rows, context):
+        args = [context['service_extend']] if self._config.datastore_extend_context else []
 
-        if self._config.datastore_extend:
-            data = await self.middleware.call(self._config.datastore_extend, *args)
+        if self._config.datastore_extend_batch:
+            rows = await self.middleware.call(self._config.datastore_extend_batch, rows, *args)
+        elif self._config.datastore_extend:
+            rows = [await self.middleware.call(self._config.datastore_extend, row, *args) for row in rows]
 
-        data[self.locked_field] = await self.middleware.call(
-            f'{self._config.namespace}.sharing_task_determine_locked', data, context['locked_datasets']
-        )
+        for row in rows:
+            row[self.locked_field] = await self.sharing_task_determine_locked(row, context['locked_datasets'])
 
-        return data
+        return rows
 
     @private
     async def get_options(self, options):
         return {
             **(await super().get_options(options)),
-            'extend': f'{self._config.namespace}.sharing_task_extend',
+            'extend': None,
+            'extend_batch': f'{self._config.namespace}.sharing_task_extend_batch',
             'extend_context': f'{self._config.namespace}.sharing_task_extend_context',
         }
 
@@ -16,6 +16,7 @@ class SystemServiceService(ConfigService):
         return await self._get_or_insert(
             self._config.datastore, {
                 'extend': self._config.datastore_extend,
+                'extend_batch': self._config.datastore_extend_batch,
                 'extend_context': self._config.datastore_extend_context,
                 'prefix': self._config.datastore_prefix
             }
@@ -1,11 +1,16 @@
 import asyncio
+import copy
+import heapq
 import logging
 import re
 import signal
 import subprocess
 import json
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps, cache
+# `middlewared.utils.itertools` submodule shadows `itertools` in this namespace once it is imported
+from itertools import islice
 from threading import Lock
 
 from middlewared.service_exception import MatchNotFound
@@ -20,6 +25,7 @@ BRAND_PRODUCT = f'{BRAND}-{PRODUCT}'
 NULLS_FIRST = 'nulls_first:'
 NULLS_LAST = 'nulls_last:'
 REVERSE_CHAR = '-'
+FILTER_PLAN_CACHE_SIZE = 256
 
 logger = logging.getLogger(__name__)
 
@@ -127,6 +133,168 @@ def casefold(obj):
     raise ValueError(f'{type(obj)}: support for casefolding object type not implemented.')
 
 
+class FilterPlan(object):
+    """
+    A filter/options tree compiled once into a row predicate, a projection and a composite sort key.
+
+    Plans are immutable and shared between callers through the `filters` plan cache, so they must never
+    be modified after compilation.
+    """
+
+    def __init__(self, filters, options, predicate, projection, sort_key, sort_reverse):
+        self.filters = filters
+        self.options = options
+        self.predicate = predicate
+        self.projection = projection
+        self.sort_key = sort_key
+        self.sort_reverse = sort_reverse
+        self.get = options.get('get')
+        self.count = options.get('count') is True
+        self.offset = options.get('offset')
+        self.limit = options.get('limit')
+        self.shortcircuit = self.get and sort_key is None
+
+    def matches(self, filters, options):
+        # The cache is keyed by JSON which does not distinguish e.g. tuples from lists
+        return self.filters == filters and self.options == options
+
+    def iter_filters(self, _list):
+        """
+        Lazily apply the predicate and the projection to `_list`.
+        """
+        if self.predicate is not None:
+            _list = filter(self.predicate, _list)
+
+        if self.projection is not None:
+            _list = map(self.projection, _list)
+
+        return _list
+
+    def page_size(self):
+        """
+        Number of leading entries the result is sliced from or `None` if all of them are required.
+        """
+        if self.get is True:
+            return 1
+
+        if self.limit and self.limit > 0 and (self.offset or 0) >= 0:
+            return (self.offset or 0) + self.limit
+
+        return None
+
+    def do_order(self, rv, size):
+        if size is None:
+            return sorted(rv, key=self.sort_key, reverse=self.sort_reverse)
+
+        # Both are equivalent to `sorted(rv, ...)[:size]` (including the stability) but only keep `size`
+        # entries in a heap
+        if self.sort_reverse:
+            return heapq.nlargest(size, rv, key=self.sort_key)
+
+        return heapq.nsmallest(size, rv, key=self.sort_key)
+
+    def do_get(self, rv):
+        try:
+            return rv[0]
+        except IndexError:
+            raise MatchNotFound() from None
+
+    def execute(self, _list):
+        if self.predicate is None and self.projection is None:
+            rv = _list
+        else:
+            rv = self.iter_filters(_list)
+            if self.predicate is not None and self.shortcircuit:
+                return self.do_get(list(islice(rv, 1)))
+
+        if self.count:
+            if isinstance(rv, list):
+                return len(rv)
+
+            return sum(1 for i in rv)
+
+        size = self.page_size()
+        if self.sort_key is not None:
+            rv = self.do_order(rv, size)
+        elif size is not None and not isinstance(rv, list):
+            # Stop filtering as soon as the requested page is complete
+            rv = list(islice(rv, size))
+        elif not isinstance(rv, list):
+            rv = list(rv)
+
+        if self.get is True:
+            return self.do_get(rv)
+
+        if self.offset:
+            rv = rv[self.offset:]
+
+        if self.limit:
+            return rv[:self.limit]
+
+        return rv
+
+
+class _ReverseOrder(object):
+    """
+    Wraps a sort key component so that it sorts in descending order within an ascending composite key.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _compile_membership(value, negate):
+    try:
+        members = frozenset(value)
+    except TypeError:
+        members = None
+
+    if negate:
+        def fallback(x):
+            return x not in value
+    else:
+        def fallback(x):
+            return x in value
+
+    if members is None or isinstance(value, str):
+        return fallback
+
+    # Hash lookups are equivalent to list membership for hashable sources. Unhashable sources (i.e. lists)
+    # fall back to the original linear scan.
+    if negate:
+        def op(x):
+            try:
+                return x not in members
+            except TypeError:
+                return fallback(x)
+    else:
+        def op(x):
+            try:
+                return x in members
+            except TypeError:
+                return fallback(x)
+
+    return op
+
+
+def _compile_regex(value):
+    try:
+        match = re.compile(value).match
+    except (TypeError, re.error):
+        # Keep raising for every row being matched, the same way `re.match` does
+        return lambda x: re.match(value, x)
+
+    return lambda x: match(x)
+
+
 class filters(object):
     opmap = {
         '=': lambda x, y: x == y,
@@ -146,6 +314,30 @@ class filters(object):
         '!$': lambda x, y: x is not None and not x.endswith(y),
     }
 
+    # Same operations as `opmap`, bound to their filter value once at compile time
+    compiled_opmap = {
+        '=': lambda y: lambda x: x == y,
+        '!=': lambda y: lambda x: x != y,
+        '>': lambda y: lambda x: x > y,
+        '>=': lambda y: lambda x: x >= y,
+        '<': lambda y: lambda x: x < y,
+        '<=': lambda y: lambda x: x <= y,
+        '~': _compile_regex,
+        'in': lambda y: _compile_membership(y, False),
+        'nin': lambda y: _compile_membership(y, True),
+        'rin': lambda y: lambda x: x is not None and y in x,
+        'rnin': lambda y: lambda x: x is not None and y not in x,
+        '^': lambda y: lambda x: x is not None and x.startswith(y),
+        '!^': lambda y: lambda x: x is not None and not x.startswith(y),
+        '$': lambda y: lambda x: x is not None and x.endswith(y),
+        '!$': lambda y: lambda x: x is not None and not x.endswith(y),
+    }
+
+    def __init__(self, plan_cache_size=FILTER_PLAN_CACHE_SIZE):
+        self.plan_cache = OrderedDict()
+        self.plan_cache_size = plan_cache_size
+        self.plan_cache_lock = Lock()
+
     def validate_filters(self, filters):
         for f in filters:
             if len(f) == 2:
@@ -207,7 +399,8 @@ class filters(object):
         return False
 
     def getter_fn(self, _list):
-        if not _list:
+        # Lazy iterables (which `FilterPlan.execute` consumes only as far as needed) are expected to yield dicts
+        if not isinstance(_list, (list, tuple)) or not _list:
             return None
 
         if isinstance(_list[0], dict):
@@ -310,7 +503,200 @@ class filters(object):
         except IndexError:
             raise MatchNotFound() from None
 
+    def compile_getter(self, name, getter):
+        """
+        Resolve the dotted `name` once and return a function retrieving it from a single row.
+        """
+        if getter is getattr:
+            return lambda i: getattr(i, name)
+
+        segments = []
+        right = name
+        while right:
+            left, right = partition(right)
+            segments.append(left)
+
+        if len(segments) == 1:
+            key = segments[0]
+
+            def fn(i):
+                if isinstance(i, dict):
+                    return i.get(key)
+
+                return get(i, name)
+
+            return fn
+
+        def fn(i):
+            cur = i
+            for left in segments:
+                if isinstance(cur, dict):
+                    cur = cur.get(left)
+                elif isinstance(cur, (list, tuple)):
+                    left = int(left)
+                    cur = cur[left] if left < len(cur) else None
+            return cur
+
+        return fn
+
+    def compile_filter(self, f, getter):
+        if len(f) == 2:
+            branches = [self.compile_filter(branch, getter) for branch in f[1]]
+
+            def fn(i):
+                for branch in branches:
+                    if branch(i):
+                        return True
+
+                return False
+
+            return fn
+
+        name, op, value = f
+        source = self.compile_getter(name, getter)
+        if op[0] == 'C':
+            try:
+                value = casefold(value)
+            except ValueError:
+                fn = self.opmap[op[1:]]
+                return lambda i: fn(casefold(source(i)), casefold(value))
+
+            test = self.compiled_opmap[op[1:]](value)
+            return lambda i: test(casefold(source(i)))
+
+        test = self.compiled_opmap[op](value)
+        return lambda i: test(source(i))
+
+    def compile_predicate(self, filters, getter):
+        predicates = [self.compile_filter(f, getter) for f in filters]
+        if len(predicates) == 1:
+            return predicates[0]
+
+        def fn(i):
+            for predicate in predicates:
+                if not predicate(i):
+                    return False
+
+            return True
+
+        return fn
+
+    def compile_projection(self, select):
+        select = tuple(select)
+        return lambda i: {s: i[s] for s in select if s in i}
+
+    def compile_order(self, order_by):
+        """
+        Compile `order_by` into a single `(key, reverse)` pair.
+
+        Ordering by several fields has always been implemented as one stable sort per field, which makes the
+        last field the most significant one. The composite key preserves that.
+        """
+        parts = []
+        for o in order_by:
+            if o.startswith(NULLS_FIRST):
+                o = o[len(NULLS_FIRST):]
+                nulls_first = True
+            elif o.startswith(NULLS_LAST):
+                o = o[len(NULLS_LAST):]
+                nulls_first = False
+            else:
+                nulls_first = None
+
+            if o.startswith(REVERSE_CHAR):
+                o = o[1:]
+                reverse = True
+            else:
+                reverse = False
+
+            parts.append((o, self.compile_getter(o, get), reverse, nulls_first))
+
+        if not parts:
+            return None, False
+
+        if len(parts) == 1 and parts[0][3] is None:
+            return parts[0][1], parts[0][2]
+
+        components = []
+        for name, getter, reverse, nulls_first in reversed(parts):
+            if reverse:
+                getter = (lambda g: lambda i: _ReverseOrder(g(i)))(getter)
+
+            if nulls_first is None:
+                components.append(getter)
+                continue
+
+            # Nulls are grouped before (or after) every other entry, keeping their relative order
+            null_rank, value_rank = (0, 1) if nulls_first else (1, 0)
+            components.append(
+                (lambda name, getter, null_rank, value_rank: lambda i: (
+                    (null_rank,) if i[name] is None else (value_rank, getter(i))
+                ))(name, getter, null_rank, value_rank)
+            )
+
+        if len(components) == 1:
+            return components[0], False
+
+        return lambda i: tuple(component(i) for component in components), False
+
+    def compile(self, filters=None, options=None, getter=get):
+        """
+        Validate `filters` and `options` and compile them into a `FilterPlan`.
+
+        `getter` is the row accessor that `getter_fn` would pick for the list the plan is applied to.
+        """
+        options, select, order_by = self.validate_options(options)
+        if filters:
+            self.validate_filters(filters)
+            predicate = self.compile_predicate(filters, getter)
+        else:
+            predicate = None
+
+        return FilterPlan(
+            filters,
+            options,
+            predicate,
+            self.compile_projection(select) if select else None,
+            *self.compile_order(order_by),
+        )
+
+    def get_plan(self, filters=None, options=None, getter=get):
+        """
+        Return a compiled plan for `filters` and `options`, reusing a cached one when possible.
+        """
+        try:
+            key = json.dumps([filters, options, getter is get])
+        except (TypeError, ValueError):
+            # Not JSON serializable (or circular), compile without caching
+            return self.compile(filters, options, getter)
+
+        with self.plan_cache_lock:
+            plan = self.plan_cache.get(key)
+            if plan is not None:
+                self.plan_cache.move_to_end(key)
+
+        if plan is not None:
+            if plan.matches(filters, options or {}):
+                return plan
+
+            return self.compile(filters, options, getter)
+
+        # Cached plans outlive this call, make sure they do not reference caller-owned (mutable) values
+        plan = self.compile(copy.deepcopy(filters), copy.deepcopy(options), getter)
+        with self.plan_cache_lock:
+            self.plan_cache[key] = plan
+            if len(self.plan_cache) > self.plan_cache_size:
+                self.plan_cache.popitem(last=False)
+
+        return plan
+
     def filter_list(self, _list, filters=None, options=None):
+        return self.get_plan(filters, options, self.getter_fn(_list) or get).execute(_list)
+
+    def interpret_list(self, _list, filters=None, options=None):
+        """
+        Reference implementation of `filter_list` that interprets `filters` and `options` for every row.
+        """
         options, select, order_by = self.validate_options(options)
 
         do_shortcircuit = options.get('get') and not order_by
@@ -5,6 +5,8 @@ import asyncio
 import inspect
 import os
 import setproctitle
+import threading
+import time
 
 from . import logger
 from .common.environ import environ_update
@@ -14,6 +16,46 @@ import middlewared.utils.osc as osc
 from .utils.service.call import MethodNotFoundError, ServiceCallMixin
 
 MIDDLEWARE = None
+PROGRESS_UPDATE_INTERVAL = 1
+
+
+class WorkerClient(object):
+    """
+    Single long-lived connection to the middleware internal socket shared by every call, event and job progress
+    update of the worker process. It is established on demand and re-established if it was closed.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.lock = threading.Lock()
+        self.on_connect_callbacks = []
+
+    def get(self):
+        with self.lock:
+            if self.client is None or self.client.closed:
+                client = Client(f'ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock', py_exceptions=True)
+                try:
+                    for callback in self.on_connect_callbacks:
+                        callback(client)
+                except Exception:
+                    client.close()
+                    raise
+
+                self.client = client
+
+            return self.client
+
+    def on_connect(self, callback):
+        """
+        Run `callback(client)` every time a new connection is established (i.e. to subscribe to events).
+        """
+        with self.lock:
+            self.on_connect_callbacks.append(callback)
+            if self.client is not None and not self.client.closed:
+                callback(self.client)
+
+    def call(self, method, *params, **kwargs):
+        return self.get().call(method, *params, **kwargs)
 
 
 class FakeMiddleware(LoadPluginsMixin, ServiceCallMixin):
@@ -23,23 +65,25 @@ class FakeMiddleware(LoadPluginsMixin, ServiceCallMixin):
 
     def __init__(self):
         super().__init__()
-        self.client = None
+        self.client = WorkerClient()
         _logger = logger.Logger('worker')
         self.logger = _logger.getLogger()
         _logger.configure_logging('console')
         self.loop = asyncio.get_event_loop()
 
     def _call(self, name, serviceobj, methodobj, params=None, app=None, pipes=None, job=None):
+        fake_job = None
+        job_options = getattr(methodobj, '_job', None)
+        if job and job_options:
+            fake_job = FakeJob(job['id'], self.client)
+            params = list(params) if params else []
+            params.insert(0, fake_job)
+
         try:
-            with Client(f'ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock', py_exceptions=True) as c:
-                self.client = c
-                job_options = getattr(methodobj, '_job', None)
-                if job and job_options:
-                    params = list(params) if params else []
-                    params.insert(0, FakeJob(job['id'], self.client))
-                return methodobj(*params)
+            return methodobj(*params)
         finally:
-            self.client = None
+            if fake_job is not None:
+                fake_job.flush_progress()
 
     def _run(self, name, args, job):
         serviceobj, methodobj = self._method_lookup(name)
@@ -82,8 +126,7 @@ class FakeMiddleware(LoadPluginsMixin, ServiceCallMixin):
         return []
 
     def send_event(self, name, event_type, **kwargs):
-        with Client(py_exceptions=True) as c:
-            return c.call('core.event_send', name, event_type, kwargs)
+        return self.client.call('core.event_send', name, event_type, kwargs)
 
 
 class FakeJob(object):
@@ -96,13 +139,43 @@ class FakeJob(object):
             'description': None,
             'extra': None,
         }
+        self.progress_lock = threading.Lock()
+        self.progress_sent_at = None
+        self.pending_progress = None
 
     def set_progress(self, percent, description=None, extra=None):
-        self.progress['percent'] = percent
-        if description:
-            self.progress['description'] = description
-        if extra:
-            self.progress['extra'] = extra
+        """
+        Progress updates more frequent than `PROGRESS_UPDATE_INTERVAL` seconds are coalesced, only the latest one
+        is sent once the interval expires.
+        """
+        with self.progress_lock:
+            self.progress['percent'] = percent
+            if description:
+                self.progress['description'] = description
+            if extra:
+                self.progress['extra'] = extra
+
+            if (
+                self.progress_sent_at is None or
+                time.monotonic() - self.progress_sent_at >= PROGRESS_UPDATE_INTERVAL
+            ):
+                self._send_progress()
+            elif self.pending_progress is None:
+                self.pending_progress = threading.Timer(PROGRESS_UPDATE_INTERVAL, self.flush_progress)
+                self.pending_progress.daemon = True
+                self.pending_progress.start()
+
+    def flush_progress(self):
+        with self.progress_lock:
+            if self.pending_progress is not None:
+                self._send_progress()
+
+    def _send_progress(self):
+        if self.pending_progress is not None:
+            self.pending_progress.cancel()
+            self.pending_progress = None
+
+        self.progress_sent_at = time.monotonic()
         self.client.call('core.job_update', self.id, {'progress': self.progress})
 
 
@@ -120,18 +193,38 @@ def main_worker(*call_args):
     return res
 
 
+def receive_environ(client):
+    client.subscribe('core.environ', lambda *args, **kwargs: environ_update(kwargs['fields']))
+    environ_update(client.call('core.environ'))
+
+
 def receive_events():
-    c = Client(f'ws+unix://{MIDDLEWARE_RUN_DIR}/middlewared-internal.sock', py_exceptions=True)
-    c.subscribe('core.environ', lambda *args, **kwargs: environ_update(kwargs['fields']))
-    environ_update(c.call('core.environ'))
+    MIDDLEWARE.client.on_connect(receive_environ)
+    MIDDLEWARE.client.get()
 
 
-def worker_init(debug_level, log_handler):
+def load_plugins():
+    """
+    Load all middleware plugins in the current process unless they were already loaded. Workers forked from the
+    preloaded forkserver (see `middlewared.worker_preload`) inherit loaded plugins and skip this entirely.
+    """
     global MIDDLEWARE
+    if MIDDLEWARE is not None:
+        return
+
     MIDDLEWARE = FakeMiddleware()
     os.environ['MIDDLEWARED_LOADING'] = 'True'
     MIDDLEWARE._load_plugins()
     os.environ['MIDDLEWARED_LOADING'] = 'False'
+
+
+def worker_init(debug_level, log_handler):
+    if MIDDLEWARE is not None:
+        # Do not share the event loop (and its selector) created in the forkserver between workers
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        MIDDLEWARE.loop = asyncio.get_event_loop()
+
+    load_plugins()
     setproctitle.setproctitle('middlewared (worker)')
     osc.die_with_parent()
     logger.setup_logging('worker', debug_level, log_handler)
@@ -0,0 +1,7 @@
+"""
+Imported once by the process pool forkserver (see `Middleware.__init_procpool`) so that every process pool worker
+forked from it starts with all plugins already loaded.
+"""
+from middlewared.worker import load_plugins
+
+load_plugins()
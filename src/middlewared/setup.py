@@ -40,7 +40,7 @@ class InstallWithBabel(install):
 setup(
     name='middlewared',
     description='TrueNAS Middleware Daemon',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     package_data={
         'middlewared.apidocs': [
             'templates/websocket/*',